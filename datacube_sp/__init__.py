@@ -26,15 +26,76 @@ try:
 except ImportError:
     __version__ = 'Unknown/Not Installed'
 
-from .api import Datacube
+import importlib
+import importlib.util
+import sys
 import warnings
-from .utils import xarray_geoextensions
 
 # Ensure deprecation warnings from datacube_sp modules are shown
 warnings.filterwarnings('always', category=DeprecationWarning, module=r'^datacube_sp\.')
 
+# Heavy subsystems (xarray, dask, rasterio, ...) are only imported on first use, so that
+# short lived processes (e.g. CLI commands that only talk to the index) start quickly
+_LAZY_ATTRS = {
+    "Datacube": "datacube_sp.api",
+    "xarray_geoextensions": "datacube_sp.utils",
+}
+
 __all__ = (
     "Datacube",
     "__version__",
     "xarray_geoextensions",
 )
+
+
+class _AccessorsOnXarrayImport:
+    """
+    One-shot import hook registering the `.geobox`/`.extent` xarray accessors as soon as xarray
+    is imported, so that they are there without `datacube_sp` importing xarray itself.
+    """
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname != "xarray":
+            return None
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(fullname)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _AccessorsLoader(spec.loader)
+        return spec
+
+
+class _AccessorsLoader:
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # hand xarray its own loader back before it runs
+        module.__loader__ = module.__spec__.loader = self._loader
+        self._loader.exec_module(module)
+        # `datacube_sp.utils` registers them once initialised, which may be what is importing xarray
+        importlib.import_module("datacube_sp.utils")
+
+
+# The accessors are registered by importing `datacube_sp.utils.xarray_geoextensions`, which happens
+# on first use of `Datacube` or any module working with xarray, or else when xarray is imported.
+if "xarray" in sys.modules:
+    importlib.import_module("datacube_sp.utils.xarray_geoextensions")
+else:
+    sys.meta_path.insert(0, _AccessorsOnXarrayImport())
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    module = importlib.import_module(_LAZY_ATTRS[name])
+    value = getattr(module, name) if hasattr(module, name) else importlib.import_module(module.__name__ + '.' + name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
@@ -3,28 +3,32 @@
 # Copyright (c) 2015-2021 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
 import uuid
+import json
 import collections.abc
 from itertools import groupby
 from typing import Set, Union, Optional, Dict, Tuple, cast
 import datetime
 
-import ipdb
 import numpy
 import xarray
 from dask import array as da
+from toolz import partition_all  # type: ignore[import]
 
 from datacube_sp.config import LocalConfig
 from datacube_sp.storage import reproject_and_fuse, BandInfo, BandInfo_sp, RasterDataSourceforGDAL
 from datacube_sp.utils import ignore_exceptions_if
 from datacube_sp.utils import geometry
 from datacube_sp.utils.dates import normalise_dt
-from datacube_sp.utils.geometry import intersects, GeoBox
+from datacube_sp.utils.geometry import GeoBox
 from datacube_sp.utils.geometry.gbox import GeoboxTiles
+from datacube_sp.utils.rio import effective_rio_options, resolve_io_profile, use_io_profile
 from datacube_sp.model import ExtraDimensions
 from datacube_sp.model.utils import xr_apply
 
 from .query import Query, query_group_by, query_geopolygon
+from .spatial_index import DatasetSpatialIndex
 from ..index import index_connect
+from ..index._query_cache import DEFAULT_QUERY_CACHE_TTL
 from ..drivers import new_datasource
 
 
@@ -47,7 +51,9 @@ class Datacube(object):
                  config=None,
                  app=None,
                  env=None,
-                 validate_connection=True):
+                 validate_connection=True,
+                 query_cache_size=None,
+                 query_cache_ttl=DEFAULT_QUERY_CACHE_TTL):
         """
         Create the interface for the query and storage access.
 
@@ -73,6 +79,14 @@ class Datacube(object):
 
         :param bool validate_connection: Should we check that the database connection is available and valid
 
+        :param int query_cache_size: If given, cache the results of :meth:`find_datasets` searches,
+            holding up to this many dataset records. Off by default.
+
+            The cache belongs to the index: it is shared with other users of the same index object and
+            invalidated by dataset changes made through it. See :meth:`datacube_sp.index.Index.enable_query_cache`.
+
+        :param float query_cache_ttl: Seconds a cached search result is reused for.
+
         :return: Datacube object
 
         """
@@ -89,6 +103,9 @@ class Datacube(object):
                                   application_name=app,
                                   validate_connection=validate_connection)
 
+        if query_cache_size:
+            index.enable_query_cache(query_cache_size, query_cache_ttl)
+
         self.index = index
 
     def list_products(self, with_pandas=True, dataset_count=False):
@@ -191,7 +208,7 @@ class Datacube(object):
     #: pylint: disable=too-many-arguments, too-many-locals
     def load(self, product=None, measurements=None, output_crs=None, resolution=None, resampling=None,
              skip_broken_datasets=False, dask_chunks=None, like=None, fuse_func=None, align=None,
-             datasets=None, dataset_predicate=None, progress_cbk=None, patch_url=None, **query):
+             datasets=None, dataset_predicate=None, progress_cbk=None, patch_url=None, io_profile=None, **query):
         """
         Load data as an ``xarray.Dataset`` object.
         Each measurement will be a data variable in the :class:`xarray.Dataset`.
@@ -390,6 +407,17 @@ class Datacube(object):
             if supplied, will be used to patch/sign the url(s), as required to access some commercial archives
             (e.g. Microsoft Planetary Computer).
 
+        :param str io_profile:
+            Optional. GDAL settings to read with, applied in every thread doing IO for this load, one of:
+
+            - ``'cloud-bulk'``: many concurrent reads from an object store (HTTP/2 multiplexing, merged ranges)
+            - ``'local-nvme'``: local files, decode on all cores, no VSI cache
+            - ``'latency'``: few small reads, fetch headers in one request
+
+            The GDAL block cache is sized from the available memory. The profile name and the effective
+            GDAL settings are recorded in the ``dc_io_profile`` and ``dc_io_settings`` (JSON) attributes
+            of the result. See :data:`datacube_sp.utils.rio.IO_PROFILES`.
+
         :return:
             Requested data in a :class:`xarray.Dataset`
 
@@ -449,7 +477,8 @@ class Datacube(object):
                                 skip_broken_datasets=skip_broken_datasets,
                                 progress_cbk=progress_cbk,
                                 extra_dims=extra_dims,
-                                patch_url=patch_url)
+                                patch_url=patch_url,
+                                io_profile=io_profile)
 
         return result
 
@@ -482,8 +511,12 @@ class Datacube(object):
         if not query.product:
             raise ValueError("must specify a product")
 
-        datasets = self.index.datasets.search(limit=limit,
-                                              **query.search_terms)
+        cache = self.index.query_cache
+        if cache is not None:
+            datasets = cache.search(self.index, limit=limit, **query.search_terms)
+        else:
+            datasets = self.index.datasets.search(limit=limit,
+                                                  **query.search_terms)
 
         if query.geopolygon is not None:
             datasets = select_datasets_inside_polygon(datasets, query.geopolygon)
@@ -636,7 +669,7 @@ class Datacube(object):
 
     @staticmethod
     def _dask_load(sources, geobox, measurements, dask_chunks,
-                   skip_broken_datasets=False, extra_dims=None, patch_url=None):
+                   skip_broken_datasets=False, extra_dims=None, patch_url=None, io_profile=None):
         chunk_sizes = _calculate_chunk_sizes(sources, geobox, dask_chunks, extra_dims)
         needed_irr_chunks = chunk_sizes[0]
         if extra_dims:
@@ -646,12 +679,9 @@ class Datacube(object):
         dsk = {}
 
         def chunk_datasets(dss, gbt):
-            out = {}
             for ds in dss:
                 dsk[_tokenize_dataset(ds)] = ds
-                for idx in gbt.tiles(ds.extent):
-                    out.setdefault(idx, []).append(ds)
-            return out
+            return DatasetSpatialIndex(dss, gbt.base.crs).tiles(gbt)
 
         chunked_srcs = xr_apply(sources,
                                 lambda _, dss: chunk_datasets(dss, gbt),
@@ -667,7 +697,8 @@ class Datacube(object):
                                     chunks=chunks,
                                     skip_broken_datasets=skip_broken_datasets,
                                     extra_dims=extra_dims,
-                                    patch_url=patch_url)
+                                    patch_url=patch_url,
+                                    io_profile=io_profile)
 
         return Datacube.create_storage(sources.coords, geobox, measurements, data_func, extra_dims)
 
@@ -675,7 +706,7 @@ class Datacube(object):
     def _xr_load(sources, geobox, measurements,
                  skip_broken_datasets=False,
                  progress_cbk=None, extra_dims=None,
-                 patch_url=None):
+                 patch_url=None, io_profile=None):
 
         def mk_cbk(cbk):
             if cbk is None:
@@ -721,7 +752,7 @@ class Datacube(object):
                 _fuse_measurement(data_slice, datasets, geobox, m,
                                   skip_broken_datasets=skip_broken_datasets,
                                   progress_cbk=_cbk, extra_dim_index=extra_dim_index,
-                                  patch_url=patch_url)
+                                  patch_url=patch_url, io_profile=io_profile)
             except (TerminateCurrentLoad, KeyboardInterrupt):
                 data.attrs['dc_partial_load'] = True
                 return data
@@ -732,7 +763,7 @@ class Datacube(object):
     def load_data(sources, geobox, measurements, resampling=None,
                   fuse_func=None, dask_chunks=None, skip_broken_datasets=False,
                   progress_cbk=None, extra_dims=None, patch_url=None,
-                  **extra):
+                  io_profile=None, **extra):
         """
         Load data from :meth:`group_datasets` into an :class:`xarray.Dataset`.
 
@@ -778,23 +809,35 @@ class Datacube(object):
         :param Callable[[str], str], patch_url:
             if supplied, will be used to patch/sign the url(s), as required to access some commercial archives.
 
+        :param str|IOProfile io_profile:
+            GDAL settings to read with, see :meth:`load`.
+
         :rtype: xarray.Dataset
 
         .. seealso:: :meth:`find_datasets` :meth:`group_datasets`
         """
         measurements = per_band_load_data_settings(measurements, resampling=resampling, fuse_func=fuse_func)
+        io_profile = resolve_io_profile(io_profile)
 
         if dask_chunks is not None:
-            return Datacube._dask_load(sources, geobox, measurements, dask_chunks,
+            result = Datacube._dask_load(sources, geobox, measurements, dask_chunks,
+                                         skip_broken_datasets=skip_broken_datasets,
+                                         extra_dims=extra_dims,
+                                         patch_url=patch_url,
+                                         io_profile=io_profile)
+        else:
+            result = Datacube._xr_load(sources, geobox, measurements,
                                        skip_broken_datasets=skip_broken_datasets,
+                                       progress_cbk=progress_cbk,
                                        extra_dims=extra_dims,
-                                       patch_url=patch_url)
-        else:
-            return Datacube._xr_load(sources, geobox, measurements,
-                                     skip_broken_datasets=skip_broken_datasets,
-                                     progress_cbk=progress_cbk,
-                                     extra_dims=extra_dims,
-                                     patch_url=patch_url)
+                                       patch_url=patch_url,
+                                       io_profile=io_profile)
+
+        if io_profile is not None:
+            result.attrs['dc_io_profile'] = io_profile.name
+            result.attrs['dc_io_settings'] = json.dumps(effective_rio_options(io_profile), sort_keys=True)
+
+        return result
 
     def __str__(self):
         return "Datacube<index={!r}>".format(self.index)
@@ -902,23 +945,24 @@ def output_geobox(like=None, output_crs=None, resolution=None, align=None,
     return geometry.GeoBox.from_geopolygon(geopolygon, resolution, crs, align)
 
 
-def select_datasets_inside_polygon(datasets, polygon):
+def select_datasets_inside_polygon(datasets, polygon, batch_size=1000):
     # Check against the bounding box of the original scene, can throw away some portions
     assert polygon is not None
     query_crs = polygon.crs
-    for dataset in datasets:
-        if intersects(polygon, dataset.extent.to_crs(query_crs)):
-            yield dataset
+    # Index dataset extents a batch at a time
+    for batch in partition_all(batch_size, datasets):
+        yield from DatasetSpatialIndex(batch, query_crs).intersecting(polygon, strict=True)
 
 
 def fuse_lazy(datasets, geobox, measurement,
-              skip_broken_datasets=False, prepend_dims=0, extra_dim_index=None, patch_url=None):
+              skip_broken_datasets=False, prepend_dims=0, extra_dim_index=None, patch_url=None, io_profile=None):
     prepend_shape = (1,) * prepend_dims
     data = numpy.full(geobox.shape, measurement.nodata, dtype=measurement.dtype)
     _fuse_measurement(data, datasets, geobox, measurement,
                       skip_broken_datasets=skip_broken_datasets,
                       extra_dim_index=extra_dim_index,
-                      patch_url=patch_url)
+                      patch_url=patch_url,
+                      io_profile=io_profile)
     return data.reshape(prepend_shape + geobox.shape)
 
 
@@ -926,7 +970,8 @@ def _fuse_measurement(dest, datasets, geobox, measurement,
                       skip_broken_datasets=False,
                       progress_cbk=None,
                       extra_dim_index=None,
-                      patch_url=None):
+                      patch_url=None,
+                      io_profile=None):
     srcs = []
     for ds in datasets:
         src = None
@@ -945,19 +990,20 @@ def _fuse_measurement(dest, datasets, geobox, measurement,
         else:
             srcs.append(src)
 
-    reproject_and_fuse(srcs,
-                       dest,
-                       geobox,
-                       dest.dtype.type(measurement.nodata),
-                       resampling=measurement.get('resampling_method', 'nearest'),
-                       fuse_func=measurement.get('fuser', None),
-                       skip_broken_datasets=skip_broken_datasets,
-                       progress_cbk=progress_cbk,
-                       extra_dim_index=extra_dim_index)
+    with use_io_profile(io_profile):
+        reproject_and_fuse(srcs,
+                           dest,
+                           geobox,
+                           dest.dtype.type(measurement.nodata),
+                           resampling=measurement.get('resampling_method', 'nearest'),
+                           fuse_func=measurement.get('fuser', None),
+                           skip_broken_datasets=skip_broken_datasets,
+                           progress_cbk=progress_cbk,
+                           extra_dim_index=extra_dim_index)
 
 
 def get_bounds(datasets, crs):
-    bbox = geometry.bbox_union(ds.extent.to_crs(crs).boundingbox for ds in datasets)
+    bbox = DatasetSpatialIndex(datasets, crs).bounds
     return geometry.box(*bbox, crs=crs)
 
 
@@ -1014,7 +1060,8 @@ def _make_dask_array(chunked_srcs,
                      chunks,
                      skip_broken_datasets=False,
                      extra_dims=None,
-                     patch_url=None):
+                     patch_url=None,
+                     io_profile=None):
     dsk = dsk.copy()  # this contains mapping from dataset id to dataset object
 
     token = uuid.uuid4().hex
@@ -1069,11 +1116,11 @@ def _make_dask_array(chunked_srcs,
                     # Do extra_dim subsetting here
                     index_subset = extra_dims.measurements_index(measurement.extra_dim)
                     for result_index, extra_dim_index in enumerate(range(*index_subset)):
-                        dsk[key_prefix + (result_index,) + idx] = val + (extra_dim_index, patch_url)
+                        dsk[key_prefix + (result_index,) + idx] = val + (extra_dim_index, patch_url, io_profile)
                 else:
                     # Get extra_dim index if available
                     extra_dim_index = measurement.get('extra_dim_index', None)
-                    dsk[key_prefix + idx] = val + (extra_dim_index, patch_url)
+                    dsk[key_prefix + idx] = val + (extra_dim_index, patch_url, io_profile)
 
     y_shapes = [grid_chunks[0]]*gbt.shape[0]
     x_shapes = [grid_chunks[1]]*gbt.shape[1]
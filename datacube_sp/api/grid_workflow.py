@@ -7,9 +7,9 @@ import xarray
 from collections import OrderedDict
 import pandas as pd
 
-from datacube_sp.utils.geometry import intersects
 from .query import Query, query_group_by
 from .core import Datacube
+from .spatial_index import DatasetSpatialIndex
 
 _LOG = logging.getLogger(__name__)
 
@@ -203,34 +203,26 @@ class GridWorkflow(object):
             geobox = geobox.buffered(*tile_buffer) if tile_buffer else geobox
 
             datasets, query = self._find_datasets(geobox.extent, indexers)
-            for dataset in datasets:
-                if intersects(geobox.extent, dataset.extent.to_crs(self.grid_spec.crs)):
-                    add_dataset_to_cells(cell_index, geobox, dataset)
+            for dataset in DatasetSpatialIndex(datasets, self.grid_spec.crs).intersecting(geobox.extent, strict=True):
+                add_dataset_to_cells(cell_index, geobox, dataset)
             return cells
         else:
             datasets, query = self._find_datasets(geopolygon, indexers)
             geobox_cache = {}
+            spatial_index = DatasetSpatialIndex(datasets, self.grid_spec.crs)
 
             if query.geopolygon:
-                # Get a rough region of tiles
-                query_tiles = set(
-                    tile_index for tile_index, tile_geobox in
-                    self.grid_spec.tiles_from_geopolygon(query.geopolygon, geobox_cache=geobox_cache))
-
-                for dataset in datasets:
-                    # Go through our datasets and see which tiles each dataset produces, and whether they intersect
-                    # our query geopolygon.
-                    dataset_extent = dataset.extent.to_crs(self.grid_spec.crs)
-                    bbox = dataset_extent.boundingbox
-                    bbox = bbox.buffered(*tile_buffer) if tile_buffer else bbox
-
-                    for tile_index, tile_geobox in self.grid_spec.tiles(bbox, geobox_cache=geobox_cache):
-                        if tile_index in query_tiles and intersects(tile_geobox.extent, dataset_extent):
-                            add_dataset_to_cells(tile_index, tile_geobox, dataset)
+                # Get a rough region of tiles, then the datasets intersecting each of them
+                query_tiles = list(self.grid_spec.tiles_from_geopolygon(query.geopolygon, geobox_cache=geobox_cache))
+                hits = spatial_index.query([tile_geobox.extent for _, tile_geobox in query_tiles], strict=True)
+
+                for (tile_index, tile_geobox), ds_idxs in zip(query_tiles, hits):
+                    for i in ds_idxs:
+                        add_dataset_to_cells(tile_index, tile_geobox, spatial_index.datasets[i])
 
             else:
-                for dataset in datasets:
-                    for tile_index, tile_geobox in self.grid_spec.tiles_from_geopolygon(dataset.extent,
+                for dataset, dataset_extent in zip(datasets, spatial_index.extents):
+                    for tile_index, tile_geobox in self.grid_spec.tiles_from_geopolygon(dataset_extent,
                                                                                         tile_buffer=tile_buffer,
                                                                                         geobox_cache=geobox_cache):
                         add_dataset_to_cells(tile_index, tile_geobox, dataset)
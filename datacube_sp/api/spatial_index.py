@@ -0,0 +1,125 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Bulk spatial queries over lists of datasets.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy
+import shapely  # type: ignore[import]
+from shapely.strtree import STRtree  # type: ignore[import]
+
+from datacube_sp.model import Dataset
+from datacube_sp.utils.geometry import (BoundingBox, Geometry, MaybeCRS, batch_to_crs, bbox_union, common_crs,
+                                        intersects)
+from datacube_sp.utils.geometry._base import _SHAPELY_VECTORISED
+from datacube_sp.utils.geometry.gbox import GeoboxTiles
+
+
+def _geom_array(geoms: Sequence[Geometry]) -> numpy.ndarray:
+    out = numpy.empty(len(geoms), dtype=object)
+    out[:] = [g.geom for g in geoms]
+    return out
+
+
+class DatasetSpatialIndex:
+    """
+    Spatial index of dataset footprints, answering many "which datasets touch this polygon"
+    queries at once.
+
+    Footprints are reprojected once (see :func:`datacube_sp.utils.geometry.batch_to_crs`). A
+    shapely ``STRtree`` over them is only built the first time several polygons are queried
+    together, a single polygon is checked against all the footprints in one vectorised call.
+
+    :param datasets: Datasets to index. Each must have an extent.
+    :param crs: CRS to index the footprints in, query geometries are reprojected to it.
+                Defaults to the (common) CRS of the footprints.
+    """
+
+    def __init__(self, datasets: Iterable[Dataset], crs: MaybeCRS = None):
+        self.datasets: List[Dataset] = list(datasets)
+        extents = [ds.extent for ds in self.datasets]
+        if crs is None:
+            self.crs = common_crs(extents)
+            self.extents = extents
+        else:
+            self.extents = batch_to_crs(extents, crs)
+            self.crs = self.extents[0].crs if self.extents else None
+        self._geoms = _geom_array(self.extents)
+        self._tree: Optional[STRtree] = None
+
+    def __len__(self) -> int:
+        return len(self.datasets)
+
+    @property
+    def bounds(self) -> BoundingBox:
+        """
+        Bounding box of all the footprints.
+        """
+        return bbox_union(extent.boundingbox for extent in self.extents)
+
+    def query(self, polygons: Iterable[Geometry], strict: bool = False) -> List[List[int]]:
+        """
+        Find the datasets intersecting each of the polygons.
+
+        :param polygons: Query geometries
+        :param strict: Exclude footprints that only touch the polygon (as :func:`datacube_sp.utils.geometry.intersects`)
+        :return: For each polygon, the positions of the intersecting datasets, in order.
+        """
+        polygons = list(polygons)
+        out: List[List[int]] = [[] for _ in polygons]
+        if not polygons or not self.extents:
+            return out
+        if self.crs is not None:
+            polygons = batch_to_crs(polygons, self.crs)
+
+        if not _SHAPELY_VECTORISED:
+            for hits, polygon in zip(out, polygons):
+                hits.extend(i for i, extent in enumerate(self.extents)
+                            if (intersects(polygon, extent) if strict else polygon.intersects(extent)))
+            return out
+
+        geoms = _geom_array(polygons)
+        if len(geoms) == 1:
+            # not worth building a tree for, test the prepared polygon against every footprint
+            geom = geoms[0]
+            shapely.prepare(geom)
+            hit = shapely.intersects(geom, self._geoms)
+            if strict:
+                hit &= ~shapely.touches(geom, self._geoms)
+            out[0].extend(numpy.flatnonzero(hit).tolist())
+            return out
+
+        if self._tree is None:
+            self._tree = STRtree(self._geoms)
+        poly_idx, ds_idx = self._tree.query(geoms, predicate='intersects')
+        if strict:
+            keep = ~shapely.touches(geoms[poly_idx], self._geoms[ds_idx])
+            poly_idx, ds_idx = poly_idx[keep], ds_idx[keep]
+        order = numpy.lexsort((ds_idx, poly_idx))
+        for p, d in zip(poly_idx[order].tolist(), ds_idx[order].tolist()):
+            out[p].append(d)
+        return out
+
+    def intersecting(self, polygon: Geometry, strict: bool = False) -> List[Dataset]:
+        """
+        Datasets whose footprints intersect the polygon, in order.
+
+        :param strict: Exclude footprints that only touch the polygon
+        """
+        return [self.datasets[i] for i in self.query([polygon], strict=strict)[0]]
+
+    def tiles(self, gbt: GeoboxTiles) -> Dict[Tuple[int, int], List[Dataset]]:
+        """
+        Datasets overlapping each tile of a tiled GeoBox, for tiles with any.
+
+        Only the tiles within the bounding box of a footprint are checked against it,
+        see :meth:`datacube_sp.utils.geometry.gbox.GeoboxTiles.tiles_batch`.
+        """
+        out: Dict[Tuple[int, int], List[Dataset]] = {}
+        for ds, idxs in zip(self.datasets, gbt.tiles_batch(self.extents)):
+            for idx in idxs:
+                out.setdefault(idx, []).append(ds)
+        return out
@@ -7,7 +7,6 @@ User configuration.
 """
 
 import os
-import ipdb
 from pathlib import Path
 import configparser
 from urllib.parse import unquote_plus, urlparse, parse_qsl
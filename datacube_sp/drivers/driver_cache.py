@@ -2,11 +2,166 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
+import json
 import logging
-from typing import Dict, Any, Tuple, Iterable
+import os
+import re
+import sys
+import tempfile
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, Any, Tuple, Iterable, Iterator, List, Optional
 
 _LOG = logging.getLogger(__name__)
 
+#: Environment variable with the location of the entry point cache, set it empty to disable the cache
+CACHE_ENV = 'DATACUBE_ENTRY_POINTS_CACHE'
+
+_EXTRAS = re.compile(r'\[(?P<extras>[^\]]*)\]\s*$')
+_REQUIREMENT = re.compile(r'^\s*(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)')
+_EXTRA_MARKER = re.compile(r'''extra\s*==\s*['"](?P<extra>[^'"]+)['"]''')
+
+_DIST_INFO = ('.dist-info', '.egg-info')
+_DIST_FILES = ('entry_points.txt', 'METADATA', 'PKG-INFO')
+
+
+def _is_installed(name: str) -> bool:
+    try:
+        metadata.distribution(name)
+    except metadata.PackageNotFoundError:
+        return False
+    return True
+
+
+def _missing_requirements(dist: metadata.Distribution, extras: Iterable[str]) -> List[str]:
+    """ Requirements of the optional `extras` of `dist` that aren't installed. """
+    extras = set(extras)
+    missing = []
+    for req in dist.requires or []:
+        req, _, marker = req.partition(';')
+        extra = _EXTRA_MARKER.search(marker)
+        if extra is None or extra.group('extra') not in extras:
+            continue
+        name = _REQUIREMENT.match(req)
+        if name is not None and not _is_installed(name.group('name')):
+            missing.append(name.group('name'))
+    return missing
+
+
+def iter_entry_points(group: str) -> Iterator[Tuple[metadata.EntryPoint, metadata.Distribution]]:
+    """
+    All entry points of a group, along with the distribution providing them.
+
+    Only the first distribution of a given name on ``sys.path`` is used, as for imports.
+    """
+    seen = set()
+    for dist in metadata.distributions():
+        name = (dist.metadata['Name'] or '').lower().replace('_', '-')
+        if name and name in seen:
+            continue
+        seen.add(name)
+        for ep in dist.entry_points:
+            if ep.group == group:
+                yield ep, dist
+
+
+def _scan(group: str) -> List[Tuple[str, str]]:
+    """
+    (name, value) of the entry points of a group, skipping those marked with optional
+    extras whose requirements aren't installed.
+    """
+    found = []
+    for ep, dist in iter_entry_points(group):
+        extras = _EXTRAS.search(ep.value)
+        if extras is not None:
+            missing = _missing_requirements(dist, (e.strip() for e in extras.group('extras').split(',')))
+            if missing:
+                _LOG.debug('Skipping driver %s::%s, missing %s', group, ep.name, ', '.join(missing))
+                continue
+        found.append((ep.name, ep.value))
+    return found
+
+
+def _cache_path() -> Optional[Path]:
+    path = os.environ.get(CACHE_ENV)
+    if path is not None:
+        return Path(path) if path else None
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'datacube_sp' / 'entry_points.json'
+
+
+def _fingerprint() -> List[Any]:
+    """
+    Changes whenever a distribution is installed or removed: that adds or deletes
+    its metadata directory, which changes the modification time of its ``sys.path`` entry.
+
+    Metadata can also be edited in place (e.g. re-running ``setup.py develop`` rewrites
+    ``*.egg-info/entry_points.txt``), so the metadata files of each distribution are included too.
+    """
+    entries: List[Any] = [sys.version]
+    for entry in sys.path:
+        path = entry or '.'
+        try:
+            entries.append([entry, os.stat(path).st_mtime_ns])
+            with os.scandir(path) as it:
+                dists = sorted(e.name for e in it if e.name.endswith(_DIST_INFO))
+        except OSError:
+            continue
+        for dist in dists:
+            for name in _DIST_FILES:
+                try:
+                    entries.append([dist, name, os.stat(os.path.join(path, dist, name)).st_mtime_ns])
+                except OSError:
+                    pass
+    return entries
+
+
+def _read_cache(path: Path, fingerprint: List[Any]) -> Dict[str, Any]:
+    try:
+        with path.open() as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get('fingerprint') != fingerprint:
+        return {}
+    return cache.get('groups', {})
+
+
+def _write_cache(path: Path, fingerprint: List[Any], groups: Dict[str, Any]) -> None:
+    # pylint: disable=broad-except
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'groups': groups}, f)
+        os.replace(tmp, str(path))
+    except Exception as e:
+        _LOG.debug('Failed to write entry point cache %s: %r', path, e)
+
+
+def entry_points(group: str) -> List[metadata.EntryPoint]:
+    """
+    Entry points of a group that can be loaded, i.e. all of whose extra requirements are installed.
+
+    Scanning the installed distributions (and checking the requirements of their extras) is done once,
+    the results are kept in a small JSON file (``~/.cache/datacube_sp/entry_points.json``, or as set by
+    the ``DATACUBE_ENTRY_POINTS_CACHE`` environment variable) until a package is installed or removed.
+    """
+    path = _cache_path()
+    if path is None:
+        found = _scan(group)
+    else:
+        fingerprint = _fingerprint()
+        groups = _read_cache(path, fingerprint)
+        if group in groups:
+            found = [tuple(ep) for ep in groups[group]]
+        else:
+            found = _scan(group)
+            groups[group] = found
+            _write_cache(path, fingerprint, groups)
+
+    return [metadata.EntryPoint(name, value, group) for name, value in found]
+
 
 def load_drivers(group: str) -> Dict[str, Any]:
     """
@@ -14,6 +169,7 @@ def load_drivers(group: str) -> Dict[str, Any]:
 
     Gracefully handles:
 
+     - Driver requiring optional extras that weren't installed
      - Driver module not able to be imported
      - Driver init function throwing an exception or returning None
 
@@ -26,14 +182,9 @@ def load_drivers(group: str) -> Dict[str, Any]:
     """
 
     def safe_load(ep):
-        from pkg_resources import DistributionNotFound
         # pylint: disable=broad-except,bare-except
         try:
             driver_init = ep.load()
-        except DistributionNotFound:
-            # This happens when entry points were marked with extra features,
-            # but extra feature were not requested for installation
-            return None
         except Exception as e:
             _LOG.warning('Failed to resolve driver %s::%s', group, ep.name)
             _LOG.warning('Error was: %s', repr(e))
@@ -51,8 +202,7 @@ def load_drivers(group: str) -> Dict[str, Any]:
         return driver
 
     def resolve_all(group: str) -> Iterable[Tuple[str, Any]]:
-        from pkg_resources import iter_entry_points
-        for ep in iter_entry_points(group=group, name=None):
+        for ep in entry_points(group):
             driver = safe_load(ep)
             if driver is not None:
                 yield (ep.name, driver)
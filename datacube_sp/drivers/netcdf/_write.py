@@ -5,6 +5,10 @@
 from pathlib import Path
 import logging
 
+import dask
+import dask.array
+from dask.array.core import normalize_chunks
+
 from . import writer as netcdf_writer
 from datacube_sp.utils import DatacubeException
 from datacube_sp.storage._hdf5 import HDF5_LOCK
@@ -85,6 +89,57 @@ def create_netcdf_storage_unit(filename,
     return nco
 
 
+def _chunk_aligned(data, chunking):
+    """
+    Dask array of `data`, with blocks covering whole netCDF chunks.
+
+    Dask arrays keep their block sizes, rounded to a multiple of the netCDF chunk size, so
+    every HDF5 chunk is written (and compressed) exactly once. In memory arrays are split
+    into blocks of about ``array.chunk-size`` (dask config).
+
+    :param data: numpy or dask array
+    :param chunking: netCDF chunk sizes of the variable, None if it is contiguous
+    """
+    if not dask.is_dask_collection(data):
+        chunks = normalize_chunks('auto', data.shape, dtype=data.dtype, previous_chunks=chunking)
+        return dask.array.from_array(data, chunks=chunks)
+    if chunking is None:
+        return data
+
+    aligned = tuple(min(size, max(1, round(max(blocks) / chunk)) * chunk)
+                    for blocks, chunk, size in zip(data.chunks, chunking, data.shape))
+    return data.rechunk(aligned)
+
+
+def _write_variables(nco, data_vars):
+    """
+    Write variables block by block, computing blocks of dask backed variables on a thread pool.
+
+    Only the netCDF calls hold ``HDF5_LOCK``, so computing (and reading) further blocks,
+    including from other HDF5 files, carries on while a block is written.
+    """
+    sources, targets = [], []
+    for name, variable in data_vars.items():
+        data = variable.data
+        if data.dtype.kind == 'S' and data.dtype.itemsize > 1:
+            # stored with an extra character dimension, small enough to write in one go
+            data = netcdf_writer.netcdfy_data(variable.values)
+            with HDF5_LOCK:
+                nco[name][:] = data
+            continue
+
+        with HDF5_LOCK:
+            chunking = nco[name].chunking()
+        data = _chunk_aligned(data, None if chunking == 'contiguous' else chunking)
+        if data.dtype.kind == 'M':
+            data = data.map_blocks(netcdf_writer.netcdfy_data, dtype='float64')
+        sources.append(data)
+        targets.append(nco[name])
+
+    # netCDF variables and the lock can't leave the process
+    dask.array.store(sources, targets, lock=HDF5_LOCK, scheduler='threads')
+
+
 def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_params=None,
                             netcdfparams=None):
     """
@@ -92,6 +147,11 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
 
     Requires a spatial Dataset, with attached coordinates and global crs attribute.
 
+    Variables are written block by block, aligned to their netCDF chunks (see the ``chunksizes``
+    variable parameter). Dask backed variables are computed as they are written, on a thread
+    pool, rather than loaded into memory first. ``HDF5_LOCK`` is only held by netCDF calls,
+    not while blocks are being computed.
+
     :param `xarray.Dataset` dataset:
     :param filename: Output filename
     :param global_attributes: Global file attributes. dict of attr_name: attr_value
@@ -111,8 +171,7 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
     if dataset.geobox is None:
         raise DatacubeException('Dataset geobox property is None, cannot write to NetCDF file.')
 
-    try:
-        HDF5_LOCK.acquire(blocking=True)
+    with HDF5_LOCK:
         nco = create_netcdf_storage_unit(filename,
                                          dataset.geobox.crs,
                                          dataset.coords,
@@ -120,10 +179,8 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
                                          variable_params,
                                          global_attributes,
                                          netcdfparams)
-
-        for name, variable in dataset.data_vars.items():
-            nco[name][:] = netcdf_writer.netcdfy_data(variable.values)
-
-        nco.close()
+    try:
+        _write_variables(nco, dataset.data_vars)
     finally:
-        HDF5_LOCK.release()
+        with HDF5_LOCK:
+            nco.close()
@@ -19,7 +19,7 @@ import uuid  # noqa: F401
 from sqlalchemy import cast
 from sqlalchemy import delete, update
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy import select, text, and_, or_, func
+from sqlalchemy import select, text, and_, or_, func, literal, column, union_all
 from sqlalchemy.dialects.postgresql import INTERVAL
 from typing import Iterable, Sequence
 
@@ -35,7 +35,7 @@ from ._schema import MetadataType, Product, \
     Dataset, DatasetSource, DatasetLocation, SelectedDatasetLocation, \
     search_field_index_map, search_field_tables
 from ._spatial import geom_alchemy
-from .sql import escape_pg_identifier
+from .sql import escape_pg_identifier, pg_column_exists
 
 
 # Make a function because it's broken
@@ -213,6 +213,21 @@ class PostgisDbAPI(object):
     def execute(self, command):
         return self._connection.execute(command)
 
+    def _execute_batched(self, query, batch_size=None):
+        """
+        Execute a query, fetching rows from a server-side cursor ``batch_size`` at a time
+        (rather than all at once) if a batch size is given.
+        """
+        if batch_size is None or self.in_transaction:
+            return self._connection.execute(query)
+        # Server-side (named) cursors need a transaction, so autocommit is turned off for the
+        # rest of this connection checkout. It is reset when the connection returns to the pool.
+        return self._connection.execution_options(
+            isolation_level='READ COMMITTED',
+            stream_results=True,
+            max_row_buffer=batch_size,
+        ).execute(query)
+
     def insert_dataset(self, metadata_doc, dataset_id, product_id):
         """
         Insert dataset if not already indexed.
@@ -605,17 +620,61 @@ class PostgisDbAPI(object):
     def search_datasets(self, expressions,
                         source_exprs=None, select_fields=None,
                         with_source_ids=False, limit=None,
-                        geom=None):
+                        geom=None, batch_size=None):
         """
         :type with_source_ids: bool
         :type select_fields: tuple[datacube.drivers.postgis._fields.PgField]
         :type expressions: tuple[datacube.drivers.postgis._fields.PgExpression]
+        :param int batch_size: Fetch rows from the server in batches of this size
         """
         select_query = self.search_datasets_query(expressions, source_exprs,
                                                   select_fields, with_source_ids,
                                                   limit, geom=geom)
         _LOG.debug("search_datasets SQL: %s", str(select_query))
-        return self._connection.execute(select_query)
+        return self._execute_batched(select_query, batch_size)
+
+    def search_products_query(self, product_expressions, select_fields=None, limit=None, order_by_product=False):
+        """
+        One statement searching several products: a ``UNION ALL`` of one branch per entry.
+
+        :param product_expressions: Sequence of (product ids, expressions, geom) branches. Each branch
+            matches the datasets of its products satisfying its expressions and intersecting its
+            (optional) search geometry, and has its own limit.
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression], Optional[Geometry]]]
+        :type select_fields: Iterable[PgField]
+        :param order_by_product: Order the rows of several products by product, so they can be
+            demultiplexed as they arrive (see :func:`datacube_sp.index.fields.split_rows_by_product`).
+            This sorts the whole result on the server.
+        :rtype: sqlalchemy.Expression
+        """
+        queries = [
+            self.search_datasets_query(
+                expressions, select_fields=select_fields, limit=limit, geom=geom
+            ).where(
+                Dataset.product_ref.in_(product_ids)
+            )
+            for product_ids, expressions, geom in product_expressions
+        ]
+        query = queries[0] if len(queries) == 1 else union_all(*queries)
+        if order_by_product and len({pid for product_ids, _, _ in product_expressions for pid in product_ids}) > 1:
+            query = query.order_by(column('product_ref'))
+        return query
+
+    def search_datasets_by_product(self, product_expressions, select_fields=None, limit=None, batch_size=None,
+                                   order_by_product=False):
+        """
+        Search several products with a single statement.
+
+        Rows of all products are returned together, in no particular order unless ``order_by_product``
+        is set: demultiplex them using their ``product_ref`` column (when selecting full datasets).
+
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression], Optional[Geometry]]]
+        :type select_fields: tuple[datacube.drivers.postgis._fields.PgField]
+        :param int batch_size: Fetch rows from the server in batches of this size
+        """
+        select_query = self.search_products_query(product_expressions, select_fields, limit, order_by_product)
+        _LOG.debug("search_datasets_by_product SQL: %s", str(select_query))
+        return self._execute_batched(select_query, batch_size)
 
     @staticmethod
     def search_unique_datasets_query(expressions, select_fields, limit):
@@ -684,6 +743,41 @@ class PostgisDbAPI(object):
         )
         return self._connection.scalar(select_query)
 
+    @staticmethod
+    def count_products_query(product_expressions):
+        """
+        One statement counting datasets of several products, grouped by product.
+
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression]]]
+        :rtype: sqlalchemy.Expression
+        """
+        queries = []
+        for product_ids, expressions in product_expressions:
+            query = select(Dataset.product_ref, func.count(Dataset.id)).select_from(Dataset)
+            for joins in PostgisDbAPI._join_tables(expressions):
+                query = query.join(*joins)
+            queries.append(
+                query.where(
+                    and_(Dataset.archived == None,
+                         Dataset.product_ref.in_(product_ids),
+                         *PostgisDbAPI._alchemify_expressions(expressions))
+                ).group_by(
+                    Dataset.product_ref
+                )
+            )
+        if len(queries) == 1:
+            return queries[0]
+        return union_all(*queries)
+
+    def count_datasets_by_product(self, product_expressions):
+        """
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression]]]
+        :return: (product id, count) of each product with matching datasets
+        :rtype: list[(int, int)]
+        """
+        return [(product_id, count)
+                for product_id, count in self._connection.execute(self.count_products_query(product_expressions))]
+
     def count_datasets_through_time(self, start, end, period, time_field, expressions):
         """
         :type period: str
@@ -1025,6 +1119,44 @@ class PostgisDbAPI(object):
     def get_all_metadata_types(self):
         return self._connection.execute(select(MetadataType).order_by(MetadataType.name.asc())).fetchall()
 
+    def _has_updated_columns(self):
+        """
+        Have the row-update timestamp triggers been installed? Checked once per database connection.
+        """
+        info = self._connection.info
+        if 'dc_has_updated_columns' not in info:
+            info['dc_has_updated_columns'] = pg_column_exists(self._connection,
+                                                              _core.schema_qualified(Product.__tablename__), 'updated')
+        return info['dc_has_updated_columns']
+
+    def get_resource_version(self):
+        """
+        A cheap token that changes whenever a metadata type or product is added, updated or deleted.
+
+        Uses the ``updated`` columns maintained by the row-update timestamp triggers
+        (see :func:`._core.install_timestamp_trigger`).
+
+        Databases created before the triggers were introduced (until ``update_schema`` is run)
+        don't have the ``updated`` columns, there only additions and deletions are noticed.
+
+        :rtype: tuple
+        """
+        has_updated = self._has_updated_columns()
+
+        def table_version(orm_table):
+            table = orm_table.__table__
+            return select(
+                literal(table.name).label('table_name'),
+                func.count().label('row_count'),
+                func.max(func.coalesce(column('updated'), table.c.added) if has_updated
+                         else table.c.added).label('last_change'),
+            ).select_from(table)
+
+        results = self._connection.execute(
+            union_all(table_version(MetadataType), table_version(Product))
+        ).fetchall()
+        return tuple(sorted(tuple(row) for row in results))
+
     def get_locations(self, dataset_id):
         return [
             record[0]
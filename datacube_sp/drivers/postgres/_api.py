@@ -18,7 +18,7 @@ import uuid  # noqa: F401
 from typing import Iterable, Tuple
 from sqlalchemy import cast
 from sqlalchemy import delete
-from sqlalchemy import select, text, bindparam, and_, or_, func, literal, distinct
+from sqlalchemy import select, text, bindparam, and_, or_, func, literal, distinct, column, union_all
 from sqlalchemy.dialects.postgresql import INTERVAL
 from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.exc import IntegrityError
@@ -30,8 +30,8 @@ from . import _core
 from . import _dynamic as dynamic
 from ._fields import parse_fields, Expression, PgField, PgExpression  # noqa: F401
 from ._fields import NativeField, DateDocField, SimpleDocField
-from ._schema import DATASET, DATASET_SOURCE, METADATA_TYPE, DATASET_LOCATION, PRODUCT
-from .sql import escape_pg_identifier
+from ._schema import DATASET, DATASET_SOURCE, DATASET_LINEAGE, METADATA_TYPE, DATASET_LOCATION, PRODUCT
+from .sql import escape_pg_identifier, pg_column_exists
 
 
 def _dataset_uri_field(table):
@@ -175,8 +175,10 @@ def get_dataset_fields(metadata_type_definition):
 
 
 class PostgresDbAPI(object):
-    def __init__(self, connection):
+    def __init__(self, connection, lineage_closure=False):
         self._connection = connection
+        # Use the (optional) materialised lineage closure table rather than recursive queries
+        self._lineage_closure = lineage_closure
 
     @property
     def in_transaction(self):
@@ -194,6 +196,21 @@ class PostgresDbAPI(object):
     def execute(self, command):
         return self._connection.execute(command)
 
+    def _execute_batched(self, query, batch_size=None):
+        """
+        Execute a query, fetching rows from a server-side cursor ``batch_size`` at a time
+        (rather than all at once) if a batch size is given.
+        """
+        if batch_size is None or self.in_transaction:
+            return self._connection.execute(query)
+        # Server-side (named) cursors need a transaction, so autocommit is turned off for the
+        # rest of this connection checkout. It is reset when the connection returns to the pool.
+        return self._connection.execution_options(
+            isolation_level='READ COMMITTED',
+            stream_results=True,
+            max_row_buffer=batch_size,
+        ).execute(query)
+
     def insert_dataset(self, metadata_doc, dataset_id, product_id):
         """
         Insert dataset if not already indexed.
@@ -403,6 +420,21 @@ class PostgresDbAPI(object):
         ).fetchall()
 
     def get_dataset_sources(self, dataset_id):
+        return self._connection.execute(
+            self.get_dataset_sources_query(dataset_id, self._lineage_closure)
+        ).fetchall()
+
+    @staticmethod
+    def get_dataset_sources_query(dataset_id, lineage_closure=False):
+        """
+        A dataset and all of its ancestors, each with the (source ids, classifiers) of its direct sources.
+
+        :param lineage_closure: Find the ancestors in the lineage closure table, rather than recursively
+        :rtype: sqlalchemy.Expression
+        """
+        if lineage_closure:
+            return PostgresDbAPI._get_dataset_sources_from_closure(dataset_id)
+
         # recursively build the list of (dataset_ref, source_dataset_ref) pairs starting from dataset_id
         # include (dataset_ref, NULL) [hence the left join]
         sources = select(
@@ -441,7 +473,34 @@ class PostgresDbAPI(object):
             _DATASET_SELECT_FIELDS + (aggd.c.sources, aggd.c.classes)
         ).select_from(aggd.join(DATASET, DATASET.c.id == aggd.c.dataset_ref))
 
-        return self._connection.execute(query).fetchall()
+        return query
+
+    @staticmethod
+    def _get_dataset_sources_from_closure(dataset_id):
+        lineage = DATASET.alias('lineage_dataset')
+        ancestors = select(
+            [DATASET_LINEAGE.c.ancestor_ref]
+        ).where(
+            DATASET_LINEAGE.c.descendant_ref == dataset_id
+        )
+
+        # adjacency list (dataset_ref, [source_dataset_ref, ...]) of the dataset and its ancestors
+        # some source_dataset_ref's will be NULL
+        aggd = select(
+            [lineage.c.id.label('dataset_ref'),
+             func.array_agg(DATASET_SOURCE.c.source_dataset_ref).label('sources'),
+             func.array_agg(DATASET_SOURCE.c.classifier).label('classes')]
+        ).select_from(
+            lineage.join(DATASET_SOURCE,
+                         lineage.c.id == DATASET_SOURCE.c.dataset_ref,
+                         isouter=True)
+        ).where(
+            or_(lineage.c.id == dataset_id, lineage.c.id.in_(ancestors))
+        ).group_by(lineage.c.id).alias('aggd')
+
+        return select(
+            _DATASET_SELECT_FIELDS + (aggd.c.sources, aggd.c.classes)
+        ).select_from(aggd.join(DATASET, DATASET.c.id == aggd.c.dataset_ref))
 
     def search_datasets_by_metadata(self, metadata):
         """
@@ -478,13 +537,15 @@ class PostgresDbAPI(object):
 
     @staticmethod
     def search_datasets_query(expressions, source_exprs=None,
-                              select_fields=None, with_source_ids=False, limit=None):
+                              select_fields=None, with_source_ids=False, limit=None,
+                              lineage_closure=False):
         """
         :type expressions: Tuple[Expression]
         :type source_exprs: Tuple[Expression]
         :type select_fields: Iterable[PgField]
         :type with_source_ids: bool
         :type limit: int
+        :param lineage_closure: Match sources using the lineage closure table, rather than recursively
         :rtype: sqlalchemy.Expression
         """
 
@@ -526,6 +587,28 @@ class PostgresDbAPI(object):
                     limit
                 )
             )
+        if lineage_closure:
+            # Datasets with any (active) ancestor matching the source expressions
+            matching_descendants = select(
+                [DATASET_LINEAGE.c.descendant_ref]
+            ).select_from(
+                PostgresDbAPI._from_expression(DATASET, source_exprs).join(
+                    DATASET_LINEAGE, DATASET_LINEAGE.c.ancestor_ref == DATASET.c.id
+                )
+            ).where(
+                and_(DATASET.c.archived == None, *PostgresDbAPI._alchemify_expressions(source_exprs))
+            ).correlate(None)
+            return (
+                select(
+                    select_columns
+                ).select_from(
+                    from_expression
+                ).where(
+                    and_(where_expr, DATASET.c.id.in_(matching_descendants))
+                ).limit(
+                    limit
+                )
+            )
         base_query = (
             select(
                 select_columns + (DATASET_SOURCE.c.source_dataset_ref,
@@ -571,15 +654,61 @@ class PostgresDbAPI(object):
 
     def search_datasets(self, expressions,
                         source_exprs=None, select_fields=None,
-                        with_source_ids=False, limit=None):
+                        with_source_ids=False, limit=None, batch_size=None):
         """
         :type with_source_ids: bool
         :type select_fields: tuple[datacube.drivers.postgres._fields.PgField]
         :type expressions: tuple[datacube.drivers.postgres._fields.PgExpression]
+        :param int batch_size: Fetch rows from the server in batches of this size
         """
         select_query = self.search_datasets_query(expressions, source_exprs,
-                                                  select_fields, with_source_ids, limit)
-        return self._connection.execute(select_query)
+                                                  select_fields, with_source_ids, limit,
+                                                  lineage_closure=self._lineage_closure)
+        return self._execute_batched(select_query, batch_size)
+
+    @staticmethod
+    def search_products_query(product_expressions, select_fields=None, with_source_ids=False, limit=None,
+                              order_by_product=False):
+        """
+        One statement searching several products: a ``UNION ALL`` of one branch per entry.
+
+        :param product_expressions: Sequence of (product ids, expressions) branches. Each branch
+            matches the datasets of its products satisfying its expressions (and has its own limit).
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression]]]
+        :type select_fields: Iterable[PgField]
+        :param order_by_product: Order the rows of several products by product, so they can be
+            demultiplexed as they arrive (see :func:`datacube_sp.index.fields.split_rows_by_product`).
+            This sorts the whole result on the server.
+        :rtype: sqlalchemy.Expression
+        """
+        queries = [
+            PostgresDbAPI.search_datasets_query(
+                expressions, select_fields=select_fields, with_source_ids=with_source_ids, limit=limit
+            ).where(
+                DATASET.c.dataset_type_ref.in_(product_ids)
+            )
+            for product_ids, expressions in product_expressions
+        ]
+        query = queries[0] if len(queries) == 1 else union_all(*queries)
+        if order_by_product and len({pid for product_ids, _ in product_expressions for pid in product_ids}) > 1:
+            query = query.order_by(column('dataset_type_ref'))
+        return query
+
+    def search_datasets_by_product(self, product_expressions, select_fields=None,
+                                   with_source_ids=False, limit=None, batch_size=None, order_by_product=False):
+        """
+        Search several products with a single statement.
+
+        Rows of all products are returned together, in no particular order unless ``order_by_product``
+        is set: demultiplex them using their ``dataset_type_ref`` column (when selecting full datasets).
+
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression]]]
+        :type select_fields: tuple[datacube.drivers.postgres._fields.PgField]
+        :param int batch_size: Fetch rows from the server in batches of this size
+        """
+        select_query = self.search_products_query(product_expressions, select_fields,
+                                                  with_source_ids, limit, order_by_product)
+        return self._execute_batched(select_query, batch_size)
 
     @staticmethod
     def search_unique_datasets_query(expressions, select_fields, limit):
@@ -696,6 +825,41 @@ class PostgresDbAPI(object):
 
         return self._connection.scalar(select_query)
 
+    @staticmethod
+    def count_products_query(product_expressions):
+        """
+        One statement counting datasets of several products, grouped by product.
+
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression]]]
+        :rtype: sqlalchemy.Expression
+        """
+        queries = [
+            select(
+                [DATASET.c.dataset_type_ref, func.count('*')]
+            ).select_from(
+                PostgresDbAPI._from_expression(DATASET, expressions)
+            ).where(
+                and_(DATASET.c.archived == None,
+                     DATASET.c.dataset_type_ref.in_(product_ids),
+                     *PostgresDbAPI._alchemify_expressions(expressions))
+            ).group_by(
+                DATASET.c.dataset_type_ref
+            )
+            for product_ids, expressions in product_expressions
+        ]
+        if len(queries) == 1:
+            return queries[0]
+        return union_all(*queries)
+
+    def count_datasets_by_product(self, product_expressions):
+        """
+        :type product_expressions: Sequence[Tuple[Sequence[int], Tuple[PgExpression]]]
+        :return: (product id, count) of each product with matching datasets
+        :rtype: list[(int, int)]
+        """
+        return [(product_id, count)
+                for product_id, count in self._connection.execute(self.count_products_query(product_expressions))]
+
     def count_datasets_through_time(self, start, end, period, time_field, expressions):
         """
         :type period: str
@@ -960,6 +1124,42 @@ class PostgresDbAPI(object):
     def get_all_metadata_types(self):
         return self._connection.execute(METADATA_TYPE.select().order_by(METADATA_TYPE.c.name.asc())).fetchall()
 
+    def _has_updated_columns(self):
+        """
+        Have the row-update timestamp triggers been installed? Checked once per database connection.
+        """
+        info = self._connection.info
+        if 'dc_has_updated_columns' not in info:
+            info['dc_has_updated_columns'] = pg_column_exists(self._connection,
+                                                              _core.schema_qualified(PRODUCT.name), 'updated')
+        return info['dc_has_updated_columns']
+
+    def get_resource_version(self):
+        """
+        A cheap token that changes whenever a metadata type or product is added, updated or deleted.
+
+        Uses the ``updated`` columns maintained by the row-update timestamp triggers.
+
+        Databases created before the triggers were introduced (until ``update_schema`` is run)
+        don't have the ``updated`` columns, there only additions and deletions are noticed.
+
+        :rtype: tuple
+        """
+        has_updated = self._has_updated_columns()
+
+        def table_version(table):
+            return select([
+                literal(table.name).label('table_name'),
+                func.count().label('row_count'),
+                func.max(func.coalesce(column('updated'), table.c.added) if has_updated
+                         else table.c.added).label('last_change'),
+            ]).select_from(table)
+
+        results = self._connection.execute(
+            union_all(table_version(METADATA_TYPE), table_version(PRODUCT))
+        ).fetchall()
+        return tuple(sorted(tuple(row) for row in results))
+
     def get_locations(self, dataset_id):
         return [
             record[0]
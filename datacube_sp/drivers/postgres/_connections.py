@@ -67,6 +67,7 @@ class PostgresDb(object):
         # We don't recommend using this constructor directly as it may change.
         # Use static methods PostgresDb.create() or PostgresDb.from_config()
         self._engine = engine
+        self._lineage_closure: Optional[bool] = None
 
     @classmethod
     def from_config(cls, config, application_name=None, validate_connection=True):
@@ -206,6 +207,28 @@ class PostgresDb(object):
 
         return is_new
 
+    @property
+    def has_lineage_closure(self) -> bool:
+        """
+        Does the database have the (optional) lineage closure table?
+
+        Checked once: a table created by another process is only used by new connections.
+        """
+        if self._lineage_closure is None:
+            self._lineage_closure = _core.has_lineage_closure(self._engine)
+        return self._lineage_closure
+
+    def build_lineage_closure(self) -> int:
+        """
+        Create (or rebuild) the lineage closure table from the current dataset sources.
+
+        :return: Number of (ancestor, descendant, path) rows
+        """
+        with self._engine.begin() as connection:
+            count = _core.install_lineage_closure(connection)
+        self._lineage_closure = True
+        return count
+
     @contextmanager
     def _connect(self):
         """
@@ -223,9 +246,10 @@ class PostgresDb(object):
 
         Low level context manager, use <index_resource>._db_connection instead
         """
+        lineage_closure = self.has_lineage_closure
         with self._engine.connect() as connection:
             try:
-                yield _api.PostgresDbAPI(connection)
+                yield _api.PostgresDbAPI(connection, lineage_closure=lineage_closure)
             finally:
                 connection.close()
 
@@ -9,12 +9,14 @@ Core SQL schema settings.
 import logging
 
 from datacube_sp.drivers.postgres.sql import (INSTALL_TRIGGER_SQL_TEMPLATE,
+                                              LINEAGE_BACKFILL_SQL, LINEAGE_TRIGGER_SQL,
                                               SCHEMA_NAME, TYPES_INIT_SQL,
                                               UPDATE_COLUMN_MIGRATE_SQL_TEMPLATE,
                                               ADDED_COLUMN_MIGRATE_SQL_TEMPLATE,
                                               UPDATE_TIMESTAMP_SQL,
                                               escape_pg_identifier,
-                                              pg_column_exists)
+                                              pg_column_exists,
+                                              pg_exists)
 from sqlalchemy import MetaData
 from sqlalchemy.engine import Engine
 from sqlalchemy.schema import CreateSchema
@@ -60,6 +62,34 @@ def install_added_column(connection):
     connection.execute(ADDED_COLUMN_MIGRATE_SQL_TEMPLATE.format(schema=SCHEMA_NAME, table=TABLE_NAME))
 
 
+def install_lineage_closure(connection):
+    """
+    Create (or rebuild) the optional lineage closure table, and the triggers maintaining it.
+
+    Run inside a transaction: new lineage is blocked until it completes.
+
+    :return: Number of (ancestor, descendant, path) rows in the table
+    """
+    from . import _schema
+    connection.execute('lock table {} in share row exclusive mode'.format(
+        schema_qualified(_schema.DATASET_SOURCE.name)))
+    _schema.DATASET_LINEAGE.create(connection, checkfirst=True)
+    connection.execute(LINEAGE_TRIGGER_SQL)
+    connection.execute('truncate {}'.format(schema_qualified(_schema.DATASET_LINEAGE.name)))
+    count = connection.execute(LINEAGE_BACKFILL_SQL).rowcount
+    if has_role(connection, 'agdc_user'):
+        connection.execute('grant select on {} to agdc_user'.format(schema_qualified(_schema.DATASET_LINEAGE.name)))
+    return count
+
+
+def has_lineage_closure(conn):
+    """
+    Has the optional lineage closure table been created?
+    """
+    from . import _schema
+    return pg_exists(conn, schema_qualified(_schema.DATASET_LINEAGE.name))
+
+
 def schema_qualified(name):
     """
     >>> schema_qualified('dataset')
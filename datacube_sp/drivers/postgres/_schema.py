@@ -9,7 +9,7 @@ Tables for indexing the datasets which were ingested into the AGDC.
 import logging
 
 from sqlalchemy import ForeignKey, UniqueConstraint, PrimaryKeyConstraint, CheckConstraint, SmallInteger
-from sqlalchemy import Table, Column, Integer, String, DateTime
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData
 from sqlalchemy.dialects import postgresql as postgres
 from sqlalchemy.sql import func
 
@@ -138,3 +138,21 @@ DATASET_SOURCE = Table(
     # This table is immutable and uses a migrations based `added` column to keep track of new
     # dataset locations being added. The added column defaults to `now()`
 )
+
+# Optional materialised closure of DATASET_SOURCE: one row per (ancestor, descendant, path).
+#
+# Created and backfilled on request (see ``_core.install_lineage_closure()``), and kept up to
+# date by triggers on DATASET_SOURCE. It is not part of ``_core.METADATA``, so it isn't
+# created with new databases.
+DATASET_LINEAGE = Table(
+    'dataset_lineage', MetaData(naming_convention=_core.SQL_NAMING_CONVENTIONS, schema=_core.SCHEMA_NAME),
+    Column('ancestor_ref', postgres.UUID(as_uuid=True), nullable=False, index=True),
+    Column('descendant_ref', postgres.UUID(as_uuid=True), nullable=False),
+
+    # Number of links between them, and the classifiers of those links from the descendant down
+    # (eg. 'level1.satellite_telemetry_data')
+    Column('depth', SmallInteger, nullable=False),
+    Column('path', String, nullable=False),
+
+    PrimaryKeyConstraint('descendant_ref', 'ancestor_ref', 'path'),
+)
@@ -60,6 +60,67 @@ for each row
 execute procedure {schema}.set_row_update_time();
 """
 
+# Keep the optional lineage closure table in step with dataset_source.
+#
+# A new (dataset -> source) link connects every ancestor of the source (and the source itself)
+# to every descendant of the dataset (and the dataset itself). Removing a link removes the
+# closure rows whose path runs through it. Runs as the owner, so ingest users need no grants
+# on the closure table.
+LINEAGE_TRIGGER_SQL = """
+create or replace function {schema}.update_dataset_lineage()
+returns trigger as $$
+begin
+  if tg_op = 'INSERT' then
+    insert into {schema}.dataset_lineage (ancestor_ref, descendant_ref, depth, path)
+    select a.ancestor_ref, d.descendant_ref, d.depth + a.depth + 1,
+           concat_ws('.', nullif(d.path, ''), new.classifier, nullif(a.path, ''))
+    from (
+      select new.source_dataset_ref as ancestor_ref, 0 as depth, '' as path
+      union all
+      select ancestor_ref, depth, path from {schema}.dataset_lineage where descendant_ref = new.source_dataset_ref
+    ) a, (
+      select new.dataset_ref as descendant_ref, 0 as depth, '' as path
+      union all
+      select descendant_ref, depth, path from {schema}.dataset_lineage where ancestor_ref = new.dataset_ref
+    ) d
+    on conflict do nothing;
+    return new;
+  end if;
+
+  delete from {schema}.dataset_lineage l
+  using (
+    select old.dataset_ref as descendant_ref, old.classifier::text as path
+    union all
+    select descendant_ref, path || '.' || old.classifier
+    from {schema}.dataset_lineage where ancestor_ref = old.dataset_ref
+  ) d
+  where l.descendant_ref = d.descendant_ref
+    and (l.path = d.path or left(l.path, length(d.path) + 1) = d.path || '.');
+  return old;
+end;
+$$ language plpgsql security definer;
+
+drop trigger if exists dataset_lineage_maintenance on {schema}.dataset_source;
+create trigger dataset_lineage_maintenance
+after insert or delete on {schema}.dataset_source
+for each row
+execute procedure {schema}.update_dataset_lineage();
+""".format(schema=SCHEMA_NAME)
+
+# (Re)populate the lineage closure table from dataset_source.
+LINEAGE_BACKFILL_SQL = """
+insert into {schema}.dataset_lineage (ancestor_ref, descendant_ref, depth, path)
+with recursive lineage (ancestor_ref, descendant_ref, depth, path) as (
+  select source_dataset_ref, dataset_ref, 1, classifier::text
+  from {schema}.dataset_source
+  union all
+  select s.source_dataset_ref, l.descendant_ref, l.depth + 1, l.path || '.' || s.classifier
+  from lineage l join {schema}.dataset_source s on s.dataset_ref = l.ancestor_ref
+)
+select ancestor_ref, descendant_ref, depth, path from lineage
+on conflict do nothing
+""".format(schema=SCHEMA_NAME)
+
 TYPES_INIT_SQL = """
 create or replace function {schema}.common_timestamp(text)
 returns timestamp with time zone as $$
@@ -0,0 +1,17 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Zarr storage units.
+
+Needs the optional ``zarr`` dependencies (``pip install datacube_sp[zarr]``).
+"""
+from ._write import write_dataset_to_zarr, zarr_store
+from ._read import ZarrDataSource
+
+__all__ = (
+    'write_dataset_to_zarr',
+    'zarr_store',
+    'ZarrDataSource',
+)
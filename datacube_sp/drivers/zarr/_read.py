@@ -0,0 +1,153 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+from contextlib import contextmanager
+import logging
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import zarr
+from affine import Affine
+
+from datacube_sp.drivers.datasource import DataSource, GeoRasterReader, RasterShape, RasterWindow
+from datacube_sp.storage._base import BandInfo
+from datacube_sp.utils import get_part_from_uri
+from datacube_sp.utils.geometry import CRS
+from datacube_sp.utils.math import affine_from_axis, num2numpy
+from ._write import strip_fragment, zarr_store
+
+_LOG = logging.getLogger(__name__)
+
+
+def open_zarr_group(uri, storage_options=None) -> zarr.Group:
+    """
+    Open a zarr storage unit read only, using its consolidated metadata when there is any.
+    """
+    store = zarr_store(strip_fragment(uri), storage_options)
+    try:
+        return zarr.open_consolidated(store, mode='r')
+    except KeyError:
+        return zarr.open_group(store, mode='r')
+
+
+def _nearest(start: int, size: int, out_size: int) -> np.ndarray:
+    # pixel centres of the decimated grid, as a nearest neighbour read by GDAL
+    return start + ((np.arange(out_size) + 0.5) * (size / out_size)).astype('int64')
+
+
+class ZarrBandReader(GeoRasterReader):
+    """
+    One 2D slice of a zarr array.
+
+    :param array: zarr array with the spatial dimensions last
+    :param index: Indices into the leading (e.g. time) dimensions of `array`
+    """
+
+    def __init__(self, array: zarr.Array, index: Tuple[int, ...],
+                 crs: Optional[CRS], transform: Optional[Affine], nodata):
+        self._array = array
+        self._index = index
+        self._crs = crs
+        self._transform = transform
+        self._nodata = nodata
+
+    @property
+    def crs(self) -> Optional[CRS]:
+        return self._crs
+
+    @property
+    def transform(self) -> Optional[Affine]:
+        return self._transform
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._array.dtype
+
+    @property
+    def shape(self) -> RasterShape:
+        return self._array.shape[-2:]
+
+    @property
+    def nodata(self):
+        return self._nodata
+
+    def read(self, window: Optional[RasterWindow] = None,
+             out_shape: Optional[RasterShape] = None) -> Optional[np.ndarray]:
+        """
+        Read the window (or all) of the slice, decimated to `out_shape` by nearest neighbour.
+
+        Only the zarr chunks overlapping the window are fetched and decoded.
+        """
+        if window is None:
+            window = (slice(None), slice(None))
+        rows, cols = (slice(*w.indices(n)[:2]) if isinstance(w, slice) else slice(*w)
+                      for w, n in zip(window[-2:], self.shape))
+
+        if out_shape is None or tuple(out_shape) == (rows.stop - rows.start, cols.stop - cols.start):
+            return self._array[self._index + (rows, cols)]
+
+        rr = _nearest(rows.start, rows.stop - rows.start, out_shape[0])
+        cc = _nearest(cols.start, cols.stop - cols.start, out_shape[1])
+        return self._array.oindex[self._index + (rr, cc)]
+
+
+class ZarrDataSource(DataSource):
+    """
+    Data source for a band of a zarr storage unit, as written by
+    :func:`datacube_sp.drivers.zarr.write_dataset_to_zarr`.
+
+    The slice along the leading (time) dimension comes from the band index, the ``#part=``
+    fragment of the URI, or the only slice of the array.
+    """
+
+    def __init__(self, band: BandInfo):
+        self._band_info = band
+        self._part = get_part_from_uri(band.uri)
+
+    def _index(self, array: zarr.Array) -> Tuple[int, ...]:
+        leading = array.shape[:-2]
+        if not leading:
+            return ()
+        bi = self._band_info
+        if bi.band is not None:
+            idx = bi.band - 1
+        elif self._part is not None:
+            idx = self._part
+        elif np.prod(leading) == 1:
+            idx = 0
+        else:
+            raise ValueError("Stacked zarr storage unit without explicit time index: %s" % bi.uri)
+        return np.unravel_index(idx, leading)
+
+    def _crs(self, group: zarr.Group, array: zarr.Array) -> Optional[CRS]:
+        grid_mapping = array.attrs.get('grid_mapping')
+        if grid_mapping in group:
+            attrs = group[grid_mapping].attrs
+            wkt = attrs.get('spatial_ref', attrs.get('crs_wkt'))
+            if wkt:
+                return CRS(wkt)
+        crs = array.attrs.get('crs', self._band_info.crs)
+        return CRS(crs) if isinstance(crs, str) else crs
+
+    def _transform(self, group: zarr.Group, array: zarr.Array) -> Optional[Affine]:
+        ydim, xdim = array.attrs['_ARRAY_DIMENSIONS'][-2:]
+        if xdim in group and ydim in group:
+            return affine_from_axis(group[xdim][:], group[ydim][:])
+        return self._band_info.transform
+
+    @contextmanager
+    def open(self) -> Iterator[ZarrBandReader]:
+        bi = self._band_info
+        _LOG.debug("opening %s", bi.uri)
+        group = open_zarr_group(bi.uri)
+        array = group[bi.layer or bi.name]
+        nodata = array.attrs.get('nodata', bi.nodata)
+        if nodata is not None:
+            nodata = num2numpy(nodata, array.dtype, ignore_range=True)
+
+        yield ZarrBandReader(array,
+                             tuple(int(i) for i in self._index(array)),
+                             self._crs(group, array),
+                             self._transform(group, array),
+                             nodata)
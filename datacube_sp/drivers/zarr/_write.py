@@ -0,0 +1,140 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+import logging
+from urllib.parse import urlsplit, urlunsplit
+
+import dask
+import fsspec
+import numcodecs
+import numpy
+import xarray
+from zarr.errors import ContainsArrayError, ContainsGroupError
+
+from datacube_sp.utils import DatacubeException, uri_to_local_path
+
+_LOG = logging.getLogger(__name__)
+
+LOCAL_SCHEMES = ('', 'file')
+
+
+def zarr_store(uri, storage_options=None):
+    """
+    Zarr store for a storage unit URI.
+
+    Local paths and ``file://`` URIs are opened as directory stores, anything else is handed
+    to fsspec (e.g. ``s3://bucket/unit.zarr``, or ``memory://unit.zarr`` for a process local
+    stand-in of an object store).
+
+    :param uri: Storage unit path or URI, without a ``#part=`` fragment
+    :param storage_options: Extra arguments for the fsspec filesystem
+    """
+    uri = str(uri)
+    scheme = urlsplit(uri).scheme
+    if scheme in LOCAL_SCHEMES or len(scheme) == 1:  # windows drive letters
+        return str(uri_to_local_path(uri) if scheme == 'file' else uri)
+    return fsspec.get_mapper(uri, **(storage_options or {}))
+
+
+def strip_fragment(uri):
+    """ Storage unit URI without the ``#part=`` fragment of a dataset location. """
+    return urlunsplit(urlsplit(str(uri))._replace(fragment=''))
+
+
+def _attr_value(value):
+    # zarr keeps attributes as JSON
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, numpy.generic):
+        return value.item()
+    if isinstance(value, (numpy.ndarray, list, tuple)):
+        return [_attr_value(v) for v in value]
+    return str(value)
+
+
+def _attrs(*sources):
+    out = {}
+    for attrs in sources:
+        out.update((key, _attr_value(value)) for key, value in (attrs or {}).items())
+    return out
+
+
+def _compressor(params):
+    if 'compressor' in params:
+        return params['compressor']
+    if params.get('zlib', False):
+        return numcodecs.Zlib(level=params.get('complevel', 4))
+    shuffle = numcodecs.Blosc.SHUFFLE if params.get('shuffle', True) else numcodecs.Blosc.NOSHUFFLE
+    return numcodecs.Blosc(cname='zstd', clevel=params.get('complevel', 5), shuffle=shuffle)
+
+
+def _zarr_chunks(shape, chunksizes):
+    if not chunksizes or len(chunksizes) != len(shape):
+        return None
+    return tuple(max(1, min(chunk, size)) for chunk, size in zip(chunksizes, shape))
+
+
+def _aligned_blocks(data, chunks):
+    """
+    Rechunk dask array `data` so every block covers whole zarr chunks.
+
+    Blocks are rounded to a multiple of the chunk size, so no zarr chunk is written by more
+    than one task and blocks can be stored concurrently without a lock.
+    """
+    aligned = tuple(min(size, max(1, round(max(blocks) / chunk)) * chunk)
+                    for blocks, chunk, size in zip(data.chunks, chunks, data.shape))
+    return data.rechunk(aligned)
+
+
+def write_dataset_to_zarr(dataset, uri, global_attributes=None, variable_params=None,
+                          storage_options=None):
+    """
+    Write a Data Cube style xarray Dataset to a zarr storage unit.
+
+    Every variable is stored as chunked, compressed zarr arrays, with consolidated metadata.
+    Dask backed variables are computed and stored block by block in parallel, blocks are
+    aligned to the zarr chunks so no locking is needed. Variables are laid out as
+    :meth:`xarray.Dataset.to_zarr` does, so units can be opened with :func:`xarray.open_zarr`
+    as well as read back through :class:`datacube_sp.drivers.zarr.ZarrDataSource`.
+
+    :param `xarray.Dataset` dataset:
+    :param uri: Path or URI of the storage unit, see :func:`zarr_store`
+    :param global_attributes: Global attributes. dict of attr_name: attr_value
+    :param variable_params: dict of variable_name: {param_name: param_value, [...]}
+                            Understands ``chunksizes``, ``zlib``, ``complevel``, ``shuffle``
+                            and ``attrs`` as in the NetCDF driver, or a numcodecs ``compressor``.
+                            Variables are Blosc/zstd compressed unless ``zlib`` is set.
+    :param storage_options: Extra arguments for the fsspec filesystem of remote stores
+    :raises RuntimeError: If the storage unit already exists
+    """
+    variable_params = variable_params or {}
+
+    if not dataset.data_vars.keys():
+        raise DatacubeException('Cannot save empty dataset to disk.')
+
+    if dataset.geobox is None:
+        raise DatacubeException('Dataset geobox property is None, cannot write to zarr store.')
+
+    data_vars, encoding = {}, {}
+    for name, variable in dataset.data_vars.items():
+        params = variable_params.get(name, {})
+        data = variable.data
+        chunks = _zarr_chunks(data.shape, params.get('chunksizes'))
+        if chunks is not None and dask.is_dask_collection(data):
+            data = _aligned_blocks(data, chunks)
+
+        data_vars[name] = xarray.Variable(variable.dims, data, attrs=_attrs(variable.attrs, params.get('attrs')))
+        encoding[name] = dict(compressor=_compressor(params))
+        if chunks is not None:
+            encoding[name]['chunks'] = chunks
+
+    coords = {name: xarray.Variable(coord.dims, coord.data, attrs=_attrs(coord.attrs))
+              for name, coord in dataset.coords.items()}
+    out = xarray.Dataset(data_vars, coords=coords, attrs=_attrs(dataset.attrs, global_attributes))
+
+    _LOG.info('Creating storage unit: %s', uri)
+    try:
+        out.to_zarr(zarr_store(uri, storage_options), mode='w-', encoding=encoding, consolidated=True)
+    except (ContainsArrayError, ContainsGroupError) as e:
+        raise RuntimeError('Storage Unit already exists: %s' % uri) from e
@@ -0,0 +1,82 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+from datacube_sp.utils.uris import is_url, normalise_path
+from ._read import ZarrDataSource
+from ._write import write_dataset_to_zarr
+
+PROTOCOLS = ['file', 's3', 'gs', 'memory']
+FORMAT = 'zarr'
+
+
+class ZarrReaderDriver(object):
+    def __init__(self):
+        self.name = 'ZarrReader'
+        self.protocols = PROTOCOLS
+        self.formats = [FORMAT]
+
+    def supports(self, protocol, fmt):
+        return (protocol in self.protocols and
+                fmt in self.formats)
+
+    def new_datasource(self, band):
+        return ZarrDataSource(band)
+
+
+def reader_driver_init():
+    return ZarrReaderDriver()
+
+
+class ZarrWriterDriver(object):
+    def __init__(self):
+        pass
+
+    @property
+    def aliases(self):
+        return ['Zarr']
+
+    @property
+    def format(self):
+        return FORMAT
+
+    @property
+    def uri_scheme(self):
+        return PROTOCOLS[0]
+
+    def mk_uri(self, file_path, storage_config):
+        """
+        Constructs a URI from the file_path and storage config.
+
+        Local paths become ``file://`` URIs. Paths that already are URIs (e.g. a ``location``
+        of ``s3://bucket/prefix`` in the ingest definition) are kept as they are.
+
+        :param Path file_path: The file path of the storage unit
+        :param dict storage_config: The dict holding the storage config found in the ingest definition.
+        :return: file_path as a URI that the Driver understands.
+        :rtype: str
+        """
+        # pathlib collapses the double slash of ``s3://``
+        file_path = str(file_path)
+        for scheme in PROTOCOLS[1:]:
+            if file_path.startswith(scheme + ':/') and not file_path.startswith(scheme + '://'):
+                file_path = file_path.replace(':/', '://', 1)
+        if is_url(file_path):
+            return file_path
+        return normalise_path(file_path).as_uri()
+
+    def write_dataset_to_storage(self, dataset, file_uri,
+                                 global_attributes=None,
+                                 variable_params=None,
+                                 storage_config=None,
+                                 **kwargs):
+        write_dataset_to_zarr(dataset, file_uri,
+                              global_attributes=global_attributes,
+                              variable_params=variable_params,
+                              storage_options=(storage_config or {}).get('storage_options'))
+
+        return {}
+
+
+def writer_driver_init():
+    return ZarrWriterDriver()
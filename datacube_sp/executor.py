@@ -4,12 +4,32 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 # type: ignore
+import asyncio
+import queue
 import sys
+import threading
 
 _REMOTE_LOG_FORMAT_STRING = '%(asctime)s {} %(process)d %(name)s %(levelname)s %(message)s'
 
 
+def add_done_callback(future, callback):
+    """
+    Call `callback(future)` once a future of any of the executors is done.
+
+    The callback runs on whichever thread completes the future. Serial executor "futures" only
+    run when their result is asked for, so they are always ready and `callback` is called
+    straight away.
+    """
+    if hasattr(future, 'add_done_callback'):
+        future.add_done_callback(lambda _: callback(future))
+    else:
+        callback(future)
+
+
 class SerialExecutor(object):
+    #: Number of tasks run at once
+    workers = 1
+
     def __repr__(self):
         return 'SerialExecutor'
 
@@ -60,6 +80,8 @@ class SerialExecutor(object):
     def release(future):
         pass
 
+    add_done_callback = staticmethod(add_done_callback)
+
 
 def setup_logging():
     import logging
@@ -91,6 +113,11 @@ def _get_distributed_executor(scheduler):
             self._executor = executor
             self.setup_logging()
 
+        @property
+        def workers(self):
+            """ Number of tasks run at once: the threads of all the workers of the cluster. """
+            return max(1, sum(self._executor.nthreads().values()))
+
         def setup_logging(self):
             self._executor.run(setup_logging)
 
@@ -131,6 +158,8 @@ def _get_distributed_executor(scheduler):
         def release(future):
             future.release()
 
+        add_done_callback = staticmethod(add_done_callback)
+
     try:
         executor = DistributedExecutor(distributed.Client(scheduler))
         return executor
@@ -144,9 +173,9 @@ def _run_cloud_pickled_function(f_data, *args, **kwargs):
     return func(*args, **kwargs)
 
 
-def _get_concurrent_executor(workers, use_cloud_pickle=False):
+def _get_concurrent_executor(workers, use_cloud_pickle=False, threads=False):
     try:
-        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
     except ImportError:
         return None
 
@@ -161,13 +190,14 @@ def _get_concurrent_executor(workers, use_cloud_pickle=False):
         return submit_cloud_pickle if use_cloud_pickle else submit_direct
 
     class MultiprocessingExecutor(object):
-        def __init__(self, pool, use_cloud_pickle):
+        def __init__(self, pool, workers, use_cloud_pickle, name='Multiprocessing'):
             self._pool = pool
             self._submitter = mk_submitter(pool, use_cloud_pickle)
+            self._name = name
+            self.workers = workers
 
         def __repr__(self):
-            max_workers = self._pool.__dict__.get('_max_workers', '??')
-            return 'Multiprocessing ({})'.format(max_workers)
+            return '{} ({})'.format(self._name, self.workers)
 
         def submit(self, func, *args, **kwargs):
             return self._submitter(func, *args, **kwargs)
@@ -215,19 +245,26 @@ def _get_concurrent_executor(workers, use_cloud_pickle=False):
         def release(future):
             pass
 
+        add_done_callback = staticmethod(add_done_callback)
+
     if workers <= 0:
         return None
 
-    return MultiprocessingExecutor(ProcessPoolExecutor(workers), use_cloud_pickle)
+    if threads:
+        # functions don't need pickling to reach a thread
+        return MultiprocessingExecutor(ThreadPoolExecutor(workers), workers, False, name='Threads')
+    return MultiprocessingExecutor(ProcessPoolExecutor(workers), workers, use_cloud_pickle)
 
 
-def get_executor(scheduler, workers, use_cloud_pickle=True):
+def get_executor(scheduler, workers, use_cloud_pickle=True, threads=False):
     """
     Return a task executor based on input parameters. Falling back as required.
 
     :param scheduler: IP address and port of a distributed.Scheduler, or a Scheduler instance
-    :param workers: Number of processes to start for process based parallel execution
+    :param workers: Number of processes (or threads) to start for local parallel execution
     :param use_cloud_pickle: Only applies when scheduler is None and workers > 0, default is True
+    :param threads: Run tasks on a pool of threads rather than processes, for tasks that mostly
+                    wait on IO or release the GIL
     """
     if not workers:
         return SerialExecutor()
@@ -237,8 +274,160 @@ def get_executor(scheduler, workers, use_cloud_pickle=True):
         if distributed_exec:
             return distributed_exec
 
-    concurrent_exec = _get_concurrent_executor(workers, use_cloud_pickle=use_cloud_pickle)
+    concurrent_exec = _get_concurrent_executor(workers, use_cloud_pickle=use_cloud_pickle, threads=threads)
     if concurrent_exec:
         return concurrent_exec
 
     return SerialExecutor()
+
+
+class Completions(object):
+    """
+    Tasks submitted to an executor, handed back in the order they complete.
+
+    Completion is reported by future callbacks into a queue, so waiting for the next completed
+    task doesn't depend on how many are in flight (unlike repeated calls to ``next_completed``).
+
+    :param executor: Any of the executors of this module
+    :param max_in_flight: Largest number of submitted tasks that haven't completed yet,
+                          :meth:`submit` blocks until a task completes when there are this many.
+                          No limit if None.
+    """
+
+    def __init__(self, executor, max_in_flight=None):
+        self.executor = executor
+        self._done = queue.Queue()
+        self._slots = None if max_in_flight is None else threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def __len__(self):
+        """ Number of submitted tasks not yet handed back. """
+        return self._pending
+
+    def _on_done(self, future):
+        if self._slots is not None:
+            self._slots.release()
+        self._done.put(future)
+
+    def submit(self, func, *args, **kwargs):
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except BaseException:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        with self._lock:
+            self._pending += 1
+        add_done_callback(future, self._on_done)
+        return future
+
+    def next(self, timeout=None):
+        """
+        Next completed future.
+
+        :param timeout: Seconds to wait for one, forever if None
+        :raises queue.Empty: If none completed within the timeout
+        :raises StopIteration: If there are no tasks in flight
+        """
+        if not self._pending:
+            raise StopIteration
+        future = self._done.get(timeout=timeout)
+        with self._lock:
+            self._pending -= 1
+        return future
+
+    def __iter__(self):
+        while self._pending:
+            yield self.next()
+
+
+class AsyncExecutor(object):
+    """
+    :mod:`asyncio` facade of the executors of this module.
+
+    ::
+
+        aex = AsyncExecutor(get_executor(None, 4), max_in_flight=8)
+        result = await aex.submit(func, x)
+        async for result in aex.as_completed(aex.submit(func, x) for x in xs):
+            ...
+
+    Tasks still run on the wrapped executor, the event loop is woken up by their completion.
+
+    :param executor: Any of the executors of this module
+    :param max_in_flight: Largest number of tasks submitted to the executor at once, others wait
+                          their turn in :meth:`submit`. No limit if None.
+    """
+
+    def __init__(self, executor, max_in_flight=None):
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self._slots = None
+
+    def _semaphore(self):
+        # created on first use, so it belongs to the running event loop
+        if self._slots is None and self.max_in_flight is not None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self._slots
+
+    async def _run(self, func, args, kwargs):
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(func, *args, **kwargs)
+        try:
+            if not hasattr(future, 'add_done_callback'):
+                # serial executor: the task runs when asked for its result, keep it off the loop
+                return await loop.run_in_executor(None, self.executor.result, future)
+
+            done = loop.create_future()
+
+            def _wake(_):
+                loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+            add_done_callback(future, _wake)
+            await done
+            return self.executor.result(future)
+        finally:
+            self.executor.release(future)
+
+    async def submit(self, func, *args, **kwargs):
+        """ Run `func(*args, **kwargs)` on the executor, and return its result. """
+        slots = self._semaphore()
+        if slots is None:
+            return await self._run(func, args, kwargs)
+        async with slots:
+            return await self._run(func, args, kwargs)
+
+    async def map(self, func, iterable):
+        """ Results of `func` over `iterable`, in order. """
+        return await asyncio.gather(*(self.submit(func, x) for x in iterable))
+
+    async def as_completed(self, aws):
+        """
+        Results of the awaitables (usually :meth:`submit` calls) in the order they complete.
+
+        The awaitables are only started as earlier ones complete, keeping at most ``max_in_flight``
+        (if set) of them going, so a large (or endless) iterable can be passed.
+        """
+        done = asyncio.Queue()
+        aws = iter(aws)
+        running = 0
+
+        def start_next():
+            aw = next(aws, None)
+            if aw is None:
+                return False
+            asyncio.ensure_future(aw).add_done_callback(done.put_nowait)
+            return True
+
+        while (self.max_in_flight is None or running < self.max_in_flight) and start_next():
+            running += 1
+
+        while running:
+            task = await done.get()
+            running -= 1
+            if start_next():
+                running += 1
+            yield task.result()
@@ -0,0 +1,231 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Conversion of dataset search results into Apache Arrow record batches.
+
+Rows are converted a batch (and a column) at a time: times become timestamp columns,
+ranges become ``{begin, end}`` struct columns and the ``extent`` pseudo-field becomes a
+WKB-encoded polygon, so the result can be written straight to Parquet or Arrow IPC files.
+
+``pyarrow`` is an optional dependency (``pip install datacube_sp[arrow]``).
+"""
+import json
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+import numpy
+
+from datacube_sp.model._base import Range
+from datacube_sp.model.fields import Field
+
+#: Pseudo-field: the lat/lon bounding box of each dataset, as a WKB polygon in EPSG:4326.
+EXTENT_FIELD = 'extent'
+#: Default number of rows per record batch.
+DEFAULT_ARROW_BATCH_SIZE = 10_000
+
+# Native fields whose values aren't strings.
+_NATIVE_FIELD_TYPES = {
+    'indexed_time': 'datetime',
+    'dataset_type_id': 'integer',
+    'metadata_type_id': 'integer',
+    'metadata_doc': 'json',
+}
+
+# A little-endian WKB polygon with a single five-point ring.
+_WKB_BOX = numpy.dtype([('byte_order', 'u1'), ('geometry_type', '<u4'), ('num_rings', '<u4'),
+                        ('num_points', '<u4'), ('coords', '<f8', (5, 2))])
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('pyarrow is required for Arrow export of search results: '
+                          'install it with `pip install datacube_sp[arrow]`') from None
+    return pyarrow
+
+
+def select_field_names(field_names: Sequence[str]) -> Tuple[str, ...]:
+    """
+    The search fields needed to produce the given columns.
+    """
+    names = [name for name in field_names if name != EXTENT_FIELD]
+    if EXTENT_FIELD in field_names:
+        names.extend(name for name in ('lat', 'lon') if name not in names)
+    return tuple(names)
+
+
+def _type_name(field: Field) -> str:
+    return _NATIVE_FIELD_TYPES.get(field.name, field.type_name)
+
+
+def _arrow_type(pa, type_name: str):
+    if type_name.endswith('-range'):
+        element = _arrow_type(pa, type_name[:-len('-range')])
+        return pa.struct([('begin', element), ('end', element)])
+    if type_name == 'datetime':
+        return pa.timestamp('us', tz='UTC')
+    if type_name == 'integer':
+        return pa.int64()
+    if type_name in ('numeric', 'double'):
+        return pa.float64()
+    return pa.string()
+
+
+def arrow_schema(field_names: Sequence[str], fields: Mapping[str, Field]):
+    """
+    Arrow schema for the given columns of search results.
+
+    :param field_names: Requested field names (may include :data:`EXTENT_FIELD`)
+    :param fields: Search fields of the metadata type, by name
+    :rtype: pyarrow.Schema
+    """
+    pa = _pyarrow()
+    columns = []
+    for name in field_names:
+        if name == EXTENT_FIELD:
+            columns.append(pa.field(name, pa.binary(), metadata={'encoding': 'WKB', 'crs': 'EPSG:4326'}))
+        else:
+            columns.append(pa.field(name, _arrow_type(pa, _type_name(fields[name]))))
+    return pa.schema(columns)
+
+
+def _range_bounds(value) -> Tuple[Any, Any]:
+    if value is None:
+        return None, None
+    if isinstance(value, Range):
+        return value.begin, value.end
+    # psycopg2 range
+    return value.lower, value.upper
+
+
+def _to_array(pa, values: List[Any], type_name: str, arrow_type):
+    if type_name.endswith('-range'):
+        element_type = type_name[:-len('-range')]
+        bounds = [_range_bounds(v) for v in values]
+        return pa.StructArray.from_arrays(
+            [_to_array(pa, [b[0] for b in bounds], element_type, arrow_type.field(0).type),
+             _to_array(pa, [b[1] for b in bounds], element_type, arrow_type.field(1).type)],
+            fields=list(arrow_type),
+            mask=pa.array([v is None for v in values], type=pa.bool_()),
+        )
+    if type_name in ('numeric', 'double'):
+        values = [None if v is None else float(v) for v in values]
+    elif type_name == 'json':
+        values = [None if v is None else json.dumps(v) for v in values]
+    elif arrow_type == pa.string():
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def _bounds_arrays(values: List[Any]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    bounds = numpy.array([_range_bounds(v) for v in values], dtype='float64').reshape(len(values), 2)
+    return bounds[:, 0], bounds[:, 1]
+
+
+def extent_wkb_array(lat: List[Any], lon: List[Any]):
+    """
+    WKB polygons of the lat/lon boxes given by two columns of range values, built without a
+    per-row geometry object. Rows without both ranges are null.
+
+    :rtype: pyarrow.BinaryArray
+    """
+    pa = _pyarrow()
+    ymin, ymax = _bounds_arrays(lat)
+    xmin, xmax = _bounds_arrays(lon)
+    valid = numpy.isfinite(ymin) & numpy.isfinite(ymax) & numpy.isfinite(xmin) & numpy.isfinite(xmax)
+
+    boxes = numpy.zeros(int(valid.sum()), dtype=_WKB_BOX)
+    boxes['byte_order'] = 1
+    boxes['geometry_type'] = 3
+    boxes['num_rings'] = 1
+    boxes['num_points'] = 5
+    xmin, ymin, xmax, ymax = xmin[valid], ymin[valid], xmax[valid], ymax[valid]
+    # Counter-clockwise exterior ring
+    boxes['coords'][:, :, 0] = numpy.stack([xmin, xmax, xmax, xmin, xmin], axis=1)
+    boxes['coords'][:, :, 1] = numpy.stack([ymin, ymin, ymax, ymax, ymin], axis=1)
+
+    offsets = numpy.zeros(len(valid) + 1, dtype='int32')
+    numpy.cumsum(valid * _WKB_BOX.itemsize, out=offsets[1:])
+    validity = None if valid.all() else pa.py_buffer(numpy.packbits(valid, bitorder='little'))
+    return pa.Array.from_buffers(pa.binary(), len(valid),
+                                 [validity, pa.py_buffer(offsets), pa.py_buffer(boxes.tobytes())],
+                                 null_count=int((~valid).sum()))
+
+
+def to_record_batch(rows: Sequence[Sequence[Any]],
+                    field_names: Sequence[str],
+                    fields: Mapping[str, Field],
+                    schema):
+    """
+    Convert search result rows (with the columns of :func:`select_field_names`) to a record batch.
+
+    :rtype: pyarrow.RecordBatch
+    """
+    pa = _pyarrow()
+    selected = select_field_names(field_names)
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(selected)}
+    arrays = []
+    for column in schema:
+        if column.name == EXTENT_FIELD:
+            arrays.append(extent_wkb_array(columns['lat'], columns['lon']))
+        else:
+            arrays.append(_to_array(pa, columns[column.name], _type_name(fields[column.name]), column.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def batched(rows: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """
+    Group rows into lists of (at most) ``batch_size``.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def record_batch_reader(field_names: Sequence[str],
+                        fields: Mapping[str, Field],
+                        row_batches: Iterable[Sequence[Sequence[Any]]]):
+    """
+    Stream batches of search result rows as Arrow record batches.
+
+    :param field_names: Requested field names (may include :data:`EXTENT_FIELD`)
+    :param fields: Search fields of the metadata type, by name
+    :param row_batches: Batches of rows, with the columns of :func:`select_field_names`
+    :rtype: pyarrow.RecordBatchReader
+    """
+    pa = _pyarrow()
+    schema = arrow_schema(field_names, fields)
+    return pa.RecordBatchReader.from_batches(
+        schema,
+        (to_record_batch(rows, field_names, fields, schema) for rows in row_batches)
+    )
+
+
+def write_record_batches(reader, path: str, format: str = 'parquet') -> int:
+    """
+    Write a stream of record batches to a Parquet or Arrow IPC (``'arrow'``) file.
+
+    :param pyarrow.RecordBatchReader reader:
+    :return: Number of rows written
+    """
+    pa = _pyarrow()
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, reader.schema)
+    elif format == 'arrow':
+        writer = pa.ipc.new_file(path, reader.schema)
+    else:
+        raise ValueError('Unknown export format: %r' % format)
+
+    count = 0
+    with writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
@@ -0,0 +1,306 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Process-wide cache of metadata type and product definitions for SQL indexes.
+
+Every new ``Index`` instance used to refetch all product definitions the first time
+they were needed, which is a significant cost for short-lived workers (dask workers,
+web request handlers). A :class:`ResourceCache` is shared by all index instances
+connected to the same database, is revalidated against the database at most once
+every ``ttl`` seconds, and can be pickled to a file and preloaded so new processes
+start warm.
+
+Change detection relies on the ``updated`` column maintained by the row-update
+timestamp triggers (see ``install_timestamp_trigger`` in the SQL drivers): the
+version of a table is its row count plus its most recent ``added``/``updated`` time.
+"""
+import logging
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple, Union
+
+_LOG = logging.getLogger(__name__)
+
+#: Default number of seconds a cache is trusted before revalidating against the database.
+DEFAULT_CACHE_TTL = 60.0
+
+METADATA_TYPES = 'metadata_type'
+PRODUCTS = 'product'
+
+# Columns kept for each cached record: enough to rebuild the model objects.
+_RECORD_KEYS = {
+    METADATA_TYPES: ('id', 'name', 'definition'),
+    PRODUCTS: ('id', 'name', 'definition', 'metadata_type_ref'),
+}
+
+_SNAPSHOT_FORMAT = 1
+
+
+class ResourceCache:
+    """
+    Cache of metadata type and product records for one index.
+
+    Records are stored as plain dictionaries so the cache can be pickled; model
+    objects are built on demand by the owning index and memoised until the cache
+    contents next change.
+
+    Thread safe.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._version: Optional[Hashable] = None
+        self._checked: Optional[float] = None
+        self._records: Dict[str, Dict[int, dict]] = {kind: {} for kind in _RECORD_KEYS}
+        self._names: Dict[str, Dict[str, int]] = {kind: {} for kind in _RECORD_KEYS}
+        self._models: Dict[Tuple[str, int], Any] = {}
+
+    @property
+    def version(self) -> Optional[Hashable]:
+        """Database version token of the cached records, None if never loaded or invalidated."""
+        return self._version
+
+    def is_due(self) -> bool:
+        """Is the cache due for revalidation against the database?"""
+        checked = self._checked
+        return checked is None or self._version is None or time.monotonic() - checked >= self.ttl
+
+    def sync(self,
+             version: Hashable,
+             fetch_records: Callable[[], Tuple[Iterable[Mapping], Iterable[Mapping]]]) -> bool:
+        """
+        Revalidate the cache against the current database version token.
+
+        :param version: Current version token, as returned by ``get_resource_version()``
+                        on a database connection.
+        :param fetch_records: Called to fetch ``(metadata_type_rows, product_rows)`` if
+                              the version has changed.
+        :return: True if the records were reloaded
+        """
+        with self._lock:
+            self._checked = time.monotonic()
+            if version is not None and version == self._version:
+                return False
+            metadata_types, products = fetch_records()
+            self._replace(version, {METADATA_TYPES: metadata_types, PRODUCTS: products})
+            _LOG.debug("Reloaded resource cache at version %r", version)
+            return True
+
+    def invalidate(self) -> None:
+        """
+        Force a reload on next use (e.g. after a local add or update).
+        """
+        with self._lock:
+            self._version = None
+            self._checked = None
+
+    def get_record(self, kind: str, id_: Optional[int] = None, name: Optional[str] = None) -> Optional[dict]:
+        """
+        Look up a cached record by id or by name.
+
+        :param kind: ``METADATA_TYPES`` or ``PRODUCTS``
+        """
+        with self._lock:
+            if id_ is None:
+                id_ = self._names[kind].get(name)
+            return self._records[kind].get(id_)
+
+    def records(self, kind: str) -> List[dict]:
+        """
+        All cached records of a kind, ordered by name.
+        """
+        with self._lock:
+            return sorted(self._records[kind].values(), key=lambda r: r['name'])
+
+    def model(self, kind: str, record: dict, build: Callable[[dict], Any]) -> Any:
+        """
+        Return the model object for a cached record, building it with ``build`` on first use.
+        """
+        key = (kind, record['id'])
+        with self._lock:
+            model = self._models.get(key)
+        if model is None:
+            # Build outside the lock: building a product looks up its metadata type,
+            # which may need a database connection.
+            model = build(record)
+            with self._lock:
+                model = self._models.setdefault(key, model)
+        return model
+
+    def snapshot(self) -> dict:
+        """
+        Picklable copy of the cached records.
+        """
+        with self._lock:
+            return dict(
+                format=_SNAPSHOT_FORMAT,
+                version=self._version,
+                records={kind: list(recs.values()) for kind, recs in self._records.items()},
+            )
+
+    def restore(self, snapshot: Mapping[str, Any]) -> None:
+        """
+        Replace the cached records with a snapshot.
+
+        The snapshot is revalidated (one cheap version query) on first use: if
+        the database hasn't changed since it was taken it is used as-is.
+        """
+        if snapshot.get('format') != _SNAPSHOT_FORMAT:
+            raise ValueError('Unsupported resource cache snapshot format: %r' % snapshot.get('format'))
+        with self._lock:
+            self._replace(snapshot['version'], snapshot['records'])
+            self._checked = None
+
+    def dump(self, path: Union[str, Path]) -> None:
+        """
+        Write a snapshot of the cache to a file, for preloading in other processes.
+        """
+        with open(str(path), 'wb') as f:
+            pickle.dump(self.snapshot(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path: Union[str, Path]) -> None:
+        """
+        Preload the cache from a file written by :meth:`dump`.
+        """
+        with open(str(path), 'rb') as f:
+            self.restore(pickle.load(f))
+
+    def _replace(self, version: Optional[Hashable], rows: Mapping[str, Iterable[Mapping]]) -> None:
+        self._version = version
+        self._models.clear()
+        for kind, keys in _RECORD_KEYS.items():
+            records = [{k: row[k] for k in keys} for row in rows[kind]]
+            self._records[kind] = {r['id']: r for r in records}
+            self._names[kind] = {r['name']: r['id'] for r in records}
+
+    def __repr__(self) -> str:
+        return 'ResourceCache<ttl={!r}, version={!r}, metadata_types={}, products={}>'.format(
+            self.ttl, self._version, len(self._records[METADATA_TYPES]), len(self._records[PRODUCTS]))
+
+
+_SHARED_CACHES: Dict[str, ResourceCache] = {}
+_SHARED_CACHES_LOCK = threading.Lock()
+
+
+def shared_resource_cache(index_id: str,
+                          ttl: Optional[float] = None,
+                          snapshot: Optional[Union[str, Path]] = None) -> Optional[ResourceCache]:
+    """
+    Get (or create) the process-wide resource cache for an index.
+
+    :param index_id: Unique id of the index (see ``AbstractIndex.index_id``)
+    :param ttl: Seconds between revalidations, ``0`` disables the shared cache.
+                Defaults to ``DEFAULT_CACHE_TTL``.
+    :param snapshot: Optional path of a file written by :meth:`ResourceCache.dump`,
+                     loaded if the cache is newly created.
+    :return: The shared cache, or None if disabled
+    """
+    explicit_ttl = ttl not in (None, '')
+    ttl = float(ttl) if explicit_ttl else DEFAULT_CACHE_TTL  # type: ignore[arg-type]
+    if ttl <= 0:
+        return None
+
+    with _SHARED_CACHES_LOCK:
+        cache = _SHARED_CACHES.get(index_id)
+        if cache is None:
+            cache = ResourceCache(ttl)
+            if snapshot:
+                try:
+                    cache.load(snapshot)
+                except (OSError, ValueError, pickle.UnpicklingError) as e:
+                    _LOG.warning("Unable to preload resource cache from %s: %s", snapshot, e)
+            _SHARED_CACHES[index_id] = cache
+        elif explicit_ttl:
+            cache.ttl = ttl
+        return cache
+
+
+class ResourceCacheAddIn:
+    """
+    Resource cache access for SQL Index implementations.
+
+    The host index needs a ``_shared_cache`` attribute (a :class:`ResourceCache`
+    or None), plus the usual ``_active_connection()`` and ``thread_transaction()``.
+    Its connection API needs ``get_resource_version()``, ``get_all_metadata_types()``
+    and ``get_all_products()``.
+
+    While a transaction is active the shared cache is bypassed, lookups are instead
+    memoised in the transaction (see ``AbstractTransaction.resource_memo``).
+    """
+    _shared_cache: Optional[ResourceCache] = None
+
+    @property
+    def resource_cache(self) -> Optional[ResourceCache]:
+        return self._shared_cache
+
+    def _current_resource_cache(self, force: bool = False) -> Optional[ResourceCache]:
+        """
+        The shared cache, revalidated if due (or forced).
+
+        None if caching is disabled, or a transaction is active in this thread
+        (uncommitted changes must not leak into a cache shared with other threads).
+        """
+        cache = self._shared_cache
+        if cache is None or self.thread_transaction() is not None:  # type: ignore[attr-defined]
+            return None
+        if force or cache.is_due():
+            with self._active_connection() as conn:  # type: ignore[attr-defined]
+                cache.sync(conn.get_resource_version(),
+                           lambda: (conn.get_all_metadata_types(), conn.get_all_products()))
+        return cache
+
+    def _cached_get(self, kind: str, build: Callable[[dict], Any], fetch: Callable[[], Any],
+                    id_: Optional[int] = None, name: Optional[str] = None) -> Any:
+        """
+        Get a model from the shared cache, or the transaction memo.
+
+        :param build: Builds the model from a cached record
+        :param fetch: Gets the model from the database, when the shared cache is not available
+        :raises KeyError: if there is no such record in the database
+        """
+        trans = self.thread_transaction()  # type: ignore[attr-defined]
+        if trans is not None:
+            key = (kind, id_, name)
+            model = trans.resource_memo.get(key)
+            if model is None:
+                model = trans.resource_memo[key] = fetch()
+            return model
+        cache = self._current_resource_cache()
+        if cache is None:
+            return fetch()
+        record = cache.get_record(kind, id_=id_, name=name)
+        if record is None:
+            # It may have been added elsewhere since we last looked.
+            self._current_resource_cache(force=True)
+            record = cache.get_record(kind, id_=id_, name=name)
+            if record is None:
+                raise KeyError('"%s" is not a valid %s %s' % (
+                    id_ if id_ is not None else name, kind, 'id' if id_ is not None else 'name'))
+        return cache.model(kind, record, build)
+
+    def _cached_all(self, kind: str, build: Callable[[dict], Any]) -> Optional[List[Any]]:
+        """
+        All models of a kind from the shared cache, ordered by name.
+
+        :return: List of models, or None if the cache is not available
+        """
+        cache = self._current_resource_cache()
+        if cache is None:
+            return None
+        return [cache.model(kind, record, build) for record in cache.records(kind)]
+
+    def _invalidate_resource_cache(self) -> None:
+        trans = self.thread_transaction()  # type: ignore[attr-defined]
+        if trans is not None:
+            trans.resource_memo.clear()
+        cache = self._shared_cache
+        if cache is not None:
+            cache.invalidate()
+            if trans is not None:
+                # Other threads only see the change once committed, don't let them cache the old version
+                trans.add_commit_callback(cache.invalidate)
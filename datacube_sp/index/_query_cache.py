@@ -0,0 +1,316 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Opt-in cache of dataset search results.
+
+Dashboards and tile servers tend to run the same ``find_datasets`` queries over and over.
+A :class:`DatasetQueryCache` keeps the results of recent searches as compact records (no
+``Dataset`` objects, no derived properties), keyed by the normalised search terms.
+
+Entries are evicted least-recently-used first once the cache holds more than ``max_size``
+dataset records, and expire ``ttl`` seconds after they were fetched. Dataset changes made
+through the owning index (add, update, archive, restore, purge) invalidate the entries they
+could affect, once they are committed; changes made by other processes are only seen once
+entries expire. Searches made inside a transaction bypass the cache.
+"""
+import copy
+import datetime
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from datacube_sp.model import Dataset, Range
+
+_LOG = logging.getLogger(__name__)
+
+#: Default maximum number of dataset records held.
+DEFAULT_QUERY_CACHE_SIZE = 100_000
+#: Default number of seconds a search result is reused for.
+DEFAULT_QUERY_CACHE_TTL = 300.0
+
+
+class DatasetRecord(NamedTuple):
+    """
+    What the cache keeps of each dataset: enough to rebuild the ``Dataset``.
+
+    The metadata document is copied in and out, so changes made to returned datasets don't leak into the cache.
+    """
+    id: Any
+    product: str
+    metadata_doc: Dict[str, Any]
+    uris: Optional[Tuple[str, ...]]
+    indexed_by: Optional[str]
+    indexed_time: Optional[datetime.datetime]
+    archived_time: Optional[datetime.datetime]
+
+    @classmethod
+    def from_dataset(cls, dataset: Dataset) -> "DatasetRecord":
+        return cls(dataset.id, dataset.product.name, copy.deepcopy(dataset.metadata_doc),
+                   tuple(dataset.uris) if dataset.uris is not None else None,
+                   dataset.indexed_by, dataset.indexed_time, dataset.archived_time)
+
+    def to_dataset(self, product) -> Dataset:
+        return Dataset(product, copy.deepcopy(self.metadata_doc),
+                       uris=list(self.uris) if self.uris is not None else None,
+                       indexed_by=self.indexed_by,
+                       indexed_time=self.indexed_time,
+                       archived_time=self.archived_time)
+
+
+class QueryCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    size: int
+
+
+class _Entry(NamedTuple):
+    records: Tuple[DatasetRecord, ...]
+    # Product names the query could match, or None if it isn't restricted to known products.
+    products: Optional[Set[str]]
+    expires: float
+
+
+def normalise_search_terms(value: Any) -> Hashable:
+    """
+    Convert search terms (as from ``Query.search_terms``) into a hashable cache key.
+
+    Equivalent queries get the same key: argument order doesn't matter, and times are compared in UTC.
+    """
+    if isinstance(value, Mapping):
+        return tuple(sorted((str(k), normalise_search_terms(v)) for k, v in value.items()))
+    if isinstance(value, Range):
+        return ('range', normalise_search_terms(value.begin), normalise_search_terms(value.end))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalise_search_terms(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(normalise_search_terms(v) for v in value))
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        return value.isoformat()
+    if hasattr(value, 'wkt') and hasattr(value, 'crs'):
+        # Geometry
+        return ('geometry', str(value.crs), value.wkt)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _query_products(search_terms: Mapping[str, Any]) -> Optional[Set[str]]:
+    product = search_terms.get('product')
+    if product is None:
+        return None
+    if isinstance(product, str):
+        return {product}
+    return set(product)
+
+
+class DatasetQueryCache:
+    """
+    LRU/TTL cache of dataset search results.
+
+    Thread safe.
+
+    :param max_size: Maximum number of dataset records held across all cached searches.
+                     Larger results are not cached.
+    :param ttl: Seconds a search result is reused for.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_QUERY_CACHE_SIZE, ttl: float = DEFAULT_QUERY_CACHE_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # Dataset id -> keys of the entries containing it.
+        self._keys_by_id: Dict[Any, Set[Hashable]] = {}
+        self._size = 0
+        # Incremented by each invalidation, so a result fetched before an invalidation isn't stored after it.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def search(self,
+               index,
+               limit: Optional[int] = None,
+               **search_terms) -> List[Dataset]:
+        """
+        ``index.datasets.search(limit=limit, **search_terms)``, reusing a recent result if possible.
+        """
+        if index.thread_transaction() is not None:
+            # May see uncommitted changes, which other connections can't and which may be rolled back.
+            return list(index.datasets.search(limit=limit, **search_terms))
+
+        key = (normalise_search_terms(search_terms), limit)
+        records, generation = self._get(key)
+        if records is None:
+            datasets = list(index.datasets.search(limit=limit, **search_terms))
+            self._put(key, [DatasetRecord.from_dataset(ds) for ds in datasets], _query_products(search_terms),
+                      generation)
+            return datasets
+
+        products: Dict[str, Any] = {}
+
+        def product(name: str):
+            p = products.get(name)
+            if p is None:
+                p = products[name] = index.products.get_by_name(name)
+            return p
+
+        return [record.to_dataset(product(record.product)) for record in records]
+
+    def invalidate(self,
+                   products: Iterable[str] = (),
+                   ids: Iterable[Any] = ()) -> None:
+        """
+        Drop the entries that may be affected by changes to datasets.
+
+        :param products: Products with new (or updated) datasets: drops the searches that could match them.
+        :param ids: Changed (archived, restored, purged, updated) datasets: drops the searches that returned them.
+        """
+        products = set(products)
+        with self._lock:
+            stale: Set[Hashable] = set()
+            for id_ in ids:
+                if not isinstance(id_, uuid.UUID):
+                    id_ = uuid.UUID(str(id_))
+                stale.update(self._keys_by_id.get(id_, ()))
+            if products:
+                stale.update(key for key, entry in self._entries.items()
+                             if entry.products is None or entry.products & products)
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_id.clear()
+            self._size = 0
+
+    @property
+    def stats(self) -> QueryCacheStats:
+        """
+        Hit/miss counters, and current contents.
+        """
+        with self._lock:
+            return QueryCacheStats(self.hits, self.misses, self.evictions, self.invalidations,
+                                   len(self._entries), self._size)
+
+    def _get(self, key: Hashable) -> Tuple[Optional[Tuple[DatasetRecord, ...]], int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, self._generation
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.records, self._generation
+
+    def _put(self, key: Hashable, records: List[DatasetRecord], products: Optional[Set[str]],
+             generation: int) -> None:
+        if len(records) > self.max_size:
+            _LOG.debug("Not caching search result of %d datasets", len(records))
+            return
+        if products is not None:
+            products = products | {record.product for record in records}
+        with self._lock:
+            if generation != self._generation:
+                # Datasets changed while searching: the result may already be stale.
+                return
+            self._remove(key)
+            self._entries[key] = _Entry(tuple(records), products, time.monotonic() + self.ttl)
+            for record in records:
+                self._keys_by_id.setdefault(record.id, set()).add(key)
+            self._size += len(records)
+            while self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry.records)
+        for record in entry.records:
+            keys = self._keys_by_id.get(record.id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_id[record.id]
+
+    def __repr__(self) -> str:
+        return 'DatasetQueryCache<max_size={!r}, ttl={!r}, {!r}>'.format(self.max_size, self.ttl, self.stats)
+
+
+class DatasetQueryCacheAddIn:
+    """
+    Query cache management for Index implementations.
+    """
+    _query_cache: Optional[DatasetQueryCache] = None
+
+    @property
+    def query_cache(self) -> Optional[DatasetQueryCache]:
+        """
+        The dataset search result cache, None unless enabled with :meth:`enable_query_cache`.
+        """
+        return self._query_cache
+
+    def enable_query_cache(self,
+                           max_size: int = DEFAULT_QUERY_CACHE_SIZE,
+                           ttl: float = DEFAULT_QUERY_CACHE_TTL) -> DatasetQueryCache:
+        """
+        Cache the results of ``Datacube.find_datasets`` searches on this index.
+
+        :param max_size: Maximum number of dataset records held
+        :param ttl: Seconds a search result is reused for
+        :return: The cache (also available as :attr:`query_cache`)
+        """
+        if self._query_cache is None:
+            self._query_cache = DatasetQueryCache(max_size, ttl)
+        else:
+            self._query_cache.max_size = max_size
+            self._query_cache.ttl = ttl
+        return self._query_cache
+
+    def disable_query_cache(self) -> None:
+        self._query_cache = None
+
+    def thread_transaction(self):
+        """
+        The active transaction for this index in the current thread, if any (overridden by index implementations).
+        """
+        return None
+
+    def _datasets_changed(self, products: Iterable[str] = (), ids: Iterable[Any] = ()) -> None:
+        """
+        Called by dataset resources after datasets are added or changed.
+
+        Inside a transaction the changes aren't visible to other connections until it commits:
+        a search made in the meantime would still be stored, so the cache is only invalidated on commit.
+        """
+        cache = self._query_cache
+        if cache is None:
+            return
+        products, ids = list(products), list(ids)
+        trans = self.thread_transaction()
+        if trans is not None:
+            trans.add_commit_callback(lambda: cache.invalidate(products=products, ids=ids))
+        else:
+            cache.invalidate(products=products, ids=ids)
@@ -8,12 +8,15 @@ from pathlib import Path
 from threading import Lock
 
 from abc import ABC, abstractmethod
-from typing import (Any, Iterable, Iterator,
+from typing import (Any, Callable, Dict, Hashable, Iterable, Iterator,
                     List, Mapping, Optional,
                     Tuple, Union, Sequence)
 from uuid import UUID
 
 from datacube_sp.config import LocalConfig
+from datacube_sp.index._arrow import DEFAULT_ARROW_BATCH_SIZE, batched, record_batch_reader, select_field_names
+from datacube_sp.index._cache import ResourceCache
+from datacube_sp.index._query_cache import DatasetQueryCacheAddIn
 from datacube_sp.index.exceptions import TransactionException
 from datacube_sp.index.fields import Field
 from datacube_sp.model import Dataset, MetadataType, Range
@@ -812,6 +815,60 @@ class AbstractDatasetResource(ABC):
         :return: Namedtuple of requested fields, for each matching dataset.
         """
 
+    def search_to_arrow(self,
+                        field_names: Iterable[str],
+                        batch_size: int = DEFAULT_ARROW_BATCH_SIZE,
+                        limit: Optional[int] = None,
+                        **query: QueryField):
+        """
+        Perform a search, returning the specified fields as a stream of Apache Arrow record batches.
+
+        Intended for bulk export and analysis: rows are converted a batch at a time, rather than
+        one namedtuple per row. Times are returned as timestamp columns, ranges as ``{begin, end}``
+        structs, and the pseudo-field ``extent`` as a WKB polygon of the dataset's lat/lon bounds.
+
+        Requires ``pyarrow``.
+
+        :param field_names: Names of desired fields (and optionally ``extent``)
+        :param batch_size: Number of rows in each record batch
+        :param limit: Limit number of dataset (None/default = unlimited)
+        :param query: search query parameters
+        :return: A ``pyarrow.RecordBatchReader``: iterate it, or pass it to a Parquet writer.
+        """
+        field_names = tuple(field_names)
+        select_names = select_field_names(field_names)
+        return record_batch_reader(field_names,
+                                   self._search_fields(select_names, query),
+                                   self._search_returning_batches(select_names, batch_size, limit=limit, **query))
+
+    def _search_returning_batches(self,
+                                  field_names: Tuple[str, ...],
+                                  batch_size: int,
+                                  limit: Optional[int] = None,
+                                  **query: QueryField) -> Iterator[Sequence[Tuple]]:
+        """
+        Rows of :meth:`search_returning`, in lists of (at most) ``batch_size``.
+
+        Index drivers can override this to fetch rows from the database in batches.
+        """
+        return batched(self.search_returning(field_names, limit=limit, **query), batch_size)
+
+    def _search_fields(self, field_names: Iterable[str], query: Mapping[str, QueryField]) -> Mapping[str, Field]:
+        """
+        Search fields (by name) of a metadata type that could be searched with the query and has the given fields.
+        """
+        field_names = tuple(field_names)
+        product = query.get('product')
+        if isinstance(product, str):
+            products: Iterable[Product] = [p for p in [self.products.get_by_name(product)] if p is not None]
+        else:
+            products = self.products.get_with_fields(field_names)
+        for p in products:
+            dataset_fields = p.metadata_type.dataset_fields
+            if all(name in dataset_fields for name in field_names):
+                return dataset_fields
+        raise ValueError('No type of dataset has fields: {}'.format(field_names))
+
     @abstractmethod
     def count(self, **query: QueryField) -> int:
         """
@@ -1019,6 +1076,9 @@ class AbstractTransaction(ABC):
         self._tls_id = f"txn-{index_id}"
         self._obj_lock = Lock()
         self._controlling_trans = None
+        self._commit_callbacks: List[Callable[[], None]] = []
+        #: Products and metadata types looked up during the transaction, by the index resources
+        self.resource_memo: Dict[Hashable, Any] = {}
 
     # Main Transaction API
     def begin(self) -> None:
@@ -1049,6 +1109,10 @@ class AbstractTransaction(ABC):
             self._release_connection()
             self._connection = None
             self._tls_purge()
+            self.resource_memo.clear()
+            callbacks, self._commit_callbacks = self._commit_callbacks, []
+        for callback in callbacks:
+            callback()
 
     def rollback(self) -> None:
         """
@@ -1065,6 +1129,8 @@ class AbstractTransaction(ABC):
             self._release_connection()
             self._connection = None
             self._tls_purge()
+            self.resource_memo.clear()
+            self._commit_callbacks = []
 
     @property
     def active(self):
@@ -1073,6 +1139,17 @@ class AbstractTransaction(ABC):
         """
         return self._connection is not None
 
+    def add_commit_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Call a function once the transaction is committed (dropped if it is rolled back).
+
+        Callbacks added to a nested transaction are run when the outermost transaction commits.
+        """
+        if self._controlling_trans is not None:
+            self._controlling_trans.add_commit_callback(callback)
+        else:
+            self._commit_callbacks.append(callback)
+
     # Manage thread-local storage
     def _tls_stash(self) -> None:
         """
@@ -1174,7 +1251,7 @@ class UnhandledTransaction(AbstractTransaction):
         pass
 
 
-class AbstractIndex(ABC):
+class AbstractIndex(DatasetQueryCacheAddIn, ABC):
     """
     Abstract base class for an Index.  All Index implementations should
     inherit from this base class and implement all abstract methods.
@@ -1276,6 +1353,27 @@ class AbstractIndex(ABC):
                  None if spatial indexes are not supported.
         """
 
+    def build_lineage_closure(self) -> Optional[int]:
+        """
+        Create (or rebuild) a materialised lineage closure table, used in place of recursive
+        queries when fetching dataset sources and for source-filtered searches.
+
+        Once created, the table is kept up to date as datasets are added.
+
+        :return: Number of (ancestor, descendant, path) rows in the table.
+                 None if lineage closure tables are not supported by the index driver.
+        """
+        _LOG.warning("Lineage closure tables are not supported by this index driver")
+        return None
+
+    @property
+    def resource_cache(self) -> Optional[ResourceCache]:
+        """
+        :return: The process-wide metadata type and product cache shared by this index,
+                 or None if the index does not use one.
+        """
+        return None
+
     def thread_transaction(self) -> Optional["AbstractTransaction"]:
         """
         :return: The existing Transaction object cached in thread-local storage for this index, if there is one.
@@ -6,9 +6,11 @@
 Common datatypes for DB drivers.
 """
 
+import itertools
+import operator
 from datetime import date, datetime, time
 from dateutil.tz import tz
-from typing import List
+from typing import Any, Dict, Iterable, List, Tuple
 
 from datacube_sp.model import Range
 from datacube_sp.model.fields import Expression, Field
@@ -18,7 +20,9 @@ __all__ = ['Field',
            'OrExpression',
            'UnknownFieldError',
            'to_expressions',
-           'as_expression']
+           'as_expression',
+           'group_product_queries',
+           'split_rows_by_product']
 
 
 class UnknownFieldError(Exception):
@@ -71,3 +75,63 @@ def to_expressions(get_field, **query) -> List[Expression]:
     :type query: dict[str,str|float|datacube.model.Range]
     """
     return [_to_expression(get_field, name, value) for name, value in query.items()]
+
+
+def group_product_queries(product_queries: Iterable[Tuple[dict, Any]],
+                          id_field: str,
+                          merge: bool = True) -> List[Tuple[Any, List[Tuple[List[Any], dict]]]]:
+    """
+    Group per-product queries so they can be run as one statement per metadata type.
+
+    Only products sharing a metadata type share search fields (and so result columns).
+    Within a metadata type, products left with identical search terms (after the product
+    id term is removed) are merged into a single branch, searched with one ``IN`` test.
+
+    :param product_queries: ``(query, product)`` pairs, each query including a product id term
+    :param id_field: Name of the product id term in each query (e.g. ``'product_id'``)
+    :param merge: Merge products with identical search terms into one branch. Disable when
+                  each product must be queried on its own (e.g. a per-product limit).
+    :return: ``(metadata_type, [(products, query)])`` in first-seen order, each query
+             without its product id term
+    """
+    groups: List[Tuple[Any, List[Tuple[List[Any], dict]]]] = []
+    by_metadata_type: Dict[int, List[Tuple[List[Any], dict]]] = {}
+    for q, product in product_queries:
+        q = {k: v for k, v in q.items() if k != id_field}
+        metadata_type = product.metadata_type
+        branches = by_metadata_type.get(metadata_type.id)
+        if branches is None:
+            branches = by_metadata_type[metadata_type.id] = []
+            groups.append((metadata_type, branches))
+        for products, branch_q in branches:
+            if merge and branch_q == q:
+                products.append(product)
+                break
+        else:
+            branches.append(([product], q))
+    return groups
+
+
+def split_rows_by_product(rows: Iterable[Any],
+                          products: List[Any],
+                          product_ref: str) -> Iterable[Tuple[Any, Iterable[Any]]]:
+    """
+    Demultiplex the rows of a multi-product search, as they arrive.
+
+    The rows of each product are passed on lazily, so must be consumed before moving on to the next product.
+
+    :param rows: Result rows, each with a product id column, ordered by product id
+    :param products: The products searched
+    :param product_ref: Name of the product id column
+    :return: ``(product, rows)`` for each product in product id order (with no rows if nothing matched)
+    """
+    groups = itertools.groupby(rows, key=operator.attrgetter(product_ref))
+    group = next(groups, None)
+    for product in sorted(products, key=operator.attrgetter('id')):
+        if group is not None and group[0] == product.id:
+            yield product, group[1]
+            group = next(groups, None)
+        else:
+            yield product, iter(())
+    if group is not None:
+        raise ValueError("Rows not ordered by product, or of an unexpected product: {!r}".format(group[0]))
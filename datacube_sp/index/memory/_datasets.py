@@ -32,6 +32,7 @@ _LOG = logging.getLogger(__name__)
 class DatasetResource(AbstractDatasetResource):
     def __init__(self, product_resource: ProductResource) -> None:
         self.product_resource = product_resource
+        self.products = product_resource
         self.metadata_type_resource = product_resource.metadata_type_resource
         # Main dataset index
         self.by_id: MutableMapping[UUID, Dataset] = {}
@@ -11,6 +11,7 @@ from typing import Iterable
 class DatasetResource(AbstractDatasetResource):
     def __init__(self, product_resource):
         self.types = product_resource
+        self.products = product_resource
 
     def get(self, id_: DSID, include_sources=False):
         return None
@@ -167,6 +167,7 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
                 # 1c. Store locations
                 if dataset.uris is not None:
                     self._ensure_new_locations(dataset, transaction=transaction)
+        self._index._datasets_changed(products=[dataset.product.name])
 
         return dataset
 
@@ -240,6 +241,7 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
 
         if not safe_changes and not unsafe_changes:
             self._ensure_new_locations(dataset, existing)
+            self._index._datasets_changed(ids=[dataset.id])
             _LOG.info("No changes detected for dataset %s", dataset.id)
             return dataset
 
@@ -267,6 +269,7 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
             transaction.update_search_index(dsids=[dataset.id])
 
         self._ensure_new_locations(dataset, existing)
+        self._index._datasets_changed(products=[product.name], ids=[dataset.id])
 
         return dataset
 
@@ -292,9 +295,11 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
 
         :param Iterable[UUID] ids: list of dataset ids to archive
         """
+        ids = list(ids)
         with self._db_connection(transaction=True) as transaction:
             for id_ in ids:
                 transaction.archive_dataset(id_)
+        self._index._datasets_changed(ids=ids)
 
     def restore(self, ids):
         """
@@ -302,9 +307,11 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
 
         :param Iterable[UUID] ids: list of dataset ids to restore
         """
+        ids = list(ids)
         with self._db_connection(transaction=True) as transaction:
             for id_ in ids:
                 transaction.restore_dataset(id_)
+        self._index._datasets_changed(ids=ids)
 
     def purge(self, ids: Iterable[DSID]):
         """
@@ -312,9 +319,11 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
 
         :param ids: iterable of dataset ids to purge
         """
+        ids = list(ids)
         with self._db_connection(transaction=True) as transaction:
             for id_ in ids:
                 transaction.delete_dataset(id_)
+        self._index._datasets_changed(ids=ids)
 
     def get_all_dataset_ids(self, archived: bool):
         """
@@ -389,7 +398,10 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
             return False
 
         with self._db_connection() as connection:
-            return connection.insert_dataset_location(id_, uri)
+            was_added = connection.insert_dataset_location(id_, uri)
+        if was_added:
+            self._index._datasets_changed(ids=[id_])
+        return was_added
 
     def get_datasets_for_location(self, uri, mode=None):
         """
@@ -412,7 +424,9 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
         """
         with self._db_connection() as connection:
             was_removed = connection.remove_location(id_, uri)
-            return was_removed
+        if was_removed:
+            self._index._datasets_changed(ids=[id_])
+        return was_removed
 
     def archive_location(self, id_, uri):
         """
@@ -424,7 +438,9 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
         """
         with self._db_connection() as connection:
             was_archived = connection.archive_location(id_, uri)
-            return was_archived
+        if was_archived:
+            self._index._datasets_changed(ids=[id_])
+        return was_archived
 
     def restore_location(self, id_, uri):
         """
@@ -436,7 +452,9 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
         """
         with self._db_connection() as connection:
             was_restored = connection.restore_location(id_, uri)
-            return was_restored
+        if was_restored:
+            self._index._datasets_changed(ids=[id_])
+        return was_restored
 
     def _make(self, dataset_res, full_info=False, product=None):
         """
@@ -488,9 +506,11 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
         :rtype: __generator[Dataset]
         """
         source_filter = query.pop('source_filter', None)
+        # Rows of several products come unsorted, the product of each is looked up (in the resource cache)
         for product, datasets in self._do_search_by_product(query,
                                                             source_filter=source_filter,
-                                                            limit=limit):
+                                                            limit=limit,
+                                                            by_product=False):
             yield from self._make_many(datasets, product)
 
     def search_by_product(self, **query):
@@ -525,6 +545,21 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
             for columns in results:
                 yield result_type(*columns)
 
+    def _search_returning_batches(self, field_names, batch_size, limit=None, **query):
+        """
+        Rows of :meth:`search_returning`, fetched from a server-side cursor ``batch_size`` at a time.
+        """
+        for _, results in self._do_search_by_product(query,
+                                                     return_fields=True,
+                                                     select_field_names=field_names,
+                                                     limit=limit,
+                                                     batch_size=batch_size):
+            while True:
+                rows = results.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
     def count(self, **query):
         """
         Perform a search, returning count of results.
@@ -532,7 +567,6 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
         :param dict[str,str|float|datacube.model.Range] query:
         :rtype: int
         """
-        # This may be optimised into one query in the future.
         result = 0
         for product_type, count in self._do_count_by_product(query):
             result += count
@@ -595,7 +629,17 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
     # pylint: disable=too-many-locals
     def _do_search_by_product(self, query, return_fields=False, select_field_names=None,
                               with_source_ids=False, source_filter=None,
-                              limit=None):
+                              limit=None, batch_size=None, by_product=True):
+        """
+        Search each matching product, with one statement per metadata type.
+
+        :param batch_size: Fetch rows from the database in batches of this size, rather than all at once.
+        :param by_product: Split the rows of a statement by product. This has the database sort them,
+                           otherwise ``(None, rows)`` is returned for statements covering several products.
+        :return: ``(product, rows)`` for each product. When ``return_fields`` is set, it is
+                 ``(products, rows)`` for each metadata type instead, as the selected fields
+                 don't necessarily identify the product.
+        """
         assert not with_source_ids
         assert source_filter is None
         product_queries = list(self._get_product_queries(query))
@@ -606,44 +650,67 @@ class DatasetResource(AbstractDatasetResource, IndexResourceAddIn):
             else:
                 raise ValueError(f"No such product: {product}")
 
-        for q, product in product_queries:
-            _LOG.warning("Querying product %s", product)
-            # Extract Geospatial search geometry
-            geom = self._extract_geom_from_query(q)
-            assert "lat" not in q
-            assert "lon" not in q
-
-            dataset_fields = product.metadata_type.dataset_fields
-            query_exprs = tuple(fields.to_expressions(dataset_fields.get, **q))
-            select_fields = None
-            if return_fields:
-                # if no fields specified, select all
-                if select_field_names is None:
-                    select_fields = tuple(field for name, field in dataset_fields.items()
-                                          if not field.affects_row_selection)
-                else:
-                    select_fields = tuple(dataset_fields[field_name]
-                                          for field_name in select_field_names)
+        # One statement per metadata type. Products can only share a branch if there's no per-product limit.
+        for metadata_type, branches in fields.group_product_queries(product_queries, 'product_id',
+                                                                    merge=limit is None):
+            dataset_fields = metadata_type.dataset_fields
+            product_expressions = []
+            for products, q in branches:
+                _LOG.debug("Querying products %s", [product.name for product in products])
+                # Extract Geospatial search geometry
+                geom = self._extract_geom_from_query(q)
+                assert "lat" not in q
+                assert "lon" not in q
+                product_expressions.append((
+                    [product.id for product in products],
+                    tuple(fields.to_expressions(dataset_fields.get, **q)),
+                    geom
+                ))
+            products = [product for branch_products, _ in branches for product in branch_products]
             with self._db_connection() as connection:
-                yield (product,
-                       connection.search_datasets(
-                           query_exprs,
-                           select_fields=select_fields,
-                           limit=limit,
-                           with_source_ids=with_source_ids,
-                           geom=geom
-                       ))
+                results = connection.search_datasets_by_product(
+                    product_expressions,
+                    select_fields=self._select_fields(dataset_fields, return_fields, select_field_names),
+                    limit=limit,
+                    batch_size=batch_size,
+                    order_by_product=by_product and not return_fields
+                )
+                if return_fields:
+                    # Selected fields may not identify the product: rows of the metadata type are returned together.
+                    yield products, results
+                elif len(products) == 1:
+                    yield products[0], results
+                elif not by_product:
+                    yield None, results
+                else:
+                    yield from fields.split_rows_by_product(results, products, 'product_ref')
 
-    def _do_count_by_product(self, query):
-        product_queries = self._get_product_queries(query)
+    @staticmethod
+    def _select_fields(dataset_fields, return_fields, select_field_names):
+        if not return_fields:
+            return None
+        # if no fields specified, select all
+        if select_field_names is None:
+            return tuple(field for name, field in dataset_fields.items()
+                         if not field.affects_row_selection)
+        return tuple(dataset_fields[field_name]
+                     for field_name in select_field_names)
 
-        for q, product in product_queries:
-            dataset_fields = product.metadata_type.dataset_fields
-            query_exprs = tuple(fields.to_expressions(dataset_fields.get, **q))
+    def _do_count_by_product(self, query):
+        for metadata_type, branches in fields.group_product_queries(self._get_product_queries(query),
+                                                                    'product_id'):
+            dataset_fields = metadata_type.dataset_fields
+            product_expressions = [
+                ([product.id for product in products], tuple(fields.to_expressions(dataset_fields.get, **q)))
+                for products, q in branches
+            ]
             with self._db_connection() as connection:
-                count = connection.count_datasets(query_exprs)
-            if count > 0:
-                yield product, count
+                counts = dict(connection.count_datasets_by_product(product_expressions))
+            for products, _ in branches:
+                for product in products:
+                    count = counts.get(product.id, 0)
+                    if count > 0:
+                        yield product, count
 
     def _do_time_count(self, period, query, ensure_single=False):
         if 'time' not in query:
@@ -5,7 +5,7 @@
 import logging
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import Iterable, Optional, Sequence
 
 from datacube_sp.drivers.postgis import PostGisDb, PostgisDbAPI
 from datacube_sp.index.postgis._transaction import PostgisTransaction
@@ -13,6 +13,7 @@ from datacube_sp.index.postgis._datasets import DatasetResource, DSID  # type: i
 from datacube_sp.index.postgis._metadata_types import MetadataTypeResource
 from datacube_sp.index.postgis._products import ProductResource
 from datacube_sp.index.postgis._users import UserResource
+from datacube_sp.index._cache import ResourceCacheAddIn, shared_resource_cache
 from datacube_sp.index.abstract import AbstractIndex, AbstractIndexDriver, AbstractTransaction, default_metadata_type_docs
 from datacube_sp.model import MetadataType
 from datacube_sp.utils.geometry import CRS
@@ -23,7 +24,7 @@ _LOG = logging.getLogger(__name__)
 _DEFAULT_METADATA_TYPES_PATH = Path(__file__).parent.joinpath('default-metadata-types.yaml')
 
 
-class Index(AbstractIndex):
+class Index(ResourceCacheAddIn, AbstractIndex):
     """
     Access to the datacube_sp index.
 
@@ -56,12 +57,22 @@ class Index(AbstractIndex):
     supports_source_filters = False
     supports_transactions = True
 
-    def __init__(self, db: PostGisDb) -> None:
+    def __init__(self, db: PostGisDb,
+                 cache_ttl: Optional[float] = None,
+                 cache_snapshot: Optional[str] = None) -> None:
+        """
+        :param db: Database connection
+        :param cache_ttl: Seconds before the shared product/metadata type cache is revalidated
+                          against the database. ``0`` disables the shared cache.
+        :param cache_snapshot: File written by ``index.resource_cache.dump()`` to preload the
+                               shared cache from.
+        """
         # POSTGIS driver is not stable with respect to database schema or internal APIs.
         _LOG.warning("""WARNING: The POSTGIS index driver implementation is considered EXPERIMENTAL.
 WARNING:
 WARNING: Database schema and internal APIs may change significantly between releases. Use at your own risk.""")
         self._db = db
+        self._shared_cache = shared_resource_cache(self.index_id, ttl=cache_ttl, snapshot=cache_snapshot)
 
         self._users = UserResource(db, self)
         self._metadata_types = MetadataTypeResource(db, self)
@@ -92,7 +103,9 @@ WARNING: Database schema and internal APIs may change significantly between rele
     def from_config(cls, config, application_name=None, validate_connection=True):
         db = PostGisDb.from_config(config, application_name=application_name,
                                    validate_connection=validate_connection)
-        return cls(db)
+        return cls(db,
+                   cache_ttl=config.get('index_cache_ttl', None),
+                   cache_snapshot=config.get('index_cache_snapshot', None))
 
     @classmethod
     def get_dataset_fields(cls, doc):
@@ -6,6 +6,7 @@ import logging
 
 from cachetools.func import lru_cache
 
+from datacube_sp.index._cache import METADATA_TYPES
 from datacube_sp.index.abstract import AbstractMetadataTypeResource
 from datacube_sp.index.postgres._transaction import IndexResourceAddIn
 from datacube_sp.model import MetadataType
@@ -23,8 +24,10 @@ class MetadataTypeResource(AbstractMetadataTypeResource, IndexResourceAddIn):
         self._db = db
         self._index = index
 
-        self.get_unsafe = lru_cache()(self.get_unsafe)
-        self.get_by_name_unsafe = lru_cache()(self.get_by_name_unsafe)
+        if self._index.resource_cache is None:
+            # No shared cache: memoise lookups for the life of this resource instead.
+            self.get_unsafe = lru_cache()(self.get_unsafe)
+            self.get_by_name_unsafe = lru_cache()(self.get_by_name_unsafe)
 
     def __getstate__(self):
         """
@@ -76,6 +79,7 @@ class MetadataTypeResource(AbstractMetadataTypeResource, IndexResourceAddIn):
                     definition=metadata_type.definition,
                     concurrently=not allow_table_lock
                 )
+            self._clear_caches()
         return self.get_by_name(metadata_type.name)
 
     def can_update(self, metadata_type, allow_unsafe_updates=False):
@@ -151,8 +155,7 @@ class MetadataTypeResource(AbstractMetadataTypeResource, IndexResourceAddIn):
                 concurrently=not allow_table_lock
             )
 
-        self.get_by_name_unsafe.cache_clear()   # type: ignore[attr-defined]
-        self.get_unsafe.cache_clear()           # type: ignore[attr-defined]
+        self._clear_caches()
         return self.get_by_name(metadata_type.name)
 
     def update_document(self, definition, allow_unsafe_updates=False):
@@ -167,23 +170,33 @@ class MetadataTypeResource(AbstractMetadataTypeResource, IndexResourceAddIn):
         """
         return self.update(self.from_doc(definition), allow_unsafe_updates=allow_unsafe_updates)
 
-    # This is memoized in the constructor
+    def _clear_caches(self):
+        self._index._invalidate_resource_cache()
+        if self._index.resource_cache is None:
+            self.get_by_name_unsafe.cache_clear()   # type: ignore[attr-defined]
+            self.get_unsafe.cache_clear()           # type: ignore[attr-defined]
+
+    # This may be memoized in the constructor
     # pylint: disable=method-hidden
     def get_unsafe(self, id_):  # type: ignore
-        with self._db_connection() as connection:
-            record = connection.get_metadata_type(id_)
-        if record is None:
-            raise KeyError('%s is not a valid MetadataType id')
-        return self._make_from_query_row(record)
-
-    # This is memoized in the constructor
+        def fetch():
+            with self._db_connection() as connection:
+                record = connection.get_metadata_type(id_)
+            if record is None:
+                raise KeyError('%s is not a valid MetadataType id')
+            return self._make_from_query_row(record)
+        return self._index._cached_get(METADATA_TYPES, self._make_from_query_row, fetch, id_=id_)
+
+    # This may be memoized in the constructor
     # pylint: disable=method-hidden
     def get_by_name_unsafe(self, name):  # type: ignore
-        with self._db_connection() as connection:
-            record = connection.get_metadata_type_by_name(name)
-        if not record:
-            raise KeyError('%s is not a valid MetadataType name' % name)
-        return self._make_from_query_row(record)
+        def fetch():
+            with self._db_connection() as connection:
+                record = connection.get_metadata_type_by_name(name)
+            if not record:
+                raise KeyError('%s is not a valid MetadataType name' % name)
+            return self._make_from_query_row(record)
+        return self._index._cached_get(METADATA_TYPES, self._make_from_query_row, fetch, name=name)
 
     def check_field_indexes(self, allow_table_lock=False,
                             rebuild_views=False, rebuild_indexes=False):
@@ -208,6 +221,9 @@ class MetadataTypeResource(AbstractMetadataTypeResource, IndexResourceAddIn):
 
         :rtype: iter[datacube_sp.model.MetadataType]
         """
+        cached = self._index._cached_all(METADATA_TYPES, self._make_from_query_row)
+        if cached is not None:
+            return cached
         with self._db_connection() as connection:
             return self._make_many(connection.get_all_metadata_types())
 
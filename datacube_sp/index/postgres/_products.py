@@ -7,6 +7,7 @@ import logging
 from cachetools.func import lru_cache
 
 from datacube_sp.index import fields
+from datacube_sp.index._cache import PRODUCTS
 from datacube_sp.index.abstract import AbstractProductResource
 from datacube_sp.index.postgres._transaction import IndexResourceAddIn
 from datacube_sp.model import DatasetType, MetadataType
@@ -34,8 +35,10 @@ class ProductResource(AbstractProductResource, IndexResourceAddIn):
         self._index = index
         self.metadata_type_resource = self._index.metadata_types
 
-        self.get_unsafe = lru_cache()(self.get_unsafe)
-        self.get_by_name_unsafe = lru_cache()(self.get_by_name_unsafe)
+        if self._index.resource_cache is None:
+            # No shared cache: memoise lookups for the life of this resource instead.
+            self.get_unsafe = lru_cache()(self.get_unsafe)
+            self.get_by_name_unsafe = lru_cache()(self.get_by_name_unsafe)
 
     def __getstate__(self):
         """
@@ -87,6 +90,7 @@ class ProductResource(AbstractProductResource, IndexResourceAddIn):
                     definition=product.definition,
                     concurrently=not allow_table_lock,
                 )
+            self._clear_caches()
         return self.get_by_name(product.name)
 
     def can_update(self, product, allow_unsafe_updates=False):
@@ -201,8 +205,7 @@ class ProductResource(AbstractProductResource, IndexResourceAddIn):
                 concurrently=not allow_table_lock
             )
 
-        self.get_by_name_unsafe.cache_clear()  # type: ignore[attr-defined]
-        self.get_unsafe.cache_clear()          # type: ignore[attr-defined]
+        self._clear_caches()
         return self.get_by_name(product.name)
 
     def update_document(self, definition, allow_unsafe_updates=False, allow_table_lock=False):
@@ -225,23 +228,33 @@ class ProductResource(AbstractProductResource, IndexResourceAddIn):
             allow_table_lock=allow_table_lock,
         )
 
-    # This is memoized in the constructor
+    def _clear_caches(self):
+        self._index._invalidate_resource_cache()
+        if self._index.resource_cache is None:
+            self.get_by_name_unsafe.cache_clear()  # type: ignore[attr-defined]
+            self.get_unsafe.cache_clear()          # type: ignore[attr-defined]
+
+    # This may be memoized in the constructor
     # pylint: disable=method-hidden
     def get_unsafe(self, id_):  # type: ignore
-        with self._db_connection() as connection:
-            result = connection.get_product(id_)
-        if not result:
-            raise KeyError('"%s" is not a valid Product id' % id_)
-        return self._make(result)
-
-    # This is memoized in the constructor
+        def fetch():
+            with self._db_connection() as connection:
+                result = connection.get_product(id_)
+            if not result:
+                raise KeyError('"%s" is not a valid Product id' % id_)
+            return self._make(result)
+        return self._index._cached_get(PRODUCTS, self._make, fetch, id_=id_)
+
+    # This may be memoized in the constructor
     # pylint: disable=method-hidden
     def get_by_name_unsafe(self, name):  # type: ignore
-        with self._db_connection() as connection:
-            result = connection.get_product_by_name(name)
-        if not result:
-            raise KeyError('"%s" is not a valid Product name' % name)
-        return self._make(result)
+        def fetch():
+            with self._db_connection() as connection:
+                result = connection.get_product_by_name(name)
+            if not result:
+                raise KeyError('"%s" is not a valid Product name' % name)
+            return self._make(result)
+        return self._index._cached_get(PRODUCTS, self._make, fetch, name=name)
 
     def get_with_fields(self, field_names):
         """
@@ -322,6 +335,9 @@ class ProductResource(AbstractProductResource, IndexResourceAddIn):
         """
         Retrieve all Products
         """
+        cached = self._index._cached_all(PRODUCTS, self._make)
+        if cached is not None:
+            return cached
         with self._db_connection() as connection:
             return (self._make(record) for record in connection.get_all_products())
 
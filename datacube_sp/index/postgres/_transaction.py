@@ -20,7 +20,7 @@ class PostgresTransaction(AbstractTransaction):
     def _new_connection(self) -> Any:
         dbconn = self._db.give_me_a_connection()
         dbconn.execute(text('BEGIN'))
-        conn = PostgresDbAPI(dbconn)
+        conn = PostgresDbAPI(dbconn, lineage_closure=self._db.has_lineage_closure)
         return conn
 
     def _commit(self) -> None:
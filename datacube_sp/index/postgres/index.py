@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: Apache-2.0
 import logging
 from contextlib import contextmanager
+from typing import Optional
 
 from datacube_sp.drivers.postgres import PostgresDb, PostgresDbAPI
 from datacube_sp.index.postgres._transaction import PostgresTransaction
@@ -11,6 +12,7 @@ from datacube_sp.index.postgres._datasets import DatasetResource  # type: ignore
 from datacube_sp.index.postgres._metadata_types import MetadataTypeResource
 from datacube_sp.index.postgres._products import ProductResource
 from datacube_sp.index.postgres._users import UserResource
+from datacube_sp.index._cache import ResourceCacheAddIn, shared_resource_cache
 from datacube_sp.index.abstract import AbstractIndex, AbstractIndexDriver, default_metadata_type_docs, AbstractTransaction
 from datacube_sp.model import MetadataType
 from datacube_sp.utils.geometry import CRS
@@ -18,7 +20,7 @@ from datacube_sp.utils.geometry import CRS
 _LOG = logging.getLogger(__name__)
 
 
-class Index(AbstractIndex):
+class Index(ResourceCacheAddIn, AbstractIndex):
     """
     Access to the datacube_sp index.
 
@@ -44,8 +46,18 @@ class Index(AbstractIndex):
 
     supports_transactions = True
 
-    def __init__(self, db: PostgresDb) -> None:
+    def __init__(self, db: PostgresDb,
+                 cache_ttl: Optional[float] = None,
+                 cache_snapshot: Optional[str] = None) -> None:
+        """
+        :param db: Database connection
+        :param cache_ttl: Seconds before the shared product/metadata type cache is revalidated
+                          against the database. ``0`` disables the shared cache.
+        :param cache_snapshot: File written by ``index.resource_cache.dump()`` to preload the
+                               shared cache from.
+        """
         self._db = db
+        self._shared_cache = shared_resource_cache(self.index_id, ttl=cache_ttl, snapshot=cache_snapshot)
 
         self._users = UserResource(db, self)
         self._metadata_types = MetadataTypeResource(db, self)
@@ -76,7 +88,9 @@ class Index(AbstractIndex):
     def from_config(cls, config, application_name=None, validate_connection=True):
         db = PostgresDb.from_config(config, application_name=application_name,
                                     validate_connection=validate_connection)
-        return cls(db)
+        return cls(db,
+                   cache_ttl=config.get('index_cache_ttl', None),
+                   cache_snapshot=config.get('index_cache_snapshot', None))
 
     @classmethod
     def get_dataset_fields(cls, doc):
@@ -113,6 +127,9 @@ class Index(AbstractIndex):
     def create_spatial_index(self, crs: CRS) -> None:
         _LOG.warning("postgres driver does not support spatio-temporal indexes")
 
+    def build_lineage_closure(self) -> Optional[int]:
+        return self._db.build_lineage_closure()
+
     def __repr__(self):
         return "Index<db={!r}>".format(self._db)
 
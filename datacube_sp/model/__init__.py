@@ -19,7 +19,6 @@ from typing import Optional, List, Mapping, Any, Dict, Tuple, Iterator, Iterable
 from urllib.parse import urlparse
 from datacube_sp.utils import geometry, without_lineage_sources, parse_time, cached_property, uri_to_local_path, \
     schema_validated, DocReader
-from datacube_sp.index.eo3 import is_doc_eo3
 from .fields import Field, get_dataset_fields
 from ._base import Range, ranges_overlap  # noqa: F401
 from .eo3 import validate_eo3_compatible_type
@@ -81,6 +80,8 @@ class Dataset:
 
     @property
     def is_eo3(self) -> bool:
+        # datacube_sp.index imports this module
+        from datacube_sp.index.eo3 import is_doc_eo3
         return is_doc_eo3(self.metadata_doc)
 
     @property
@@ -10,12 +10,16 @@ Datacube command-line interface
 
 
 from datacube_sp.ui.click import cli
-import datacube_sp.scripts.dataset   # noqa: F401
-import datacube_sp.scripts.ingest    # noqa: F401
-import datacube_sp.scripts.product   # noqa: F401
-import datacube_sp.scripts.metadata  # noqa: F401
-import datacube_sp.scripts.system    # noqa: F401
-import datacube_sp.scripts.user      # noqa: F401
+
+# Command modules are imported when their command is used (see LazyGroup)
+cli.lazy_commands.update({
+    'dataset': 'datacube_sp.scripts.dataset',
+    'ingest': 'datacube_sp.scripts.ingest',
+    'product': 'datacube_sp.scripts.product',
+    'metadata': 'datacube_sp.scripts.metadata',
+    'system': 'datacube_sp.scripts.system',
+    'user': 'datacube_sp.scripts.user',
+})
 
 
 if __name__ == '__main__':
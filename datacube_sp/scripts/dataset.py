@@ -16,6 +16,7 @@ import yaml
 import yaml.resolver
 from click import echo
 
+from datacube_sp.index._arrow import DEFAULT_ARROW_BATCH_SIZE, EXTENT_FIELD, write_record_batches
 from datacube_sp.index.exceptions import MissingRecordError
 from datacube_sp.index.hl import Doc2Dataset, check_dataset_consistent
 from datacube_sp.index.eo3 import prep_eo3  # type: ignore[attr-defined]
@@ -30,6 +31,8 @@ from datacube_sp.utils.uris import uri_resolve
 
 _LOG = logging.getLogger('datacube_sp-dataset')
 
+DEFAULT_EXPORT_FIELDS = ('id', 'product', 'time', EXTENT_FIELD)
+
 
 def report_old_options(mapping):
     def maybe_remap(s):
@@ -460,6 +463,29 @@ def search_cmd(index, limit, f, expressions):
     )
 
 
+@dataset_cmd.command('export')
+@click.option('--output', '-o', help='File to write', type=click.Path(dir_okay=False), required=True)
+@click.option('--format', 'format_', help='Output format',
+              type=click.Choice(['parquet', 'arrow']), default='parquet', show_default=True)
+@click.option('--field', '-F', 'field_names', help='Field to export (repeatable)',
+              multiple=True, default=DEFAULT_EXPORT_FIELDS, show_default=True)
+@click.option('--batch-size', help='Rows fetched and written at a time',
+              type=int, default=DEFAULT_ARROW_BATCH_SIZE, show_default=True)
+@click.option('--limit', help='Limit the number of results',
+              type=int, default=None)
+@ui.parsed_search_expressions
+@ui.pass_index()
+def export_cmd(index, output, format_, field_names, batch_size, limit, expressions):
+    """
+    Export search fields of matching datasets to a Parquet or Arrow IPC file
+
+    The 'extent' field is the lat/lon bounding box of each dataset, as a WKB polygon.
+    """
+    reader = index.datasets.search_to_arrow(field_names, batch_size=batch_size, limit=limit, **expressions)
+    count = write_record_batches(reader, output, format=format_)
+    echo('Exported {} rows to {}'.format(count, output), err=True)
+
+
 def _get_derived_set(index: Index, id_: UUID) -> Set[Dataset]:
     """
     Get a single flat set of all derived datasets.
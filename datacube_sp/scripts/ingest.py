@@ -6,8 +6,9 @@ import time
 import logging
 import click
 import cachetools
-import itertools
+import queue
 import sys
+import threading
 from copy import deepcopy
 from pathlib import Path
 from pandas import to_datetime
@@ -24,7 +25,9 @@ from datacube_sp.ui import click as ui
 from datacube_sp.utils import read_documents
 from datacube_sp.utils.documents import InvalidDocException
 from datacube_sp.utils.uris import normalise_path
-from datacube_sp.ui.task_app import check_existing_files, load_tasks as load_tasks_, save_tasks as save_tasks_
+from datacube_sp.ui.task_app import (check_existing_files, journal_option, retries_option, run_tasks, task_id,
+                                     wrap_task, load_tasks as load_tasks_, save_tasks as save_tasks_)
+from datacube_sp.ui.task_journal import TaskJournal
 from datacube_sp.drivers import storage_writer_by_name
 
 from datacube_sp.ui.click import cli
@@ -295,6 +298,10 @@ def ingest_work(config, source_type, output_type, tile, tile_index):
     return datasets
 
 
+def _ingest_task(task, config, source_type, output_type):
+    return task_id(task), ingest_work(config, source_type, output_type, **task)
+
+
 def _index_datasets(index, results):
     n = 0
     for datasets in results:
@@ -311,60 +318,189 @@ def _index_datasets(index, results):
     return n
 
 
-def process_tasks(index, config, source_type, output_type, tasks, queue_size, executor):
-    # pylint: disable=too-many-locals
-    def submit_task(task):
-        _LOG.info('Submitting task: %s', task['tile_index'])
-        return executor.submit(ingest_work,
-                               config=config,
-                               source_type=source_type,
-                               output_type=output_type,
-                               **task)
+class _StageStats:
+    """ Throughput of one stage of the ingest pipeline. """
 
-    pending = []
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.count = self.failed = self.batches = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
 
-    # Count of storage unit/s creation successful/failed
-    nc_successful = nc_failed = 0
+    def add(self, count=0, failed=0, busy=0.0):
+        with self._lock:
+            self.count += count
+            self.failed += failed
+            self.batches += 1
+            self.busy += busy
 
-    # Count of storage unit/s indexed successfully or failed to index
-    index_successful = index_failed = 0
+    def __str__(self):
+        elapsed = max(time.monotonic() - self._start, 1e-9)
+        out = '%s: %d %s (%d failed) in %.1fs, %.2f %s/s' % (
+            self.name, self.count, self.unit, self.failed, elapsed, self.count / elapsed, self.unit)
+        if self.busy:
+            out += ', busy %.0f%% of the time' % (100 * self.busy / elapsed)
+        return out
 
-    tasks = iter(tasks)
 
-    while True:
-        pending += [submit_task(task) for task in itertools.islice(tasks, queue_size)]
-        if len(pending) == 0:
-            break
+class _BatchIndexer:
+    """
+    Index storage unit datasets on a background thread.
+
+    Units are indexed in batches of whatever has finished since the previous batch (up to
+    `batch_size`), each batch in a single transaction. When a batch fails, its units are
+    retried one transaction at a time, so a bad unit doesn't lose the others.
 
-        nc_completed, failed, pending = executor.get_ready(pending)
-        nc_successful += len(nc_completed)
+    `on_indexed(key, error)` is called from the indexer thread for every unit, with the key it
+    was put with and the exception if it failed to be indexed.
+    """
+
+    def __init__(self, index, batch_size=100, on_indexed=None):
+        self.stats = _StageStats('index', 'datasets')
+        self.units_failed = 0
+        self._index = index
+        self._batch_size = batch_size
+        self._on_indexed = on_indexed or (lambda key, error: None)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='ingest-indexer', daemon=True)
+        self._thread.start()
+
+    def put(self, datasets, key=None):
+        self._queue.put((key, datasets))
+
+    def close(self):
+        """ Index everything put so far, stop the thread and return (datasets indexed, units failed). """
+        self._queue.put(None)
+        self._thread.join()
+        return self.stats.count, self.units_failed
+
+    def _add(self, batch):
+        with self._index.transaction():
+            return _index_datasets(self._index, (datasets for _, datasets in batch))
+
+    def _index_batch(self, batch):
+        t0 = time.monotonic()
+        n = failed = 0
+        try:
+            n = self._add(batch)
+        except Exception as err:  # pylint: disable=broad-except
+            if len(batch) == 1:
+                _LOG.exception('Failed to index storage unit file')
+                failed = 1
+                self._on_indexed(batch[0][0], err)
+            else:
+                _LOG.warning('Failed to index a batch of %d storage unit files, indexing them one by one',
+                             len(batch))
+                for unit in batch:
+                    try:
+                        n += self._add([unit])
+                    except Exception as unit_err:  # pylint: disable=broad-except
+                        _LOG.exception('Failed to index storage unit file')
+                        failed += 1
+                        self._on_indexed(unit[0], unit_err)
+                    else:
+                        self._on_indexed(unit[0], None)
+        else:
+            for key, _ in batch:
+                self._on_indexed(key, None)
+        self.units_failed += failed
+        self.stats.add(count=n, failed=failed, busy=time.monotonic() - t0)
+        _LOG.info('Storage unit files indexed (Datasets: %s, Failed units: %s)', self.stats.count, self.units_failed)
+
+    def _run(self):
+        done = False
+        while not done:
+            batch = []
+            item = self._queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                done = True
+            if batch:
+                self._index_batch(batch)
+
+
+class _IngestJournal(TaskJournal):
+    """
+    Task journal that only records an ingest task as done once its storage unit is indexed.
 
-        for future in failed:
+    :func:`datacube_sp.ui.task_app.run_tasks` finishes a task as soon as its unit is written, the
+    indexer thread reports the unit later (see :meth:`indexed`). The SQLite file is only written
+    to from the thread that opened it, on every finished task and on :meth:`record_indexed`.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._written = {}
+        self._indexed = queue.Queue()
+
+    def finish(self, task_id, duration):
+        self._written[task_id] = duration
+        self.record_indexed()
+
+    def indexed(self, task_id, error=None):
+        """ Note that the unit of a written task is indexed (or failed to be), from any thread. """
+        self._indexed.put((task_id, error))
+
+    def record_indexed(self):
+        """ Record the tasks whose units were indexed since the last call. """
+        while True:
             try:
-                executor.result(future)
-            except Exception as err:  # pylint: disable=broad-except
-                _LOG.exception('Failed to create storage unit file (Exception: %s) ', str(err), exc_info=True)
-                nc_failed += 1
+                task_id, error = self._indexed.get_nowait()
+            except queue.Empty:
+                return
+            duration = self._written.pop(task_id)
+            if error is None:
+                super().finish(task_id, duration)
+            else:
+                self.fail(task_id, duration, error)
+
+
+def process_tasks(index, config, source_type, output_type, tasks, queue_size, executor, batch_size=100,
+                  journal=None, retries=0):
+    """
+    Run ingest tasks on the executor, and index the storage units they create.
 
-        _LOG.info('Storage unit file creation status (Created_Count: %s, Failed_Count: %s)',
-                  nc_successful,
-                  nc_failed)
+    Tasks are run with :func:`datacube_sp.ui.task_app.run_tasks`: up to `queue_size` are in flight
+    at once, the actual number tuned to observed task latencies. Finished units are indexed on a
+    separate thread, in transactions of up to `batch_size` units.
 
-        if not nc_completed:
-            time.sleep(1)
-            continue
+    :param journal: SQLite file recording task runs by tile index. Tiles it has as done are skipped,
+                    so an interrupted ingest is resumed by running it again with the same journal.
+                    A tile is only done once its storage unit is indexed.
+    :param retries: How many times to retry creating a storage unit that failed
+    :return: (number of datasets indexed, number of storage units that failed to be indexed)
+    """
+    compute = _StageStats('compute', 'units')
+    journal = None if journal is None else _IngestJournal(journal)
+    indexer = _BatchIndexer(index, batch_size, on_indexed=None if journal is None else journal.indexed)
 
-        try:
-            # TODO: ideally we wouldn't block here indefinitely
-            # maybe limit gather to 50-100 results and put the rest into a index backlog
-            # this will also keep the queue full
-            results = executor.results(nc_completed)
-            index_successful += _index_datasets(index, results)
-        except Exception as err:  # pylint: disable=broad-except
-            _LOG.exception('Failed to index storage unit file (Exception: %s)', str(err), exc_info=True)
-            index_failed += 1
+    def index_unit(result):
+        key, datasets = result
+        indexer.put(datasets, key)
+        compute.add(count=1)
 
-        _LOG.info('Storage unit files indexed (Successful: %s, Failed: %s)', index_successful, index_failed)
+    try:
+        _, failed = run_tasks(tasks, executor, wrap_task(_ingest_task, config, source_type, output_type),
+                              process_result=index_unit, queue_size=queue_size, journal=journal, retries=retries)
+        compute.add(failed=failed)
+    finally:
+        index_successful, index_failed = indexer.close()
+        if journal is not None:
+            journal.record_indexed()
+            _LOG.info('Ingest journal %s: %s', journal.path, journal.summary())
+            journal.close()
+
+    _LOG.info('Ingest %s', compute)
+    _LOG.info('Ingest %s in %d batches', indexer.stats, indexer.stats.batches)
 
     return index_successful, index_failed
 
@@ -396,11 +532,16 @@ def get_driver_from_config(config):
               type=click.Path(exists=True, readable=True, writable=False, dir_okay=False),
               help='Ingest configuration file')
 @click.option('--year', callback=_validate_year, help='Limit the process to a particular year')
-@click.option('--queue-size', type=click.IntRange(1, 100000), default=3200, help='Task queue size')
+@click.option('--queue-size', type=click.IntRange(1, 100000), default=3200,
+              help='Maximum number of tasks in flight, the actual number is tuned to task latency')
+@click.option('--index-batch-size', type=click.IntRange(1, 100000), default=100,
+              help='Maximum number of storage units indexed in one transaction')
 @click.option('--save-tasks', help='Save tasks to the specified file',
               type=click.Path(exists=False))
 @click.option('--load-tasks', help='Load tasks from the specified file',
               type=click.Path(exists=True, readable=True, writable=False, dir_okay=False))
+@journal_option
+@retries_option
 @click.option('--dry-run', '-d', is_flag=True, default=False, help='Check if everything is ok')
 @click.option('--allow-product-changes', is_flag=True, default=False,
               help='Allow the output product definition to be updated if it differs.')
@@ -410,8 +551,11 @@ def ingest_cmd(index,
                config_file,
                year,
                queue_size,
+               index_batch_size,
                save_tasks,
                load_tasks,
+               journal,
+               retries,
                dry_run,
                allow_product_changes,
                executor):
@@ -448,7 +592,8 @@ def ingest_cmd(index,
     elif save_tasks:
         save_tasks_(config, tasks, save_tasks)
     else:
-        successful, failed = process_tasks(index, config, source_type, output_type, tasks, queue_size, executor)
-        click.echo('%d successful, %d failed' % (successful, failed))
+        successful, failed = process_tasks(index, config, source_type, output_type, tasks, queue_size, executor,
+                                           batch_size=index_batch_size, journal=journal, retries=retries)
+        click.echo('%d datasets indexed, %d storage units failed to index' % (successful, failed))
 
         sys.exit(failed)
@@ -3,6 +3,7 @@
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
 import logging
+import sys
 
 import click
 from click import echo, style
@@ -65,6 +66,18 @@ def database_init(index, default_types, init_users, recreate_views, rebuild, loc
     echo('Done.')
 
 
+@system.command('lineage', help='Create or rebuild the lineage closure table (caution: slow on large databases)')
+@ui.pass_index()
+def build_lineage(index):
+    echo('Building lineage closure table...')
+    count = index.build_lineage_closure()
+    if count is None:
+        echo('Lineage closure tables are not supported by this index driver.', err=True)
+        sys.exit(1)
+    echo('Indexed {} ancestor/descendant paths.'.format(count))
+    echo('Done.')
+
+
 @system.command('check', help='Check and display current configuration')
 @ui.pass_config
 def check(local_config: LocalConfig):
@@ -10,7 +10,7 @@ from ..storage import reproject_and_fuse, BandInfo
 from ..storage._rio import RasterioDataSource, RasterDatasetDataSource
 from ..utils.geometry._warp import resampling_s2rio
 from ..storage._read import rdr_geobox
-from ..utils.geometry import GeoBox
+from ..utils.geometry import GeoBox, geobox_union_conservative
 from ..utils.geometry import gbox as gbx
 from ..index.eo3 import is_doc_eo3, EO3Grid  # type: ignore[attr-defined]
 from types import SimpleNamespace
@@ -119,6 +119,58 @@ def native_geobox(ds, measurements=None, basis=None):
     return geobox
 
 
+def _native_grid_key(ds, measurements=None, basis=None):
+    """
+    Hashable description of the native grid of a dataset, if it is known without reading any files.
+    """
+    if ds.product.grid_spec is not None:
+        return ('tile', ds.product.name, tuple(ds.bounds))
+
+    if not is_doc_eo3(ds.metadata_doc):
+        return None
+
+    if basis is not None:
+        measurements = [basis]
+    elif measurements is None:
+        measurements = list(ds.product.measurements)
+
+    grids = []
+    for band in measurements:
+        mm = ds.measurements.get(ds.product.canonical_measurement(band))
+        grid = toolz.get_in(('grids', 'default' if mm is None else mm.get('grid', 'default')), ds.metadata_doc)
+        if mm is None or grid is None:
+            # leave it to `native_geobox` to complain
+            return None
+        grids.append((tuple(grid.get('shape', ())), tuple(grid.get('transform', ()))))
+
+    return ('eo3', str(ds.crs), tuple(grids))
+
+
+def native_geobox_union(datasets, measurements=None, basis=None):
+    """Compute the union of the native GeoBoxes of datasets, see :func:`native_geobox`.
+
+    The grid of a dataset of an ingested product or of an EO3 dataset is known from its metadata,
+    so the GeoBox of each distinct grid (all observations of a tile, for example) is only computed once.
+    Other datasets have their files read.
+
+    :param datasets: Datasets sharing a compatible pixel grid
+    :param measurements: List of band names to consider
+    :param basis: Name of the band to use for computing reference frame
+
+    :return: GeoBox covering all the datasets
+    """
+    geoboxes = {}
+    others = []
+    for ds in datasets:
+        key = _native_grid_key(ds, measurements, basis)
+        if key is None:
+            others.append(native_geobox(ds, measurements, basis))
+        elif key not in geoboxes:
+            geoboxes[key] = native_geobox(ds, measurements, basis)
+
+    return geobox_union_conservative(list(geoboxes.values()) + others)
+
+
 def native_load(ds, measurements=None, basis=None, **kw):
     """Load single dataset in native resolution.
 
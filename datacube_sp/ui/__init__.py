@@ -5,12 +5,29 @@
 """
 User Interface Utilities
 """
-from .expression import parse_expressions
-from .common import get_metadata_path
-from datacube_sp.utils import read_documents
+import importlib
+
+# Imported on first use, so that importing ``datacube_sp.ui.click`` for the CLI stays cheap
+_LAZY_ATTRS = {
+    'parse_expressions': 'datacube_sp.ui.expression',
+    'get_metadata_path': 'datacube_sp.ui.common',
+    'read_documents': 'datacube_sp.utils',
+}
 
 __all__ = [
     'parse_expressions',
     'get_metadata_path',
     "read_documents",
 ]
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
@@ -9,18 +9,14 @@ import functools
 import logging
 import os
 import copy
+import importlib
 import sys
 
 import click
 
 from datacube_sp import config, __version__
-from datacube_sp.api.core import Datacube
 
 from datacube_sp.executor import get_executor  # type: ignore[attr-defined]
-from datacube_sp.index import index_connect
-
-from datacube_sp.ui.expression import parse_expressions
-from sqlalchemy.exc import OperationalError, ProgrammingError
 
 _LOG_FORMAT_STRING = '%(asctime)s %(process)d %(name)s %(levelname)s %(message)s'
 CLICK_SETTINGS = dict(help_option_names=['-h', '--help'])
@@ -172,7 +168,28 @@ global_cli_options = compose(
 )
 
 
-@click.group(help="Data Cube command-line interface", context_settings=CLICK_SETTINGS)
+class LazyGroup(click.Group):
+    """
+    Click group with sub-commands that are only imported when they are used.
+
+    ``lazy_commands`` maps a command name to the module that adds it to the group, so that
+    ``--help``, ``--version`` or running one command don't import every other command.
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            importlib.import_module(self.lazy_commands[cmd_name])
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(help="Data Cube command-line interface", context_settings=CLICK_SETTINGS, cls=LazyGroup)
 @global_cli_options
 def cli():
     pass
@@ -218,6 +235,10 @@ def pass_index(app_name=None, expect_initialised=True):
         def with_index(local_config: config.LocalConfig,
                        *args,
                        **kwargs):
+            # The index (and everything it pulls in) is only imported once a command runs
+            from datacube_sp.index import index_connect
+            from sqlalchemy.exc import OperationalError, ProgrammingError
+
             command_path = click.get_current_context().command_path
             try:
                 index = index_connect(local_config,
@@ -254,6 +275,7 @@ def pass_datacube(app_name=None, expect_initialised=True):
     def decorate(f):
         @pass_index(app_name=app_name, expect_initialised=expect_initialised)
         def with_datacube(index, *args, **kwargs):
+            from datacube_sp.api.core import Datacube
             return f(Datacube(index=index), *args, **kwargs)
 
         return functools.update_wrapper(with_datacube, f)
@@ -269,6 +291,7 @@ def parse_endpoint(value):
 EXECUTOR_TYPES = {
     'serial': lambda _: get_executor(None, None),
     'multiproc': lambda workers: get_executor(None, int(workers)),
+    'threads': lambda workers: get_executor(None, int(workers), threads=True),
     'distributed': lambda addr: get_executor(addr, True),
 }
 
@@ -287,6 +310,7 @@ executor_cli_options = click.option('--executor',  # type: ignore
                                     default=['serial', None],
                                     help="Run parallelized, either locally or distributed. eg:\n"
                                          "--executor multiproc 4 (OR)\n"
+                                         "--executor threads 8 (OR)\n"
                                          "--executor distributed 10.0.0.8:8888",
                                     callback=_setup_executor)
 
@@ -356,6 +380,7 @@ def parsed_search_expressions(f):
     """
 
     def my_parse(ctx, param, value):
+        from datacube_sp.ui.expression import parse_expressions
         return parse_expressions(*list(value))
 
     f = click.argument('expressions', callback=my_parse, nargs=-1)(f)
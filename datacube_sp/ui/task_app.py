@@ -7,13 +7,17 @@ import os
 import time
 import click
 import functools
+import heapq
 import itertools
+import queue
 import re
 from pathlib import Path
 import pandas as pd
 import pickle
 
+from datacube_sp.executor import Completions
 from datacube_sp.ui import click as dc_ui
+from datacube_sp.ui.task_journal import TaskJournal
 from datacube_sp.utils import read_documents
 
 
@@ -85,14 +89,22 @@ load_tasks_option = click.option('--load-tasks', 'input_tasks_file', help='Load
 save_tasks_option = click.option('--save-tasks', 'output_tasks_file', help='Save tasks to the specified file',
                                  type=click.Path(exists=False))
 #: pylint: disable=invalid-name
-queue_size_option = click.option('--queue-size', help='Number of tasks to queue at the start',
+queue_size_option = click.option('--queue-size', help='Maximum number of tasks in flight',
                                  type=click.IntRange(1, 100000), default=3200)
+#: pylint: disable=invalid-name
+journal_option = click.option('--journal', help='SQLite file recording task runs, to resume an interrupted run',
+                              type=click.Path(dir_okay=False))
+#: pylint: disable=invalid-name
+retries_option = click.option('--retries', help='Number of times to retry a failed task',
+                              type=click.IntRange(0, 100), default=0)
 
 #: pylint: disable=invalid-name
 task_app_options = dc_ui.compose(
     app_config_option,
     load_tasks_option,
     save_tasks_option,
+    journal_option,
+    retries_option,
 
     dc_ui.config_option,
     dc_ui.verbose_option,
@@ -262,47 +274,204 @@ def wrap_task(f, *args, **kwargs):
     return functools.partial(_wrap_impl, f, args, kwargs)
 
 
-def run_tasks(tasks, executor, run_task, process_result=None, queue_size=50):
+class QueueDepth:
+    """
+    Number of tasks to keep in flight, tuned from observed task latencies.
+
+    The shortest (smoothed) latency seen estimates how long a task takes once it runs, the
+    current latency how long it takes including waiting for a worker, so
+    ``size * (1 - shortest / current)`` is about the number of tasks queued behind busy workers.
+
+    The depth starts from ``initial``, the number of workers, so that the first latencies are
+    those of tasks that didn't wait. It then doubles every ``size`` completed tasks until tasks
+    start queueing, i.e. latency rises (as TCP slow start). From then on it grows by one while
+    fewer than ``backlog`` tasks are queued, and shrinks while more than half the queue is
+    waiting, so workers always have the next task at hand without submitting more work than they
+    can get through (as TCP Vegas does for congestion windows).
+
+    :param limit: Largest allowed depth
+    :param initial: Depth to start from, capped by ``limit``
+    :param backlog: Tasks to keep queued on top of the running ones
+    :param smoothing: Weight of the newest latency in the moving average
+    """
+
+    def __init__(self, limit, initial=1, backlog=2, smoothing=0.2):
+        self.limit = limit
+        self.size = max(1, min(initial, limit))
+        self.backlog = backlog
+        self.smoothing = smoothing
+        self.latency = None
+        self.shortest = None
+        self.slow_start = True
+        self._completed = 0
+
+    def observe(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        self.shortest = self.latency if self.shortest is None else min(self.shortest, self.latency)
+
+        queued = self.size * (1 - self.shortest / self.latency) if self.latency > 0 else 0
+        if self.slow_start:
+            if queued < self.backlog:
+                self._completed += 1
+                if self._completed >= self.size:
+                    self.size = min(self.limit, 2 * self.size)
+                    self._completed = 0
+                return
+            self.slow_start = False
+
+        if queued < self.backlog:
+            self.size = min(self.limit, self.size + 1)
+        elif queued > max(self.backlog, self.size / 2):
+            self.size = max(1, self.size - 1)
+
+
+def task_id(task):
+    """
+    Default id of a task in a :class:`datacube_sp.ui.task_journal.TaskJournal`: its tile index.
+
+    Other tasks need an id that is the same from one run to the next, which their string
+    representation doesn't give (e.g. it can include object addresses), so one has to be
+    supplied with the ``get_task_id`` argument of :func:`run_tasks`.
+
+    :raises ValueError: If the task has no tile index
+    """
+    if isinstance(task, dict) and 'tile_index' in task:
+        return str(task['tile_index'])
+    raise ValueError("Task has no 'tile_index' to record it in the journal with, "
+                     "pass `get_task_id` to identify tasks: {}".format(_describe(task)))
+
+
+def count_sources(task):
+    """
+    Estimated cost of a task: the number of source datasets of its tile.
+    """
+    sources = getattr(task.get('tile') if isinstance(task, dict) else None, 'sources', None)
+    if sources is None:
+        return 0
+    return sum(len(datasets) for datasets in sources.values.ravel())
+
+
+def _describe(task):
+    return task.get('tile_index', str(task)) if isinstance(task, dict) else str(task)
+
+
+def run_tasks(tasks, executor, run_task, process_result=None, queue_size=50,
+              journal=None, retries=0, retry_delay=1.0, task_cost=None, get_task_id=task_id):
     """
     :param tasks: iterable of tasks. Usually a generator to create them as required.
     :param executor: a datacube_sp executor, similar to `distributed.Client` or `concurrent.futures`
     :param run_task: the function used to run a task. Expects a single argument of one of the tasks
     :param process_result: a function to do something based on the result of a completed task. It
                            takes a single argument, the return value from `run_task(task)`
-    :param queue_size: How large the queue of tasks should be. Will depend on how fast tasks are
-                       processed, and how much memory is available to buffer them.
+    :param queue_size: The largest number of tasks in flight. The actual number starts from the number of
+                       workers of the executor and is tuned to task latency (see :class:`QueueDepth`),
+                       a new task is submitted as soon as one completes
+                       (see :class:`datacube_sp.executor.Completions`).
+    :param journal: :class:`datacube_sp.ui.task_journal.TaskJournal` (or the path of its SQLite file)
+                    to record task runs in. Tasks it has as done are skipped, so an interrupted run
+                    is resumed by running it again with the same tasks and journal.
+    :param retries: How many times to retry a failed task (either `run_task` or `process_result` failing)
+    :param retry_delay: Seconds to wait before the first retry, doubling for every further attempt
+    :param task_cost: A function estimating the cost of a task (e.g. :func:`count_sources`). When given,
+                      all tasks are read up front and the most expensive are run first, so that long
+                      tasks don't hold up the end of the run.
+    :param get_task_id: A function giving the id of a task in the journal, which must be the same on every run.
+                        Defaults to :func:`task_id`, the tile index of the task.
+    :return: (number of successful tasks, number of failed tasks)
     """
+    # pylint: disable=too-many-locals,too-many-branches,too-many-statements
     click.echo('Starting processing...')
     process_result = process_result or do_nothing
-    results = []
-    task_queue = itertools.islice(tasks, queue_size)
-    for task in task_queue:
-        _LOG.info('Running task: %s', task.get('tile_index', str(task)))
-        results.append(executor.submit(run_task, task=task))
 
-    click.echo('Task queue filled, waiting for first result...')
+    own_journal = journal is not None and not isinstance(journal, TaskJournal)
+    if own_journal:
+        journal = TaskJournal(journal)
+
+    if journal is not None:
+        tasks = (task for task in tasks if not journal.is_done(get_task_id(task)))
+    if task_cost is not None:
+        tasks = sorted(((task_cost(task), i, task) for i, task in enumerate(tasks)),
+                       key=lambda cost_task: (-cost_task[0], cost_task[1]))
+    else:
+        tasks = ((None, i, task) for i, task in enumerate(tasks))
+    tasks = iter(tasks)
+
+    pending = {}    # id(future) -> (future, task, cost, attempt, order, start time)
+    retrying = []   # heap of (time due, order, task, cost, attempt)
+    completions = Completions(executor)
+    depth = QueueDepth(queue_size, initial=getattr(executor, 'workers', 1))
+
+    def submit(task, cost, attempt, order):
+        _LOG.info('Running task: %s', _describe(task))
+        if journal is not None:
+            journal.start(get_task_id(task), cost)
+        future = completions.submit(run_task, task=task)
+        pending[id(future)] = (future, task, cost, attempt, order, time.monotonic())
 
     successful = failed = 0
-    while results:
-        result, results = executor.next_completed(results, None)
-
-        # submit a new _task to replace the one we just finished
-        task = next(tasks, None)
-        if task:
-            _LOG.info('Running task: %s', task.get('tile_index', str(task)))
-            results.append(executor.submit(run_task, task=task))
-
-        # Process the result
-        try:
-            actual_result = executor.result(result)
-            process_result(actual_result)
-            successful += 1
-        except Exception as err:  # pylint: disable=broad-except
-            _LOG.exception('Task failed: %s', err)
-            failed += 1
-            continue
-        finally:
-            # Release the _task to free memory so there is no leak in executor/scheduler/worker process
-            executor.release(result)
+    try:
+        exhausted = False
+        while True:
+            now = time.monotonic()
+            while len(pending) < depth.size:
+                if retrying and retrying[0][0] <= now:
+                    _, order, task, cost, attempt = heapq.heappop(retrying)
+                else:
+                    cost_task = None if exhausted else next(tasks, None)
+                    if cost_task is None:
+                        exhausted = True
+                        break
+                    cost, order, task = cost_task
+                    attempt = 1
+                submit(task, cost, attempt, order)
+
+            if not pending and not retrying:
+                break
+
+            if not pending:
+                # only retries left, wait for the next one to be due
+                time.sleep(max(0, retrying[0][0] - now))
+                continue
 
+            try:
+                timeout = max(0, retrying[0][0] - now) if retrying else None
+                future = completions.next(timeout=timeout)
+            except queue.Empty:
+                continue
+
+            future, task, cost, attempt, order, start = pending.pop(id(future))
+            try:
+                process_result(executor.result(future))
+            except Exception as err:  # pylint: disable=broad-except
+                duration = time.monotonic() - start
+                if attempt <= retries:
+                    delay = retry_delay * 2 ** (attempt - 1)
+                    _LOG.warning('Task %s failed (attempt %d), retrying in %.1fs: %s',
+                                 _describe(task), attempt, delay, err)
+                    heapq.heappush(retrying, (time.monotonic() + delay, order, task, cost, attempt + 1))
+                else:
+                    _LOG.exception('Task failed: %s', err)
+                    failed += 1
+                if journal is not None:
+                    journal.fail(get_task_id(task), duration, err, retry=attempt <= retries)
+            else:
+                duration = time.monotonic() - start
+                successful += 1
+                if journal is not None:
+                    journal.finish(get_task_id(task), duration)
+            finally:
+                # Release the _task to free memory so there is no leak in executor/scheduler/worker process
+                executor.release(future)
+            depth.observe(duration)
+    finally:
+        if own_journal:
+            journal.close()
+
+    if depth.latency is not None:
+        _LOG.info('Task latency: %.2fs (shortest %.2fs), final queue depth %d',
+                  depth.latency, depth.shortest, depth.size)
     click.echo('%d successful, %d failed' % (successful, failed))
+    return successful, failed
@@ -0,0 +1,100 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Persistent record of task runs, so long running task apps can be resumed.
+"""
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cost REAL,
+    duration REAL,
+    error TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+
+class TaskJournal:
+    """
+    Task run journal, kept in a local SQLite file.
+
+    Records the status (``running``, ``done``, ``pending`` a retry, or ``failed``), number of
+    attempts, estimated cost and duration of the last attempt of every task, by task id.
+    Every update is committed straight away, so the journal survives the process being killed:
+    tasks that were running at the time are simply run again.
+
+    :param path: SQLite file, created if it doesn't exist
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def status(self, task_id: str) -> Optional[str]:
+        """ Status of the task, None if it hasn't been run. """
+        row = self._conn.execute('SELECT status FROM task WHERE task_id = ?', (task_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def is_done(self, task_id: str) -> bool:
+        return self.status(task_id) == DONE
+
+    def attempts(self, task_id: str) -> int:
+        row = self._conn.execute('SELECT attempts FROM task WHERE task_id = ?', (task_id,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def start(self, task_id: str, cost: Optional[float] = None) -> None:
+        """ Record the start of another attempt at the task. """
+        self._conn.execute(
+            'INSERT INTO task (task_id, status, attempts, cost, updated) VALUES (?, ?, 1, ?, ?) '
+            'ON CONFLICT (task_id) DO UPDATE SET status = excluded.status, attempts = attempts + 1, '
+            'cost = COALESCE(excluded.cost, cost), updated = excluded.updated',
+            (task_id, RUNNING, cost, time.time()))
+
+    def finish(self, task_id: str, duration: float) -> None:
+        """ Record the task as done. """
+        self._update(task_id, DONE, duration, None)
+
+    def fail(self, task_id: str, duration: float, error, retry: bool = False) -> None:
+        """
+        Record a failed attempt at the task.
+
+        :param retry: Whether the task will be attempted again (it stays ``pending``)
+        """
+        self._update(task_id, PENDING if retry else FAILED, duration, str(error))
+
+    def _update(self, task_id, status, duration, error):
+        self._conn.execute('UPDATE task SET status = ?, duration = ?, error = ?, updated = ? WHERE task_id = ?',
+                           (status, duration, error, time.time(), task_id))
+
+    def summary(self) -> Dict[str, int]:
+        """ Number of tasks by status. """
+        return dict(self._conn.execute('SELECT status, count(*) FROM task GROUP BY status'))
+
+    def __repr__(self):
+        return 'TaskJournal({!r})'.format(str(self.path))
@@ -8,7 +8,6 @@ Utility functions
 
 from .dates import datetime_to_seconds_since_1970, parse_time
 from .py import cached_property, ignore_exceptions_if, import_function
-from .serialise import jsonify_document
 from .uris import is_url, uri_to_local_path, get_part_from_uri, mk_part_uri, is_vsipath
 from .io import slurp, check_write_path, write_user_secret_file
 from .documents import (
@@ -38,6 +37,10 @@ from ._misc import (
     DatacubeException,
     gen_password,
 )
+# serialise needs datacube_sp.model, which imports from this module
+from .serialise import jsonify_document
+# registers the .geobox/.extent xarray accessors, which used to happen on ``import datacube_sp``
+from . import xarray_geoextensions  # noqa: F401
 
 
 __all__ = (
@@ -0,0 +1,547 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Single pass Cloud Optimized GeoTIFF writer.
+
+The image is consumed one strip of rows at a time (one row of chunks for Dask input).
+Every strip is cut into tiles that are compressed on a thread pool, and halved to feed the
+next overview level, so only a row of tiles per pyramid level is ever held in memory.
+Compressed tiles are spooled to temporary files until the image is complete, after which
+the TIFF header, all the IFDs, and the tile data (smallest overview first) are written out
+sequentially, as the COG layout requires. The destination therefore only has to support
+``write``: a file, ``BytesIO``, or a multipart upload.
+"""
+import math
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import dask
+import numpy as np
+import rasterio                               # type: ignore[import]
+
+from .geometry import GeoBox
+from .math import valid_mask
+
+__all__ = ("write_cog_stream", "read_tiff_tags")
+
+# TIFF field types
+_BYTE, _ASCII, _SHORT, _LONG, _DOUBLE, _LONG8 = 1, 2, 3, 4, 12, 16
+_FIELD_FORMATS = {_BYTE: "B", _SHORT: "H", _LONG: "I", _DOUBLE: "d", _LONG8: "Q",
+                  6: "b", 8: "h", 9: "i", 11: "f", 17: "q"}
+
+# TIFF tags
+_NEW_SUBFILE_TYPE = 254
+_IMAGE_WIDTH, _IMAGE_LENGTH, _BITS_PER_SAMPLE, _COMPRESSION = 256, 257, 258, 259
+_PHOTOMETRIC, _SAMPLES_PER_PIXEL, _PLANAR_CONFIG, _PREDICTOR = 262, 277, 284, 317
+_TILE_WIDTH, _TILE_LENGTH, _TILE_OFFSETS, _TILE_BYTE_COUNTS = 322, 323, 324, 325
+_EXTRA_SAMPLES, _SAMPLE_FORMAT = 338, 339
+_GDAL_NODATA = 42113
+# GeoTIFF tags, copied verbatim from a template written by GDAL
+_GEO_TAGS = (33550, 33922, 34264, 34735, 34736, 34737)
+
+_COMPRESSION_CODES = {"none": 1, "deflate": 8}
+_SAMPLE_FORMATS = {"u": 1, "i": 2, "f": 3}
+_RESAMPLINGS = ("nearest", "average")
+
+# Compressed tiles are kept in RAM up to this size per pyramid level, then spill to disk
+SPOOL_MAX_RAM = 16 * (1 << 20)
+
+# Same "ghost" header as the GDAL COG driver: each tile is preceded by its size as a uint32 and
+# followed by a copy of its last 4 bytes, the trailing space keeps the first IFD word aligned
+_STRUCTURAL_METADATA = (b"LAYOUT=IFDS_BEFORE_DATA\n"
+                        b"BLOCK_ORDER=ROW_MAJOR\n"
+                        b"BLOCK_LEADER=SIZE_AS_UINT4\n"
+                        b"BLOCK_TRAILER=LAST_4_BYTES_REPEATED\n"
+                        b"KNOWN_INCOMPATIBLE_EDITION=NO\n ")
+
+Tags = Dict[int, Tuple[int, Any]]
+
+
+def _ghost_header() -> bytes:
+    head = "GDAL_STRUCTURAL_METADATA_SIZE={:06d} bytes\n".format(len(_STRUCTURAL_METADATA))
+    return head.encode("ascii") + _STRUCTURAL_METADATA
+
+
+def read_tiff_tags(data: bytes) -> List[Tags]:
+    """
+    Parse the IFDs of a TIFF (or BigTIFF) file.
+
+    :param data: Bytes of the file, at least up to the end of the last IFD
+    :return: For each IFD in file order, a dictionary ``tag -> (field type, values)``,
+             where values are a tuple of numbers, or bytes for ASCII and unknown field types
+    """
+    bo = {b"II": "<", b"MM": ">"}.get(bytes(data[:2]))
+    if bo is None:
+        raise ValueError("Not a TIFF file")
+    (version,) = struct.unpack_from(bo + "H", data, 2)
+    if version == 42:
+        count_fmt, entry_fmt, off_fmt, slot, first = "H", "HHI", "I", 4, 4
+    elif version == 43:
+        count_fmt, entry_fmt, off_fmt, slot, first = "Q", "HHQ", "Q", 8, 8
+    else:
+        raise ValueError("Not a TIFF file")
+
+    ifds = []
+    (pos,) = struct.unpack_from(bo + off_fmt, data, first)
+    while pos:
+        (n,) = struct.unpack_from(bo + count_fmt, data, pos)
+        pos += struct.calcsize(count_fmt)
+        tags: Tags = {}
+        for _ in range(n):
+            tag, typ, count = struct.unpack_from(bo + entry_fmt, data, pos)
+            fmt = _FIELD_FORMATS.get(typ)
+            nbytes = count * (struct.calcsize(fmt) if fmt else 1)
+            value_pos = pos + 4 + struct.calcsize(entry_fmt[2])
+            if nbytes > slot:
+                (value_pos,) = struct.unpack_from(bo + off_fmt, data, value_pos)
+            if fmt is None:
+                tags[tag] = (typ, bytes(data[value_pos:value_pos + nbytes]))
+            else:
+                tags[tag] = (typ, struct.unpack_from("{}{}{}".format(bo, count, fmt), data, value_pos))
+            pos += struct.calcsize(entry_fmt) + slot
+        ifds.append(tags)
+        (pos,) = struct.unpack_from(bo + off_fmt, data, pos)
+    return ifds
+
+
+def _pack_ifd(tags: Tags, pos: int, bigtiff: bool, next_ifd: int = 0) -> bytes:
+    """
+    Serialise an IFD, that will be written at offset ``pos``, followed by its out of line values.
+
+    The size of the output only depends on the tags and their value counts.
+    """
+    count_fmt, entry_fmt, off_fmt, slot = ("<Q", "<HHQ", "<Q", 8) if bigtiff else ("<H", "<HHI", "<I", 4)
+    head_size = struct.calcsize(count_fmt) + len(tags) * (struct.calcsize(entry_fmt) + slot) + slot
+    entries = []
+    extra = bytearray()
+    for tag in sorted(tags):
+        typ, values = tags[tag]
+        if isinstance(values, bytes):
+            value = values
+        else:
+            value = struct.pack("<{}{}".format(len(values), _FIELD_FORMATS[typ]), *values)
+        count = len(values)
+
+        if len(value) <= slot:
+            field = value.ljust(slot, b"\0")
+        else:
+            field = struct.pack(off_fmt, pos + head_size + len(extra))
+            extra += value
+            if len(extra) % 2:
+                extra += b"\0"
+        entries.append(struct.pack(entry_fmt, tag, typ, count) + field)
+
+    return b"".join([struct.pack(count_fmt, len(tags)), *entries, struct.pack(off_fmt, next_ifd), bytes(extra)])
+
+
+def _geotiff_tags(geobox: GeoBox) -> Tags:
+    """
+    GeoTIFF tags for the CRS and transform of the geobox, as GDAL would write them.
+    """
+    opts: Dict[str, Any] = dict(transform=geobox.transform)
+    if geobox.crs is not None:
+        opts.update(crs=str(geobox.crs))
+    with rasterio.MemoryFile() as mem:
+        with mem.open(driver="GTiff", width=1, height=1, count=1, dtype="uint8", **opts):
+            pass
+        template = read_tiff_tags(mem.read())[0]
+    return {tag: template[tag] for tag in _GEO_TAGS if tag in template}
+
+
+def _nodata_str(nodata: float, dtype: np.dtype) -> str:
+    if dtype.kind == "f":
+        return "nan" if math.isnan(nodata) else "{:.18g}".format(nodata)
+    return str(int(nodata))
+
+
+def _image_tags(shape: Tuple[int, int], tile: Tuple[int, int], dtype: np.dtype, nbands: int,
+                compression: int, predictor: int, nodata: Optional[float], overview: bool) -> Tags:
+    h, w = shape
+    tags: Tags = {
+        _NEW_SUBFILE_TYPE: (_LONG, (1 if overview else 0,)),
+        _IMAGE_WIDTH: (_LONG, (w,)),
+        _IMAGE_LENGTH: (_LONG, (h,)),
+        _BITS_PER_SAMPLE: (_SHORT, (dtype.itemsize * 8,) * nbands),
+        _COMPRESSION: (_SHORT, (compression,)),
+        _PHOTOMETRIC: (_SHORT, (1,)),
+        _SAMPLES_PER_PIXEL: (_SHORT, (nbands,)),
+        _PLANAR_CONFIG: (_SHORT, (1,)),
+        _TILE_WIDTH: (_SHORT, (tile[1],)),
+        _TILE_LENGTH: (_SHORT, (tile[0],)),
+        _SAMPLE_FORMAT: (_SHORT, (_SAMPLE_FORMATS[dtype.kind],) * nbands),
+    }
+    if predictor != 1:
+        tags[_PREDICTOR] = (_SHORT, (predictor,))
+    if nbands > 1:
+        tags[_EXTRA_SAMPLES] = (_SHORT, (0,) * (nbands - 1))
+    if nodata is not None:
+        tags[_GDAL_NODATA] = (_ASCII, _nodata_str(nodata, dtype).encode("ascii") + b"\0")
+    return tags
+
+
+def _encode_tile(tile: np.ndarray, predictor: int, zlevel: Optional[int]) -> bytes:
+    """
+    Apply the TIFF predictor to a (rows, cols, bands) tile and compress it.
+    """
+    tile = np.ascontiguousarray(tile, dtype=tile.dtype.newbyteorder("<"))
+    rows, _, nbands = tile.shape
+    if predictor == 2:
+        tile = np.diff(tile, axis=1, prepend=tile.dtype.type(0))
+    elif predictor == 3:
+        # bytes of every row are regrouped most significant first, then differenced
+        nb = tile.dtype.itemsize
+        planes = tile.view(np.uint8).reshape(rows, -1, nb)[:, :, ::-1]
+        planes = planes.transpose(0, 2, 1).reshape(rows, -1)
+        tile = planes.copy()
+        tile[:, nbands:] -= planes[:, :-nbands]
+
+    data = tile.tobytes()
+    if zlevel is None:
+        return data
+    return zlib.compress(data, zlevel)
+
+
+class _TileRows:
+    """
+    Cuts an image, pushed in as strips of rows, into rows of tiles. Tiles are encoded on
+    the thread pool and appended in row major order to a spool file, with their leaders
+    and trailers.
+
+    At most two rows of tiles are in flight at a time.
+    """
+
+    def __init__(self, shape: Tuple[int, int], tile: Tuple[int, int], fill, encode, pool: ThreadPoolExecutor,
+                 spool_dir: Optional[str]):
+        self.shape = shape
+        self.tile = tile
+        self.fill = fill
+        self._encode = encode
+        self._pool = pool
+        self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_RAM, dir=spool_dir)
+        self.offsets: List[int] = []
+        self.sizes: List[int] = []
+        self._rows: List[np.ndarray] = []
+        self._nrows = 0
+        self._pending: List[Any] = []
+
+    @property
+    def nbytes(self) -> int:
+        """ Size of the spooled tiles, with their leaders and trailers """
+        return sum(self.sizes) + 8 * len(self.sizes)
+
+    def push(self, rows: np.ndarray):
+        self._rows.append(rows)
+        self._nrows += rows.shape[0]
+        th = self.tile[0]
+        while self._nrows >= th:
+            strip = np.concatenate(self._rows) if len(self._rows) > 1 else self._rows[0]
+            self._emit(strip[:th])
+            self._rows = [strip[th:]] if strip.shape[0] > th else []
+            self._nrows -= th
+
+    def finish(self):
+        if self._nrows > 0:
+            self._emit(np.concatenate(self._rows))
+            self._rows, self._nrows = [], 0
+        self._drain()
+        self.spool.seek(0)
+
+    def close(self):
+        for fut in self._pending:
+            fut.cancel()
+        self.spool.close()
+
+    def _emit(self, strip: np.ndarray):
+        th, tw = self.tile
+        ntx = -(-self.shape[1] // tw)
+        if strip.shape[:2] != (th, ntx * tw):
+            padded = np.full((th, ntx * tw, strip.shape[2]), self.fill, dtype=strip.dtype)
+            padded[:strip.shape[0], :strip.shape[1]] = strip
+            strip = padded
+
+        tiles = [self._pool.submit(self._encode, strip[:, ix * tw:(ix + 1) * tw]) for ix in range(ntx)]
+        self._drain()
+        self._pending = tiles
+
+    def _drain(self):
+        for fut in self._pending:
+            data = fut.result()
+            self.offsets.append(self.spool.tell() + 4)
+            self.sizes.append(len(data))
+            self.spool.write(struct.pack("<I", len(data)) + data + data[-4:])
+        self._pending = []
+
+
+class _Pyramid:
+    """
+    Feeds strips of the full resolution image to the tiles of every level of the pyramid.
+
+    Each level halves the one above it. An odd row is held back until the next strip arrives,
+    and the last row and column of odd sized images are replicated, so levels are ``ceil(n/2)``
+    in size like GDAL overviews. ``"average"`` levels are computed from running sums and counts
+    of valid pixels, so they are exact means over the whole ``2^k x 2^k`` block.
+
+    :param writers: Tiles of each level, ``None`` for levels that are only needed to compute deeper ones
+    """
+
+    def __init__(self, writers: Sequence[Optional[_TileRows]], resampling: str, nodata: Optional[float],
+                 dtype: np.dtype):
+        self.writers = writers
+        self.resampling = resampling
+        self.nodata = nodata
+        self.dtype = dtype
+        self._carry: List[Optional[np.ndarray]] = [None] * len(writers)
+
+    def push(self, rows: np.ndarray):
+        writer = self.writers[0]
+        assert writer is not None
+        writer.push(rows)
+        if len(self.writers) > 1:
+            self._push(1, self._accumulate(rows))
+
+    def finish(self):
+        writer = self.writers[0]
+        assert writer is not None
+        writer.finish()
+        for level in range(1, len(self.writers)):
+            carry = self._carry[level]
+            if carry is not None:
+                self._carry[level] = None
+                self._emit(level, self._halve(np.concatenate([carry, carry])))
+            writer = self.writers[level]
+            if writer is not None:
+                writer.finish()
+
+    def _push(self, level: int, rows: np.ndarray):
+        carry = self._carry[level]
+        if carry is not None:
+            rows = np.concatenate([carry, rows])
+        n = rows.shape[0] - rows.shape[0] % 2
+        self._carry[level] = rows[n:] if n < rows.shape[0] else None
+        if n:
+            self._emit(level, self._halve(rows[:n]))
+
+    def _emit(self, level: int, rows: np.ndarray):
+        writer = self.writers[level]
+        if writer is not None:
+            writer.push(self._pixels(rows))
+        if level + 1 < len(self.writers):
+            self._push(level + 1, rows)
+
+    def _accumulate(self, rows: np.ndarray) -> np.ndarray:
+        if self.resampling == "nearest":
+            return rows
+        valid = valid_mask(rows, self.nodata)
+        return np.concatenate([np.where(valid, rows, 0).astype("float64"), valid.astype("float64")], axis=2)
+
+    def _halve(self, rows: np.ndarray) -> np.ndarray:
+        if rows.shape[1] % 2:
+            rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+        if self.resampling == "nearest":
+            return rows[::2, ::2]
+        n, w, nb = rows.shape
+        return rows.reshape(n // 2, 2, w // 2, 2, nb).sum(axis=(1, 3))
+
+    def _pixels(self, rows: np.ndarray) -> np.ndarray:
+        if self.resampling == "nearest":
+            return rows
+        total, count = np.split(rows, 2, axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+        if self.dtype.kind != "f":
+            mean = np.floor(mean + 0.5)
+        fill = np.nan if self.nodata is None else self.nodata
+        return np.where(count > 0, mean, fill).astype(self.dtype)
+
+
+def _iter_strips(pix, nrows: int) -> Iterator[np.ndarray]:
+    """
+    Yield (rows, cols, bands) strips of a 2d or bands first 3d array.
+
+    Dask arrays are computed one row of chunks at a time.
+    """
+    def _hwc(strip):
+        strip = np.asarray(strip)
+        return strip[..., np.newaxis] if strip.ndim == 2 else strip.transpose(1, 2, 0)
+
+    h = pix.shape[-2]
+    if dask.is_dask_collection(pix):
+        bounds = np.cumsum((0,) + pix.chunks[-2]).tolist()
+    else:
+        bounds = list(range(0, h, nrows)) + [h]
+
+    for y0, y1 in zip(bounds[:-1], bounds[1:]):
+        strip = pix[..., y0:y1, :]
+        if dask.is_dask_collection(strip):
+            strip = strip.compute()
+        yield _hwc(strip)
+
+
+def _tile_shape(blocksize: int, shape: Tuple[int, int]) -> Tuple[int, int]:
+    def _adjust(dim):
+        return min(blocksize, -(-dim // 16) * 16)
+    return (_adjust(shape[0]), _adjust(shape[1]))
+
+
+def write_cog_stream(pix,
+                     geobox: GeoBox,
+                     dst: Union[str, Path, BinaryIO],
+                     nodata: Optional[float] = None,
+                     blocksize: int = 512,
+                     ovr_blocksize: Optional[int] = None,
+                     overview_levels: Sequence[int] = (),
+                     overview_resampling: str = "nearest",
+                     compress: str = "deflate",
+                     zlevel: int = 6,
+                     predictor: Optional[int] = None,
+                     bigtiff: Optional[bool] = None,
+                     max_workers: Optional[int] = None,
+                     spool_dir: Optional[str] = None) -> int:
+    """
+    Write a Cloud Optimized GeoTIFF in a single pass over the image.
+
+    :param pix: 2d, or 3d bands first, numpy or Dask array, Dask arrays are loaded one row of chunks at a time
+    :param geobox: Geo registration of ``pix``
+    :param dst: Output path, or a binary stream to write to (only ``.write`` is used)
+    :param nodata: Nodata value to record, also excluded from ``"average"`` overviews
+    :param blocksize: Size of the tiles of the full resolution image, a multiple of 16
+    :param ovr_blocksize: Size of the tiles of overview images (defaults to blocksize)
+    :param overview_levels: Shrink factors of the overviews, powers of two: ``[2, 4, 8, 16, 32]``
+    :param overview_resampling: ``"nearest"`` or ``"average"``
+    :param compress: ``"deflate"`` or ``"none"``
+    :param zlevel: Deflate compression level
+    :param predictor: TIFF predictor, defaults to 3 for floating point data and 2 otherwise
+    :param bigtiff: Force BigTIFF on or off, by default used only when the output needs it
+    :param max_workers: Number of threads compressing tiles
+    :param spool_dir: Directory for the temporary files holding compressed tiles,
+                      defaults to the directory of ``dst`` when it is a path
+    :return: Number of bytes written
+    """
+    # pylint: disable=too-many-locals
+    if pix.ndim not in (2, 3):
+        raise ValueError("Need 2d or 3d array on input")
+    h, w = pix.shape[-2:]
+    nbands = pix.shape[0] if pix.ndim == 3 else 1
+    dtype = np.dtype(pix.dtype)
+    if dtype.kind not in _SAMPLE_FORMATS or dtype.itemsize > 8:
+        raise ValueError("Unsupported data type: {}".format(dtype))
+    if blocksize % 16 != 0 or (ovr_blocksize or blocksize) % 16 != 0:
+        raise ValueError("Block size must be a multiple of 16")
+    compress = compress.lower()
+    if compress not in _COMPRESSION_CODES:
+        raise ValueError("Unsupported compression: {}".format(compress))
+    if overview_resampling not in _RESAMPLINGS:
+        raise ValueError("Unsupported overview resampling: {}".format(overview_resampling))
+    if predictor is None:
+        predictor = 3 if dtype.kind == "f" else 2
+    if compress == "none":
+        predictor = 1
+    if predictor not in (1, 3 if dtype.kind == "f" else 2):
+        raise ValueError("Predictor {} does not apply to {} data".format(predictor, dtype))
+
+    ovr_shifts = sorted({int(level).bit_length() - 1 for level in overview_levels})
+    if any(1 << shift != level for shift, level in zip(ovr_shifts, sorted(set(overview_levels)))) or \
+            (ovr_shifts and ovr_shifts[0] < 1):
+        raise ValueError("Overview levels must be powers of two")
+
+    ovr_blocksize = ovr_blocksize or blocksize
+    fill = nodata if nodata is not None and not (dtype.kind != "f" and math.isnan(nodata)) else 0
+    zl = None if compress == "none" else zlevel
+
+    def encode(tile):
+        return _encode_tile(tile, predictor, zl)
+
+    if spool_dir is None and isinstance(dst, (str, Path)):
+        spool_dir = str(Path(dst).parent)
+
+    shapes = [(h, w)]
+    for _ in range(ovr_shifts[-1] if ovr_shifts else 0):
+        shapes.append(tuple(-(-n // 2) for n in shapes[-1]))  # type: ignore[misc]
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        writers: List[Optional[_TileRows]] = []
+        try:
+            for shift, shape in enumerate(shapes):
+                if shift == 0 or shift in ovr_shifts:
+                    bs = blocksize if shift == 0 else ovr_blocksize
+                    writers.append(_TileRows(shape, _tile_shape(bs, shape), fill, encode, pool, spool_dir))
+                else:
+                    writers.append(None)
+
+            pyramid = _Pyramid(writers, overview_resampling, nodata, dtype)
+            for strip in _iter_strips(pix, writers[0].tile[0]):  # type: ignore[union-attr]
+                pyramid.push(strip)
+            pyramid.finish()
+
+            images = [(shape, writer) for shape, writer in zip(shapes, writers) if writer is not None]
+            geo = _geotiff_tags(geobox)
+            ifds: List[Tags] = []
+            for i, (shape, writer) in enumerate(images):
+                tags = _image_tags(shape, writer.tile, dtype, nbands, _COMPRESSION_CODES[compress], predictor,
+                                   nodata, overview=i > 0)
+                if i == 0:
+                    tags.update(geo)
+                ifds.append(tags)
+
+            if isinstance(dst, (str, Path)):
+                with open(str(dst), "wb") as f:
+                    return _write_layout(f, ifds, [writer for _, writer in images], bigtiff)
+            return _write_layout(dst, ifds, [writer for _, writer in images], bigtiff)
+        finally:
+            for writer in writers:
+                if writer is not None:
+                    writer.close()
+
+
+def _write_layout(dst: BinaryIO, ifds: List[Tags], writers: List[_TileRows], bigtiff: Optional[bool]) -> int:
+    """
+    Write header, IFDs (full resolution first), then tiles (smallest overview first).
+    """
+    ghost = _ghost_header()
+
+    def _layout(big):
+        off_type = _LONG8 if big else _LONG
+        pos = (16 if big else 8) + len(ghost)
+        ifd_pos = []
+        for tags, writer in zip(ifds, writers):
+            tags[_TILE_OFFSETS] = (off_type, (0,) * len(writer.sizes))
+            tags[_TILE_BYTE_COUNTS] = (_LONG, tuple(writer.sizes))
+            ifd_pos.append(pos)
+            pos += len(_pack_ifd(tags, 0, big))
+        data_pos = {}
+        for writer in reversed(writers):
+            data_pos[id(writer)] = pos
+            pos += writer.nbytes
+        return ifd_pos, data_pos, pos
+
+    ifd_pos, data_pos, end = _layout(False)
+    if bigtiff is None:
+        bigtiff = end >= 1 << 32
+    if bigtiff:
+        ifd_pos, data_pos, end = _layout(True)
+    elif end >= 1 << 32:
+        raise ValueError("Output is too large for a classic TIFF file, use BigTIFF")
+
+    if bigtiff:
+        header = b"II" + struct.pack("<HHHQ", 43, 8, 0, ifd_pos[0])
+    else:
+        header = b"II" + struct.pack("<HI", 42, ifd_pos[0])
+    dst.write(header + ghost)
+
+    for i, (tags, writer) in enumerate(zip(ifds, writers)):
+        start = data_pos[id(writer)]
+        tags[_TILE_OFFSETS] = (tags[_TILE_OFFSETS][0], tuple(start + off for off in writer.offsets))
+        next_ifd = ifd_pos[i + 1] if i + 1 < len(ifds) else 0
+        dst.write(_pack_ifd(tags, ifd_pos[i], bigtiff, next_ifd))
+
+    for writer in reversed(writers):
+        shutil.copyfileobj(writer.spool, dst)
+    return end
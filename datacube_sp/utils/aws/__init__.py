@@ -18,6 +18,7 @@ from sqlalchemy.engine.url import URL
 
 from typing import Optional, Dict, Tuple, Any, Union, IO
 from datacube_sp.utils.generic import thread_local_cache
+from ._cache import S3BlockCache, S3CacheStats, S3File, s3_block_cache
 
 ByteRange = Union[slice, Tuple[int, int]]       # pylint: disable=invalid-name
 MaybeS3 = Optional[botocore.client.BaseClient]  # pylint: disable=invalid-name
@@ -29,6 +30,10 @@ __all__ = (
     "s3_open",
     "s3_fetch",
     "s3_dump",
+    "S3BlockCache",
+    "S3CacheStats",
+    "S3File",
+    "s3_block_cache",
     "ec2_metadata",
     "ec2_current_region",
     "botocore_default_region",
@@ -0,0 +1,461 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+In-process block cache for S3 objects, with concurrent prefetch.
+"""
+import io
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_LOG = logging.getLogger(__name__)
+
+_CONTENT_RANGE = re.compile(r'bytes \d+-\d+/(?P<size>\d+)')
+
+BlockKey = Tuple[str, int]  # pylint: disable=invalid-name
+
+
+class S3CacheStats:
+    """ Counters of an :class:`S3BlockCache`. """
+
+    def __init__(self):
+        self.hits = 0            # blocks served from the cache, including ones being prefetched
+        self.misses = 0          # blocks fetched from S3 for a read
+        self.requests = 0        # GET requests made
+        self.bytes_fetched = 0   # bytes fetched from S3, including prefetch
+        self.bytes_read = 0      # bytes returned to readers
+        self.evictions = 0       # blocks dropped to stay within the memory budget
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __repr__(self):
+        return 'S3CacheStats({})'.format(', '.join('{}={}'.format(k, v) for k, v in vars(self).items()))
+
+
+class S3BlockCache:
+    """
+    Reads S3 objects through a bounded, least recently used cache of fixed size blocks.
+
+    Blocks are keyed by object URL and byte offset, so repeated or overlapping ranged reads
+    (e.g. GeoTIFF headers and tiles) only go to S3 once. Consecutive missing blocks are
+    fetched with a single ranged GET, and concurrent reads of the same block wait for one
+    fetch. A single botocore client (which is thread safe) is shared by all threads, its
+    connection pool is sized by ``max_pool_connections``, which also bounds the number of
+    prefetch threads.
+
+    .. code-block:: python
+
+       cache = S3BlockCache(max_bytes=512 * 2**20)
+       cache.prefetch(urls[1:9])   # download in the background
+       data = cache.read(urls[0])
+       with rasterio.open(url, opener=cache.opener) as src:
+           ...
+
+    :param s3: Pre-configured s3 client, by default one is made with :func:`s3_client`
+    :param block_size: Size of cached blocks, in bytes
+    :param max_bytes: Memory budget of the cache, in bytes
+    :param max_pool_connections: Size of the client connection pool and of the prefetch thread pool
+    :param get_kwargs: Passed on to every ``s3.get_object(..)``, e.g. ``RequestPayer='requester'``
+    :param client_kwargs: Passed on to :func:`s3_client` when ``s3`` isn't supplied
+    """
+
+    def __init__(self,
+                 s3=None,
+                 block_size: int = 2**20,
+                 max_bytes: int = 256 * 2**20,
+                 max_pool_connections: int = 16,
+                 get_kwargs: Optional[Dict] = None,
+                 **client_kwargs):
+        if s3 is None:
+            from . import s3_client
+            s3 = s3_client(max_pool_connections=max_pool_connections, **client_kwargs)
+
+        self.s3 = s3
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.max_pool_connections = max_pool_connections
+        self.stats = S3CacheStats()
+        self._get_kwargs = dict(get_kwargs or {})
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()  # type: OrderedDict[BlockKey, bytes]
+        self._nbytes = 0
+        self._sizes = {}  # type: Dict[str, Optional[int]]
+        self._pending = {}  # type: Dict[BlockKey, Future]
+        self._pending_objects = {}  # type: Dict[str, Future]
+        self._prefetches = {}  # type: Dict[str, Future]
+        self._pool = None  # type: Optional[ThreadPoolExecutor]
+
+    @property
+    def nbytes(self) -> int:
+        """ Bytes currently held in the cache. """
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __repr__(self):
+        return 'S3BlockCache(blocks={}, nbytes={}, max_bytes={}, {!r})'.format(
+            len(self), self._nbytes, self.max_bytes, self.stats)
+
+    def size(self, url: str) -> int:
+        """
+        Size of the object in bytes, from a previous read or a HEAD request.
+
+        :raises FileNotFoundError: When there is no such object
+        """
+        if url not in self._sizes:
+            from . import s3_head_object
+            meta = s3_head_object(url, s3=self.s3)
+            self._sizes[url] = None if meta is None else meta['ContentLength']
+        size = self._sizes[url]
+        if size is None:
+            raise FileNotFoundError(url)
+        return size
+
+    def read(self, url: str, range: Optional[Tuple[int, int]] = None) -> bytes:  # pylint: disable=redefined-builtin
+        """
+        Read entire or part of an object.
+
+        :param url: s3://bucket/path/to/object
+        :param range: Byte range to read (first_byte, one_past_last_byte), default is whole object
+        """
+        with self._lock:
+            pending = self._pending_objects.get(url)
+        if pending is not None:
+            # the whole object is on its way (e.g. prefetch), its blocks will be in the cache
+            wait([pending])
+
+        if range is None:
+            size = self._sizes.get(url)
+            if size is None:
+                data = self._read_object(url)
+                with self._lock:
+                    self.stats.bytes_read += len(data)
+                return data
+            range = (0, size)
+
+        start, stop = range
+        size = self._sizes.get(url)
+        if size is not None:
+            stop = min(stop, size)
+        if stop <= start:
+            return b''
+
+        bs = self.block_size
+        blocks = self._read_blocks(url, list(_block_range(start, stop, bs)))
+        data = b''.join(blocks)
+        first = (start // bs) * bs
+        data = data[start - first:stop - first]
+        with self._lock:
+            self.stats.bytes_read += len(data)
+        return data
+
+    def discard(self, url: str) -> None:
+        """ Drop all cached blocks of an object, and cancel its prefetch if it hasn't started. """
+        with self._lock:
+            prefetch = self._prefetches.pop(url, None)
+            for key in [k for k in self._blocks if k[0] == url]:
+                self._nbytes -= len(self._blocks.pop(key))
+            self._sizes.pop(url, None)
+        if prefetch is not None:
+            prefetch.cancel()
+
+    def clear(self) -> None:
+        with self._lock:
+            prefetches = list(self._prefetches.values())
+            self._prefetches.clear()
+            self._blocks.clear()
+            self._sizes.clear()
+            self._nbytes = 0
+        for prefetch in prefetches:
+            prefetch.cancel()
+
+    def prefetch(self, urls: Iterable[str]) -> List[Future]:
+        """
+        Start downloading whole objects into the cache in the background.
+
+        Objects already being fetched aren't fetched again. Reads of a prefetched object wait
+        for its download rather than starting another one. :meth:`discard` cancels the prefetch
+        of an object, or makes it a no-op if it was already dequeued.
+
+        :returns: Future per url, resolving to the object size (None when it was discarded first)
+        """
+        urls = list(urls)
+        futures = []
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_pool_connections,
+                                                thread_name_prefix='s3-prefetch')
+            for url in urls:
+                fut = self._prefetches.get(url)
+                if fut is None:
+                    fut = self._prefetches[url] = self._pool.submit(self._prefetch, url)
+                futures.append(fut)
+        for url, fut in zip(urls, futures):
+            fut.add_done_callback(lambda f, url=url: self._prefetch_done(url, f))
+        return futures
+
+    def open(self, url: str) -> 'S3File':
+        """ Read only, seekable file object reading through the cache. """
+        return S3File(self, url, self.size(url))
+
+    def opener(self, path: str, mode: str = 'rb') -> 'S3File':
+        """
+        File opener for ``rasterio.open(url, opener=cache.opener)`` (rasterio>=1.4).
+
+        Use with ``GDAL_DISABLE_READDIR_ON_OPEN=EMPTY_DIR`` (the datacube default for cloud access),
+        otherwise GDAL probes for many side-car files, each one a HEAD request.
+        """
+        if 'w' in mode or '+' in mode:
+            raise ValueError('S3BlockCache is read only')
+        if not path.startswith('s3://'):
+            raise FileNotFoundError(path)
+        return self.open(path)
+
+    def close(self) -> None:
+        """ Stop prefetching. """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # internals
+
+    def _get(self, url: str, range: Optional[Tuple[int, int]]) -> bytes:  # pylint: disable=redefined-builtin
+        from . import s3_fmt_range, s3_url_parse
+        bucket, key = s3_url_parse(url)
+        kwargs = dict(self._get_kwargs)
+        if range is not None:
+            kwargs['Range'] = s3_fmt_range(range)
+        oo = self.s3.get_object(Bucket=bucket, Key=key, **kwargs)
+        data = oo['Body'].read()
+
+        content_range = _CONTENT_RANGE.match(oo.get('ContentRange', ''))
+        self._sizes[url] = int(content_range.group('size')) if content_range else len(data)
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.bytes_fetched += len(data)
+        return data
+
+    def _store(self, key: BlockKey, data: bytes) -> None:
+        # called with the lock held
+        if key in self._blocks:
+            self._nbytes -= len(self._blocks.pop(key))
+        self._blocks[key] = data
+        self._nbytes += len(data)
+        while self._nbytes > self.max_bytes and self._blocks:
+            _, evicted = self._blocks.popitem(last=False)
+            self._nbytes -= len(evicted)
+            self.stats.evictions += 1
+
+    def _prefetch(self, url: str) -> Optional[int]:
+        data = self._read_object(url, prefetch=True)
+        return None if data is None else len(data)
+
+    def _prefetch_done(self, url: str, fut: Future) -> None:
+        with self._lock:
+            if self._prefetches.get(url) is fut:
+                del self._prefetches[url]
+
+    def _read_object(self, url: str, prefetch: bool = False) -> Optional[bytes]:
+        """
+        Whole object, from the cache when all of its blocks are there, else with a single GET.
+
+        A prefetch returns None instead if the object was discarded before it got to run.
+        """
+        with self._lock:
+            if prefetch and url not in self._prefetches:
+                return None
+            size = self._sizes.get(url)
+            if size is not None:
+                keys = [(url, i) for i in _block_range(0, size, self.block_size)]
+                if all(k in self._blocks for k in keys):
+                    for k in keys:
+                        self._blocks.move_to_end(k)
+                    if not prefetch:
+                        self.stats.hits += len(keys)
+                    return b''.join(self._blocks[k] for k in keys)
+
+            fut = self._pending_objects.get(url)
+            owner = fut is None
+            if owner:
+                fut = self._pending_objects[url] = Future()
+        if not owner:
+            data = fut.result()
+            if not prefetch:
+                with self._lock:
+                    self.stats.hits += _nblocks(len(data), self.block_size)
+            return data
+
+        try:
+            data = self._get(url, None)
+        except BaseException as e:
+            with self._lock:
+                del self._pending_objects[url]
+            fut.set_exception(e)
+            raise
+
+        bs = self.block_size
+        with self._lock:
+            if not prefetch:
+                self.stats.misses += max(1, _nblocks(len(data), bs))
+            for i in _block_range(0, len(data), bs):
+                self._store((url, i), data[i * bs:(i + 1) * bs])
+            del self._pending_objects[url]
+        fut.set_result(data)
+        return data
+
+    def _read_blocks(self, url: str, indices: List[int]) -> List[bytes]:
+        found = {}  # type: Dict[int, bytes]
+        waiting = {}  # type: Dict[int, Future]
+        claimed = []  # type: List[int]
+
+        with self._lock:
+            for i in indices:
+                key = (url, i)
+                if key in self._blocks:
+                    self._blocks.move_to_end(key)
+                    found[i] = self._blocks[key]
+                elif key in self._pending:
+                    waiting[i] = self._pending[key]
+                else:
+                    self._pending[key] = Future()
+                    claimed.append(i)
+            self.stats.hits += len(found) + len(waiting)
+            self.stats.misses += len(claimed)
+
+        bs = self.block_size
+        for run in _runs(claimed):
+            keys = [(url, i) for i in run]
+            try:
+                data = self._get(url, (run[0] * bs, (run[-1] + 1) * bs))
+            except BaseException as e:
+                with self._lock:
+                    futures = [self._pending.pop(k) for k in keys]
+                for f in futures:
+                    f.set_exception(e)
+                raise
+            with self._lock:
+                futures = []
+                for n, key in enumerate(keys):
+                    block = data[n * bs:(n + 1) * bs]
+                    self._store(key, block)
+                    found[key[1]] = block
+                    futures.append((self._pending.pop(key), block))
+            for f, block in futures:
+                f.set_result(block)
+
+        for i, f in waiting.items():
+            found[i] = f.result()
+
+        return [found[i] for i in indices]
+
+
+def _nblocks(nbytes: int, block_size: int) -> int:
+    return -(-nbytes // block_size)
+
+
+def _block_range(start: int, stop: int, block_size: int) -> range:
+    return range(start // block_size, _nblocks(stop, block_size))
+
+
+def _runs(indices: List[int]) -> List[List[int]]:
+    """ Split sorted block indices into runs of consecutive ones. """
+    runs = []  # type: List[List[int]]
+    for i in indices:
+        if runs and runs[-1][-1] == i - 1:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+    return runs
+
+
+class S3File(io.RawIOBase):
+    """ Read only, seekable file object for an S3 object, reading through an :class:`S3BlockCache`. """
+
+    def __init__(self, cache: S3BlockCache, url: str, size: int):
+        super().__init__()
+        self._cache = cache
+        self.name = url
+        self.size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError('Invalid whence: {}'.format(whence))
+        if pos < 0:
+            raise ValueError('Negative seek position: {}'.format(pos))
+        self._pos = pos
+        return pos
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        stop = self.size if size is None or size < 0 else min(self.size, self._pos + size)
+        if stop <= self._pos:
+            return b''
+        data = self._cache.read(self.name, (self._pos, stop))
+        self._pos += len(data)
+        return data
+
+    def readall(self):
+        return self.read(-1)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+_DEFAULT = {}  # type: Dict[str, S3BlockCache]
+_DEFAULT_LOCK = threading.Lock()
+
+
+def s3_block_cache(**kwargs) -> S3BlockCache:
+    """
+    Process wide :class:`S3BlockCache`, shared by all threads.
+
+    It is created on first use (and again in a forked child, as clients and threads
+    don't survive a fork). Passing ``kwargs`` replaces it with one configured with them.
+    """
+    key = str(os.getpid())
+    with _DEFAULT_LOCK:
+        cache = _DEFAULT.get(key)
+        if cache is None or kwargs:
+            if cache is not None:
+                cache.close()
+            _DEFAULT.clear()
+            cache = _DEFAULT[key] = S3BlockCache(**kwargs)
+    return cache
@@ -2,22 +2,66 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
+import contextlib
+import io
+import logging
+import os
+import time
+import uuid
 import warnings
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
 import toolz                                  # type: ignore[import]
 import rasterio                               # type: ignore[import]
 from rasterio.shutil import copy as rio_copy  # type: ignore[import]
 import numpy as np
 import xarray as xr
 import dask
+from dask.base import get_scheduler
 from dask.delayed import Delayed
 from pathlib import Path
-from typing import Union, Optional, List, Any, Dict
+from typing import Union, Optional, List, Any, Dict, BinaryIO, NamedTuple, Sequence, Tuple
+import pandas as pd
+import yaml
 
 from .io import check_write_path
+from .generic import ByteBudget
+from .serialise import SafeDatacubeDumper
 from .geometry import GeoBox
 from .geometry.tools import align_up
+from ._cog_stream import write_cog_stream
 
-__all__ = ("write_cog", "to_cog")
+__all__ = ("write_cog", "to_cog", "write_cogs", "CogExport")
+
+_LOG = logging.getLogger(__name__)
+
+# Creation options understood by the single pass writer, anything else goes through GDAL
+_STREAM_RIO_OPTS = {"compress", "zlevel", "predictor", "bigtiff", "num_threads"}
+
+
+class _ChunkedInput:
+    """
+    Passes a Dask array to a delayed writer without computing it first, so that the
+    single pass writer can load it one row of chunks at a time.
+
+    The graph of the array is then hidden from the scheduler, and computed from within the
+    writing task on local threads. Only used with local schedulers, see :func:`_local_scheduler`.
+    """
+
+    def __init__(self, pix):
+        self.pix = pix
+
+    def __dask_tokenize__(self):
+        return self.pix.name
+
+
+def _local_scheduler() -> bool:
+    """
+    Will Dask compute on a local scheduler (threads, processes or synchronous), rather than a
+    ``distributed`` cluster? A task computing a hidden graph there would be loading all
+    of it on one worker, outside of the view of the scheduler.
+    """
+    owner = getattr(get_scheduler(), "__self__", None)
+    return owner is None or not type(owner).__module__.startswith("distributed")
 
 
 def _adjust_blocksize(block, dim):
@@ -26,10 +70,47 @@ def _adjust_blocksize(block, dim):
     return align_up(block, 16)
 
 
+def _stream_options(
+    dtype: np.dtype,
+    overview_levels: Optional[List[int]],
+    overview_resampling: Optional[str],
+    extra_rio_opts: Dict[str, Any],
+) -> Optional[Dict[str, Any]]:
+    """
+    Arguments for :func:`write_cog_stream` equivalent to the GDAL creation options,
+    ``None`` if the single pass writer can not produce the requested file.
+    """
+    opts = {k.lower(): v for k, v in extra_rio_opts.items()}
+    if not set(opts) <= _STREAM_RIO_OPTS:
+        return None
+    if dtype.kind not in "uif" or dtype.itemsize > 8:
+        return None
+    if overview_resampling not in (None, "nearest", "average"):
+        return None
+    if any(level < 2 or level & (level - 1) for level in overview_levels or []):
+        return None
+
+    compress = str(opts.get("compress", "deflate")).lower()
+    predictor = int(opts.get("predictor", 3 if dtype.kind == "f" else 2))
+    if compress not in ("deflate", "none"):
+        return None
+    if compress == "deflate" and predictor not in (1, 3 if dtype.kind == "f" else 2):
+        return None
+
+    threads = str(opts.get("num_threads", "ALL_CPUS")).upper()
+    return dict(
+        compress=compress,
+        zlevel=int(opts.get("zlevel", 6)),
+        predictor=predictor,
+        bigtiff={"YES": True, "NO": False}.get(str(opts.get("bigtiff", "IF_NEEDED")).upper()),
+        max_workers=None if threads == "ALL_CPUS" else int(threads),
+    )
+
+
 def _write_cog(
     pix: np.ndarray,
     geobox: GeoBox,
-    fname: Union[Path, str],
+    fname: Union[Path, str, BinaryIO],
     nodata: Optional[float] = None,
     overwrite: bool = False,
     blocksize: Optional[int] = None,
@@ -39,11 +120,11 @@ def _write_cog(
     use_windowed_writes: bool = False,
     intermediate_compression: Union[bool, str, Dict[str, Any]] = False,
     **extra_rio_opts
-) -> Union[Path, bytes]:
+) -> Union[Path, bytes, BinaryIO]:
     """Write geo-registered ndarray to a GeoTiff file or RAM.
 
     :param pix: ``xarray.DataArray`` with crs or (ndarray, geobox, nodata) triple
-    :param fname:  Output file or ":mem:"
+    :param fname:  Output file, ":mem:", or a binary stream (anything with a ``.write`` method)
     :param nodata: Set ``nodata`` flag to this value if supplied
     :param overwrite: True -- replace existing file, False -- abort with IOError exception
     :param blocksize: Size of internal tiff tiles (512x512 pixels)
@@ -56,20 +137,27 @@ def _write_cog(
     :param extra_rio_opts: Any other option is passed to ``rasterio.open``
 
     When fname=":mem:" write COG to memory rather than to a file and return it
-    as a memoryview object.
+    as a bytes object.
 
     NOTE: about memory requirements
 
-    This function generates a temporary in memory tiff file without compression
+    With DEFLATE (or no) compression, ``nearest`` or ``average`` overviews at power of two
+    levels and no other creation options, the image is written in a single pass by
+    :func:`datacube_sp.utils._cog_stream.write_cog_stream`: a row of tiles per overview level
+    is kept in memory and compressed tiles are spooled to temporary files until they can be
+    written out in COG order. In that case ``pix`` may also be a Dask array, which is then
+    loaded one row of chunks at a time, and ``use_windowed_writes`` and
+    ``intermediate_compression`` have no effect.
+
+    Otherwise this function generates a temporary in memory tiff file without compression
     to speed things up. It then adds overviews to this file and only then
     copies it to the final destination with requested compression settings.
-    This is necessary to produce a compliant COG, since the COG standard demands
-    overviews to be placed before native resolution data and a double pass is the
-    only way to achieve this currently.
-
-    This means that this function will use about 1.5 to 2 times memory taken by `pix`.
+    This means that it will use about 1.5 to 2 times memory taken by `pix`.
     """
     # pylint: disable=too-many-locals
+    chunked = isinstance(pix, _ChunkedInput)
+    if chunked:
+        pix = pix.pix
     if blocksize is None:
         blocksize = 512
     if ovr_blocksize is None:
@@ -108,16 +196,45 @@ def _write_cog(
         else:
             overview_levels = [2 ** i for i in range(1, 6)]
 
-    if fname != ":mem:":
+    is_stream = hasattr(fname, "write")
+    if fname != ":mem:" and not is_stream:
         path = check_write_path(
             fname, overwrite
         )  # aborts if overwrite=False and file exists already
 
-    resampling = rasterio.enums.Resampling[overview_resampling]
-
     if (blocksize % 16) != 0:
         warnings.warn("Block size must be a multiple of 16, will be adjusted")
 
+    stream_opts = _stream_options(pix.dtype, overview_levels, overview_resampling, extra_rio_opts)
+    if stream_opts is not None:
+        stream_opts.update(
+            nodata=nodata,
+            blocksize=align_up(blocksize, 16),
+            ovr_blocksize=align_up(ovr_blocksize, 16),
+            overview_levels=overview_levels,
+            overview_resampling=overview_resampling,
+        )
+        # a hidden graph is computed here, on local threads whichever scheduler runs this task
+        with dask.config.set(scheduler="threads") if chunked else contextlib.nullcontext():
+            if fname == ":mem:":
+                buf = io.BytesIO()
+                write_cog_stream(pix, geobox, buf, **stream_opts)
+                return buf.getvalue()
+            write_cog_stream(pix, geobox, fname if is_stream else path, **stream_opts)
+            return fname if is_stream else path
+
+    if is_stream:
+        fname.write(_write_cog(pix, geobox, ":mem:", nodata=nodata, blocksize=blocksize,
+                               overview_resampling=overview_resampling, overview_levels=overview_levels,
+                               ovr_blocksize=ovr_blocksize, use_windowed_writes=use_windowed_writes,
+                               intermediate_compression=intermediate_compression, **extra_rio_opts))
+        return fname
+
+    if dask.is_dask_collection(pix):
+        pix = pix.compute()
+
+    resampling = rasterio.enums.Resampling[overview_resampling]
+
     rio_opts = dict(
         width=w,
         height=h,
@@ -209,7 +326,7 @@ _delayed_write_cog_to_file = dask.delayed(  # pylint: disable=invalid-name
 
 def write_cog(
     geo_im: xr.DataArray,
-    fname: Union[str, Path],
+    fname: Union[str, Path, BinaryIO],
     overwrite: bool = False,
     blocksize: Optional[int] = None,
     ovr_blocksize: Optional[int] = None,
@@ -240,7 +357,8 @@ def write_cog(
        write_cog(xx.isel(time=0).red.compute(), "red.tif")
 
     :param geo_im: ``xarray.DataArray`` with crs
-    :param fname: Output path or ``":mem:"`` in which case compress to RAM and return bytes
+    :param fname: Output path or ``":mem:"`` in which case compress to RAM and return bytes,
+                  or a binary stream to write to (e.g. an open file or a multipart upload)
     :param overwrite: True -- replace existing file, False -- abort with IOError exception
     :param blocksize: Size of internal tiff tiles (512x512 pixels)
     :param ovr_blocksize: Size of internal tiles in overview images (defaults to blocksize)
@@ -255,20 +373,28 @@ def write_cog(
 
     :returns: Path to which output was written
     :returns: Bytes if ``fname=":mem:"``
+    :returns: The stream if ``fname`` is a stream
     :returns: ``dask.Delayed`` object if input is a Dask array
 
     .. note ::
 
        **memory requirements**
 
-       This function generates a temporary in memory tiff file without
-       compression to speed things up. It then adds overviews to this file and
-       only then copies it to the final destination with requested compression
-       settings. This is necessary to produce a compliant COG, since the COG standard
-       demands overviews to be placed before native resolution data and double
-       pass is the only way to achieve this currently.
-
-       This means that this function will use about 1.5 to 2 times memory taken by ``geo_im``.
+       With the default DEFLATE compression (or ``compress="none"``), ``nearest`` or
+       ``average`` overview resampling and power of two overview levels, the image is
+       written in a single pass: tiles are compressed on a pool of ``num_threads`` threads
+       (all CPUs by default) while overviews are computed from the same rows of pixels,
+       and only a row of tiles per overview level is held in memory. Compressed tiles are
+       spooled to temporary files until they can be written out in COG order.
+       Dask input is then loaded one row of chunks at a time, rather than all at once, from
+       within the writing task, on local threads. This needs a local Dask scheduler (threads,
+       processes or synchronous) at the time ``write_cog`` is called: with a ``distributed``
+       client, the array is an ordinary input of the writing task, and is computed (by the
+       cluster) in full before it is written.
+
+       Other settings go through GDAL, which generates a temporary in memory tiff file
+       without compression, adds overviews to it, and only then copies it to the final
+       destination. This uses about 1.5 to 2 times memory taken by ``geo_im``.
     """
     pix = geo_im.data
     geobox = getattr(geo_im, "geobox", None)
@@ -285,6 +411,9 @@ def write_cog(
             if fname == ":mem:"
             else _delayed_write_cog_to_file
         )
+        if _local_scheduler() and \
+                _stream_options(pix.dtype, overview_levels, overview_resampling, extra_rio_opts) is not None:
+            pix = _ChunkedInput(pix)
     else:
         real_op = _write_cog
 
@@ -360,3 +489,218 @@ def to_cog(
         bb, (bytes, Delayed)
     )  # for mypy sake for :mem: output it bytes or delayed bytes
     return bb
+
+
+class CogExport(NamedTuple):
+    """
+    Outcome of :func:`write_cogs`.
+    """
+
+    paths: List[Path]
+    """ Files written, in (time, band) order """
+
+    documents: List[Path]
+    """ EO3 dataset documents written, in the same order """
+
+    nbytes: int
+    """ Size of the exported pixels """
+
+    nbytes_written: int
+    """ Total size of the files written """
+
+    elapsed: float
+    """ Wall clock time taken, in seconds """
+
+    @property
+    def throughput(self) -> float:
+        """ Pixel bytes exported per second """
+        return self.nbytes / self.elapsed if self.elapsed > 0 else float("inf")
+
+
+def _cog_memory(pix: Any, blocksize: Optional[int], streaming: bool) -> int:
+    """ Approximate memory :func:`_write_cog` needs beyond the input array itself. """
+    if not streaming:
+        return 2 * pix.nbytes
+    h = pix.shape[-2]
+    row_bytes = pix.nbytes // h
+    # two rows of tiles in flight, for the image and its overviews
+    rows = 3 * (blocksize or 512)
+    if dask.is_dask_collection(pix):
+        rows += max(pix.chunks[-2])
+    return min(rows, h) * row_bytes
+
+
+def _eo3_document(path: Path, band: str, geobox: GeoBox, timestamp: pd.Timestamp,
+                  product: str) -> Dict[str, Any]:
+    properties: Dict[str, Any] = {"datetime": timestamp.isoformat(), "odc:file_format": "GeoTIFF"}
+    return {
+        "$schema": "https://schemas.opendatacube.org/dataset",
+        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, path.resolve().as_uri())),
+        "product": {"name": product},
+        "crs": str(geobox.crs),
+        "grids": {
+            "default": {
+                "shape": list(geobox.shape),
+                "transform": list(geobox.transform),
+            }
+        },
+        "measurements": {band: {"path": path.name}},
+        "properties": properties,
+        "lineage": {},
+    }
+
+
+def _write_cog_job(
+    pix: Any,
+    geobox: GeoBox,
+    path: Path,
+    nodata: Optional[float],
+    document: Optional[Dict[str, Any]],
+    cog_opts: Dict[str, Any],
+) -> Tuple[int, Optional[Path]]:
+    # Dask input is loaded by this job on local threads, also when it runs on a cluster worker
+    with dask.config.set(scheduler="threads"):
+        _write_cog(pix, geobox, path, nodata=nodata, **cog_opts)
+
+    doc_path = None
+    if document is not None:
+        doc_path = path.with_suffix(".odc-metadata.yaml")
+        with open(str(doc_path), "w") as f:
+            yaml.dump(document, f, Dumper=SafeDatacubeDumper, default_flow_style=False, sort_keys=False)
+    return path.stat().st_size, doc_path
+
+
+def write_cogs(
+    ds: xr.Dataset,
+    path_template: str,
+    bands: Optional[Sequence[str]] = None,
+    overwrite: bool = False,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    eo3_product: Optional[str] = None,
+    blocksize: Optional[int] = None,
+    ovr_blocksize: Optional[int] = None,
+    overview_resampling: Optional[str] = None,
+    overview_levels: Optional[List[int]] = None,
+    **extra_rio_opts
+) -> CogExport:
+    """
+    Save every band of every time slice of an ``xarray.Dataset`` to its own Cloud Optimized GeoTiff.
+
+    The files are written concurrently, each of them with :func:`write_cog` and the same
+    settings. Dask backed bands are computed as they are written, one row of chunks at a time
+    (see the memory notes of :func:`write_cog`), rather than loaded up front.
+
+    .. code-block:: python
+
+       xx = dc.load(.., dask_chunks=dict(x=2048, y=2048))
+       out = write_cogs(xx, "out/{time:%Y%m%d}/{band}.tif", memory_budget=4 << 30, eo3_product="my_product")
+       print(f"{out.throughput / 1e6:.1f} MB/s")
+
+    :param ds: ``xarray.Dataset`` with crs, with or without a ``time`` dimension
+    :param path_template: Output path, formatted with ``band`` (the variable name), ``time`` (a
+                          ``pandas.Timestamp``, so ``{time:%Y-%m-%d}`` works) and ``index``
+                          (position along ``time``). It must give a different path for each output.
+    :param bands: Variables to export, defaults to all of them
+    :param overwrite: True -- replace existing files, False -- abort with IOError exception
+    :param executor: ``concurrent.futures.Executor`` to write on, e.g. ``client.get_executor()``
+                     for a Dask cluster. Defaults to a thread pool of ``max_workers`` threads.
+                     Dask backed bands are loaded by the job writing them, on the local threads
+                     of wherever it runs.
+    :param max_workers: Number of files written at once on the default thread pool (defaults
+                        to the number of CPUs). Tiles of each file are compressed on
+                        ``num_threads`` threads, by default an even share of the CPUs.
+    :param memory_budget: Bytes of working memory the writers in flight may use together,
+                          a file is only started once there is room for it.
+    :param eo3_product: When set, write an EO3 dataset document of this product next to every file,
+                        as ``<name>.odc-metadata.yaml``. EO3 datasets need a ``datetime``, so ``ds``
+                        must then have a ``time`` dimension or (scalar) coordinate.
+    :param blocksize: Size of internal tiff tiles (512x512 pixels)
+    :param ovr_blocksize: Size of internal tiles in overview images (defaults to blocksize)
+    :param overview_resampling: Use this resampling when computing overviews
+    :param overview_levels: List of shrink factors to compute overviews for: [2,4,8,16,32]
+    :param extra_rio_opts: Any other option is passed to :func:`write_cog`
+
+    :returns: :class:`CogExport` with the paths written, sizes and timing
+    """
+    # pylint: disable=too-many-locals
+    geobox = getattr(ds, "geobox", None)
+    if geobox is None:
+        raise ValueError("Need geo-registered dataset on input")
+    if bands is None:
+        bands = [str(name) for name in ds.data_vars]
+
+    times = [pd.Timestamp(t) for t in ds.time.values] if "time" in ds.dims else [None]
+    # a single time slice may still have its time as a scalar coordinate
+    doc_times = [pd.Timestamp(ds.time.values)] if times == [None] and "time" in ds.coords else times
+    if eo3_product is not None and doc_times == [None]:
+        raise ValueError("EO3 documents need a datetime: dataset has no time dimension or coordinate")
+    jobs = []
+    for index, timestamp in enumerate(times):
+        for band in bands:
+            xx = ds[band] if timestamp is None else ds[band].isel(time=index)
+            path = Path(path_template.format(band=band, time=timestamp, index=index))
+            jobs.append((xx, band, doc_times[index], path))
+
+    paths = [path for *_, path in jobs]
+    if len(set(paths)) < len(paths):
+        raise ValueError("path_template needs to produce a different path for every band and time")
+
+    ncpu = os.cpu_count() or 1
+    workers = min(max_workers or ncpu, len(jobs)) or 1
+    cog_opts = dict(
+        overwrite=overwrite,
+        blocksize=blocksize,
+        ovr_blocksize=ovr_blocksize,
+        overview_resampling=overview_resampling,
+        overview_levels=overview_levels,
+        **extra_rio_opts
+    )
+    if "num_threads" not in {k.lower() for k in extra_rio_opts}:
+        cog_opts["num_threads"] = max(1, ncpu // workers)
+
+    budget = ByteBudget(memory_budget) if memory_budget is not None else None
+    pool = executor if executor is not None else ThreadPoolExecutor(max_workers=workers)
+    results: List[Any] = [None] * len(jobs)
+    futures = {}
+    start = time.monotonic()
+    try:
+        for i, (xx, band, timestamp, path) in enumerate(jobs):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            document = None
+            if eo3_product is not None:
+                document = _eo3_document(path, band, geobox, timestamp, eo3_product)
+            streaming = _stream_options(xx.dtype, overview_levels, overview_resampling, extra_rio_opts) is not None
+            nbytes = _cog_memory(xx.data, blocksize, streaming)
+            if budget is not None:
+                budget.acquire(nbytes)
+            fut = pool.submit(_write_cog_job, xx.data, geobox, path, xx.attrs.get("nodata", None), document,
+                              cog_opts)
+            if budget is not None:
+                fut.add_done_callback(lambda _, n=nbytes: budget.release(n))  # type: ignore[union-attr]
+            futures[fut] = i
+
+        for fut in as_completed(futures):
+            i = futures[fut]
+            results[i] = fut.result()
+            _LOG.debug("Wrote %s (%d bytes)", jobs[i][-1], results[i][0])
+    except BaseException:
+        for fut in futures:
+            fut.cancel()
+        raise
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    elapsed = time.monotonic() - start
+    out = CogExport(
+        paths=paths,
+        documents=[doc for _, doc in results if doc is not None],
+        nbytes=sum(xx.nbytes for xx, *_ in jobs),
+        nbytes_written=sum(size for size, _ in results),
+        elapsed=elapsed,
+    )
+    _LOG.info("Wrote %d COGs, %d bytes of pixels in %.2fs (%.1f MB/s)",
+              len(paths), out.nbytes, elapsed, out.throughput / 1e6)
+    return out
@@ -6,6 +6,7 @@
 Functions for working with YAML documents and configurations
 """
 import gzip
+import io
 import json
 import logging
 import math
@@ -17,7 +18,7 @@ from itertools import chain
 from pathlib import Path
 from urllib.parse import urlparse
 from urllib.request import urlopen
-from typing import Dict, Any, Mapping
+from typing import Dict, Any, Mapping, Set
 from copy import deepcopy
 from uuid import UUID
 
@@ -43,8 +44,21 @@ def _open_from_s3(url):
     if o.scheme != 's3':
         raise RuntimeError("Abort abort I don't know how to open non s3 urls")
 
-    from .aws import s3_open
-    yield s3_open(url)
+    from .aws import s3_block_cache
+    cache = s3_block_cache()
+    try:
+        yield io.BytesIO(cache.read(url))
+    finally:
+        # documents are read once, only keep them in the cache until then
+        cache.discard(url)
+
+
+def _prefetch_from_s3(urls, submitted):
+    urls = [url for url in urls if url.startswith('s3://') and url not in submitted]
+    if urls:
+        from .aws import s3_block_cache
+        s3_block_cache().prefetch(urls)
+        submitted.update(urls)
 
 
 def _open_with_urllib(url):
@@ -121,7 +135,7 @@ def load_documents(path):
             yield from parser(fh)
 
 
-def read_documents(*paths, uri=False):
+def read_documents(*paths, uri=False, prefetch=8):
     """
     Read and parse documents from the filesystem or remote URLs (yaml or json).
 
@@ -131,8 +145,12 @@ def read_documents(*paths, uri=False):
     Data Cube we store JSONB in PostgreSQL and it will turn our dates
     into strings anyway.
 
+    Documents on S3 are read through the shared :func:`datacube_sp.utils.aws.s3_block_cache`,
+    which downloads the next `prefetch` of them in the background.
+
     :param uri: When True yield URIs instead of Paths
     :param paths: input Paths or URIs
+    :param prefetch: Number of S3 documents to download ahead of the one being parsed
     :type uri: Bool
     :rtype: tuple[(str, dict)]
     """
@@ -158,7 +176,12 @@ def read_documents(*paths, uri=False):
                                           if_one=add_uri_no_part,
                                           if_many=add_uri_with_part)
 
-    for path in paths:
+    urls = [as_url(str(path)) for path in paths] if prefetch else []
+    prefetched = set()  # type: Set[str]
+
+    for i, path in enumerate(paths):
+        if prefetch:
+            _prefetch_from_s3(urls[i + 1:i + 1 + prefetch], prefetched)
         try:
             yield from process_file(path)
         except InvalidDocException as e:
@@ -15,6 +15,7 @@ __all__ = (
     "qmap",
     "it2q",
     "thread_local_cache",
+    "ByteBudget",
 )
 
 
@@ -104,3 +105,22 @@ def thread_local_cache(name: str,
             setattr(_LCL, name, cc)
 
     return cc
+
+
+class ByteBudget:
+    """ Limit on the number of bytes in use at once. A single request over the limit is let through alone. """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes: int):
+        with self._cond:
+            self._cond.wait_for(lambda: self.used == 0 or self.used + nbytes <= self.limit)
+            self.used += nbytes
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
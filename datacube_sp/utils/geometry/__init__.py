@@ -18,6 +18,7 @@ from ._base import (
     GeoBox,
     assign_crs,
     common_crs,
+    batch_to_crs,
     bbox_union,
     bbox_intersection,
     crs_units_per_degree,
@@ -87,6 +88,7 @@ __all__ = [
     "GeoBox",
     "assign_crs",
     "common_crs",
+    "batch_to_crs",
     "bbox_union",
     "bbox_intersection",
     "crs_units_per_degree",
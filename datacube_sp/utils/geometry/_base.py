@@ -8,7 +8,7 @@ import math
 import array
 import warnings
 from collections import namedtuple, OrderedDict
-from typing import Tuple, Iterable, List, Union, Optional, Any, Callable, Hashable, Dict, Iterator
+from typing import Tuple, Iterable, List, Union, Optional, Any, Callable, Hashable, Dict, Iterator, cast
 from collections.abc import Sequence
 from distutils.version import LooseVersion
 
@@ -17,6 +17,7 @@ import numpy
 import xarray as xr
 from affine import Affine
 import rasterio                    # type: ignore[import]
+import shapely                     # type: ignore[import]
 from shapely import geometry, ops  # type: ignore[import]
 from shapely.geometry import base  # type: ignore[import]
 from pyproj import CRS as _CRS
@@ -33,6 +34,9 @@ SomeCRS = Union[str, 'CRS', _CRS, Dict[str, Any]]
 MaybeCRS = Optional[SomeCRS]
 CoordList = List[Tuple[float, float]]
 
+# Shapely 2 operates on arrays of geometries
+_SHAPELY_VECTORISED = LooseVersion(shapely.__version__) >= LooseVersion("2.0")
+
 # pylint: disable=too-many-lines
 
 
@@ -757,6 +761,57 @@ def common_crs(geoms: Iterable[Geometry]) -> Optional[CRS]:
     return ref
 
 
+def batch_to_crs(geoms: Iterable[Geometry],
+                 crs: SomeCRS,
+                 resolution: Optional[float] = None) -> List[Geometry]:
+    """
+    Convert many geometries to a different Coordinate Reference System.
+
+    Equivalent to ``[g.to_crs(crs, resolution) for g in geoms]``, but the coordinates of all geometries
+    sharing a source CRS are segmented and reprojected together, in a single call into pyproj.
+
+    :param geoms: Geometries to convert. Each must have a CRS.
+    :param crs: CRS to convert to
+    :param resolution: Subdivide the geometries such that they have no segment longer than the given
+                       distance. Defaults to 1 degree for geographic and 100km for projected source CRSs.
+                       To disable completely use Infinity float('+inf')
+    :return: Converted geometries, in the same order
+    """
+    crs = _norm_crs_or_error(crs)
+    geoms = list(geoms)
+    if not _SHAPELY_VECTORISED:
+        return [g.to_crs(crs, resolution) for g in geoms]
+
+    out: List[Optional[Geometry]] = [None] * len(geoms)
+    by_crs: Dict[CRS, List[int]] = {}
+    for i, g in enumerate(geoms):
+        if g.crs is None:
+            raise ValueError("Cannot project geometries without CRS")
+        if g.crs == crs:
+            out[i] = g
+        else:
+            by_crs.setdefault(g.crs, []).append(i)
+
+    for src_crs, idxs in by_crs.items():
+        src = numpy.array([geoms[i].geom for i in idxs], dtype=object)
+        res = resolution
+        if res is None:
+            res = 1 if src_crs.geographic else 100000
+        if math.isfinite(res):
+            src = shapely.segmentize(src, res)
+
+        transform = src_crs.transformer_to_crs(crs)
+
+        def transform_xy(xy: numpy.ndarray) -> numpy.ndarray:
+            x, y = transform(xy[:, 0], xy[:, 1])
+            return numpy.stack([x, y], axis=-1)
+
+        for i, g in zip(idxs, shapely.transform(src, transform_xy)):
+            out[i] = Geometry(g, crs)
+
+    return cast(List[Geometry], out)
+
+
 def projected_lon(crs: MaybeCRS,
                   lon: float,
                   lat: Tuple[float, float] = (-90.0, 90.0),
@@ -1227,6 +1282,32 @@ def bounding_box_in_pixel_domain(geobox: GeoBox, reference: GeoBox) -> BoundingB
     return BoundingBox(tx, ty, tx + geobox.width, ty + geobox.height)
 
 
+def _pixel_domain_bounds(geoboxes: List[GeoBox], reference: GeoBox) -> numpy.ndarray:
+    """
+    Vectorised :func:`bounding_box_in_pixel_domain`, returns an array of ``(left, bottom, right, top)`` rows.
+    """
+    tol = 1.e-8
+
+    if any(geobox.crs is not reference.crs and geobox.crs != reference.crs for geobox in geoboxes):
+        raise ValueError("Cannot combine geoboxes in different CRSs")
+
+    # rows of (a, b, c, d, e, f) of `~reference.affine * geobox.affine`
+    inv = numpy.array(tuple(~reference.affine)).reshape(3, 3)
+    affines = numpy.array([tuple(geobox.affine) for geobox in geoboxes]).reshape(-1, 3, 3)
+    a, b, c, d, e, f = numpy.matmul(inv, affines)[:, :2].reshape(-1, 6).T
+
+    def almost_int(x):
+        return numpy.abs(x - numpy.round(x)) < tol
+
+    if not (numpy.isclose(a, 1) & numpy.isclose(b, 0) & almost_int(c) &
+            numpy.isclose(d, 0) & numpy.isclose(e, 1) & almost_int(f)).all():
+        raise ValueError("Incompatible grids")
+
+    tx, ty = numpy.round(c).astype('int64'), numpy.round(f).astype('int64')
+    shapes = numpy.array([geobox.shape for geobox in geoboxes], dtype='int64').reshape(-1, 2)
+    return numpy.stack([tx, ty, tx + shapes[:, 1], ty + shapes[:, 0]], axis=1)
+
+
 def geobox_union_conservative(geoboxes: List[GeoBox]) -> GeoBox:
     """ Union of geoboxes. Fails whenever incompatible grids are encountered. """
     if len(geoboxes) == 0:
@@ -1234,8 +1315,8 @@ def geobox_union_conservative(geoboxes: List[GeoBox]) -> GeoBox:
 
     reference, *_ = geoboxes
 
-    bbox = bbox_union(bounding_box_in_pixel_domain(geobox, reference=reference)
-                      for geobox in geoboxes)
+    bounds = _pixel_domain_bounds(geoboxes, reference)
+    bbox = BoundingBox(*bounds[:, :2].min(axis=0).tolist(), *bounds[:, 2:].max(axis=0).tolist())
 
     affine = reference.affine * Affine.translation(*bbox[:2])
 
@@ -1251,8 +1332,8 @@ def geobox_intersection_conservative(geoboxes: List[GeoBox]) -> GeoBox:
 
     reference, *_ = geoboxes
 
-    bbox = bbox_intersection(bounding_box_in_pixel_domain(geobox, reference=reference)
-                             for geobox in geoboxes)
+    bounds = _pixel_domain_bounds(geoboxes, reference)
+    bbox = BoundingBox(*bounds[:, :2].max(axis=0).tolist(), *bounds[:, 2:].min(axis=0).tolist())
 
     # standardise empty geobox representation
     if bbox.left > bbox.right:
@@ -2,17 +2,67 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
-from typing import Union, Optional
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from distutils.version import LooseVersion
+from typing import Any, Dict, Tuple, Union, Optional
 import rasterio.warp  # type: ignore[import]
 import rasterio.crs   # type: ignore[import]
 import numpy as np
 from affine import Affine
 from . import GeoBox
+from .tools import is_affine_st
 
 Resampling = Union[str, int, rasterio.warp.Resampling]  # pylint: disable=invalid-name
 Nodata = Optional[Union[int, float]]  # pylint: disable=invalid-name
 _WRP_CRS = rasterio.crs.CRS.from_epsg(3857)
 
+#: Maximum number of CRS pairs to keep warp options for.
+WARP_CACHE_SIZE = 128
+#: Error (in source pixels) allowed for GDAL's approximate coordinate transformer.
+WARP_TOLERANCE = 0.125
+
+#: Resampling modes implemented by :func:`warp_affine_np`.
+NP_RESAMPLING = ('nearest', 'bilinear', 'average')
+
+# GDAL warps Int8 natively since 3.7, older versions need a round-trip through int16
+_GDAL_INT8 = LooseVersion(rasterio.__gdal_version__) >= LooseVersion("3.7")
+
+
+@functools.lru_cache(maxsize=WARP_CACHE_SIZE)
+def _rio_crs(crs: str) -> rasterio.crs.CRS:
+    return rasterio.crs.CRS.from_user_input(crs)
+
+
+@functools.lru_cache(maxsize=WARP_CACHE_SIZE)
+def warp_options(src_crs: str, dst_crs: str) -> Dict[str, Any]:
+    """
+    Keyword arguments for ``rasterio.warp.reproject`` from one CRS to another.
+
+    Cached by CRS pair, so the CRS definitions are parsed by GDAL once rather than on every call.
+    The returned dictionary is shared, don't modify it.
+    """
+    src = _rio_crs(src_crs)
+    dst = src if dst_crs == src_crs else _rio_crs(dst_crs)
+    return dict(src_crs=src, dst_crs=dst, tolerance=WARP_TOLERANCE)
+
+
+def _int8_compatible(src: np.ndarray, dst: np.ndarray,
+                     src_nodata: Nodata, dst_nodata: Nodata) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Promote int8 arrays to int16 if GDAL can't warp them directly.
+    """
+    if src.dtype.name != 'int8' and dst.dtype.name != 'int8':
+        return src, dst
+    if _GDAL_INT8 and all(nodata is None or -128 <= nodata <= 127 for nodata in (src_nodata, dst_nodata)):
+        return src, dst
+
+    if src.dtype.name == 'int8':
+        src = src.astype('int16')
+    if dst.dtype.name == 'int8':
+        dst = dst.astype('int16')
+    return src, dst
+
 
 def resampling_s2rio(name: str) -> rasterio.warp.Resampling:
     """
@@ -62,14 +112,7 @@ def warp_affine_rio(src: np.ndarray,
     if isinstance(resampling, str):
         resampling = resampling_s2rio(resampling)
 
-    # GDAL support for int8 is patchy, warp doesn't support it, so we need to convert to int16
-    if src.dtype.name == 'int8':
-        src = src.astype('int16')
-
-    if dst.dtype.name == 'int8':
-        _dst = dst.astype('int16')
-    else:
-        _dst = dst
+    src, _dst = _int8_compatible(src, dst, src_nodata, dst_nodata)
 
     rasterio.warp.reproject(src,
                             _dst,
@@ -89,15 +132,190 @@ def warp_affine_rio(src: np.ndarray,
     return dst
 
 
+def _resampling_name(resampling: Resampling) -> str:
+    if isinstance(resampling, str):
+        return resampling.lower()
+    return rasterio.warp.Resampling(resampling).name
+
+
+def _axis_taps(n: int, scale: float, offset: float, src_n: int,
+               kernel: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Source pixels contributing to each output pixel along one axis, and their weights.
+
+    Follows GDAL's warp kernels: bilinear is a triangle kernel widened by the scale factor when
+    downsampling, average weights source pixels by their overlap with the output pixel.
+
+    :param      n: Number of output pixels
+    :param  scale: Output to source pixel scale
+    :param offset: Source coordinate of the output's left (top) edge
+    :param  src_n: Number of source pixels
+    :returns: ``(index, weight, inside)``: ``(n, K)`` source indexes and weights, and whether
+              each output pixel is covered by the source
+    """
+    centre = scale*(np.arange(n) + 0.5) + offset
+    s = abs(scale)
+    inside = (centre >= 0) & (centre < src_n)
+
+    if kernel == 'nearest':
+        idx = np.floor(centre + 1e-10).astype('int64')[:, None]
+        weight = np.ones(idx.shape)
+    elif kernel == 'bilinear':
+        r = max(s, 1.0)
+        k = int(np.ceil(r))
+        pc = centre - 0.5
+        idx = np.floor(pc).astype('int64')[:, None] + np.arange(1 - k, k + 1)
+        weight = np.maximum(0, 1 - np.abs(idx - pc[:, None])/r)
+    else:
+        lo, hi = centre - s/2, centre + s/2
+        idx = np.floor(lo).astype('int64')[:, None] + np.arange(int(np.ceil(s)) + 1)
+        weight = np.maximum(0, np.minimum(hi[:, None], idx + 1) - np.maximum(lo[:, None], idx))
+        # as GDAL: the part of the footprint outside the image goes to the edge pixel
+        inside = (hi >= 0) & (lo < src_n)
+        return np.clip(idx, 0, src_n - 1), weight, inside
+
+    weight = np.where((idx < 0) | (idx >= src_n), 0, weight)
+    return np.clip(idx, 0, src_n - 1), weight, inside
+
+
+def _apply_taps(data: np.ndarray, idx: np.ndarray, weight: np.ndarray, axis: int) -> np.ndarray:
+    out = None
+    for k in range(idx.shape[1]):
+        w = weight[:, k]
+        if not w.any():
+            continue
+        term = np.take(data, idx[:, k], axis=axis).astype('float64')
+        term *= w[:, None] if axis == 0 else w[None, :]
+        if out is None:
+            out = term
+        else:
+            out += term
+    if out is None:
+        shape = list(data.shape)
+        shape[axis] = idx.shape[0]
+        out = np.zeros(shape)
+    return out
+
+
+def _valid_pixels(src: np.ndarray, nodata: Nodata) -> Optional[np.ndarray]:
+    if nodata is None:
+        return None
+    if np.isnan(nodata):
+        return ~np.isnan(src)
+    return src != nodata
+
+
+def warp_affine_np(src: np.ndarray,
+                   dst: np.ndarray,
+                   A: Affine,
+                   resampling: Resampling,
+                   src_nodata: Nodata = None,
+                   dst_nodata: Nodata = None,
+                   num_threads: int = 1) -> np.ndarray:
+    """
+    Perform scale and translation only Affine warp with NumPy.
+
+    Supports ``nearest``, ``bilinear`` and ``average`` resampling, with the same semantics as GDAL:
+    source pixels equal to ``src_nodata`` are ignored, output pixels with no valid source pixels
+    are set to ``dst_nodata`` (``src_nodata`` or 0 if not set).
+
+    :param         src: image as ndarray
+    :param         dst: image as ndarray, written in place
+    :param           A: Affine transform with no rotation or shear, maps from dst_coords to src_coords
+    :param  resampling: str|rasterio.warp.Resampling resampling strategy
+    :param  src_nodata: Value representing "no data" in the source image
+    :param  dst_nodata: Value to represent "no data" in the destination image
+    :param num_threads: Process blocks of output rows on this many threads
+
+    :returns: dst
+    """
+    if not is_affine_st(A):
+        raise ValueError('Only scale and translation transforms are supported')
+    kernel = _resampling_name(resampling)
+    if kernel not in NP_RESAMPLING:
+        raise ValueError('Unsupported resampling: {}'.format(resampling))
+
+    ny, nx = dst.shape
+    iy, wy, inside_y = _axis_taps(ny, A.e, A.f, src.shape[0], kernel)
+    ix, wx, inside_x = _axis_taps(nx, A.a, A.c, src.shape[1], kernel)
+    valid = _valid_pixels(src, src_nodata)
+    data = src if valid is None or kernel == 'nearest' else np.where(valid, src, 0)
+    if kernel == 'bilinear':
+        # as GDAL, skip output pixels with invalid source pixel under their centre
+        cy, *_ = _axis_taps(ny, A.e, A.f, src.shape[0], 'nearest')
+        cx, *_ = _axis_taps(nx, A.a, A.c, src.shape[1], 'nearest')
+
+    if dst_nodata is None:
+        dst_nodata = 0 if src_nodata is None else src_nodata
+    round_values = dst.dtype.kind in 'iu'
+    if round_values:
+        info = np.iinfo(dst.dtype)
+
+    def warp_rows(rows: slice) -> None:
+        ok = inside_y[rows, None] & inside_x[None, :]
+        if kernel == 'nearest':
+            out = src[iy[rows, 0]][:, ix[:, 0]]
+            if valid is not None:
+                ok &= valid[iy[rows, 0]][:, ix[:, 0]]
+        else:
+            if valid is None:
+                den = wy[rows].sum(axis=1)[:, None]*wx.sum(axis=1)[None, :]
+            else:
+                den = _apply_taps(_apply_taps(valid, iy[rows], wy[rows], 0), ix, wx, 1)
+                if kernel == 'bilinear':
+                    ok &= valid[cy[rows, 0]][:, cx[:, 0]]
+            out = _apply_taps(_apply_taps(data, iy[rows], wy[rows], 0), ix, wx, 1)
+            ok &= den > 1e-10
+            out = np.divide(out, den, out=out, where=ok)
+        if round_values and out.dtype.kind == 'f':
+            out = np.clip(np.floor(out + 0.5), info.min, info.max)
+        np.copyto(dst[rows], np.where(ok, out, dst_nodata), casting='unsafe')
+
+    if num_threads > 1 and ny >= 2*num_threads:
+        step = -(-ny // num_threads)
+        with ThreadPoolExecutor(max_workers=num_threads) as pool:
+            list(pool.map(warp_rows, [slice(y, y + step) for y in range(0, ny, step)]))
+    else:
+        warp_rows(slice(None))
+
+    return dst
+
+
+def _dst_inside_src(src: np.ndarray, dst: np.ndarray, A: Affine, tol: float = 1e-6) -> bool:
+    """
+    Whether the footprint of ``dst`` (mapped by ``A``) lies within ``src``.
+    """
+    (ny, nx), (src_ny, src_nx) = dst.shape, src.shape
+    xs = sorted([A.c, A.c + A.a*nx])
+    ys = sorted([A.f, A.f + A.e*ny])
+    return xs[0] >= -tol and xs[1] <= src_nx + tol and ys[0] >= -tol and ys[1] <= src_ny + tol
+
+
+def _can_warp_np(src: np.ndarray, dst: np.ndarray, A: Affine, resampling: Resampling, **kwargs) -> bool:
+    # Past the edges of the image GDAL scales its kernels by the clipped source window,
+    # which the NumPy kernels don't reproduce: only use them where they give the same result.
+    return (src.ndim == 2 and dst.ndim == 2
+            and src.dtype.kind in 'uif' and dst.dtype.kind in 'uif'
+            and set(kwargs) <= {'num_threads'}
+            and is_affine_st(A)
+            and _resampling_name(resampling) in NP_RESAMPLING
+            and _dst_inside_src(src, dst, A))
+
+
 def warp_affine(src: np.ndarray,
                 dst: np.ndarray,
                 A: Affine,
                 resampling: Resampling,
                 src_nodata: Nodata = None,
                 dst_nodata: Nodata = None,
+                backend: Optional[str] = None,
                 **kwargs) -> np.ndarray:
     """
-    Perform Affine warp using best available backend (GDAL via rasterio is the only one so far).
+    Perform Affine warp using best available backend.
+
+    Scale and translation only transforms with ``nearest``, ``bilinear`` or ``average`` resampling,
+    of a destination within the source image, are done with NumPy (:func:`warp_affine_np`),
+    everything else with GDAL via rasterio.
 
     :param        src: image as ndarray
     :param        dst: image as ndarray
@@ -105,15 +323,26 @@ def warp_affine(src: np.ndarray,
     :param resampling: str resampling strategy
     :param src_nodata: Value representing "no data" in the source image
     :param dst_nodata: Value to represent "no data" in the destination image
+    :param    backend: Force a backend: ``'numpy'`` or ``'rio'``
 
     :param     kwargs: any other args to pass to implementation
 
     :returns: dst
     """
-    return warp_affine_rio(src, dst, A, resampling,
-                           src_nodata=src_nodata,
-                           dst_nodata=dst_nodata,
-                           **kwargs)
+    if backend is None:
+        backend = 'numpy' if _can_warp_np(src, dst, A, resampling, **kwargs) else 'rio'
+
+    if backend == 'numpy':
+        return warp_affine_np(src, dst, A, resampling,
+                              src_nodata=src_nodata,
+                              dst_nodata=dst_nodata,
+                              **kwargs)
+    if backend == 'rio':
+        return warp_affine_rio(src, dst, A, resampling,
+                               src_nodata=src_nodata,
+                               dst_nodata=dst_nodata,
+                               **kwargs)
+    raise ValueError('Unknown warp backend: {}'.format(backend))
 
 
 def rio_reproject(src: np.ndarray,
@@ -142,25 +371,16 @@ def rio_reproject(src: np.ndarray,
     if isinstance(resampling, str):
         resampling = resampling_s2rio(resampling)
 
-    # GDAL support for int8 is patchy, warp doesn't support it, so we need to convert to int16
-    if src.dtype.name == 'int8':
-        src = src.astype('int16')
-
-    if dst.dtype.name == 'int8':
-        _dst = dst.astype('int16')
-    else:
-        _dst = dst
+    src, _dst = _int8_compatible(src, dst, src_nodata, dst_nodata)
 
     rasterio.warp.reproject(src,
                             _dst,
                             src_transform=s_gbox.transform,
                             dst_transform=d_gbox.transform,
-                            src_crs=str(s_gbox.crs),
-                            dst_crs=str(d_gbox.crs),
                             resampling=resampling,
                             src_nodata=src_nodata,
                             dst_nodata=dst_nodata,
-                            **kwargs)
+                            **{**warp_options(str(s_gbox.crs), str(d_gbox.crs)), **kwargs})
 
     if dst is not _dst:
         # int8 workaround copy pixels back to int8
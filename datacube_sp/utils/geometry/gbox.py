@@ -5,12 +5,12 @@
 """ Geometric operations on GeoBox class
 """
 
-from typing import Dict, Optional, Tuple, Iterable
+from typing import Dict, Iterator, List, Optional, Tuple, Iterable
 import itertools
 import math
 from affine import Affine
 
-from . import Geometry, GeoBox, BoundingBox
+from . import Geometry, GeoBox, BoundingBox, batch_to_crs
 from .tools import align_up
 from datacube_sp.utils.math import clamp
 
@@ -232,6 +232,19 @@ class GeoboxTiles():
             poly = polygon
         else:
             poly = polygon.to_crs(self._gbox.crs)
+        return self._tiles(poly)
+
+    def tiles_batch(self, polygons: Iterable[Geometry]) -> List[List[Tuple[int, int]]]:
+        """ Return tile indexes overlapping with each of the given geometries.
+
+        Geometries are reprojected to the CRS of the GeoBox together, see :func:`batch_to_crs`.
+        """
+        polygons = list(polygons)
+        if self._gbox.crs is not None:
+            polygons = batch_to_crs(polygons, self._gbox.crs)
+        return [list(self._tiles(poly)) for poly in polygons]
+
+    def _tiles(self, poly: Geometry) -> Iterator[Tuple[int, int]]:
         yy, xx = self.range_from_bbox(poly.boundingbox)
         for idx in itertools.product(yy, xx):
             gbox = self[idx]
@@ -9,7 +9,10 @@ The main functions are `make_mask(variable)` `describe_flags(variable)`
 """
 
 import collections
+import itertools
+import threading
 
+import numpy
 import pandas
 import xarray
 from xarray import DataArray, Dataset
@@ -19,6 +22,15 @@ from datacube_sp.utils.math import valid_mask
 
 FLAGS_ATTR_NAME = 'flags_definition'
 
+#: Number of compiled flag lookup tables kept by :func:`flags_lookup_table`
+FLAGS_LUT_CACHE_SIZE = 64
+
+_LUT_CACHE: 'collections.OrderedDict' = collections.OrderedDict()
+_LUT_LOCK = threading.Lock()
+
+# a table lookup costs about as much as testing this many bit patterns
+_BITWISE_TERMS = 2
+
 
 def list_flag_names(variable):
     """
@@ -94,6 +106,13 @@ def make_mask(variable, **flags):
 
     where `GOOD_PIXEL_FLAGS` is a dict of flag_name to True/False
 
+    A flag may also be given a list of values, any of which is accepted:
+
+    >>> make_mask(pqa, cloud_mask=['clear', 'water']) # doctest: +SKIP
+
+    Masks with several accepted values are evaluated with a single table lookup for 8 and 16 bit
+    data (see :func:`evaluate_flags`), lazily for dask backed data.
+
     :param variable:
     :type variable: xarray.Dataset or xarray.DataArray
     :param flags: list of boolean flags
@@ -101,9 +120,98 @@ def make_mask(variable, **flags):
     """
     flags_def = get_flags_def(variable)
 
-    mask, mask_value = create_mask_value(flags_def, **flags)
+    return xarray.apply_ufunc(evaluate_flags, variable, kwargs=dict(flags_def=flags_def, queries=(flags,)),
+                              dask='parallelized', output_dtypes=[bool])
+
+
+def _freeze(value):
+    """ Hashable version of a (JSON like) flags definition or query. """
+    if isinstance(value, collections.abc.Mapping):
+        return tuple(sorted((str(key), _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _flag_terms(flags_def, queries):
+    """
+    Expand flag queries into a list of ``(mask, value)`` pairs, a bit pattern
+    satisfies the queries if ``pattern & mask == value`` for any of them.
+    """
+    terms = []
+    for query in queries:
+        names = list(query)
+        choices = [query[name] if isinstance(query[name], (list, tuple, set, frozenset)) else [query[name]]
+                   for name in names]
+        for combination in itertools.product(*choices):
+            term = create_mask_value(flags_def, **dict(zip(names, combination)))
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+
+def _match_flags(codes, terms):
+    """ Which of the bit patterns in `codes` match any of the ``(mask, value)`` terms. """
+    result = numpy.zeros(codes.shape, dtype=bool)
+    for mask, value in terms:
+        result |= (codes & mask) == value
+    return result
+
+
+def flags_lookup_table(flags_def, *queries, nbits=16):
+    """
+    Compile flag conditions into a boolean lookup table over all `nbits` wide bit patterns.
+
+    Each query is a mapping of flag names to a value or a list of accepted values, with
+    all flags of a query required to match (AND). A bit pattern is accepted if any
+    query matches (OR).
+
+    Tables are cached per flags definition and queries, and are read-only.
+
+    :param flags_def: flags definition, as found in the ``flags_definition`` attribute
+    :param queries: mappings of flag name to flag value(s)
+    :param nbits: width of the masking variable, 8 or 16
+    :return: boolean array of length ``2**nbits``
+    """
+    key = (_freeze(flags_def), _freeze(queries), nbits)
+
+    with _LUT_LOCK:
+        lut = _LUT_CACHE.get(key)
+        if lut is not None:
+            _LUT_CACHE.move_to_end(key)
+            return lut
+
+    lut = _match_flags(numpy.arange(2 ** nbits, dtype='uint32'), _flag_terms(flags_def, queries))
+    lut.setflags(write=False)
+
+    with _LUT_LOCK:
+        _LUT_CACHE[key] = lut
+        while len(_LUT_CACHE) > FLAGS_LUT_CACHE_SIZE:
+            _LUT_CACHE.popitem(last=False)
+
+    return lut
+
+
+def evaluate_flags(data, flags_def, queries):
+    """
+    Boolean mask of the pixels of a bit-mask array satisfying any of the flag `queries`.
+
+    Queries that come down to a single bit pattern test are evaluated bitwise. Otherwise 8 and 16 bit
+    integer data is looked up in a table from :func:`flags_lookup_table`, in one pass over the data
+    however many flags and values are involved, and wider types are tested bitwise once per pattern.
+
+    :param numpy.ndarray data: bit-mask values
+    :param flags_def: flags definition
+    :param queries: mappings of flag name to flag value(s), see :func:`flags_lookup_table`
+    :return: boolean array of the same shape as `data`
+    """
+    data = numpy.asarray(data)
+    terms = _flag_terms(flags_def, queries)
+    if len(terms) > _BITWISE_TERMS and data.dtype.kind in 'ui' and data.dtype.itemsize <= 2:
+        lut = flags_lookup_table(flags_def, *queries, nbits=8 * data.dtype.itemsize)
+        return lut[data.view('u{}'.format(data.dtype.itemsize))]
 
-    return variable & mask == mask_value
+    return _match_flags(data, terms)
 
 
 def valid_data_mask(data):
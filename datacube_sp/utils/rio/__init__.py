@@ -13,8 +13,11 @@ from ._rio import (
     get_rio_env,
     set_default_rio_config,
     activate_from_config,
+    use_io_profile,
+    effective_rio_options,
     configure_s3_access,
 )
+from ._profile import IOProfile, IO_PROFILES, resolve_io_profile
 
 __all__ = (
     'activate_rio_env',
@@ -22,5 +25,10 @@ __all__ = (
     'get_rio_env',
     'set_default_rio_config',
     'activate_from_config',
+    'use_io_profile',
+    'effective_rio_options',
     'configure_s3_access',
+    'IOProfile',
+    'IO_PROFILES',
+    'resolve_io_profile',
 )
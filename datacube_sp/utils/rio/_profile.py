@@ -0,0 +1,108 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+""" Named sets of GDAL options tuned for different kinds of loads
+"""
+from typing import Any, Dict, Optional, Union
+
+_MB = 1 << 20
+
+#: GDAL options of the named IO profiles, ``cache_fraction`` of the available memory
+#: (bounded by ``cache_min``/``cache_max``) is given to the GDAL block cache.
+IO_PROFILES = {
+    # many concurrent reads of whole COGs from an object store
+    'cloud-bulk': dict(
+        cache_fraction=0.1,
+        options=dict(
+            GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
+            GDAL_HTTP_MULTIPLEX='YES',
+            GDAL_HTTP_VERSION='2',
+            GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
+            GDAL_HTTP_MAX_RETRY='10',
+            GDAL_HTTP_RETRY_DELAY='0.5',
+            VSI_CACHE='TRUE',
+            VSI_CACHE_SIZE=str(16 * _MB),
+            GDAL_NUM_THREADS='2',
+        )),
+    # local files, decoding rather than reading is the bottleneck, the OS caches file pages
+    'local-nvme': dict(
+        cache_fraction=0.25,
+        options=dict(
+            VSI_CACHE='FALSE',
+            GDAL_NUM_THREADS='ALL_CPUS',
+        )),
+    # few small reads (e.g. interactive use), fetch headers in one request and decode on all cores
+    'latency': dict(
+        cache_fraction=0.05,
+        options=dict(
+            GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
+            GDAL_HTTP_MULTIPLEX='YES',
+            GDAL_HTTP_VERSION='2',
+            GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
+            GDAL_INGESTED_BYTES_AT_OPEN='32768',
+            GDAL_HTTP_MAX_RETRY='3',
+            GDAL_HTTP_RETRY_DELAY='0.2',
+            VSI_CACHE='TRUE',
+            VSI_CACHE_SIZE=str(4 * _MB),
+            GDAL_NUM_THREADS='ALL_CPUS',
+        )),
+}  # type: Dict[str, Dict[str, Any]]
+
+_CACHE_MIN = 64 * _MB
+_CACHE_MAX = 4096 * _MB
+
+
+class IOProfile:
+    """
+    GDAL configuration options to apply in every thread doing IO for a load.
+
+    Compared by value, so that a thread only reconfigures GDAL when the profile changes,
+    including when the profile was pickled into a dask graph.
+
+    :param name: Name, for reporting
+    :param options: GDAL configuration options
+    """
+
+    def __init__(self, name: str, options: Dict[str, Any]):
+        self.name = name
+        self.options = dict(options)
+        self.key = (name, tuple(sorted((k, str(v)) for k, v in self.options.items())))
+
+    def __eq__(self, other):
+        return isinstance(other, IOProfile) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'IOProfile({!r}, {!r})'.format(self.name, self.options)
+
+
+def resolve_io_profile(profile: Union[None, str, IOProfile],
+                       available_memory: Optional[int] = None) -> Optional[IOProfile]:
+    """
+    Turn the name of one of the :data:`IO_PROFILES` into an :class:`IOProfile`.
+
+    The GDAL block cache (``GDAL_CACHEMAX``) is sized from the memory available to this
+    process. Note that GDAL has a single block cache per process, so concurrent loads with
+    different profiles share the most recently configured size.
+
+    :param profile: Profile name, or an :class:`IOProfile` (returned as is), or None
+    :param available_memory: Bytes of memory available, see :func:`datacube_sp.utils.dask.get_total_available_memory`
+    """
+    if profile is None or isinstance(profile, IOProfile):
+        return profile
+
+    spec = IO_PROFILES.get(profile)
+    if spec is None:
+        raise ValueError('Unknown io_profile {!r}, expected one of: {}'.format(profile, ', '.join(IO_PROFILES)))
+
+    if available_memory is None:
+        from datacube_sp.utils.dask import get_total_available_memory
+        available_memory = get_total_available_memory()
+
+    cache_size = int(available_memory * spec['cache_fraction'])
+    cache_size = max(_CACHE_MIN, min(_CACHE_MAX, cache_size))
+
+    return IOProfile(profile, dict(spec['options'], GDAL_CACHEMAX=cache_size))
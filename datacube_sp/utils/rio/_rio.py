@@ -5,6 +5,7 @@
 """ rasterio environment management tools
 """
 import threading
+from contextlib import contextmanager
 from types import SimpleNamespace
 import rasterio                                         # type: ignore[import]
 from rasterio.session import AWSSession, DummySession   # type: ignore[import]
@@ -17,6 +18,13 @@ _CFG = SimpleNamespace(aws=None, cloud_defaults=False, kwargs={}, epoch=0)
 
 SECRET_KEYS = ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN")
 
+# settings for reading COGs, see `cloud_defaults`
+_CLOUD_DEFAULTS = dict(
+    GDAL_DISABLE_READDIR_ON_OPEN="EMPTY_DIR",
+    GDAL_HTTP_MAX_RETRY="10",
+    GDAL_HTTP_RETRY_DELAY="0.5",
+)
+
 
 def _sanitize(opts, keys):
     return {k: (v if k not in keys else "xx..xx") for k, v in opts.items()}
@@ -24,11 +32,13 @@ def _sanitize(opts, keys):
 
 def _state(purge=False):
     """
-    .env   None| rasterio.Env
-    .epoch -1  | +Int
+    .env         None| rasterio.Env
+    .epoch       -1  | +Int
+    .profile     None| IOProfile to use for IO in this thread
+    .profile_key None| key of the IOProfile the environment was configured with
     """
     return thread_local_cache(
-        "__rio_state__", SimpleNamespace(env=None, epoch=-1), purge=purge
+        "__rio_state__", SimpleNamespace(env=None, epoch=-1, profile=None, profile_key=None), purge=purge
     )
 
 
@@ -89,15 +99,7 @@ def activate_rio_env(aws=None, cloud_defaults=False, **kwargs):
 
         session = AWSSession(**aws)
 
-    opts = (
-        dict(
-            GDAL_DISABLE_READDIR_ON_OPEN="EMPTY_DIR",
-            GDAL_HTTP_MAX_RETRY="10",
-            GDAL_HTTP_RETRY_DELAY="0.5",
-        )
-        if cloud_defaults
-        else {}
-    )
+    opts = dict(_CLOUD_DEFAULTS) if cloud_defaults else {}
 
     opts.update(**kwargs)
 
@@ -117,22 +119,61 @@ def activate_rio_env(aws=None, cloud_defaults=False, **kwargs):
 def activate_from_config():
     """ Check if this threads needs to reconfigure, then does reconfigure.
 
-    - Does nothing if this thread is already configured and configuration hasn't changed.
-    - Configures current thread with default rio settings
+    - Does nothing if this thread is already configured and neither the configuration
+      nor the IO profile of the thread (see :func:`use_io_profile`) have changed.
+    - Configures current thread with default rio settings, overridden by the IO profile
     """
     cfg = _CFG
     state = _state()
+    profile = state.profile
+    profile_key = None if profile is None else profile.key
 
-    if cfg.epoch != state.epoch:
+    if cfg.epoch != state.epoch or profile_key != state.profile_key:
+        opts = dict(cfg.kwargs)
+        if profile is not None:
+            opts.update(profile.options)
         ee = activate_rio_env(
-            aws=cfg.aws, cloud_defaults=cfg.cloud_defaults, **cfg.kwargs
+            aws=cfg.aws, cloud_defaults=cfg.cloud_defaults, **opts
         )
         state.epoch = cfg.epoch
+        state.profile_key = profile_key
         return ee
 
     return None
 
 
+@contextmanager
+def use_io_profile(profile):
+    """ Use the GDAL options of an :class:`IOProfile` for files opened by this thread within the block.
+
+    The environment is only reconfigured by :func:`activate_from_config` when a file is opened, and
+    stays configured for the profile until a file is opened under another one.
+    Does nothing if ``profile`` is None.
+    """
+    if profile is None:
+        yield
+        return
+
+    state = _state()
+    previous, state.profile = state.profile, profile
+    try:
+        yield
+    finally:
+        state.profile = previous
+
+
+def effective_rio_options(profile=None):
+    """ GDAL options IO threads are configured with: the default configuration
+    (see :func:`set_default_rio_config`) overridden by the IO profile, with secrets hidden.
+    """
+    cfg = _CFG
+    opts = dict(_CLOUD_DEFAULTS) if cfg.cloud_defaults else {}
+    opts.update(cfg.kwargs)
+    if profile is not None:
+        opts.update(profile.options)
+    return _sanitize(opts, SECRET_KEYS)
+
+
 def set_default_rio_config(aws=None, cloud_defaults=False, **kwargs):
     """ Setup default configuration for rasterio/GDAL.
 
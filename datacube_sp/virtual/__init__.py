@@ -5,10 +5,10 @@
 from typing import Mapping, Any, cast
 import copy
 
-from .impl import VirtualProduct, Transformation, VirtualProductException
+from .impl import VirtualProduct, Transformation, StreamingStatistic, VirtualProductException
 from .impl import from_validated_recipe, virtual_product_kind
 from .transformations import MakeMask, ApplyMask, ToFloat, Rename, Select, Expressions
-from .transformations import XarrayReduction, year, month, week, day, earliest_time, fiscal_year
+from .transformations import XarrayReduction, StreamingReduction, year, month, week, day, earliest_time, fiscal_year
 from .catalog import Catalog
 from .utils import reject_keys
 
@@ -131,7 +131,8 @@ DEFAULT_RESOLVER = NameResolver({'transform': dict(make_mask=MakeMask,
                                                    rename=Rename,
                                                    select=Select,
                                                    expressions=Expressions),
-                                 'aggregate': dict(xarray_reduction=XarrayReduction),
+                                 'aggregate': dict(xarray_reduction=XarrayReduction,
+                                                   streaming_reduction=StreamingReduction),
                                  'aggregate/group_by': dict(year=year,
                                                             month=month,
                                                             week=week,
@@ -1,9 +1,19 @@
+import functools
+from typing import Any, Dict, List, Sequence, Tuple
+
 import lark
 import numpy
 
 from datacube_sp.utils.masking import valid_data_mask
+from datacube_sp.utils.math import valid_mask
+
+try:
+    import numexpr  # type: ignore[import]
+except ImportError:
+    numexpr = None
 
 
+@functools.lru_cache(maxsize=None)
 def formula_parser():
     return lark.Lark("""
                 ?expr: num_expr | bool_expr
@@ -140,3 +150,140 @@ def evaluate_nodata_mask(formula, env, parser, evaluator):
             return ~valid_data_mask(env[key.value])
 
     return NodataMaskEvaluator().transform(parser.parse(formula))
+
+
+# Infix operators for the rules of the formula grammar
+_BINARY_OPERATORS = {
+    'or_': '|', 'xor': '^', 'and_': '&',
+    'eq': '==', 'ne': '!=', 'le': '<=', 'ge': '>=', 'lt': '<', 'gt': '>',
+    'lshift': '<<', 'rshift': '>>',
+    'add': '+', 'sub': '-', 'mul': '*', 'truediv': '/', 'floordiv': '//', 'mod': '%', 'pow': '**',
+}
+_UNARY_OPERATORS = {'not_': 'not ', 'neg': '-', 'pos': '+', 'inv': '~'}
+# Operators that numexpr evaluates the same way as numpy
+_NUMEXPR_OPERATORS = {'or_', 'and_', 'eq', 'ne', 'le', 'ge', 'lt', 'gt',
+                      'add', 'sub', 'mul', 'truediv', 'pow', 'neg', 'pos'}
+
+
+def _to_source(tree, names: List[str]) -> Tuple[str, bool]:
+    """
+    Python source for a formula parse tree, and whether numexpr can evaluate it.
+    Variables are renamed to ``v0``, ``v1``, ..., in the order of ``names``.
+    """
+    rule = str(tree.data)
+    if rule == 'var_name':
+        name = tree.children[0].value
+        if name not in names:
+            names.append(name)
+        return 'v{}'.format(names.index(name)), True
+    if rule in ('float_literal', 'int_literal'):
+        return tree.children[0].value, True
+
+    args = [_to_source(child, names) for child in tree.children]
+    fusable = rule in _NUMEXPR_OPERATORS and all(arg_fusable for _, arg_fusable in args)
+    if rule in _UNARY_OPERATORS:
+        (arg, _), = args
+        return '({}({}))'.format(_UNARY_OPERATORS[rule], arg), fusable
+    (left, _), (right, _) = args
+    return '(({}) {} ({}))'.format(left, _BINARY_OPERATORS[rule], right), fusable
+
+
+class Formula:
+    """
+    A formula parsed once and compiled to Python byte code.
+
+    The result of a formula is nodata wherever any of the variables it uses is nodata,
+    so :meth:`evaluate_masked` computes the data and the nodata mask together.
+    Formulas that only use floating point variables and operators supported by ``numexpr``
+    are evaluated with ``numexpr`` (if installed) in one pass, without intermediate arrays.
+    """
+
+    def __init__(self, text: str):
+        names: List[str] = []
+        source, fusable = _to_source(formula_parser().parse(text), names)
+        self.text = text
+        #: Names of the variables used, in the order values are passed to :meth:`evaluate`
+        self.variables: Tuple[str, ...] = tuple(names)
+        self.source = source
+        self._code = compile(source, '<formula>', 'eval')
+        self._local_names = ['v{}'.format(i) for i in range(len(names))]
+        self._numexpr_source = source if fusable else None
+        # result type by input types
+        self._dtypes: Dict[Tuple[numpy.dtype, ...], numpy.dtype] = {}
+
+    def _locals(self, values: Sequence[Any]) -> Dict[str, Any]:
+        if len(values) != len(self.variables):
+            raise ValueError('Formula {!r} needs values for {}'.format(self.text, self.variables))
+        return dict(zip(self._local_names, values))
+
+    def _use_numexpr(self, values: Sequence[Any]) -> bool:
+        return (numexpr is not None and self._numexpr_source is not None and len(values) > 0
+                and all(isinstance(v, numpy.ndarray) and v.dtype.kind == 'f' for v in values))
+
+    def _eval(self, values: Sequence[Any]):
+        return eval(self._code, {'__builtins__': {}}, self._locals(values))  # pylint: disable=eval-used
+
+    def _result_dtype(self, dtypes: Tuple[numpy.dtype, ...]) -> numpy.dtype:
+        dtype = self._dtypes.get(dtypes)
+        if dtype is None:
+            dtype = self._dtypes[dtypes] = numpy.asarray(self._eval([numpy.array([], dtype=d) for d in dtypes])).dtype
+        return dtype
+
+    def evaluate(self, *values):
+        """
+        Evaluate the formula for values (numpy or xarray arrays, or scalars) of :attr:`variables`.
+        """
+        if self._use_numexpr(values):
+            result = numexpr.evaluate(self._numexpr_source, local_dict=self._locals(values))
+            # numexpr computes in double precision, keep the numpy result type
+            return result.astype(self._result_dtype(tuple(v.dtype for v in values)), copy=False)
+        return self._eval(values)
+
+    def dtype(self, env) -> numpy.dtype:
+        """
+        The type of the result for variables of the types in ``env`` (anything with a ``.dtype``, by name).
+        """
+        return self._result_dtype(tuple(numpy.dtype(env[name].dtype) for name in self.variables))
+
+    def evaluate_masked(self,
+                        values: Sequence[numpy.ndarray],
+                        nodata: Sequence[Any],
+                        dtype,
+                        fill) -> numpy.ndarray:
+        """
+        Evaluate the formula over numpy arrays, set to ``fill`` wherever any input is nodata.
+
+        :param values: Arrays for :attr:`variables`
+        :param nodata: Nodata values of the arrays (or ``None``)
+        :param  dtype: Output type
+        :param   fill: Output value for nodata
+        """
+        if self._use_numexpr(values):
+            local_dict = self._locals(values)
+            terms = []
+            for i, value in enumerate(nodata):
+                terms.append('(v{0} != v{0})'.format(i))
+                if value is not None and not numpy.isnan(value):
+                    local_dict['n{}'.format(i)] = value
+                    terms.append('(v{0} == n{0})'.format(i))
+            local_dict['fill'] = fill
+            result = numexpr.evaluate('where({}, fill, {})'.format(' | '.join(terms), self._numexpr_source),
+                                      local_dict=local_dict)
+            return result.astype(dtype, copy=False)
+
+        result = numpy.asarray(self.evaluate(*values)).astype(dtype, copy=False)
+        mask = None
+        for value, value_nodata in zip(values, nodata):
+            invalid = ~valid_mask(value, value_nodata)
+            mask = invalid if mask is None else mask | invalid
+        if mask is None:
+            return result
+        return numpy.where(mask, fill, result).astype(dtype, copy=False)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_formula(text: str) -> Formula:
+    """
+    Parse and compile a formula, reusing earlier results.
+    """
+    return Formula(text)
@@ -10,15 +10,19 @@ products implementing the same interface.
 
 from abc import ABC, abstractmethod
 from collections.abc import Mapping, Sequence
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 
-from typing import Any, Dict, List, Optional, cast
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, cast
 from typing import Mapping as TypeMapping
 
-import uuid
 import numpy
 import xarray
 import dask.array
-from dask.core import flatten
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
 import yaml
 
 from datacube_sp import Datacube
@@ -27,8 +31,9 @@ from datacube_sp.api.grid_workflow import _fast_slice
 from datacube_sp.api.query import Query, query_group_by
 from datacube_sp.model import Measurement, DatasetType
 from datacube_sp.model.utils import xr_apply, xr_iter, SafeDumper
-from datacube_sp.testutils.io import native_geobox
-from datacube_sp.utils.geometry import GeoBox, rio_reproject, geobox_union_conservative
+from datacube_sp.testutils.io import native_geobox_union
+from datacube_sp.utils.generic import ByteBudget
+from datacube_sp.utils.geometry import GeoBox, rio_reproject
 from datacube_sp.utils.geometry import compute_reproject_roi
 from datacube_sp.utils.geometry.gbox import GeoboxTiles
 from datacube_sp.utils.geometry._warp import resampling_s2rio
@@ -231,6 +236,29 @@ class Transformation(ABC):
         """
 
 
+class StreamingStatistic(Transformation):
+    """
+    A statistic that can be computed from its input one slice along `dim` at a time.
+
+    An aggregate product fetches the input of a streaming statistic one time slice at a time,
+    and if `tile_size` is set, one spatial tile at a time with up to `max_workers` tiles in flight,
+    so only the state of the statistic and a single slice per tile need to be in memory.
+    """
+
+    dim = 'time'
+    tile_size: Optional[Tuple[int, int]] = None
+    max_workers = 1
+
+    @abstractmethod
+    def reduce(self, slices: Iterable[xarray.Dataset]) -> xarray.Dataset:
+        """
+        Statistic of the concatenation of `slices` along `dim`, consumed in order.
+        """
+
+    def compute(self, data):
+        return self.reduce([data])
+
+
 class VirtualProduct(Mapping):
     """
     A recipe for combining loaded data from multiple datacube_sp products.
@@ -246,7 +274,8 @@ class VirtualProduct(Mapping):
 
     _GEOBOX_KEYS = {'output_crs', 'resolution', 'align'}
     _GROUPING_KEYS = {'group_by'}
-    _LOAD_KEYS = {'measurements', 'fuse_func', 'resampling', 'dask_chunks', 'like', 'skip_broken_datasets'}
+    _LOAD_KEYS = {'measurements', 'fuse_func', 'resampling', 'dask_chunks', 'like', 'skip_broken_datasets',
+                  'executor', 'fetch_memory_budget'}
     _ADDITIONAL_SEARCH_KEYS = {'dataset_predicate', 'ensure_location'}
 
     _NON_QUERY_KEYS = _GEOBOX_KEYS | _GROUPING_KEYS | _LOAD_KEYS
@@ -397,10 +426,8 @@ class Product(VirtualProduct):
 
         if grouped.load_natively:
             canonical_names = [product.canonical_measurement(measurement) for measurement in measurement_dicts]
-            dataset_geobox = geobox_union_conservative([native_geobox(ds,
-                                                                      measurements=canonical_names,
-                                                                      basis=merged.get('like'))
-                                                        for ds in grouped.box.sum().item()])
+            datasets = [ds for group in grouped.box.values.ravel() for ds in group]
+            dataset_geobox = native_geobox_union(datasets, measurements=canonical_names, basis=merged.get('like'))
 
             if grouped.geopolygon is not None:
                 reproject_roi = compute_reproject_roi(dataset_geobox,
@@ -540,8 +567,11 @@ class Aggregate(VirtualProduct):
                 yield func({key: value[i] for key, value in coords.items()}, array.values[i])
 
         def statistic(coords, value):
-            data = self._input.fetch(value, **load_settings)
-            result = self._statistic.compute(data)
+            if isinstance(self._statistic, StreamingStatistic):
+                result = self._reduce(value, **load_settings)
+            else:
+                data = self._input.fetch(value, **load_settings)
+                result = self._statistic.compute(data)
             result.coords[dim] = coords[dim]
             return result
 
@@ -550,6 +580,140 @@ class Aggregate(VirtualProduct):
         result.coords[dim].attrs.update(grouped.box[dim].attrs)
         return result
 
+    def _reduce(self, grouped: VirtualDatasetBox, **load_settings: Dict[str, Any]) -> xarray.Dataset:
+        """ Feed a group to a streaming statistic one time slice (and spatial tile) at a time. """
+        statistic = cast(StreamingStatistic, self._statistic)
+        settings = reject_keys(load_settings, ['dask_chunks'])
+
+        def reduce_tile(box):
+            return statistic.reduce(self._input.fetch(frame, **settings) for frame in box.split(statistic.dim))
+
+        if grouped.load_natively or statistic.tile_size is None:
+            return reduce_tile(grouped)
+
+        geobox = grouped.geobox
+        rois = list(_tile_slices(geobox.shape, statistic.tile_size))
+        tiles = [grouped[(slice(None),) * grouped.box.ndim + roi] for roi in rois]
+        with ThreadPoolExecutor(max_workers=statistic.max_workers) as executor:
+            parts = list(executor.map(reduce_tile, tiles))
+
+        first = parts[0]
+        data_vars = {}
+        for name, band in first.data_vars.items():
+            values = numpy.empty(band.shape[:-2] + geobox.shape, dtype=band.dtype)
+            for roi, part in zip(rois, parts):
+                values[(Ellipsis,) + roi] = part[name].values
+            data_vars[name] = (band.dims, values, band.attrs)
+
+        coords = {name: coord for name, coord in first.coords.items() if not set(coord.dims) & set(geobox.dims)}
+        coords.update(geobox.xr_coords())
+        return xarray.Dataset(data_vars, coords=coords, attrs=first.attrs)
+
+
+def _tile_slices(shape, tile_shape):
+    """ Slices into an array of `shape` for each tile of (at most) `tile_shape`. """
+    (ny, nx), (ty, tx) = shape, tile_shape
+    for y in range(0, ny, ty):
+        for x in range(0, nx, tx):
+            yield slice(y, min(y + ty, ny)), slice(x, min(x + tx, nx))
+
+
+def _fetch_nbytes(product: VirtualProduct, grouped: VirtualDatasetBox) -> int:
+    """ Size of the data `product.fetch(grouped)` loads into memory, if known. """
+    if grouped.load_natively:
+        return 0
+
+    measurements = product.output_measurements(grouped.product_definitions)
+    return int(numpy.prod(grouped.shape)) * sum(numpy.dtype(m.dtype).itemsize for m in measurements.values())
+
+
+_FETCH_POOL: Dict[int, ThreadPoolExecutor] = {}
+_FETCH_POOL_LOCK = threading.Lock()
+
+
+def _fetch_pool() -> Executor:
+    """ Thread pool shared by all fetches (of this process), of the default `concurrent.futures` size. """
+    pid = os.getpid()
+    with _FETCH_POOL_LOCK:
+        pool = _FETCH_POOL.get(pid)
+        if pool is None:
+            _FETCH_POOL.clear()
+            pool = _FETCH_POOL[pid] = ThreadPoolExecutor(thread_name_prefix='fetch')
+    return pool
+
+
+def _completed(futures: List[Future], run: Callable[[int], xarray.Dataset]) -> Iterator[Tuple[int, xarray.Dataset]]:
+    """
+    Positions and results of `futures` as they complete.
+
+    While none of them is running, the last one that hasn't started is cancelled and `run` here instead:
+    a fetch waiting for its children on a bounded executor then can't deadlock.
+    """
+    pending = {future: position for position, future in enumerate(futures)}
+    while pending:
+        done = [future for future in pending if future.done()]
+        if not done and not any(future.running() for future in pending):
+            stolen = next((future for future in reversed(list(pending)) if future.cancel()), None)
+            if stolen is not None:
+                position = pending.pop(stolen)
+                yield position, run(position)
+                continue
+        if not done:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
+
+
+@contextmanager
+def fetch_children(jobs: List[Tuple[VirtualProduct, VirtualDatasetBox]],
+                   **load_settings: Any) -> Iterator[Iterator[Tuple[int, xarray.Dataset]]]:
+    """
+    Fetch the children of a combinator concurrently.
+
+    The fetches run on the ``executor`` load setting (a `concurrent.futures.Executor`) if given,
+    otherwise on a thread pool shared by all fetches. Nested combinators use the same executor,
+    a fetch waiting for its children runs those that haven't started yet itself.
+
+    With the ``fetch_memory_budget`` load setting (in bytes, or a :class:`~datacube_sp.utils.generic.ByteBudget`
+    shared by concurrent fetches), the size of the (eagerly loaded) data of all the children is reserved
+    before any of them starts, and held until the caller is done combining them. It covers the children
+    of the children too.
+
+    .. code-block:: python
+
+        with fetch_children(jobs, **load_settings) as results:
+            for position, data in results:
+                ...
+
+    :param jobs: the child products and the dataset boxes to fetch from them
+    :return: positions in `jobs` and fetched data, in order of completion
+    """
+    executor = cast(Optional[Executor], load_settings.get('executor')) or _fetch_pool()
+    budget = load_settings.get('fetch_memory_budget')
+    if budget is not None and not isinstance(budget, ByteBudget):
+        budget = ByteBudget(budget)
+    if load_settings.get('dask_chunks') is not None:
+        budget = None
+    settings = reject_keys(load_settings, ['fetch_memory_budget'])
+
+    def run(position):
+        product, grouped = jobs[position]
+        return product.fetch(grouped, **settings)
+
+    nbytes = 0 if budget is None else sum(_fetch_nbytes(product, grouped) for product, grouped in jobs)
+    if budget is not None:
+        budget.acquire(nbytes)
+    try:
+        futures = [executor.submit(run, position) for position in range(len(jobs))]
+        try:
+            yield _completed(futures, run)
+        finally:
+            # (cancelled futures only count as done for `wait` once the executor dequeued them)
+            wait([future for future in futures if not future.cancel()])
+    finally:
+        if budget is not None:
+            budget.release(nbytes)
+
 
 class Collate(VirtualProduct):
     """ Stack observations from products with the same set of measurements. """
@@ -626,37 +790,41 @@ class Collate(VirtualProduct):
         def strip_source(_, value):
             return value['collate'][1]
 
-        def fetch_child(child, source_index, r):
-            if any([x == 0 for x in r.box.shape]):
-                # empty raster
-                return None
-            else:
-                result = child.fetch(r, **load_settings)
-                name = self.get('index_measurement_name')
-
-                if name is None:
-                    return result
-
-                # implication for dask?
-                measurement = Measurement(name=name, dtype='int8', nodata=-1, units='1')
-                shape = select_unique([result[band].shape for band in result.data_vars])
-                array = numpy.full(shape, source_index, dtype=measurement.dtype)
-                first = result[list(result.data_vars)[0]]
-                result[name] = xarray.DataArray(array, dims=first.dims, coords=first.coords,
-                                                name=name).assign_attrs(units=measurement.units,
-                                                                        nodata=measurement.nodata)
+        def add_source_index(result, source_index):
+            name = self.get('index_measurement_name')
+
+            if name is None:
                 return result
 
-        groups = [fetch_child(child, source_index, grouped.filter(is_from(source_index)).map(strip_source))
-                  for source_index, child in enumerate(self._children)]
+            # implication for dask?
+            measurement = Measurement(name=name, dtype='int8', nodata=-1, units='1')
+            shape = select_unique([result[band].shape for band in result.data_vars])
+            array = numpy.full(shape, source_index, dtype=measurement.dtype)
+            first = result[list(result.data_vars)[0]]
+            result[name] = xarray.DataArray(array, dims=first.dims, coords=first.coords,
+                                            name=name).assign_attrs(units=measurement.units,
+                                                                    nodata=measurement.nodata)
+            return result
 
-        non_empty = [g for g in groups if g is not None]
+        jobs = []
+        for source_index, child in enumerate(self._children):
+            r = grouped.filter(is_from(source_index)).map(strip_source)
+            # skip empty rasters
+            if not any([x == 0 for x in r.box.shape]):
+                jobs.append((source_index, child, r))
 
+        groups: List[Optional[xarray.Dataset]] = [None] * len(self._children)
         dim = self.get('dim', 'time')
 
-        result = xarray.concat(non_empty,
-                               dim=dim).sortby(dim).assign_attrs(**select_unique([g.attrs
-                                                                                  for g in non_empty]))
+        with fetch_children([(child, r) for _, child, r in jobs], **load_settings) as results:
+            for position, result in results:
+                source_index = jobs[position][0]
+                groups[source_index] = add_source_index(result, source_index)
+
+            non_empty = [g for g in groups if g is not None]
+            result = xarray.concat(non_empty,
+                                   dim=dim).sortby(dim).assign_attrs(**select_unique([g.attrs
+                                                                                      for g in non_empty]))
 
         # concat and sortby mess up chunking
         if 'dask_chunks' not in load_settings or dim not in load_settings['dask_chunks']:
@@ -731,10 +899,16 @@ class Juxtapose(VirtualProduct):
                                      grouped.load_natively, grouped.product_definitions,
                                      geopolygon=grouped.geopolygon)
 
-        groups = [child.fetch(fetch_recipe(source_index), **load_settings)
-                  for source_index, child in enumerate(self._children)]
+        children = self._children
+        groups: List[xarray.Dataset] = [xarray.Dataset()] * len(children)
+        with fetch_children([(child, fetch_recipe(source_index))
+                             for source_index, child in enumerate(children)],
+                            **load_settings) as results:
+            for source_index, data in results:
+                groups[source_index] = data
 
-        return xarray.merge(groups).assign_attrs(**select_unique([g.attrs for g in groups]))
+            result = xarray.merge(groups)
+            return result.assign_attrs(**select_unique([g.attrs for g in groups]))
 
 
 class Reproject(VirtualProduct):
@@ -838,12 +1012,19 @@ def reproject_band(band, geobox, resampling, dims, dask_chunks=None):
         data = reproject_array(band.data, band.nodata, band.geobox, geobox, resampling)
         return wrap_in_dataarray(data, band, geobox, dims)
 
-    dask_name = 'warp_{name}-{token}'.format(name=band.name, token=uuid.uuid4().hex)
-    dependencies = [band.data]
-
     spatial_chunks = tuple(dask_chunks.get(k, geobox.shape[i])
                            for i, k in enumerate(geobox.dims))
 
+    src = band.data
+    dask_name = 'warp_{name}-{token}'.format(name=band.name,
+                                             token=tokenize(src.name, [(g.shape, tuple(g.affine), str(g.crs))
+                                                                       for g in (band.geobox, geobox)],
+                                                            band.nodata, resampling, spatial_chunks))
+
+    # chunk boundaries of the source along y and x
+    src_bounds = [numpy.cumsum((0,) + chunks) for chunks in src.chunks[-2:]]
+    src_prefix = (src.name,) + (0,) * (src.ndim - 2)
+
     gt = GeoboxTiles(geobox, spatial_chunks)
     new_layer = {}
 
@@ -851,26 +1032,27 @@ def reproject_band(band, geobox, resampling, dims, dask_chunks=None):
         sub_geobox = gt[tile_index]
         # find the input array slice from the output geobox
         reproject_roi = compute_reproject_roi(band.geobox, sub_geobox, padding=1)
+        roi_src = reproject_roi.roi_src
 
-        # find the chunk from the input array with the slice index
-        subset_band = band[(...,) + reproject_roi.roi_src].chunk(-1)
-
-        if min(subset_band.shape) == 0:
+        if any(roi.stop <= roi.start for roi in roi_src):
             # pad the empty chunk
             new_layer[(dask_name,) + tile_index] = (numpy.full, sub_geobox.shape, band.nodata, band.dtype)
-        else:
-            # next 3 lines to generate the new graph
-            dependencies.append(subset_band.data)
-            # get the input dask array for the function `reproject_array`
-            band_key = list(flatten(subset_band.data.__dask_keys__()))[0]
-            # generate a new layer of dask graph with reroject
-            new_layer[(dask_name,) + tile_index] = (reproject_array,
-                                                    band_key, band.nodata, subset_band.geobox, sub_geobox, resampling)
-
-    # create a new graph with the additional layer and pack the graph into dask.array
+            continue
+
+        # the source chunks overlapping the slice, and the slice relative to the first of them
+        (iy0, iy1), (ix0, ix1) = [(numpy.searchsorted(bounds, roi.start, side='right') - 1,
+                                   numpy.searchsorted(bounds, roi.stop, side='left'))
+                                  for bounds, roi in zip(src_bounds, roi_src)]
+        blocks = [[src_prefix + (iy, ix) for ix in range(ix0, ix1)] for iy in range(iy0, iy1)]
+        crop = (slice(roi_src[0].start - src_bounds[0][iy0], roi_src[0].stop - src_bounds[0][iy0]),
+                slice(roi_src[1].start - src_bounds[1][ix0], roi_src[1].stop - src_bounds[1][ix0]))
+
+        new_layer[(dask_name,) + tile_index] = (reproject_blocks, blocks, crop, band.nodata,
+                                                band.geobox[roi_src], sub_geobox, resampling)
+
     # since only regular chunking is allowed at the higher level dask.array interface,
     # to manipulate the graph seems to be the easiest way to obtain a dask.array with irregular chunks after reproject
-    data = dask.array.Array(band.data.dask.from_collections(dask_name, new_layer, dependencies=dependencies),
+    data = dask.array.Array(HighLevelGraph.from_collections(dask_name, new_layer, dependencies=[src]),
                             dask_name,
                             chunks=spatial_chunks,
                             dtype=band.dtype,
@@ -879,6 +1061,16 @@ def reproject_band(band, geobox, resampling, dims, dask_chunks=None):
     return wrap_in_dataarray(data, band, geobox, dims)
 
 
+def reproject_blocks(blocks, crop, nodata, s_geobox, d_geobox, resampling):
+    """
+    Reproject the region `crop` of the source array made up of a 2-D grid of `blocks`,
+    the source chunks overlapping it.
+    """
+    src = numpy.block(blocks)
+    src = src.reshape(src.shape[-2:])[crop]
+    return reproject_array(src, nodata, s_geobox, d_geobox, resampling)
+
+
 def reproject_array(src, nodata, s_geobox, d_geobox, resampling):
     """ Reproject a numpy array. """
     dst = numpy.full(d_geobox.shape, fill_value=nodata, dtype=src.dtype)
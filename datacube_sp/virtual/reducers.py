@@ -0,0 +1,202 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Incremental per-pixel statistics.
+
+A reducer is fed equally shaped arrays (e.g. successive time slices of a band) one at a time
+through :meth:`Reducer.update` and only keeps a fixed amount of state per pixel, so the
+memory it needs does not grow with the number of observations.
+Pixels equal to ``nodata`` (or NaN) are not counted as observations.
+"""
+from typing import Dict, Type
+
+import numpy
+
+from datacube_sp.utils.math import valid_mask
+
+
+class Reducer:
+    """
+    Base class of the incremental statistics.
+
+    :param nodata: Value of the input that marks missing observations
+    """
+
+    def __init__(self, nodata=None):
+        self.nodata = nodata
+        self.count = None
+
+    def update(self, data):
+        """
+        Add the next observation of every pixel.
+        """
+        data = numpy.asarray(data)
+        if self.count is None:
+            self.count = numpy.zeros(data.shape, dtype='int32')
+            self._start(data)
+        elif data.shape != self.count.shape:
+            raise ValueError("expected an array of shape {}, got {}".format(self.count.shape, data.shape))
+
+        valid = valid_mask(data, self.nodata)
+        self._update(data, valid)
+        self.count += valid
+
+    def result(self, fill=numpy.nan):
+        """
+        The statistic of the observations so far.
+
+        :param fill: Value for pixels without any observations, ``None`` to leave them as they are
+        """
+        if self.count is None:
+            raise ValueError("no observations to reduce")
+
+        out = self._result()
+        if fill is not None:
+            out[self.count == 0] = fill
+        return out
+
+    def _start(self, data):
+        pass
+
+    def _update(self, data, valid):
+        pass
+
+    def _result(self):
+        raise NotImplementedError
+
+
+class Count(Reducer):
+    """ Number of valid observations. """
+
+    def _result(self):
+        return self.count.copy()
+
+    def result(self, fill=None):
+        return super().result(fill=fill)
+
+
+class Sum(Reducer):
+    """ Sum of valid observations, accumulated in double precision. """
+
+    def _start(self, data):
+        self.total = numpy.zeros(data.shape, dtype='float64')
+
+    def _update(self, data, valid):
+        self.total += numpy.where(valid, data, 0)
+
+    def _result(self):
+        return self.total.copy()
+
+
+class Mean(Sum):
+    """ Mean of valid observations. """
+
+    def _result(self):
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return self.total / self.count
+
+
+class Min(Reducer):
+    """ Smallest valid observation, in the input data type. """
+
+    def _start(self, data):
+        self.best = numpy.zeros_like(data)
+
+    def _better(self, data):
+        return data < self.best
+
+    def _update(self, data, valid):
+        replace = valid & ((self.count == 0) | self._better(data))
+        numpy.copyto(self.best, data, where=replace)
+
+    def _result(self):
+        return self.best.copy()
+
+
+class Max(Min):
+    """ Largest valid observation, in the input data type. """
+
+    def _better(self, data):
+        return data > self.best
+
+
+class Quantile(Reducer):
+    """
+    Approximate quantile of valid observations, by the P² algorithm of Jain and Chlamtac (1985).
+
+    Each pixel keeps five markers (their heights and positions), which are nudged towards the
+    minimum, ``q/2``, ``q``, ``(1+q)/2`` quantiles and the maximum as observations arrive.
+    Pixels with five or fewer observations get the exact (linearly interpolated) quantile.
+
+    :param q: Quantile to estimate, strictly between 0 and 1
+    """
+
+    def __init__(self, q=0.5, nodata=None):
+        if not 0 < q < 1:
+            raise ValueError("quantile must be between 0 and 1, got {}".format(q))
+        super().__init__(nodata=nodata)
+        self.q = q
+        self._increments = numpy.array([0, q / 2, q, (1 + q) / 2, 1]).reshape(5, 1)
+
+    def _start(self, data):
+        self.heights = numpy.full((5,) + data.shape, numpy.nan)
+        self.positions = numpy.empty((5,) + data.shape)
+        self.positions[:] = numpy.arange(1, 6).reshape((5,) + (1,) * data.ndim)
+
+    def _update(self, data, valid):
+        count = self.count
+
+        # the first five observations are just collected, and sorted once the fifth arrives
+        filling = valid & (count < 5)
+        if filling.any():
+            slot = count[filling]
+            heights = self.heights[:, filling]
+            heights[slot, numpy.arange(slot.size)] = data[filling]
+            full = slot == 4
+            heights[:, full] = numpy.sort(heights[:, full], axis=0)
+            self.heights[:, filling] = heights
+
+        tracking = valid & (count >= 5)
+        if tracking.any():
+            q = self.heights[:, tracking]
+            n = self.positions[:, tracking]
+            self._step(q, n, data[tracking].astype('float64'), count[tracking])
+            self.heights[:, tracking] = q
+            self.positions[:, tracking] = n
+
+    def _step(self, q, n, x, count):
+        # cell of the new observation, widening the extreme markers if needed
+        k = (x >= q[1:4]).sum(axis=0)
+        numpy.minimum(q[0], x, out=q[0])
+        numpy.maximum(q[4], x, out=q[4])
+        n += numpy.arange(5).reshape(5, 1) > k
+
+        desired = 1 + count * self._increments
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            step = numpy.where((d >= 1) & (n[i + 1] - n[i] > 1), 1.,
+                               numpy.where((d <= -1) & (n[i - 1] - n[i] < -1), -1., 0.))
+
+            # for pixels with a zero step both candidates below evaluate to q[i]
+            parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+            neighbour = numpy.where(step > 0, i + 1, i - 1)
+            q_next = numpy.take_along_axis(q, neighbour[numpy.newaxis], axis=0)[0]
+            n_next = numpy.take_along_axis(n, neighbour[numpy.newaxis], axis=0)[0]
+            linear = q[i] + step * (q_next - q[i]) / (n_next - n[i])
+
+            q[i] = numpy.where((q[i - 1] < parabolic) & (parabolic < q[i + 1]), parabolic, linear)
+            n[i] += step
+
+    def _result(self):
+        out = self.heights[2].copy()
+        exact = (self.count > 0) & (self.count <= 5)
+        if exact.any():
+            out[exact] = numpy.nanquantile(self.heights[:, exact], self.q, axis=0)
+        return out
+
+
+REDUCERS: Dict[str, Type[Reducer]] = dict(count=Count, sum=Sum, mean=Mean, min=Min, max=Max, quantile=Quantile)
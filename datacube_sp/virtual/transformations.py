@@ -14,9 +14,9 @@ from datacube_sp.utils.masking import mask_invalid_data as mask_invalid_data_pri
 
 from datacube_sp.utils.math import dtype_is_float
 
-from .impl import VirtualProductException, Transformation, Measurement
-from .expr import FormulaEvaluator, MaskEvaluator
-from .expr import formula_parser, evaluate_data, evaluate_nodata_mask, evaluate_type
+from .impl import VirtualProductException, Transformation, StreamingStatistic, Measurement
+from .expr import compile_formula
+from .reducers import REDUCERS
 
 
 def selective_apply_dict(dictionary, apply_to=None, key_map=None, value_map=None):
@@ -353,16 +353,11 @@ class Expressions(Transformation):
         self.masked = masked
 
     def measurements(self, input_measurements):
-        parser = formula_parser()
-
         def deduce_type(output_var, output_desc):
             if 'dtype' in output_desc:
                 return numpy.dtype(output_desc['dtype'])
 
-            formula = output_desc['formula']
-            result = evaluate_type(formula, input_measurements, parser, FormulaEvaluator)
-
-            return result.dtype
+            return compile_formula(output_desc['formula']).dtype(input_measurements)
 
         def measurement(output_var, output_desc):
             if isinstance(output_desc, str):
@@ -377,58 +372,59 @@ class Expressions(Transformation):
                 for output_var, output_desc in self.output.items()}
 
     def compute(self, data):
-        parser = formula_parser()
-
         def result(output_var, output_desc):
-            # pylint: disable=invalid-unary-operand-type
-
             if isinstance(output_desc, str):
                 # copy measurement over
                 return data[output_desc]
 
             nodata = output_desc.get('nodata')
-            dtype = output_desc.get('dtype')
+            formula = compile_formula(output_desc['formula'])
+            inputs = [data[name] for name in formula.variables]
 
-            formula = output_desc['formula']
-            result = evaluate_data(formula, data, parser, FormulaEvaluator)
-            result.attrs['crs'] = data.attrs['crs']
-            if nodata is not None:
-                result.attrs['nodata'] = nodata
-            result.attrs['units'] = output_desc.get('units', '1')
+            if 'dtype' in output_desc:
+                dtype = numpy.dtype(output_desc['dtype'])
+            else:
+                dtype = formula.dtype(data)
 
             if 'masked' in output_desc:
                 masked = output_desc['masked']
             else:
                 masked = self.masked
 
+            attrs = {'crs': data.attrs['crs'], 'units': output_desc.get('units', '1')}
+            if nodata is not None:
+                attrs['nodata'] = nodata
+
             if not masked:
-                if dtype is None:
-                    return result
-                return result.astype(dtype)
+                def kernel(*values):
+                    return numpy.asarray(formula.evaluate(*values)).astype(dtype, copy=False)
 
-            # masked output
-            if dtype is not None:
-                result = result.astype(dtype)
+            else:
+                if dtype == bool:
+                    # any operation on nodata should evaluate to False
+                    # omission of attrs['nodata'] is deliberate
+                    fill = False
 
-            dtype = result.dtype
-            mask = evaluate_nodata_mask(formula, data, parser, MaskEvaluator)
+                elif nodata is None:
+                    if not dtype_is_float(dtype):
+                        raise VirtualProductException("cannot mask without specified nodata")
 
-            if numpy.dtype(dtype) == bool:
-                # any operation on nodata should evaluate to False
-                # omission of attrs['nodata'] is deliberate
-                result = result.where(~mask, False)
+                    fill = numpy.nan
+                    attrs['nodata'] = numpy.nan
 
-            elif nodata is None:
-                if not dtype_is_float(dtype):
-                    raise VirtualProductException("cannot mask without specified nodata")
+                else:
+                    fill = nodata
 
-                result = result.where(~mask)
-                result.attrs['nodata'] = numpy.nan
+                input_nodata = [value.attrs.get('nodata') for value in inputs]
 
-            else:
-                result = result.where(~mask, nodata)
-                result.attrs['nodata'] = nodata
+                def kernel(*values):
+                    return formula.evaluate_masked(values, input_nodata, dtype, fill)
 
+            # evaluate data and mask in one task per chunk
+            result = xarray.apply_ufunc(kernel, *inputs,
+                                        dask='parallelized',
+                                        output_dtypes=[dtype])
+            result.attrs.update(attrs)
             return result
 
         return xarray.Dataset(data_vars={output_var: result(output_var, output_desc)
@@ -513,3 +509,91 @@ class XarrayReduction(Transformation):
             return func(value, dim=self.dim, **self.kwargs)
 
         return selective_apply(data, apply_to=self.apply_to, value_map=worker)
+
+
+class StreamingReduction(StreamingStatistic):
+    """
+    Reduce every band with an incremental statistic, one slice of the data at a time.
+
+    Unlike `XarrayReduction`, the data along `dim` never needs to be in memory at once.
+
+    :param method: one of 'count', 'sum', 'mean', 'min', 'max', 'median' or 'quantile'
+    :param q: the quantile to (approximately) compute for the 'quantile' method
+    :param dtype: output data type, defaults to the input type for 'min' and 'max', to 'int32' for 'count',
+                  and to a floating point type otherwise
+    :param tile_size: spatial tile shape ``(y, x)`` to fetch and reduce independently in an aggregate product
+    :param max_workers: number of tiles to reduce in parallel
+    """
+
+    def __init__(self, method=None, q=None, dtype=None, dim='time', tile_size=None, max_workers=1):
+        if method == 'median':
+            method, q = 'quantile', 0.5
+        if method not in REDUCERS:
+            raise VirtualProductException("unknown streaming reduction {}".format(method))
+        if (method == 'quantile') != (q is not None):
+            raise VirtualProductException("a quantile q is required for, and only for, the quantile method")
+
+        self.method = method
+        self.q = q
+        self.dtype = dtype
+        self.dim = dim
+        self.tile_size = None if tile_size is None else tuple(tile_size)
+        self.max_workers = max_workers
+
+    def _output(self, dtype, nodata):
+        """ Data type and nodata value of the output for an input band. """
+        if self.method in ('min', 'max'):
+            dtype = dtype if self.dtype is None else self.dtype
+            if nodata is None and dtype_is_float(dtype):
+                # mark pixels without observations, as xarray's min/max would
+                nodata = numpy.nan
+            return dtype, nodata
+        if self.method == 'count':
+            return (self.dtype or 'int32'), -1
+        if self.dtype is not None:
+            return self.dtype, numpy.nan
+        return (numpy.dtype(dtype).name if dtype_is_float(dtype) else 'float64'), numpy.nan
+
+    def _reducer(self, nodata):
+        if self.method == 'quantile':
+            return REDUCERS[self.method](q=self.q, nodata=nodata)
+        return REDUCERS[self.method](nodata=nodata)
+
+    def measurements(self, input_measurements):
+        def worker(_, value):
+            result = value.copy()
+            result['dtype'], result['nodata'] = self._output(value.dtype, value.nodata)
+            if self.method == 'count':
+                result['units'] = '1'
+                result.pop('flags_definition', None)
+            return Measurement(**result)
+
+        return selective_apply_dict(input_measurements, value_map=worker)
+
+    def reduce(self, slices):
+        template = None
+        reducers = {}
+
+        for data in slices:
+            if template is None:
+                template = data.isel(**{self.dim: 0}, drop=True)
+                reducers = {name: self._reducer(band.attrs.get('nodata'))
+                            for name, band in template.data_vars.items()}
+
+            for name, reducer in reducers.items():
+                for frame in data[name].transpose(self.dim, ...).values:
+                    reducer.update(frame)
+
+        if template is None:
+            raise VirtualProductException("no data to reduce")
+
+        data_vars = {}
+        for name, band in template.data_vars.items():
+            dtype, nodata = self._output(band.dtype, band.attrs.get('nodata'))
+            values = reducers[name].result(fill=None).astype(dtype)
+            if self.method != 'count' and nodata is not None:
+                values[reducers[name].count == 0] = nodata
+            data_vars[name] = xarray.DataArray(values, dims=band.dims, coords=band.coords,
+                                               attrs={**band.attrs, 'nodata': nodata})
+
+        return xarray.Dataset(data_vars, coords=template.coords, attrs=template.attrs)
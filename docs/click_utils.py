@@ -2,7 +2,6 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
-import pkg_resources
 from docutils.nodes import literal_block, section, title, make_id
 from sphinx.domains import Domain
 from docutils.parsers.rst import Directive
@@ -34,8 +33,8 @@ def find_script_callable_from_env(name, env):
 
 
 def find_script_callable(name):
-    return list(pkg_resources.iter_entry_points(
-        'console_scripts', name))[0].load()
+    from datacube_sp.drivers.driver_cache import iter_entry_points
+    return [ep for ep, _ in iter_entry_points('console_scripts') if ep.name == name][0].load()
 
 
 def generate_help_text(command, prefix):
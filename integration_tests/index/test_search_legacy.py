@@ -535,6 +535,27 @@ def test_search_returning(index: Index,
     assert label == pseudo_ls8_dataset.metadata_doc['ga_label']
 
 
+@pytest.mark.parametrize('datacube_env_name', ('datacube_sp', ))
+def test_search_to_arrow(index: Index,
+                         pseudo_ls8_type: Product,
+                         pseudo_ls8_dataset: Dataset,
+                         pseudo_ls8_dataset2: Dataset) -> None:
+    pytest.importorskip('pyarrow')
+    reader = index.datasets.search_to_arrow(('id', 'time', 'sat_path', 'extent'),
+                                            batch_size=1,
+                                            product=pseudo_ls8_type.name)
+    assert reader.schema.names == ['id', 'time', 'sat_path', 'extent']
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [1, 1]
+
+    rows = [row for batch in batches for row in batch.to_pylist()]
+    assert {row['id'] for row in rows} == {str(pseudo_ls8_dataset.id), str(pseudo_ls8_dataset2.id)}
+    for row in rows:
+        assert row['time']['begin'].tzinfo is not None
+        assert row['sat_path'] == {'begin': 116.0, 'end': 116.0}
+        assert row['extent'] is not None
+
+
 @pytest.mark.parametrize('datacube_env_name', ('datacube_sp', ))
 def test_search_returning_rows(index, pseudo_ls8_type,
                                pseudo_ls8_dataset, pseudo_ls8_dataset2,
@@ -787,6 +808,36 @@ def test_source_filter(clirunner, index, example_ls5_dataset_path):
         )
 
 
+@pytest.mark.parametrize('datacube_env_name', ('datacube_sp', ))
+@pytest.mark.usefixtures('ga_metadata_type',
+                         'indexed_ls5_scene_products')
+def test_lineage_closure(clirunner, index, example_ls5_dataset_path):
+    # Created before any lineage is indexed: maintained as datasets are added.
+    assert index.build_lineage_closure() == 0
+    clirunner(['dataset', 'add', str(example_ls5_dataset_path)])
+
+    nbar, = index.datasets.search_eager(product='ls5_nbar_scene')
+    d = index.datasets.get(nbar.id, include_sources=True)
+    assert list(d.sources.keys()) == ['level1']
+    level1 = d.sources['level1']
+    assert list(level1.sources.keys()) == ['satellite_telemetry_data']
+    assert list(level1.sources['satellite_telemetry_data'].sources) == []
+
+    assert index.datasets.search_eager(
+        product='ls5_nbar_scene',
+        source_filter={'product': 'ls5_level1_scene', 'gsi': 'ASA'}
+    ) == [nbar]
+    assert index.datasets.search_eager(
+        product='ls5_nbar_scene',
+        source_filter={'product': 'ls5_level1_scene', 'gsi': 'GREG'}
+    ) == []
+
+    # nbar -> level1 -> telemetry: three paths, the same when rebuilt from scratch
+    assert index.build_lineage_closure() == 3
+    result = clirunner(['system', 'lineage'])
+    assert 'Indexed 3 ancestor/descendant paths' in result.output
+
+
 @pytest.mark.parametrize('datacube_env_name', ('datacube_sp', ))
 def test_cli_info(index: Index,
                   clirunner: Any,
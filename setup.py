@@ -23,12 +23,14 @@ doc_require = [
 ]
 
 extras_require = {
-    'performance': ['ciso8601', 'bottleneck'],
+    'performance': ['ciso8601', 'bottleneck', 'numexpr'],
     'distributed': ['distributed', 'dask[distributed]'],
     'doc': doc_require,
     's3': ['boto3', 'botocore'],
     'test': tests_require,
     'cf': ['compliance-checker>=4.0.0'],
+    'arrow': ['pyarrow'],
+    'zarr': ['zarr<3', 'numcodecs', 'fsspec'],
 }
 
 extras_require['dev'] = sorted(set(sum([extras_require[k] for k in [
@@ -119,10 +121,12 @@ setup(
         ],
         'datacube_sp.plugins.io.read': [
             'netcdf = datacube_sp.drivers.netcdf.driver:reader_driver_init',
+            'zarr = datacube_sp.drivers.zarr.driver:reader_driver_init [zarr]',
             *extra_plugins['read'],
         ],
         'datacube_sp.plugins.io.write': [
             'netcdf = datacube_sp.drivers.netcdf.driver:writer_driver_init',
+            'zarr = datacube_sp.drivers.zarr.driver:writer_driver_init [zarr]',
             *extra_plugins['write'],
         ],
         'datacube_sp.plugins.index': [
@@ -11,6 +11,9 @@ from datacube_sp.utils.masking import (
     list_flag_names,
     create_mask_value,
     describe_variable_flags,
+    evaluate_flags,
+    flags_lookup_table,
+    make_mask,
     mask_to_dict,
     mask_invalid_data,
     valid_data_mask,
@@ -80,6 +83,63 @@ def test_ga_good_pixel(simple_var):
     assert create_mask_value(bits_def, ga_good_pixel=True) == (16383, 16383)
 
 
+@pytest.mark.parametrize('dtype', ['uint8', 'int16', 'uint16', 'int32'])
+def test_make_mask(dtype):
+    flags_def = VariableWithMultiBitFlags().flags_definition
+    data = np.random.default_rng(3).integers(0, 2 ** 16, size=(4, 5, 6)).astype(dtype)
+    var = DataArray(data, dims=('time', 'y', 'x'), attrs={'flags_definition': flags_def})
+
+    def reference(**flags):
+        mask, value = create_mask_value(flags_def, **flags)
+        return (data & mask) == value
+
+    flags = dict(water_confidence='water', filled=True)
+    result = make_mask(var, **flags)
+    assert result.dtype == bool
+    assert result.dims == var.dims
+    np.testing.assert_array_equal(result.values, reference(**flags))
+
+    # several accepted values of a flag, bitwise and with a lookup table
+    result = make_mask(var, veg_confidence=['maybe_veg', 'veg'], filled=False)
+    np.testing.assert_array_equal(result.values, (reference(veg_confidence='maybe_veg', filled=False) |
+                                                  reference(veg_confidence='veg', filled=False)))
+    values = ['water', 'maybe_water', 'no_water']
+    result = make_mask(var, water_confidence=values, filled=True)
+    np.testing.assert_array_equal(result.values, np.logical_or.reduce([reference(water_confidence=value, filled=True)
+                                                                       for value in values]))
+
+    # lazily
+    result = make_mask(var.chunk({'time': 1, 'x': 4}), **flags)
+    assert result.chunks == ((1,) * 4, (5,), (4, 2))
+    np.testing.assert_array_equal(result.compute().values, reference(**flags))
+
+    np.testing.assert_array_equal(make_mask(var.to_dataset(name='pq'), **flags).pq.values, reference(**flags))
+    np.testing.assert_array_equal(make_mask(var).values, np.ones(data.shape, dtype=bool))
+
+    with pytest.raises(ValueError):
+        make_mask(var, this_flag_doesnot_exist=9)
+
+
+def test_flags_lookup_table():
+    flags_def = VariableWithMultiBitFlags().flags_definition
+    query = dict(water_confidence='water')
+    lut = flags_lookup_table(flags_def, query)
+    assert lut.shape == (2 ** 16,)
+    assert flags_lookup_table(flags_def, dict(query)) is lut
+    assert flags_lookup_table(dict(flags_def), query, nbits=8).shape == (256,)
+    assert not lut.flags.writeable
+
+    # queries are OR-ed
+    queries = [query, dict(filled=True), dict(veg_confidence='maybe_veg')]
+    either = flags_lookup_table(flags_def, *queries)
+    codes = np.arange(2 ** 16)
+    np.testing.assert_array_equal(either, ((codes & 0b011000) == 0b011000) | ((codes & 1) == 1) |
+                                  ((codes & 0b110000000) == 0b100000000))
+    for dtype in ('uint16', 'int16', 'int64'):
+        np.testing.assert_array_equal(evaluate_flags(codes.astype(dtype), flags_def, queries), either)
+    assert not flags_lookup_table(flags_def).any()
+
+
 def test_describe_flags(simple_var):
     describe_variable_flags(simple_var)
     describe_variable_flags(simple_var, with_pandas=False)
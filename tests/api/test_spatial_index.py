@@ -0,0 +1,91 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+from types import SimpleNamespace
+
+import pytest
+from affine import Affine
+
+from datacube_sp.api.core import get_bounds, select_datasets_inside_polygon
+from datacube_sp.api.spatial_index import DatasetSpatialIndex
+from datacube_sp.utils.geometry import GeoBox, box, intersects, polygon as mk_polygon
+from datacube_sp.utils.geometry.gbox import GeoboxTiles
+
+
+def _datasets():
+    # unit boxes along a row, the last one in a different CRS
+    dss = [SimpleNamespace(name=i, extent=box(i, 0, i + 1, 1, 'EPSG:4326')) for i in range(5)]
+    dss.append(SimpleNamespace(name=5, extent=box(10, 0, 11, 1, 'EPSG:4326').to_crs('EPSG:3857')))
+    return dss
+
+
+def test_spatial_index_query():
+    dss = _datasets()
+    index = DatasetSpatialIndex(dss, 'EPSG:4326')
+    assert len(index) == 6
+    assert index.crs == 'EPSG:4326'
+
+    query = [box(1.5, 0.2, 2.5, 0.8, 'EPSG:4326'),
+             box(2, 0, 3, 1, 'EPSG:4326'),
+             box(20, 20, 21, 21, 'EPSG:4326'),
+             box(10.2, 0.2, 10.8, 0.8, 'EPSG:4326').to_crs('EPSG:3857')]
+    assert index.query(query) == [[1, 2], [1, 2, 3], [], [5]]
+    # touching boxes don't count in strict mode
+    assert index.query(query, strict=True) == [[1, 2], [2], [], [5]]
+    assert index.query([]) == []
+
+    for polygon in query:
+        assert index.intersecting(polygon, strict=True) == [
+            ds for ds in dss if intersects(polygon, ds.extent.to_crs(polygon.crs))]
+        assert index.intersecting(polygon) == [dss[i] for i in index.query([polygon, query[2]])[0]]
+    assert [ds.name for ds in select_datasets_inside_polygon(dss, query[1], batch_size=4)] == [2]
+
+
+def test_spatial_index_tree_built_lazily():
+    dss = _datasets()
+    index = DatasetSpatialIndex(dss, 'EPSG:4326')
+    bounds = index.bounds
+    assert bounds.left == pytest.approx(0)
+    assert bounds.right == pytest.approx(11)
+    assert get_bounds(dss, 'EPSG:4326').boundingbox == bounds
+    assert index._tree is None
+    # a single polygon doesn't need the tree
+    assert index.query([box(1.5, 0.2, 2.5, 0.8, 'EPSG:4326')]) == [[1, 2]]
+    assert index._tree is None
+    assert index.query([box(1.5, 0.2, 2.5, 0.8, 'EPSG:4326')] * 2) == [[1, 2], [1, 2]]
+    assert index._tree is not None
+
+
+def test_spatial_index_native_crs():
+    dss = _datasets()[:5]
+    index = DatasetSpatialIndex(dss)
+    assert index.crs == 'EPSG:4326'
+    assert index.extents == [ds.extent for ds in dss]
+    assert [ds.name for ds in index.intersecting(box(0.5, 0.5, 1.5, 1.5, 'EPSG:4326'))] == [0, 1]
+
+    empty = DatasetSpatialIndex([])
+    assert empty.crs is None
+    assert empty.query([box(0, 0, 1, 1, 'EPSG:4326')]) == [[]]
+
+
+def test_spatial_index_tiles():
+    dss = _datasets()
+    gbox = GeoBox(40, 10, Affine(0.1, 0, 0, 0, -0.1, 1), 'EPSG:4326')
+    gbt = GeoboxTiles(gbox, (5, 5))
+    tiles = DatasetSpatialIndex(dss, gbox.crs).tiles(gbt)
+
+    expect = {}
+    for ds in dss:
+        for idx in gbt.tiles(ds.extent):
+            expect.setdefault(idx, []).append(ds)
+    assert tiles == expect
+    assert [ds.name for ds in tiles[(0, 0)]] == [0]
+    assert [ds.name for ds in tiles[(1, 2)]] == [1]
+
+    # footprints touching a tile inside their bounding box are kept
+    # (an L shape sharing only an edge with tile (0, 1))
+    outline = [(0.1, 0.9), (0.5, 0.9), (0.5, 0.45), (0.9, 0.45), (0.9, 0.1), (0.1, 0.1), (0.1, 0.9)]
+    touching = SimpleNamespace(name='t', extent=mk_polygon(outline, 'EPSG:4326'))
+    tiles = DatasetSpatialIndex([touching], gbox.crs).tiles(gbt)
+    assert sorted(tiles) == [(0, 0), (0, 1), (1, 0), (1, 1)]
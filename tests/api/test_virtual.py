@@ -3,8 +3,12 @@
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from copy import deepcopy
+from types import SimpleNamespace
+import threading
+import time
 import warnings
 
 import pytest
@@ -14,12 +18,18 @@ import xarray as xr
 
 from datacube_sp.model import DatasetType, MetadataType, Dataset, GridSpec
 from datacube_sp.utils import geometry
+from datacube_sp.utils.generic import ByteBudget
 from datacube_sp.virtual import construct_from_yaml, catalog_from_yaml, VirtualProductException
 from datacube_sp.virtual import DEFAULT_RESOLVER, Transformation
-from datacube_sp.virtual.impl import Datacube
+from datacube_sp.virtual.impl import Datacube, fetch_children, reproject_band, reproject_array
+from datacube_sp.utils.geometry.gbox import GeoboxTiles
+from datacube_sp.testutils import mk_sample_xr_dataset
 
-from datacube_sp.virtual.expr import formula_parser, FormulaEvaluator, evaluate_data
-from datacube_sp.virtual.transformations import fiscal_year
+from datacube_sp.virtual import expr
+from datacube_sp.virtual.expr import (formula_parser, FormulaEvaluator, MaskEvaluator, evaluate_data,
+                                      evaluate_nodata_mask, compile_formula)
+from datacube_sp.virtual.transformations import fiscal_year, Expressions, StreamingReduction
+from datacube_sp.virtual.reducers import Count, Sum, Mean, Min, Max, Quantile
 
 
 ##########################################
@@ -42,6 +52,74 @@ def test_formula_parsing():
     assert not evaluate_data('(x > y) & (x < y)', env, parser, evaluator)
 
 
+def test_compiled_formula():
+    env = dict(x=4, y=2, true=True, false=False)
+    assert compile_formula('x') is compile_formula('x')
+    assert compile_formula('(x + y) * 3').variables == ('x', 'y')
+    assert compile_formula('(x + y) * 3').evaluate(4, 2) == 18
+    assert compile_formula('not (true == false)').evaluate(True, False)
+    assert compile_formula('x // y % 3 << 1').evaluate(9, 2) == 2
+
+    with pytest.raises(ValueError):
+        compile_formula('x + y').evaluate(1)
+
+    def sample(name, dtype, nodata):
+        values = numpy.arange(-3, 9, dtype=dtype).reshape(3, 4)
+        values[1, 1] = nodata
+        return xr.DataArray(values, dims=['y', 'x'], attrs={'nodata': nodata}, name=name)
+
+    env = xr.Dataset({'a': sample('a', 'float32', numpy.nan),
+                      'b': sample('b', 'float64', -1),
+                      'c': sample('c', 'int16', -3)})
+    formulas = ['a + b * 2', '(a - b) / (a + b)', 'a ** 2 > b', '-a + 1.5', '(a > 0) & (b < 4) | (a == 3)',
+                'c * 2 - a', 'c // 2 + c % 3', '~c']
+
+    for text in formulas:
+        formula = compile_formula(text)
+        old = evaluate_data(text, env, formula_parser(), FormulaEvaluator)
+        old_mask = evaluate_nodata_mask(text, env, formula_parser(), MaskEvaluator)
+        values = [env[name].values for name in formula.variables]
+        nodata = [env[name].nodata for name in formula.variables]
+        dtype = formula.dtype(env)
+        assert dtype == old.dtype
+
+        for use_numexpr in (True, False):
+            with mock.patch.object(expr, 'numexpr', expr.numexpr if use_numexpr else None):
+                numpy.testing.assert_allclose(formula.evaluate(*values), old.values, rtol=1e-6)
+                fill = False if dtype == bool else -99
+                result = formula.evaluate_masked(values, nodata, dtype, fill)
+                assert result.dtype == dtype
+                numpy.testing.assert_allclose(result, old.where(~old_mask, fill).values, rtol=1e-6)
+
+
+def test_expressions_compute():
+    data = xr.Dataset({'blue': xr.DataArray(numpy.array([[1, 2], [-999, 4]], dtype='int16'), dims=['y', 'x'],
+                                            attrs={'nodata': -999}),
+                       'green': xr.DataArray(numpy.array([[10., numpy.nan], [30., 40.]], dtype='float32'),
+                                             dims=['y', 'x'], attrs={'nodata': numpy.nan})},
+                      attrs={'crs': 'EPSG:3577'})
+    transform = Expressions(output={'sum': {'formula': 'blue + green'},
+                                    'bright': {'formula': 'green > 20'},
+                                    'scaled': {'formula': 'blue * 2', 'nodata': -1, 'dtype': 'int32'},
+                                    'raw': {'formula': 'blue * 2', 'masked': False},
+                                    'blue': 'blue'})
+
+    for chunks in (None, {'x': 1}):
+        result = transform.compute(data if chunks is None else data.chunk(chunks))
+        numpy.testing.assert_array_equal(result['sum'].values, [[11, numpy.nan], [numpy.nan, 44]])
+        assert numpy.isnan(result['sum'].nodata)
+        assert result['sum'].crs == 'EPSG:3577'
+        numpy.testing.assert_array_equal(result['bright'].values, [[False, False], [True, True]])
+        assert result['scaled'].dtype == numpy.dtype('int32')
+        numpy.testing.assert_array_equal(result['scaled'].values, [[2, 4], [-1, 8]])
+        assert result['scaled'].nodata == -1
+        numpy.testing.assert_array_equal(result['raw'].values, [[2, 4], [-1998, 8]])
+        assert 'blue' in result
+
+    with pytest.raises(VirtualProductException):
+        Expressions(output={'scaled': {'formula': 'blue * 2'}}).compute(data)
+
+
 PRODUCT_LIST = ['ls7_pq_albers', 'ls8_pq_albers', 'ls7_nbar_albers', 'ls8_nbar_albers']
 
 
@@ -333,6 +411,82 @@ def test_load_data(cloud_free_nbar, dc, query):
     assert numpy.array_equal(numpy.unique(data.source_index.values), numpy.array([0, 1]))
 
 
+def test_load_data_executor(cloud_free_nbar, dc, query):
+    with mock.patch('datacube_sp.virtual.impl.Datacube') as mock_datacube, \
+            ThreadPoolExecutor(max_workers=2) as executor:
+        mock_datacube.load_data = load_data
+        mock_datacube.group_datasets = group_datasets
+        data = cloud_free_nbar.load(dc, executor=executor, fetch_memory_budget=1, **query)
+
+    assert list(data.data_vars) == ['blue', 'green', 'source_index']
+    assert numpy.array_equal(numpy.unique(data.source_index.values), numpy.array([0, 1]))
+
+
+def test_fetch_children():
+    class Child:
+        def __init__(self, name, delay, children=()):
+            self.name = name
+            self.delay = delay
+            self.children = children
+
+        def output_measurements(self, product_definitions):
+            return {self.name: SimpleNamespace(dtype='int16')}
+
+        def fetch(self, grouped, **load_settings):
+            assert 'fetch_memory_budget' not in load_settings
+            if self.children:
+                with fetch_children([(child, grouped) for child in self.children], **load_settings) as results:
+                    return self.name + ''.join(sorted(name for _, name in results))
+            with lock:
+                running.append(self.name)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(self.delay)
+            with lock:
+                running.remove(self.name)
+            return self.name
+
+    def fetch_all(jobs, **load_settings):
+        with fetch_children(jobs, **load_settings) as results:
+            return list(results)
+
+    lock = threading.Lock()
+    running, peak = [], [0]
+    box = SimpleNamespace(load_natively=False, shape=(1, 10, 10), product_definitions={})
+    jobs = [(Child('a', 0.3), box), (Child('b', 0.1), box), (Child('c', 0.1), box)]
+
+    # results arrive as they complete
+    results = fetch_all(jobs)
+    assert sorted(results) == [(0, 'a'), (1, 'b'), (2, 'c')]
+    assert results[-1] == (0, 'a')
+    assert peak[0] == 3
+
+    # nested combinators share a bounded executor without deadlocking on it
+    nested = [(Child('x', 0, [Child('a', 0.1), Child('b', 0.1)]), box),
+              (Child('y', 0, [Child('c', 0.1), Child('d', 0.1, [Child('e', 0.1)])]), box)]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert sorted(fetch_all(nested, executor=executor)) == [(0, 'xab'), (1, 'ycde')]
+
+    # each fetch needs 3 * 200 bytes until its results are combined, so two don't fit in the budget at once
+    budget = ByteBudget(1000)
+    peak[0] = 0
+    executor = ThreadPoolExecutor(max_workers=1)
+    with fetch_children(jobs, fetch_memory_budget=budget, dask_chunks=None) as results:
+        assert budget.used == 600
+        other = executor.submit(fetch_all, jobs, fetch_memory_budget=budget)
+        assert sorted(results) == [(0, 'a'), (1, 'b'), (2, 'c')]
+        time.sleep(0.1)
+        assert not other.done()
+    assert sorted(other.result()) == [(0, 'a'), (1, 'b'), (2, 'c')]
+    executor.shutdown()
+    assert peak[0] == 3
+    assert budget.used == 0
+
+    # lazy loads are not limited
+    peak[0] = 0
+    fetch_all(jobs, fetch_memory_budget=1, dask_chunks={'time': 1})
+    assert peak[0] == 3
+
+
 def test_misspelled_product(dc, query):
     ls8_nbar = construct_from_yaml("product: ls8_nbar")
 
@@ -494,6 +648,153 @@ def test_aggregate(dc, query, catalog):
     assert data.time.shape == (2,)
 
 
+def load_data_values(*args, **kwargs):
+    sources, geobox, measurements = args
+
+    # a deterministic pattern of the pixel coordinates and time, with some nodata
+    result = load_data(*args, **kwargs)
+    days = sources.time.values.astype('datetime64[D]').astype('int64')
+    y, x = (numpy.floor(result[dim].values / 25).astype('int64') for dim in geobox.dims)
+    pattern = numpy.add.outer(y, 3 * x) % 97
+    for name in result.data_vars:
+        values = (pattern + days.reshape(-1, 1, 1) % 13).astype(result[name].dtype)
+        values[:, pattern % 11 == 0] = result[name].nodata
+        result[name].values[:] = values
+    return result
+
+
+def test_reducers():
+    rng = numpy.random.default_rng(42)
+    data = rng.integers(0, 100, size=(40, 3, 4)).astype('int16')
+    data[rng.random(data.shape) < 0.3] = -1
+    data[:, 0, 0] = -1
+    masked = numpy.where(data == -1, numpy.nan, data.astype('float64'))
+
+    reducers = [Count(nodata=-1), Sum(nodata=-1), Mean(nodata=-1), Min(nodata=-1), Max(nodata=-1)]
+    for frame in data:
+        for reducer in reducers:
+            reducer.update(frame)
+
+    count, total, mean, low, high = reducers
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        numpy.testing.assert_array_equal(count.result(), (data != -1).sum(axis=0))
+        numpy.testing.assert_allclose(total.result(), numpy.where(count.result() > 0, numpy.nansum(masked, axis=0),
+                                                                  numpy.nan))
+        numpy.testing.assert_allclose(mean.result(), numpy.nanmean(masked, axis=0))
+        assert low.result(fill=-1).dtype == numpy.dtype('int16')
+        numpy.testing.assert_array_equal(low.result(fill=-1), numpy.nan_to_num(numpy.nanmin(masked, axis=0), nan=-1))
+        numpy.testing.assert_array_equal(high.result(fill=-1), numpy.nan_to_num(numpy.nanmax(masked, axis=0), nan=-1))
+
+    with pytest.raises(ValueError):
+        count.update(data[0, :2])
+    with pytest.raises(ValueError):
+        Sum().result()
+    with pytest.raises(ValueError):
+        Quantile(q=1.5)
+
+
+def test_quantile_reducer():
+    # exact for up to five observations
+    data = numpy.array([[3., 1., numpy.nan], [5., numpy.nan, numpy.nan], [4., 2., numpy.nan],
+                        [1., numpy.nan, numpy.nan], [2., 7., numpy.nan]])
+    for q in (0.25, 0.5, 0.9):
+        reducer = Quantile(q=q)
+        for frame in data:
+            reducer.update(frame)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            numpy.testing.assert_allclose(reducer.result(), numpy.nanquantile(data, q, axis=0))
+
+    # and approximate after that
+    samples = numpy.random.default_rng(0).normal(size=(2000, 4, 5))
+    for q in (0.1, 0.5, 0.95):
+        reducer = Quantile(q=q)
+        for frame in samples:
+            reducer.update(frame)
+        numpy.testing.assert_allclose(reducer.result(), numpy.quantile(samples, q, axis=0), atol=0.15)
+
+
+def test_streaming_reduction():
+    values = numpy.arange(24, dtype='int16').reshape(4, 2, 3)
+    values[1, 0, 0] = -999
+    data = xr.Dataset({'blue': xr.DataArray(values, dims=['time', 'y', 'x'], attrs={'nodata': -999, 'units': '1'})},
+                      coords={'time': numpy.arange(4)}, attrs={'crs': 'EPSG:3577'})
+    masked = data.blue.where(data.blue != -999)
+
+    for method, expected in [('mean', masked.mean('time')), ('min', masked.min('time')),
+                             ('sum', masked.sum('time')), ('median', masked.median('time')),
+                             ('count', masked.count('time'))]:
+        result = StreamingReduction(method=method).compute(data)
+        assert 'time' not in result.blue.dims
+        assert result.attrs['crs'] == 'EPSG:3577'
+        numpy.testing.assert_allclose(result.blue.values, expected.values)
+
+    assert StreamingReduction(method='max').compute(data).blue.dtype == numpy.dtype('int16')
+    assert StreamingReduction(method='mean').compute(data).blue.dtype == numpy.dtype('float64')
+    assert StreamingReduction(method='mean', dtype='float32').compute(data).blue.dtype == numpy.dtype('float32')
+    assert StreamingReduction(method='count').compute(data).blue.nodata == -1
+
+    # feeding slices gives the same answer
+    sliced = StreamingReduction(method='mean').reduce(data.isel(time=[i]) for i in range(4))
+    numpy.testing.assert_allclose(sliced.blue.values, masked.mean('time').values)
+
+    # a pixel without valid observations is NaN for float outputs, also without a nodata value
+    floats = xr.Dataset({'blue': masked.astype('float32').assign_attrs(nodata=None)})
+    floats.blue[:, 1, 2] = numpy.nan
+    for method in ['min', 'max', 'mean']:
+        result = StreamingReduction(method=method).compute(floats)
+        numpy.testing.assert_allclose(result.blue.values, getattr(floats.blue, method)('time').values)
+        assert numpy.isnan(result.blue.values[1, 2])
+    assert numpy.isnan(StreamingReduction(method='max', dtype='float64').compute(floats).blue.nodata)
+
+    with pytest.raises(VirtualProductException):
+        StreamingReduction(method='mode')
+    with pytest.raises(VirtualProductException):
+        StreamingReduction(method='quantile')
+    with pytest.raises(VirtualProductException):
+        StreamingReduction(method='mean').reduce([])
+
+
+def test_aggregate_streaming(dc, query):
+    products = {product.name: product for product in dc.index.products.get_all()}
+
+    def aggregate(**settings):
+        return construct_from_yaml("""
+            group_by: month
+            input:
+                transform: to_float
+                input:
+                    collate:
+                      - product: ls7_nbar_albers
+                        measurements: [blue]
+                      - product: ls8_nbar_albers
+                        measurements: [blue]
+        """ + ''.join('\n            {}: {}'.format(key, value) for key, value in settings.items()))
+
+    reference = aggregate(aggregate='xarray_reduction', method='mean')
+    untiled = aggregate(aggregate='streaming_reduction', method='mean')
+    tiled = aggregate(aggregate='streaming_reduction', method='mean', tile_size='[16, 20]', max_workers=2)
+
+    assert tiled.output_measurements(products)['blue'].dtype == 'float32'
+
+    with mock.patch('datacube_sp.virtual.impl.Datacube') as mock_datacube, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        mock_datacube.load_data = load_data_values
+        mock_datacube.group_datasets = group_datasets
+        expected = reference.load(dc, **query)
+        results = [untiled.load(dc, **query), tiled.load(dc, **query)]
+
+    for result in results:
+        assert result.blue.shape == expected.blue.shape
+        assert result.blue.shape[1] > 16 and result.blue.shape[2] > 20
+        assert result.blue.dtype == expected.blue.dtype
+        numpy.testing.assert_array_equal(result.time.values, expected.time.values)
+        numpy.testing.assert_array_equal(result.x.values, expected.x.values)
+        numpy.testing.assert_allclose(result.blue.values, expected.blue.values, rtol=1e-6)
+        assert result.crs == expected.crs
+
+
 def test_register(dc, query):
     class BlueGreen(Transformation):
         def compute(self, data):
@@ -540,6 +841,38 @@ def test_reproject(dc, query, catalog):
     assert data.coords['y'].attrs['resolution'] == 30
 
 
+def test_reproject_band_chunks():
+    band = mk_sample_xr_dataset(crs='EPSG:3577', shape=(90, 110), resolution=(-25, 25),
+                                xy=(1500000, -3900000)).band
+    band.values[:] = numpy.random.default_rng(1).integers(0, 1000, size=band.shape)
+    band.values[:, 40:50, 60:70] = band.nodata
+    geobox = geometry.GeoBox.from_geopolygon(band.geobox.extent.to_crs('EPSG:32755'),
+                                             resolution=(-30, 30), crs='EPSG:32755')
+    dims = ('time', 'y', 'x')
+
+    # each output tile is warped from the source pixels around it
+    expected = numpy.full(geobox.shape, band.nodata, dtype=band.dtype)
+    gt = GeoboxTiles(geobox, (32, 40))
+    for iy, ix in numpy.ndindex(gt.shape):
+        tile = gt[iy, ix]
+        roi = geometry.compute_reproject_roi(band.geobox, tile, padding=1).roi_src
+        warped = reproject_array(band.values[0][roi], band.nodata, band.geobox[roi], tile, 'nearest')
+        expected[iy * 32:(iy + 1) * 32, ix * 40:(ix + 1) * 40] = warped
+
+    chunked = band.chunk({'time': 1, 'y': 20, 'x': 35})
+    result = reproject_band(chunked, geobox, 'nearest', dims, dask_chunks={'y': 32, 'x': 40})
+
+    assert result.data.chunksize[1:] == (32, 40)
+    assert result.data.name == reproject_band(chunked, geobox, 'nearest', dims,
+                                              dask_chunks={'y': 32, 'x': 40}).data.name
+    # one warp task per output tile, on top of the source chunks
+    [warp] = [name for name in result.data.dask.layers if name.startswith('warp_band-')]
+    assert len(result.data.dask.layers[warp]) == result.data.npartitions
+    assert len(result.data.dask) == 2 * result.data.npartitions + chunked.data.npartitions
+    numpy.testing.assert_array_equal(result.values[0], expected)
+    assert (expected == band.nodata).any() and (expected != band.nodata).any()
+
+
 def test_fiscal_year():
     """
     Test fiscal year function
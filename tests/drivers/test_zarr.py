@@ -0,0 +1,96 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+""" Tests for the zarr reader and writer drivers
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from datacube_sp.testutils import mk_sample_xr_dataset
+from datacube_sp.testutils.iodriver import mk_band
+
+zarr = pytest.importorskip('zarr')
+
+from datacube_sp.drivers.zarr import ZarrDataSource, write_dataset_to_zarr  # noqa: E402
+from datacube_sp.drivers.zarr._read import open_zarr_group  # noqa: E402
+from datacube_sp.drivers.zarr.driver import reader_driver_init, writer_driver_init  # noqa: E402
+
+
+def _sample(ntimes=3, shape=(50, 70)):
+    ds = mk_sample_xr_dataset(crs='EPSG:3577', shape=shape, resolution=(-25, 25), nodata=-999)
+    ds = xr.concat([ds] * ntimes, dim='time')
+    ds['time'] = np.arange(ntimes).astype('datetime64[D]').astype('datetime64[ns]')
+    ds.band.data[:] = np.arange(ds.band.size).reshape(ds.band.shape) % 1000
+    ds.band.data[:, :5, :5] = -999
+    return ds
+
+
+@pytest.mark.parametrize('chunks', [None, {'time': 1, 'y': 13, 'x': 30}])
+def test_zarr_roundtrip(tmp_path, chunks):
+    ds = _sample()
+    if chunks:
+        ds = ds.chunk(chunks)
+    uri = (tmp_path / 'unit.zarr').as_uri()
+    variable_params = {'band': {'chunksizes': (1, 20, 20), 'zlib': True, 'complevel': 3,
+                                'attrs': {'comment': 'test'}}}
+    write_dataset_to_zarr(ds, uri, global_attributes={'title': 'sample'}, variable_params=variable_params)
+
+    group = open_zarr_group(uri)
+    assert group.attrs['title'] == 'sample'
+    assert group['band'].chunks == (1, 20, 20)
+    assert group['band'].compressor.codec_id == 'zlib'
+    assert group['band'].attrs['comment'] == 'test'
+
+    xx = xr.open_zarr(str(tmp_path / 'unit.zarr'), mask_and_scale=False)
+    np.testing.assert_array_equal(xx.band.values, ds.band.values)
+    assert xx.band.attrs['nodata'] == -999
+
+    for t in range(3):
+        with ZarrDataSource(mk_band('band', '{}#part={}'.format(uri, t), format='zarr')).open() as rdr:
+            assert rdr.shape == (50, 70)
+            assert rdr.dtype == np.int16
+            assert rdr.nodata == -999
+            assert rdr.crs == 'EPSG:3577'
+            assert rdr.transform == ds.geobox.transform
+            np.testing.assert_array_equal(rdr.read(), ds.band.values[t])
+            np.testing.assert_array_equal(rdr.read(((10, 30), (5, 60))), ds.band.values[t, 10:30, 5:60])
+            np.testing.assert_array_equal(rdr.read((slice(0, 50), slice(0, 70)), out_shape=(25, 35)),
+                                          ds.band.values[t, 1::2, 1::2])
+
+    # band index takes precedence over the uri
+    with ZarrDataSource(mk_band('band', uri, format='zarr', band=2)).open() as rdr:
+        np.testing.assert_array_equal(rdr.read(), ds.band.values[1])
+
+    with pytest.raises(ValueError):
+        with ZarrDataSource(mk_band('band', uri, format='zarr')).open():
+            pass
+
+    with pytest.raises(RuntimeError):
+        write_dataset_to_zarr(ds, uri)
+
+
+def test_zarr_object_store():
+    fsspec = pytest.importorskip('fsspec')
+    ds = _sample(ntimes=1).chunk({'y': 25, 'x': 35})
+    uri = 'memory://bucket/test_zarr_object_store.zarr'
+
+    driver = writer_driver_init()
+    assert driver.format == 'zarr'
+    assert driver.write_dataset_to_storage(ds, uri, variable_params={'band': {'chunksizes': (1, 25, 35)}}) == {}
+    assert fsspec.filesystem('memory').exists('bucket/test_zarr_object_store.zarr/band/0.1.1')
+
+    rdr_driver = reader_driver_init()
+    assert rdr_driver.supports('memory', 'zarr')
+    with rdr_driver.new_datasource(mk_band('band', uri, format='zarr')).open() as rdr:
+        np.testing.assert_array_equal(rdr.read(), ds.band.values[0])
+
+
+def test_zarr_mk_uri(tmp_path):
+    driver = writer_driver_init()
+    assert driver.mk_uri(tmp_path / 'a.zarr', {}) == (tmp_path / 'a.zarr').as_uri()
+    assert driver.mk_uri(Path('s3://bucket/prefix/a.zarr'), {}) == 's3://bucket/prefix/a.zarr'
+    assert driver.mk_uri('memory://a.zarr', {}) == 'memory://a.zarr'
@@ -9,6 +9,7 @@ from copy import deepcopy
 
 from uuid import UUID
 
+from datacube_sp.index._query_cache import DatasetQueryCacheAddIn
 from datacube_sp.index.postgres._datasets import DatasetResource
 from datacube_sp.index.exceptions import DuplicateRecordError
 from datacube_sp.model import DatasetType, MetadataType, Dataset
@@ -213,7 +214,7 @@ class MockTypesResource:
         yield MockDb()
 
 
-class MockIndex:
+class MockIndex(DatasetQueryCacheAddIn):
     def __init__(self, db, product):
         self._db = db
         self.products = MockTypesResource(product)
@@ -0,0 +1,104 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+import datetime
+import json
+from uuid import uuid4
+
+import pytest
+from psycopg2.extras import DateTimeTZRange, NumericRange
+
+from datacube_sp.drivers.postgres._api import get_dataset_fields
+from datacube_sp.index._arrow import (EXTENT_FIELD, batched, extent_wkb_array, record_batch_reader,
+                                      select_field_names, write_record_batches)
+from datacube_sp.model import Range
+from datacube_sp.utils import read_documents
+
+pa = pytest.importorskip('pyarrow')
+
+UTC = datetime.timezone.utc
+
+
+@pytest.fixture
+def eo3_fields(eo3_metadata_file):
+    (_, doc), *_ = read_documents(eo3_metadata_file)
+    return get_dataset_fields(doc)
+
+
+def _rows():
+    t = datetime.datetime(2020, 1, 1, 10, tzinfo=UTC)
+    return [
+        (uuid4(), 'ls8', DateTimeTZRange(t, t + datetime.timedelta(seconds=10)), {'a': 1},
+         NumericRange(-35.0, -34.0), NumericRange(148.0, 149.5)),
+        (uuid4(), 'ls8', Range(t, None), None, None, NumericRange(148.0, 149.0)),
+        (uuid4(), 'ls7', None, {'b': [2]}, Range(-30.0, -29.0), Range(140, 141)),
+    ]
+
+
+def test_select_field_names():
+    assert select_field_names(('id', 'time')) == ('id', 'time')
+    assert select_field_names(('id', EXTENT_FIELD)) == ('id', 'lat', 'lon')
+    assert select_field_names(('lat', EXTENT_FIELD, 'id')) == ('lat', 'id', 'lon')
+
+
+def test_record_batches(eo3_fields):
+    field_names = ('id', 'product', 'time', 'metadata_doc', EXTENT_FIELD)
+    assert select_field_names(field_names) == ('id', 'product', 'time', 'metadata_doc', 'lat', 'lon')
+    rows = _rows()
+
+    reader = record_batch_reader(field_names, eo3_fields, batched(rows, 2))
+    schema = reader.schema
+    assert schema.names == list(field_names)
+    assert schema.field('time').type == pa.struct([('begin', pa.timestamp('us', tz='UTC')),
+                                                   ('end', pa.timestamp('us', tz='UTC'))])
+    assert schema.field(EXTENT_FIELD).type == pa.binary()
+    assert schema.field(EXTENT_FIELD).metadata == {b'encoding': b'WKB', b'crs': b'EPSG:4326'}
+
+    batches = list(reader)
+    assert [b.num_rows for b in batches] == [2, 1]
+    table = pa.Table.from_batches(batches)
+
+    assert table.column('id').to_pylist() == [str(row[0]) for row in rows]
+    assert table.column('product').to_pylist() == ['ls8', 'ls8', 'ls7']
+    times = table.column('time').to_pylist()
+    assert times[0] == {'begin': rows[0][2].lower, 'end': rows[0][2].upper}
+    assert times[1] == {'begin': rows[1][2].begin, 'end': None}
+    assert times[2] is None
+    assert [json.loads(d) if d else None for d in table.column('metadata_doc').to_pylist()] == \
+        [{'a': 1}, None, {'b': [2]}]
+
+
+def test_extent_wkb():
+    wkb = pytest.importorskip('shapely.wkb')
+    extents = extent_wkb_array([NumericRange(-35.0, -34.0), None, Range(-30.0, -29.0)],
+                               [NumericRange(148.0, 149.5), NumericRange(148.0, 149.0), Range(140, 141)])
+    assert extents.null_count == 1
+    wkbs = extents.to_pylist()
+    assert wkbs[1] is None
+
+    poly = wkb.loads(wkbs[0])
+    assert poly.geom_type == 'Polygon'
+    assert poly.bounds == (148.0, -35.0, 149.5, -34.0)
+    assert poly.exterior.is_ccw
+    assert wkb.loads(wkbs[2]).bounds == (140.0, -30.0, 141.0, -29.0)
+
+
+def test_write_record_batches(eo3_fields, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    field_names = ('id', 'time', EXTENT_FIELD)
+    rows = [(row[0], row[2], row[4], row[5]) for row in _rows()]
+
+    path = str(tmp_path / 'out.parquet')
+    assert write_record_batches(record_batch_reader(field_names, eo3_fields, batched(rows, 2)), path) == 3
+    table = pq.read_table(path)
+    assert table.num_rows == 3
+    assert table.schema.field('time').type.num_fields == 2
+
+    path = str(tmp_path / 'out.arrow')
+    assert write_record_batches(record_batch_reader(field_names, eo3_fields, [rows]), path, format='arrow') == 3
+    with pa.ipc.open_file(path) as f:
+        assert f.read_all().column('id').to_pylist() == [str(row[0]) for row in rows]
+
+    with pytest.raises(ValueError):
+        write_record_batches(record_batch_reader(field_names, eo3_fields, []), path, format='csv')
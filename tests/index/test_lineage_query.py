@@ -0,0 +1,60 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Lineage queries, with and without the lineage closure table.
+"""
+import uuid
+
+from sqlalchemy.dialects import postgresql
+
+from datacube_sp.drivers.postgres._api import PostgresDbAPI
+from datacube_sp.drivers.postgres._fields import parse_fields
+from datacube_sp.drivers.postgres._schema import DATASET
+from datacube_sp.drivers.postgres.sql import LINEAGE_BACKFILL_SQL, LINEAGE_TRIGGER_SQL
+from datacube_sp.index.fields import to_expressions
+
+
+def _sql(query):
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def _exprs(**query):
+    dataset_fields = parse_fields({'platform': {'offset': ['platform', 'code']}}, DATASET.c.metadata)
+    return tuple(to_expressions(dataset_fields.get, **query))
+
+
+def test_get_dataset_sources_query():
+    dataset_id = uuid.uuid4()
+    recursive = _sql(PostgresDbAPI.get_dataset_sources_query(dataset_id))
+    assert 'RECURSIVE' in recursive
+    assert 'dataset_lineage' not in recursive
+
+    closure = _sql(PostgresDbAPI.get_dataset_sources_query(dataset_id, lineage_closure=True))
+    assert 'RECURSIVE' not in closure
+    assert 'agdc.dataset_lineage.descendant_ref = ' in closure
+    assert 'aggd.sources, aggd.classes' in closure
+
+
+def test_source_filter_query():
+    recursive = _sql(PostgresDbAPI.search_datasets_query(_exprs(platform='a'), _exprs(platform='b')))
+    assert 'RECURSIVE' in recursive
+
+    closure = _sql(PostgresDbAPI.search_datasets_query(_exprs(platform='a'), _exprs(platform='b'),
+                                                       limit=2, lineage_closure=True))
+    assert 'RECURSIVE' not in closure
+    # Source expressions apply to the ancestors, not to the datasets returned.
+    outer, inner = closure.split('IN (SELECT agdc.dataset_lineage.descendant_ref')
+    assert 'metadata_1' in outer and 'metadata_2' in inner
+    assert 'dataset_lineage.ancestor_ref = agdc.dataset.id' in inner
+
+    # No source expressions: the closure table isn't needed
+    assert 'dataset_lineage' not in _sql(PostgresDbAPI.search_datasets_query(_exprs(platform='a'),
+                                                                             lineage_closure=True))
+
+
+def test_lineage_sql_is_schema_qualified():
+    for sql in (LINEAGE_TRIGGER_SQL, LINEAGE_BACKFILL_SQL):
+        assert '{schema}' not in sql
+        assert 'agdc.dataset_lineage' in sql
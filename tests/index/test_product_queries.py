@@ -0,0 +1,151 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Multi-product search and count statements.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from datacube_sp.drivers.postgres._api import PostgresDbAPI
+from datacube_sp.drivers.postgres._fields import parse_fields
+from datacube_sp.drivers.postgres._schema import DATASET
+from datacube_sp.index.fields import group_product_queries, split_rows_by_product, to_expressions
+from datacube_sp.model import Range
+from datacube_sp.testutils import mk_sample_product
+
+
+def _product(id_, metadata_type_id):
+    return SimpleNamespace(id=id_, name='p%d' % id_, metadata_type=SimpleNamespace(id=metadata_type_id))
+
+
+def _sql(query):
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_group_product_queries():
+    a, b, c, d = _product(1, 1), _product(2, 1), _product(3, 2), _product(4, 1)
+    time = Range(1, 2)
+    product_queries = [
+        (dict(time=time, product_id=1), a),
+        (dict(time=time, product_id=2), b),
+        (dict(time=time, product_id=3), c),
+        (dict(time=time, platform='x', product_id=4), d),
+    ]
+
+    groups = group_product_queries(product_queries, 'product_id')
+    assert [(mdt.id, [([p.id for p in ps], q) for ps, q in branches]) for mdt, branches in groups] == [
+        (1, [([1, 2], dict(time=time)), ([4], dict(time=time, platform='x'))]),
+        (2, [([3], dict(time=time))]),
+    ]
+
+    groups = group_product_queries(product_queries, 'product_id', merge=False)
+    assert [[[p.id for p in ps] for ps, _ in branches] for _, branches in groups] == [[[1], [2], [4]], [[3]]]
+
+
+def test_split_rows_by_product():
+    row = namedtuple('row', ['id', 'product_ref'])
+    a, b, c = _product(1, 1), _product(2, 1), _product(3, 1)
+    rows = [row('y', 1), row('x', 2), row('z', 2)]
+    assert [(p.id, [r.id for r in rs]) for p, rs in split_rows_by_product(rows, [b, c, a], 'product_ref')] == [
+        (1, ['y']), (2, ['x', 'z']), (3, []),
+    ]
+
+    # rows are passed on as they arrive
+    consumed = []
+
+    def stream():
+        for r in rows:
+            consumed.append(r.id)
+            yield r
+
+    split = split_rows_by_product(stream(), [a, b, c], 'product_ref')
+    product, product_rows = next(split)
+    assert product is a
+    assert [r.id for r in product_rows] == ['y']
+    assert consumed == ['y', 'x']
+
+    with pytest.raises(ValueError):
+        list(split_rows_by_product([row('x', 2), row('y', 1)], [a, b], 'product_ref'))
+
+
+class _SearchConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def search_datasets_by_product(self, product_expressions, order_by_product=False, **kwargs):
+        self.calls.append(order_by_product)
+        return iter(self.rows)
+
+
+class _SearchIndex:
+    def __init__(self, conn, products):
+        self.conn = conn
+        self.by_id = {p.id: p for p in products}
+        self.lookups = []
+        self.products = self
+
+    def search_robust(self, **query):
+        return [(p, {}) for p in self.by_id.values()]
+
+    def get(self, id_):
+        self.lookups.append(id_)
+        return self.by_id[id_]
+
+    @contextmanager
+    def _active_connection(self, transaction=False):
+        yield self.conn
+
+
+def test_multi_product_search_unsorted():
+    from datacube_sp.index.postgres._datasets import DatasetResource
+
+    a, b = mk_sample_product('a'), mk_sample_product('b')
+    a.id, b.id = 1, 2
+    row = namedtuple('row', ['id', 'dataset_type_ref', 'metadata', 'uris', 'archived'])
+    rows = [row('x', 2, {'id': 'x'}, [], None), row('y', 1, {'id': 'y'}, [], None),
+            row('z', 2, {'id': 'z'}, [], None)]
+    conn = _SearchConnection(rows)
+    index = _SearchIndex(conn, [a, b])
+    datasets = DatasetResource(None, index)
+
+    # search() takes the rows as they come, with the product of each
+    assert [(ds.metadata_doc['id'], ds.product) for ds in datasets.search()] == [('x', b), ('y', a), ('z', b)]
+    assert conn.calls == [False]
+    assert index.lookups == [2, 1, 2]
+
+    # grouping by product has the database sort the rows
+    conn.rows = sorted(rows, key=lambda r: r.dataset_type_ref)
+    grouped = [(p, [ds.metadata_doc['id'] for ds in dss]) for p, dss in datasets.search_by_product()]
+    assert grouped == [(a, ['y']), (b, ['x', 'z'])]
+    assert conn.calls == [False, True]
+
+
+def test_postgres_multi_product_statements():
+    dataset_fields = parse_fields({'platform': {'offset': ['platform', 'code']}}, DATASET.c.metadata)
+    exprs = tuple(to_expressions(dataset_fields.get, platform='x'))
+
+    single = _sql(PostgresDbAPI.search_products_query([([1, 2], exprs)]))
+    assert 'UNION ALL' not in single
+    assert 'dataset_type_ref IN' in single
+
+    union = _sql(PostgresDbAPI.search_products_query([([1], exprs), ([2], ())], limit=5))
+    assert union.count('UNION ALL') == 1
+    assert union.count('LIMIT') == 2
+    # only ordered by product when asked, to split rows by product as they arrive
+    by_product = 'ORDER BY dataset_type_ref'
+    assert by_product not in union
+    ordered = _sql(PostgresDbAPI.search_products_query([([1], exprs), ([2], ())], limit=5, order_by_product=True))
+    assert ordered.rstrip().endswith(by_product)
+    assert by_product in _sql(PostgresDbAPI.search_products_query([([1, 2], exprs)], order_by_product=True))
+    assert by_product not in _sql(PostgresDbAPI.search_products_query([([1], exprs)], order_by_product=True))
+
+    count = _sql(PostgresDbAPI.count_products_query([([1, 2], exprs), ([3], ())]))
+    assert count.count('UNION ALL') == 1
+    assert count.count('GROUP BY agdc.dataset.dataset_type_ref') == 2
@@ -0,0 +1,200 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from datacube_sp.index._query_cache import DatasetQueryCache, DatasetQueryCacheAddIn, normalise_search_terms
+from datacube_sp.index.abstract import UnhandledTransaction
+from datacube_sp.model import Dataset, Range
+from datacube_sp.testutils import mk_sample_product
+from datacube_sp.utils.generic import thread_local_cache
+from datacube_sp.utils.geometry import box
+
+
+class MockDatasets:
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self.searches = 0
+
+    def search(self, limit=None, **query):
+        self.searches += 1
+        products = query.get('product')
+        products = [products] if isinstance(products, str) else products
+        matches = [ds for ds in self.datasets if products is None or ds.product.name in products]
+        return iter(matches[:limit])
+
+
+class MockProducts:
+    def __init__(self, products):
+        self.by_name = {p.name: p for p in products}
+
+    def get_by_name(self, name):
+        return self.by_name[name]
+
+
+class MockIndex(DatasetQueryCacheAddIn):
+    def __init__(self, datasets, products):
+        self.datasets = MockDatasets(datasets)
+        self.products = MockProducts(products)
+
+    def transaction(self):
+        return UnhandledTransaction('mock')
+
+    def thread_transaction(self):
+        return thread_local_cache('txn-mock', None)
+
+
+def _dataset(product, **kw):
+    return Dataset(product, {'id': str(uuid4())}, uris=['file:///tmp/{}.yaml'.format(product.name)], **kw)
+
+
+@pytest.fixture
+def index():
+    ls7, ls8 = mk_sample_product('ls7'), mk_sample_product('ls8')
+    datasets = [_dataset(ls7), _dataset(ls8, indexed_by='me'), _dataset(ls8)]
+    return MockIndex(datasets, [ls7, ls8])
+
+
+def test_search_terms_normalised():
+    t = datetime.datetime(2020, 1, 1, 10, tzinfo=datetime.timezone(datetime.timedelta(hours=10)))
+    utc = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    assert normalise_search_terms(dict(product='ls8', time=Range(t, t))) == \
+        normalise_search_terms(dict(time=Range(utc, utc), product='ls8'))
+    assert normalise_search_terms(dict(product={'ls7', 'ls8'})) == normalise_search_terms(dict(product={'ls8', 'ls7'}))
+    assert normalise_search_terms(dict(product='ls8')) != normalise_search_terms(dict(product='ls7'))
+
+    geom = box(0, 0, 1, 1, 'EPSG:4326')
+    key = normalise_search_terms(dict(geopolygon=geom, platform=['a', 'b']))
+    assert key == normalise_search_terms(dict(platform=['a', 'b'], geopolygon=box(0, 0, 1, 1, 'EPSG:4326')))
+    hash(key)
+
+
+def test_hits_and_misses(index):
+    cache = index.enable_query_cache()
+    assert index.query_cache is cache
+
+    first = cache.search(index, product='ls8')
+    again = cache.search(index, product='ls8')
+    assert index.datasets.searches == 1
+    assert [ds.id for ds in again] == [ds.id for ds in first]
+    assert [ds.uris for ds in again] == [ds.uris for ds in first]
+    assert again[0].indexed_by == 'me'
+    assert again[0].product is index.products.get_by_name('ls8')
+
+    # Different limit is a different search
+    assert len(cache.search(index, product='ls8', limit=1)) == 1
+    assert index.datasets.searches == 2
+
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.entries, stats.size) == (1, 2, 2, 3)
+
+    index.disable_query_cache()
+    assert index.query_cache is None
+
+
+def test_ttl_expiry(index):
+    cache = DatasetQueryCache(ttl=0)
+    cache.search(index, product='ls8')
+    cache.search(index, product='ls8')
+    assert index.datasets.searches == 2
+    assert cache.stats.hits == 0
+
+
+def test_size_eviction(index):
+    cache = DatasetQueryCache(max_size=2)
+    cache.search(index, product='ls7')
+    cache.search(index, product='ls8')
+    # Least recently used (ls7) evicted to make room
+    assert cache.stats.evictions == 1
+    assert cache.stats.size == 2
+    cache.search(index, product='ls8')
+    assert index.datasets.searches == 2
+
+    # Too large to cache at all
+    cache.search(index, product=['ls7', 'ls8'])
+    cache.search(index, product=['ls7', 'ls8'])
+    assert index.datasets.searches == 4
+
+
+def test_invalidation(index):
+    cache = index.enable_query_cache()
+    cache.search(index, product='ls7')
+    ls8 = cache.search(index, product='ls8')
+    cache.search(index)
+    assert cache.stats.entries == 3
+
+    # New ls7 dataset: drops ls7 and unrestricted searches
+    index._datasets_changed(products=['ls7'])
+    assert cache.stats.entries == 1
+    assert cache.stats.invalidations == 2
+    cache.search(index, product='ls8')
+    assert cache.stats.hits == 1
+
+    # Archived dataset, by id string
+    index._datasets_changed(ids=[str(ls8[0].id)])
+    assert cache.stats.entries == 0
+    assert cache.stats.size == 0
+
+
+def test_stale_result_not_stored(index):
+    cache = index.enable_query_cache()
+    search = index.datasets.search
+
+    def search_then_change(**query):
+        result = list(search(**query))
+        index._datasets_changed(products=['ls8'])
+        return result
+
+    index.datasets.search = search_then_change
+    cache.search(index, product='ls8')
+    assert cache.stats.entries == 0
+
+
+def test_cached_documents_are_copies(index):
+    cache = index.enable_query_cache()
+    found = cache.search(index, product='ls7')
+    found[0].metadata_doc['label'] = 'changed'
+    cached = cache.search(index, product='ls7')
+    assert 'label' not in cached[0].metadata_doc
+
+    cached[0].metadata_doc['label'] = 'changed again'
+    assert 'label' not in cache.search(index, product='ls7')[0].metadata_doc
+
+
+def test_invalidated_on_commit(index):
+    cache = index.enable_query_cache()
+    cache.search(index, product='ls7')
+
+    with index.transaction():
+        index._datasets_changed(products=['ls7'])
+        # Not visible to other connections yet
+        assert cache.stats.entries == 1
+        with index.transaction():
+            index._datasets_changed(ids=[uuid4()])
+        # Searches see uncommitted changes, so aren't cached
+        cache.search(index, product='ls8')
+        assert cache.stats.entries == 1
+        assert index.datasets.searches == 2
+    assert cache.stats.entries == 0
+    assert cache.stats.invalidations == 1
+
+    cache.search(index, product='ls7')
+    trans = index.transaction()
+    trans.begin()
+    index._datasets_changed(products=['ls7'])
+    trans.rollback()
+    assert cache.stats.entries == 1
+    assert cache.stats.invalidations == 1
+
+
+def test_datacube_enables_cache(index):
+    from datacube_sp import Datacube
+
+    Datacube(index=index, query_cache_size=10, query_cache_ttl=60)
+    assert index.query_cache.max_size == 10
+    assert index.query_cache.ttl == 60
@@ -0,0 +1,218 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+from contextlib import contextmanager
+
+import pytest
+
+from datacube_sp.index._cache import (METADATA_TYPES, PRODUCTS, ResourceCache, ResourceCacheAddIn,
+                                      shared_resource_cache)
+from datacube_sp.index.abstract import UnhandledTransaction
+
+
+class MockConnection:
+    def __init__(self):
+        self.version = ('v', 1)
+        self.metadata_types = [dict(id=1, name='eo3', definition={'name': 'eo3'})]
+        self.products = [
+            dict(id=2, name='ls8', definition={'name': 'ls8'}, metadata_type_ref=1),
+            dict(id=1, name='ls7', definition={'name': 'ls7'}, metadata_type_ref=1),
+        ]
+        self.record_fetches = 0
+        self.version_checks = 0
+
+    def get_resource_version(self):
+        self.version_checks += 1
+        return self.version
+
+    def get_all_metadata_types(self):
+        self.record_fetches += 1
+        return self.metadata_types
+
+    def get_all_products(self):
+        return self.products
+
+
+class MockIndex(ResourceCacheAddIn):
+    def __init__(self, ttl=60):
+        self._conn = MockConnection()
+        self._shared_cache = ResourceCache(ttl) if ttl else None
+        self.transaction = None
+
+    def thread_transaction(self):
+        return self.transaction
+
+    @contextmanager
+    def _active_connection(self, transaction=False):
+        yield self._conn
+
+
+def _name(record):
+    return record['name']
+
+
+def _no_fetch():
+    raise AssertionError('fetched from the database')
+
+
+def test_cache_loads_once_until_version_changes():
+    index = MockIndex(ttl=0.0001)
+    conn = index._conn
+
+    assert index._cached_get(PRODUCTS, _name, _no_fetch, id_=2) == 'ls8'
+    assert index._cached_get(PRODUCTS, _name, _no_fetch, name='ls7') == 'ls7'
+    assert index._cached_all(PRODUCTS, _name) == ['ls7', 'ls8']
+    assert conn.record_fetches == 1
+    assert conn.version_checks >= 1
+
+    conn.version = ('v', 2)
+    conn.products = conn.products + [dict(id=3, name='s2', definition={}, metadata_type_ref=1)]
+    index.resource_cache._checked = None
+    assert index._cached_all(PRODUCTS, _name) == ['ls7', 'ls8', 's2']
+    assert conn.record_fetches == 2
+
+
+def test_cache_miss_forces_revalidation():
+    index = MockIndex(ttl=1000)
+    conn = index._conn
+    assert index._cached_get(METADATA_TYPES, _name, _no_fetch, name='eo3') == 'eo3'
+    checks = conn.version_checks
+
+    # Unknown and not in the database: a version check, no reload.
+    with pytest.raises(KeyError):
+        index._cached_get(PRODUCTS, _name, _no_fetch, name='s2')
+    assert conn.version_checks == checks + 1
+    assert conn.record_fetches == 1
+
+    # Added elsewhere: found despite the ttl not having expired.
+    conn.version = ('v', 2)
+    conn.products = conn.products + [dict(id=3, name='s2', definition={}, metadata_type_ref=1)]
+    assert index._cached_get(PRODUCTS, _name, _no_fetch, name='s2') == 's2'
+    assert conn.record_fetches == 2
+
+
+def test_cache_models_are_memoised_and_invalidated():
+    index = MockIndex()
+    built = []
+
+    def build(record):
+        built.append(record['id'])
+        return object()
+
+    first = index._cached_get(PRODUCTS, build, _no_fetch, id_=1)
+    assert index._cached_get(PRODUCTS, build, _no_fetch, name='ls7') is first
+    assert built == [1]
+
+    index._invalidate_resource_cache()
+    assert index._cached_get(PRODUCTS, build, _no_fetch, id_=1) is not first
+    assert built == [1, 1]
+    assert index._conn.record_fetches == 2
+
+
+def test_cache_memoised_in_transaction_bypassed_when_disabled():
+    index = MockIndex()
+    index.transaction = UnhandledTransaction('mock')
+    index.transaction.begin()
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return 'ls7 (uncommitted)'
+
+    # the shared cache isn't used, lookups are memoised for the life of the transaction
+    assert index._cached_get(PRODUCTS, _name, fetch, id_=1) == 'ls7 (uncommitted)'
+    assert index._cached_get(PRODUCTS, _name, fetch, id_=1) == 'ls7 (uncommitted)'
+    assert fetched == [1]
+    assert index._cached_all(PRODUCTS, _name) is None
+    assert index._conn.version_checks == 0
+
+    # changes made in the transaction clear the memo, and the shared cache again once committed
+    index._cached_get(PRODUCTS, _name, fetch, name='ls7')
+    index._invalidate_resource_cache()
+    assert index.transaction.resource_memo == {}
+    index._cached_get(PRODUCTS, _name, fetch, id_=1)
+    assert fetched == [1, 1, 1]
+    index.resource_cache.sync(('v', 1), lambda: ([], []))
+    index.transaction.commit()
+    assert index.resource_cache.version is None
+    assert index.transaction.resource_memo == {}
+
+    index = MockIndex(ttl=0)
+    assert index.resource_cache is None
+    assert index._cached_get(PRODUCTS, _name, lambda: 'fetched', id_=1) == 'fetched'
+
+
+def test_cache_snapshot_roundtrip(tmpdir):
+    index = MockIndex()
+    index._cached_all(PRODUCTS, _name)
+    path = str(tmpdir / 'cache.pickle')
+    index.resource_cache.dump(path)
+
+    warm = MockIndex()
+    warm.resource_cache.load(path)
+    assert warm.resource_cache.version == ('v', 1)
+    assert warm._cached_all(PRODUCTS, _name) == ['ls7', 'ls8']
+    # Validated against the database, but not refetched.
+    assert warm._conn.version_checks == 1
+    assert warm._conn.record_fetches == 0
+
+    with pytest.raises(ValueError):
+        ResourceCache().restore({'format': -1})
+
+
+def test_shared_resource_cache(tmpdir):
+    assert shared_resource_cache('test-disabled', ttl=0) is None
+
+    cache = shared_resource_cache('test-shared', ttl=30)
+    assert cache is not None
+    assert shared_resource_cache('test-shared') is cache
+    assert cache.ttl == 30
+
+    snapshot = ResourceCache()
+    snapshot.sync(('v', 7), lambda: ([dict(id=1, name='eo3', definition={})], []))
+    path = str(tmpdir / 'snapshot.pickle')
+    snapshot.dump(path)
+    preloaded = shared_resource_cache('test-preloaded', snapshot=path)
+    assert preloaded.version == ('v', 7)
+    assert preloaded.get_record(METADATA_TYPES, name='eo3')['id'] == 1
+
+    # A missing snapshot is not fatal.
+    assert shared_resource_cache('test-missing', snapshot=str(tmpdir / 'nope')).version is None
+
+
+class _RecordingConnection:
+    """ Stands in for a sqlalchemy connection to a database without the ``updated`` columns. """
+
+    def __init__(self):
+        self.info = {}
+        self.statements = []
+
+    def execute(self, statement, *args):
+        self.statements.append(statement)
+        return self
+
+    def scalar(self):
+        return None
+
+    def fetchall(self):
+        return [('metadata_type', 1, None), ('dataset_type', 2, None)]
+
+
+def test_resource_version_without_updated_columns():
+    from sqlalchemy.dialects import postgresql
+    from datacube_sp.drivers.postgres._api import PostgresDbAPI
+
+    conn = _RecordingConnection()
+    api = PostgresDbAPI(conn)
+    assert api.get_resource_version() == (('dataset_type', 2, None), ('metadata_type', 1, None))
+    assert api.get_resource_version() == (('dataset_type', 2, None), ('metadata_type', 1, None))
+
+    # the column check is made once per connection, and the versions fall back to the added timestamps
+    column_checks, *queries = conn.statements
+    assert 'pg_attribute' in column_checks
+    assert len(queries) == 2
+    sql = str(queries[0].compile(dialect=postgresql.dialect()))
+    assert 'updated' not in sql
+    assert 'max(agdc.metadata_type.added)' in sql
+    assert conn.info['dc_has_updated_columns'] is False
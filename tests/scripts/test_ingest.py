@@ -0,0 +1,100 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+import xarray as xr
+
+from datacube_sp.executor import SerialExecutor, get_executor
+from datacube_sp.scripts import ingest
+from datacube_sp.scripts.ingest import process_tasks
+from datacube_sp.ui.task_journal import DONE, FAILED, RUNNING, TaskJournal
+
+
+class _Index:
+    def __init__(self, bad=()):
+        self.added = []
+        self.transactions = []
+        self.threads = set()
+        self.bad = set(bad)
+        self.datasets = SimpleNamespace(add=self._add)
+
+    def _add(self, dataset, with_lineage=True):
+        assert not with_lineage
+        self.threads.add(threading.current_thread().name)
+        if dataset.id in self.bad:
+            raise ValueError(dataset.id)
+        self.transactions[-1].append(dataset.id)
+
+    @contextmanager
+    def transaction(self):
+        self.transactions.append([])
+        try:
+            yield
+        except Exception:
+            self.transactions.pop()
+            raise
+        self.added.extend(self.transactions[-1])
+
+
+def _ingest_work(config, source_type, output_type, tile, tile_index):
+    if tile_index == (0, 3):
+        raise RuntimeError('failed to write')
+    datasets = [SimpleNamespace(id='{}-{}'.format(tile_index, t), metadata_doc={}) for t in range(2)]
+    return xr.DataArray(datasets, dims=('time',))
+
+
+@pytest.mark.parametrize('executor', [SerialExecutor(), get_executor(None, 3, threads=True)])
+def test_process_tasks(monkeypatch, executor):
+    monkeypatch.setattr(ingest, 'ingest_work', _ingest_work)
+    index = _Index(bad={'(0, 5)-1'})
+    tasks = [dict(tile=None, tile_index=(0, i)) for i in range(20)]
+
+    indexed, failed = process_tasks(index, {}, None, None, tasks, queue_size=5, executor=executor, batch_size=4)
+
+    # one unit failed to write and one to index, the rest of its batch is indexed
+    expect = {'(0, {})-{}'.format(i, t) for i in range(20) for t in range(2) if i not in (3, 5)}
+    assert (indexed, failed) == (36, 1)
+    assert sorted(index.added) == sorted(expect)
+    assert all(len(batch) <= 8 for batch in index.transactions)
+    assert index.threads == {'ingest-indexer'}
+
+
+def test_process_tasks_resume(monkeypatch, tmp_path):
+    journal = str(tmp_path / 'ingest.sqlite')
+    tasks = [dict(tile=None, tile_index=(0, i)) for i in range(10)]
+    written = []
+    interrupt = [(0, 7)]
+
+    def ingest_work(config, source_type, output_type, tile, tile_index):
+        if tile_index in interrupt:
+            raise KeyboardInterrupt()
+        written.append(tile_index)
+        return _ingest_work(config, source_type, output_type, tile, tile_index)
+
+    monkeypatch.setattr(ingest, 'ingest_work', ingest_work)
+    index = _Index(bad={'(0, 2)-0'})
+    with pytest.raises(KeyboardInterrupt):
+        process_tasks(index, {}, None, None, tasks, queue_size=5, executor=SerialExecutor(), journal=journal)
+    assert written == [(0, i) for i in range(7)]
+
+    # units written before the interruption are still indexed, and a tile is only done once its unit is
+    with TaskJournal(journal) as tj:
+        assert [tj.status(str((0, i))) for i in range(8)] == [
+            DONE, DONE, FAILED, FAILED, DONE, DONE, DONE, RUNNING]
+
+    # running again picks up from there
+    del written[:], interrupt[:]
+    index.bad = set()
+    indexed, failed = process_tasks(index, {}, None, None, tasks, queue_size=5, executor=SerialExecutor(),
+                                    journal=journal, retries=1)
+    assert written == [(0, 2), (0, 3), (0, 7), (0, 8), (0, 9), (0, 3)]
+    assert (indexed, failed) == (8, 0)
+    assert sorted(index.added) == sorted('(0, {})-{}'.format(i, t) for i in range(10) for t in range(2) if i != 3)
+    with TaskJournal(journal) as tj:
+        assert tj.summary() == {DONE: 9, FAILED: 1}
+        assert tj.attempts(str((0, 3))) == 3
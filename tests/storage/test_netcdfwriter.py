@@ -2,6 +2,7 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
+import dask.array
 import netCDF4
 import numpy
 import xarray as xr
@@ -11,7 +12,8 @@ from hypothesis.strategies import text
 import string
 from uuid import uuid4
 
-from datacube_sp.drivers.netcdf._write import _get_units
+from datacube_sp.drivers.netcdf._write import _get_units, _chunk_aligned
+from datacube_sp.storage._hdf5 import HDF5_LOCK
 from datacube_sp.drivers.netcdf.writer import create_netcdf, create_coordinate, create_variable, netcdfy_data, \
     create_grid_mapping_variable, flag_mask_meanings, Variable
 from datacube_sp.drivers.netcdf import write_dataset_to_netcdf
@@ -354,3 +356,40 @@ def test_get_units():
     assert _get_units(geometry.Coordinate(numpy.zeros(1, dtype='uint8'), None, None)) == '1'
     assert _get_units(geometry.Coordinate(
         numpy.zeros(1, dtype='datetime64[s]'), None, None)).startswith('seconds since ')
+
+
+def test_write_dask_dataset_to_netcdf(tmpnetcdf_filename):
+    xx = mk_sample_xr_dataset(name='B10', shape=(100, 140), time='2020-01-01')
+    xx.B10.values[:] = numpy.arange(100 * 140).reshape(1, 100, 140) % 3000
+
+    def _compute(block):
+        # blocks are computed while other blocks are written, and can use HDF5 themselves
+        assert HDF5_LOCK.acquire(timeout=10)
+        HDF5_LOCK.release()
+        return block
+
+    data = xx.B10.data
+    xx['B10'] = xx.B10.copy(data=dask.array.from_array(data, chunks=(1, 30, 70)).map_blocks(_compute))
+    xx['B10'].attrs.update(nodata=-999, units='1')
+
+    write_dataset_to_netcdf(xx, tmpnetcdf_filename,
+                            variable_params={'B10': {'chunksizes': (1, 25, 35), 'zlib': True}})
+
+    with netCDF4.Dataset(tmpnetcdf_filename) as nco:
+        nco.set_auto_mask(False)
+        var = nco.variables['B10']
+        assert var.chunking() == [1, 25, 35]
+        assert var.filters()['zlib']
+        numpy.testing.assert_array_equal(var[:], data)
+        assert nco.variables['time'][:] == xx.time.values.astype('<M8[s]').astype('double')
+
+
+def test_chunk_aligned():
+    data = dask.array.zeros((3, 100, 140), chunks=(1, 30, 70))
+    assert _chunk_aligned(data, [1, 25, 35]).chunks == ((1, 1, 1), (25, 25, 25, 25), (70, 70))
+    assert _chunk_aligned(data, None) is data
+    # blocks are at least a chunk
+    assert _chunk_aligned(data, [2, 50, 200]).chunks == ((2, 1), (50, 50), (140,))
+
+    aligned = _chunk_aligned(numpy.zeros((3, 100, 140)), [1, 25, 35])
+    assert all(size % 25 == 0 for size in aligned.chunks[1][:-1])
@@ -6,7 +6,10 @@
 Tests for MultiprocessingExecutor
 """
 
-from datacube_sp.executor import get_executor
+import asyncio
+import threading
+
+from datacube_sp.executor import AsyncExecutor, Completions, SerialExecutor, get_executor
 from time import sleep
 import pytest
 
@@ -77,7 +80,8 @@ def run_executor_tests(executor, sleep_time=1):
 
 def test_concurrent_executor():
     executor = get_executor(None, 2)
-    assert 'Multiproc' in str(executor)
+    assert str(executor) == 'Multiprocessing (2)'
+    assert executor.workers == 2
     run_executor_tests(executor)
 
     executor = get_executor(None, 2, use_cloud_pickle=False)
@@ -88,5 +92,67 @@ def test_concurrent_executor():
 def test_fallback_executor():
     executor = get_executor(None, None)
     assert 'Serial' in str(executor)
+    assert executor.workers == 1
 
     run_executor_tests(executor, sleep_time=0)
+
+
+def test_thread_executor():
+    executor = get_executor(None, 3, threads=True)
+    assert 'Threads' in str(executor)
+    assert executor.workers == 3
+    run_executor_tests(executor)
+
+
+class _Gauge:
+    """ Tracks the largest number of calls running at once """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = self.peak = 0
+
+    def __call__(self, x, delay=0.01):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        sleep(delay)
+        with self.lock:
+            self.running -= 1
+        return x
+
+
+@pytest.mark.parametrize('executor', [SerialExecutor(), get_executor(None, 4, threads=True)])
+def test_completions(executor):
+    gauge = _Gauge()
+    completions = Completions(executor, max_in_flight=2)
+    for x in range(10):
+        completions.submit(gauge, x)
+    assert len(completions) == 10
+    assert sorted(executor.result(f) for f in completions) == list(range(10))
+    assert len(completions) == 0
+    assert gauge.peak <= 2
+
+    with pytest.raises(StopIteration):
+        completions.next()
+
+    completions.submit(_echo, 'x', please_fail=True)
+    with pytest.raises(IOError):
+        executor.result(completions.next(timeout=1))
+
+
+@pytest.mark.parametrize('executor', [SerialExecutor(), get_executor(None, 4, threads=True)])
+def test_async_executor(executor):
+    gauge = _Gauge()
+    aex = AsyncExecutor(executor, max_in_flight=3)
+
+    async def main():
+        assert await aex.submit(_echo, 1) == 1
+        with pytest.raises(IOError):
+            await aex.submit(_echo, 1, please_fail=True)
+        assert await aex.map(_echo, DATA) == DATA
+
+        results = [x async for x in aex.as_completed(aex.submit(gauge, x) for x in range(12))]
+        assert sorted(results) == list(range(12))
+
+    asyncio.run(main())
+    assert 1 <= gauge.peak <= 3
@@ -2,6 +2,8 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
+import os
+
 import pytest
 import yaml
 
@@ -127,3 +129,58 @@ def test_driver_singleton():
     assert obj.xx is result
 
     factory.assert_called_once_with()
+
+
+def _fake_distribution(path, name, entry_points, requires=()):
+    dist_info = path / '{}-1.0.dist-info'.format(name)
+    dist_info.mkdir()
+    (dist_info / 'METADATA').write_text('\n'.join(['Metadata-Version: 2.1', 'Name: ' + name, 'Version: 1.0']
+                                                  + ['Requires-Dist: ' + r for r in requires]) + '\n')
+    (dist_info / 'entry_points.txt').write_text('[datacube_sp.plugins.test]\n' + '\n'.join(entry_points) + '\n')
+
+
+def test_entry_points_cache(tmp_path, monkeypatch):
+    from datacube_sp.drivers import driver_cache
+
+    site = tmp_path / 'site'
+    site.mkdir()
+    _fake_distribution(site, 'dc_test_drivers', [
+        'plain = builtins:dict',
+        'installed = builtins:list [yaml]',
+        'not_installed = builtins:set [nosuch]',
+    ], requires=['pyyaml; extra == "yaml"', 'no-such-package>=1.0; extra == "nosuch"'])
+    monkeypatch.syspath_prepend(str(site))
+    cache_file = tmp_path / 'cache' / 'entry_points.json'
+    monkeypatch.setenv(driver_cache.CACHE_ENV, str(cache_file))
+
+    eps = driver_cache.entry_points('datacube_sp.plugins.test')
+    assert sorted(ep.name for ep in eps) == ['installed', 'plain']
+    assert cache_file.exists()
+    assert {ep.name: ep.load() for ep in eps} == {'plain': dict, 'installed': list}
+
+    # served from the cache until something gets installed
+    def no_scan(group):
+        raise AssertionError('entry points scanned again')
+
+    with monkeypatch.context() as m:
+        m.setattr(driver_cache, '_scan', no_scan)
+        assert [ep.value for ep in driver_cache.entry_points('datacube_sp.plugins.test')] == [ep.value for ep in eps]
+
+    _fake_distribution(site, 'dc_test_more_drivers', ['more = builtins:tuple'])
+    os.utime(str(site), ns=(0, os.stat(str(site)).st_mtime_ns + 10**9))
+    assert 'more' in [ep.name for ep in driver_cache.entry_points('datacube_sp.plugins.test')]
+
+    # entry points edited in place, e.g. by `setup.py develop`, without touching the sys.path entry
+    site_mtime = os.stat(str(site)).st_mtime_ns
+    entry_points_txt = site / 'dc_test_more_drivers-1.0.dist-info' / 'entry_points.txt'
+    entry_points_txt.write_text('[datacube_sp.plugins.test]\nmore = builtins:tuple\nedited = builtins:frozenset\n')
+    os.utime(str(entry_points_txt), ns=(0, os.stat(str(entry_points_txt)).st_mtime_ns + 10**9))
+    os.utime(str(site), ns=(0, site_mtime))
+    assert 'edited' in [ep.name for ep in driver_cache.entry_points('datacube_sp.plugins.test')]
+
+    # cache disabled
+    monkeypatch.setenv(driver_cache.CACHE_ENV, '')
+    cache_file.unlink()
+    assert driver_cache.load_drivers('datacube_sp.plugins.test') == {'plain': {}, 'installed': [], 'more': (),
+                                                                     'edited': frozenset()}
+    assert not cache_file.exists()
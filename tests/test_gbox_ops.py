@@ -175,6 +175,9 @@ def test_gbox_tiles():
 
     assert list(tt.tiles(gbox[:h, :w].extent)) == [(0, 0)]
 
+    polys = [gbox.extent, gbox[:h, :w].extent.to_crs('EPSG:4326'), gbox[h:, w:].extent]
+    assert tt.tiles_batch(polys) == [list(tt.tiles(poly)) for poly in polys]
+
     (H, W) = (11, 22)
     (h, w) = (10, 20)
     tt = gbx.GeoboxTiles(GeoBox(W, H, A, epsg3857), (h, w))
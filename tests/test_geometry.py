@@ -399,6 +399,37 @@ def test_to_crs():
         poly.to_crs(epsg3857)
 
 
+def test_batch_to_crs():
+    polys = [
+        geometry.polygon([(0, 0), (0, 5), (10, 5)], epsg4326),
+        geometry.box(1000, 2000, 51000, 72000, epsg3577),
+        geometry.box(0, 0, 1, 3, 'EPSG:4326') | geometry.box(2, 4, 3, 6, 'EPSG:4326'),
+        geometry.box(10, 10, 20, 20, epsg3857),
+        geometry.point(140, -30, epsg4326),
+    ]
+    out = geometry.batch_to_crs(polys, epsg3857)
+    assert len(out) == len(polys)
+    # Already in the destination CRS: unchanged
+    assert out[3] is polys[3]
+
+    for poly, batched in zip(polys, out):
+        expected = poly.to_crs(epsg3857)
+        assert batched.crs == epsg3857
+        assert batched.type == expected.type
+        assert batched.boundingbox == approx(expected.boundingbox, rel=1e-6)
+        assert batched.area == approx(expected.area, rel=1e-6)
+
+    # +inf disables segmentation
+    poly, = geometry.batch_to_crs(polys[:1], 'EPSG:3857', float('+inf'))
+    assert len(poly.exterior.xy[0]) == 4
+    poly, = geometry.batch_to_crs(polys[:1], 'EPSG:3857')
+    assert len(poly.exterior.xy[0]) > 4
+
+    assert geometry.batch_to_crs([], epsg3857) == []
+    with pytest.raises(ValueError):
+        geometry.batch_to_crs([geometry.polygon([(0, 0), (0, 5), (10, 5)], None)], epsg3857)
+
+
 def test_boundingbox():
     bb = BoundingBox(0, 3, 2, 4)
     assert bb.width == 2
@@ -729,6 +760,21 @@ def test_geobox():
         bounding_box_in_pixel_domain(GeoBox(1, 1, mkA(0), epsg4326),
                                      GeoBox(2, 3, mkA(0), epsg3577))
 
+    # many geoboxes at once
+    parts = [gbox[10:20, 30:60], gbox[:5, 500:], gbox[200:, :7], gbox[100:101, 100:101]]
+    union = geobox_union_conservative(parts)
+    assert union == gbox
+    assert geobox_intersection_conservative(parts[:1] + [gbox[15:40, 50:55]]) == gbox[15:20, 50:55]
+    assert geobox_intersection_conservative(parts).is_empty()
+
+    with pytest.raises(ValueError):
+        geobox_union_conservative(parts + [GeoBox(1, 1, mkA(0), epsg4326)])
+    with pytest.raises(ValueError):
+        # not a whole pixel translation
+        geobox_union_conservative(parts + [GeoBox(1, 1, A * Affine.translation(0.5, 0), epsg3577)])
+    with pytest.raises(ValueError):
+        geobox_union_conservative(parts + [GeoBox(1, 1, A * Affine.scale(2), epsg3577)])
+
 
 def test_geobox_xr_coords():
     A = mkA(0, scale=(10, -10),
@@ -0,0 +1,60 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2022 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Guard against import time regressions: the package and the CLI entry point
+should not pull in the heavy subsystems until they are used.
+"""
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ['xarray', 'dask', 'rasterio', 'pandas', 'sqlalchemy', 'psycopg2', 'pyproj', 'shapely',
+                 'pkg_resources']
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def _import_in_subprocess(module):
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                         check=True, stdout=subprocess.PIPE)
+    return json.loads(out.stdout.decode('utf-8').splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', ['datacube_sp', 'datacube_sp.scripts.cli_app'])
+def test_import_is_lightweight(module):
+    result = _import_in_subprocess(module)
+    assert result['modules'] == []
+    # generous, importing xarray alone takes longer than this
+    assert result['elapsed'] < 1.0
+
+
+def test_lazy_attributes():
+    result = subprocess.run([sys.executable, '-W', 'ignore', '-c',
+                             'import datacube_sp, xarray; '
+                             'print(datacube_sp.Datacube.__name__, hasattr(xarray.Dataset, "geobox"))'],
+                            check=True, stdout=subprocess.PIPE)
+    assert result.stdout.decode('utf-8').split() == ['Datacube', 'True']
+
+
+@pytest.mark.parametrize('script, registered', [
+    ('import xarray, datacube_sp', 'True'),
+    ('import datacube_sp, xarray', 'True'),
+    ('import datacube_sp, xarray.core.dataset', 'True'),
+    ('import datacube_sp, datacube_sp.utils.dates, xarray', 'True'),
+    ('import datacube_sp, datacube_sp.model, xarray', 'True'),
+])
+def test_xarray_accessors(script, registered):
+    result = subprocess.run([sys.executable, '-W', 'ignore', '-c',
+                             script + '; print(hasattr(xarray.Dataset, "geobox"))'],
+                            check=True, stdout=subprocess.PIPE)
+    assert result.stdout.decode('utf-8').split() == [registered]
@@ -211,6 +211,48 @@ def test_load_data_cbk(tmpdir):
     assert progress_call_data == [(1, 4), (2, 4)]
 
 
+def test_load_data_io_profile(tmpdir):
+    import json
+    from datacube_sp.utils.rio import IOProfile, deactivate_rio_env, get_rio_env
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+    ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=aa, nodata=nodata),
+                                tmpdir,
+                                prefix='ds1-',
+                                timestamp='2018-07-19',
+                                resolution=(15, -15),
+                                offset=(11230, 1381110))
+    sources = Datacube.group_datasets([ds], 'time')
+    mm = [ds.product.measurements['aa']]
+
+    deactivate_rio_env()
+    ds_data = Datacube.load_data(sources, gbox, mm, io_profile='latency')
+    np.testing.assert_array_equal(aa, ds_data.aa.values[0])
+    assert ds_data.attrs['dc_io_profile'] == 'latency'
+    settings = json.loads(ds_data.attrs['dc_io_settings'])
+    assert settings['GDAL_INGESTED_BYTES_AT_OPEN'] == '32768'
+    assert settings['GDAL_CACHEMAX'] >= 64 * 2**20
+    # the reading thread is left configured for the profile
+    assert get_rio_env()['GDAL_INGESTED_BYTES_AT_OPEN'] == 32768
+
+    # the profile travels with the dask graph to the IO threads
+    profile = IOProfile('custom', {'GDAL_NUM_THREADS': 2})
+    ds_data = Datacube.load_data(sources, gbox, mm, dask_chunks={'x': 32, 'y': 32}, io_profile=profile)
+    assert ds_data.attrs['dc_io_profile'] == 'custom'
+    tasks = dict(ds_data.aa.data.dask).values()
+    assert any(isinstance(task, tuple) and task[-1] == profile for task in tasks)
+
+    ds_data = Datacube.load_data(sources, gbox, mm)
+    assert 'dc_io_profile' not in ds_data.attrs
+    assert 'GDAL_INGESTED_BYTES_AT_OPEN' not in get_rio_env()
+    deactivate_rio_env()
+
+    with pytest.raises(ValueError):
+        Datacube.load_data(sources, gbox, mm, io_profile='no-such-profile')
+
+
 def test_hdf5_lock_release_on_failure():
     from datacube_sp.storage._rio import RasterDatasetDataSource, HDF5_LOCK
     from datacube_sp.storage import BandInfo
@@ -2,10 +2,14 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
+from copy import deepcopy
+from unittest import mock
+
 import pytest
 from datacube_sp.testutils.threads import FakeThreadPoolExecutor
 from datacube_sp.testutils import mk_sample_xr_dataset, mk_sample_dataset
-from datacube_sp.testutils.io import native_geobox
+from datacube_sp.testutils import io as testutils_io
+from datacube_sp.testutils.io import native_geobox, native_geobox_union
 
 
 def test_fakethreadpool():
@@ -109,3 +113,30 @@ def test_native_geobox_eo3(eo3_dataset_s2):
 
     with pytest.raises(ValueError):
         native_geobox(ds, ['red_edge_1'])
+
+
+def test_native_geobox_union(eo3_dataset_s2):
+    from datacube_sp.testutils.geom import AlbersGS
+
+    gbox = AlbersGS.tile_geobox((15, -40))
+    gbox2 = AlbersGS.tile_geobox((16, -40))
+    tiles = [mk_sample_dataset([dict(name='a')], geobox=g, product_opts=dict(with_grid_spec=True))
+             for g in (gbox, gbox, gbox2)]
+
+    with mock.patch.object(testutils_io, 'native_geobox', wraps=native_geobox) as counted:
+        assert native_geobox_union(tiles) == gbox | gbox2
+        # one look per distinct tile
+        assert counted.call_count == 2
+
+    ds = eo3_dataset_s2
+    other = deepcopy(ds)
+    other.metadata_doc['id'] = '5b1a5d4c-0f44-4b24-8a0f-a1e0d3a4a7f2'
+    with mock.patch.object(testutils_io, 'native_geobox', wraps=native_geobox) as counted:
+        assert native_geobox_union([ds, other, ds], basis='blue') == native_geobox(ds, basis='blue')
+        assert counted.call_count == 1
+        assert native_geobox_union([ds], ['swir_1', 'swir_2']) == native_geobox(ds, ['swir_1', 'swir_2'])
+
+    with pytest.raises(ValueError):
+        native_geobox_union([ds], ['no_such_band'])
+    with pytest.raises(ValueError):
+        native_geobox_union([ds, other], ['blue', 'swir_1'])
@@ -272,3 +272,157 @@ def test_obtain_new_iam_token(monkeypatch, without_aws_env):
     with moto.mock_iam():
         token = obtain_new_iam_auth_token(url, region_name='us-west-1')
         assert isinstance(token, str)
+
+
+def _mock_s3():
+    moto = pytest.importorskip('moto')
+    # moto>=5 replaced the per service mocks
+    return moto.mock_aws() if hasattr(moto, 'mock_aws') else moto.mock_s3()
+
+
+def test_s3_block_cache(monkeypatch, without_aws_env):
+    from concurrent.futures import ThreadPoolExecutor
+    from datacube_sp.utils.aws import S3BlockCache
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "fake-key-id")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "fake-secret")
+    data = bytes(range(256)) * 40  # 10240 bytes
+    url = "s3://bucket/file.bin"
+
+    with _mock_s3():
+        cache = S3BlockCache(region_name='us-east-1', block_size=1000, max_bytes=5000, max_pool_connections=4)
+        assert cache.s3.meta.config.max_pool_connections == 4
+        cache.s3.create_bucket(Bucket='bucket')
+        assert s3_dump(data, url, s3=cache.s3) is True
+
+        assert cache.size(url) == len(data)
+        assert cache.read(url, (10, 2500)) == data[10:2500]
+        assert (cache.stats.misses, cache.stats.hits, cache.stats.requests) == (3, 0, 1)
+        assert cache.read(url, (1500, 2900)) == data[1500:2900]
+        assert (cache.stats.misses, cache.stats.hits, cache.stats.requests) == (3, 2, 1)
+
+        # only the missing blocks are fetched, past the end of the object is clipped
+        assert cache.read(url, (2000, 20000)) == data[2000:]
+        assert cache.stats.requests == 2
+        assert cache.stats.bytes_fetched == len(data)
+        assert cache.nbytes <= 5000
+        assert cache.stats.evictions == 11 - 5
+
+        with ThreadPoolExecutor(8) as pool:
+            ranges = [(i * 300, i * 300 + 700) for i in range(30)]
+            assert list(pool.map(lambda r: cache.read(url, r), ranges)) == [data[a:b] for a, b in ranges]
+
+        with cache.open(url) as f:
+            assert f.seek(-100, 2) == len(data) - 100
+            assert f.read() == data[-100:]
+            f.seek(5)
+            assert f.read(10) == data[5:15]
+            assert f.tell() == 15
+
+        with pytest.raises(FileNotFoundError):
+            cache.open(url + '-nosuch')
+
+        cache.discard(url)
+        assert cache.nbytes == 0
+
+
+def test_s3_block_cache_prefetch(monkeypatch, without_aws_env):
+    from datacube_sp.utils.aws import S3BlockCache
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "fake-key-id")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "fake-secret")
+    urls = ["s3://bucket/doc{}.yaml".format(i) for i in range(10)]
+
+    with _mock_s3():
+        with S3BlockCache(region_name='us-east-1', block_size=100) as cache:
+            cache.s3.create_bucket(Bucket='bucket')
+            for i, url in enumerate(urls):
+                s3_dump('doc: {}\n'.format(i) * 50, url, s3=cache.s3)
+
+            assert [f.result() for f in cache.prefetch(urls)] == [350] * 10
+            requests = cache.stats.requests
+            assert requests == 10
+            assert cache.stats.misses == 0
+
+            for i, url in enumerate(urls):
+                assert cache.read(url) == ('doc: {}\n'.format(i) * 50).encode('utf8')
+            assert cache.read(urls[0], (348, 1000)) == b'0\n'
+            assert cache.stats.requests == requests
+            assert cache.stats.hits == 10 * 4 + 1
+
+
+def test_s3_block_cache_discard_prefetch(monkeypatch, without_aws_env):
+    import threading
+    from datacube_sp.utils.aws import S3BlockCache
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "fake-key-id")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "fake-secret")
+    urls = ["s3://bucket/a.txt", "s3://bucket/b.txt"]
+
+    with _mock_s3():
+        with S3BlockCache(region_name='us-east-1', max_pool_connections=1) as cache:
+            cache.s3.create_bucket(Bucket='bucket')
+            for url in urls:
+                s3_dump(url, url, s3=cache.s3)
+
+            # hold the only prefetch thread on the first url, so the second one stays queued
+            release = threading.Event()
+            get = cache._get
+
+            def slow_get(url, range):  # pylint: disable=redefined-builtin
+                if url == urls[0]:
+                    release.wait(10)
+                return get(url, range)
+
+            monkeypatch.setattr(cache, '_get', slow_get)
+            fa, fb = cache.prefetch(urls)
+            assert cache.prefetch(urls[1:]) == [fb]
+
+            assert cache.read(urls[1]) == urls[1].encode('utf8')
+            cache.discard(urls[1])
+            release.set()
+
+            assert fa.result() == len(urls[0])
+            assert fb.cancelled()
+            assert cache.stats.requests == 2
+            assert cache.nbytes == len(urls[0])
+
+            # a prefetch dequeued after its object was discarded doesn't fetch it
+            cache.discard(urls[0])
+            assert cache._read_object(urls[0], prefetch=True) is None
+            assert cache.stats.requests == 2
+            assert cache.nbytes == 0
+
+
+def test_s3_block_cache_rasterio(monkeypatch, without_aws_env):
+    import numpy as np
+    rasterio = pytest.importorskip('rasterio')
+    if tuple(int(v) for v in rasterio.__version__.split('.')[:2]) < (1, 4):
+        pytest.skip('needs rasterio>=1.4 for opener')
+    from rasterio.io import MemoryFile
+    from datacube_sp.utils.aws import S3BlockCache
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "fake-key-id")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "fake-secret")
+    url = "s3://bucket/image.tif"
+    image = np.arange(200 * 300, dtype='uint16').reshape(200, 300)
+    with MemoryFile() as mem:
+        with mem.open(driver='GTiff', width=300, height=200, count=1, dtype='uint16', crs='EPSG:3577',
+                      transform=rasterio.Affine(10, 0, 0, 0, -10, 0),
+                      tiled=True, blockxsize=64, blockysize=64) as dst:
+            dst.write(image, 1)
+        tif = mem.read()
+
+    with _mock_s3():
+        cache = S3BlockCache(region_name='us-east-1', block_size=4096)
+        cache.s3.create_bucket(Bucket='bucket')
+        s3_dump(tif, url, s3=cache.s3)
+
+        with rasterio.Env(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR'):
+            with rasterio.open(url, opener=cache.opener) as src:
+                assert src.crs.to_epsg() == 3577
+                np.testing.assert_array_equal(src.read(1, window=((10, 74), (100, 164))), image[10:74, 100:164])
+            requests = cache.stats.requests
+            with rasterio.open(url, opener=cache.opener) as src:
+                np.testing.assert_array_equal(src.read(1, window=((10, 74), (100, 164))), image[10:74, 100:164])
+            assert cache.stats.requests == requests
@@ -2,21 +2,33 @@
 #
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
+import io
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 from pathlib import Path
 import numpy as np
+import pandas as pd
+import rasterio
 import xarray as xr
+import yaml
 from types import SimpleNamespace
 from dask.delayed import Delayed
 import dask
 
 from datacube_sp.testutils import (
     mk_test_image,
+    mk_sample_xr_dataset,
     gen_tiff_dataset,
     remove_crs,
 )
 from datacube_sp.testutils.io import native_load, rio_slurp_xarray, rio_slurp
-from datacube_sp.utils.cog import write_cog, to_cog, _write_cog
+from datacube_sp.index.eo3 import eo3_grid_spatial, is_doc_eo3
+from datacube_sp.utils.cog import write_cog, write_cogs, to_cog, _write_cog, _stream_options
+from datacube_sp.utils import _cog_stream
+from datacube_sp.utils._cog_stream import read_tiff_tags
+from datacube_sp.utils.geometry import GeoBox
+from datacube_sp.utils.math import valid_mask
 
 
 def gen_test_data(prefix, dask=False, shape=None):
@@ -241,3 +253,196 @@ def test_cog_rgba(tmpdir, use_windowed_writes):
             ":mem:",
             use_windowed_writes=use_windowed_writes,
         )
+
+
+def _sample_image(shape, dtype="int16", nodata=-999, nbands=1):
+    xx = mk_sample_xr_dataset(crs="EPSG:3577", shape=shape, name="aa", time=None,
+                              dtype=dtype, nodata=nodata).aa
+    yy, xs = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing="ij")
+    xx.values[:] = (yy * 7 + xs * 3) % 101
+    xx.values[:5, :9] = nodata
+    if nbands == 1:
+        return xx
+    pix = np.stack([xx.values + i for i in range(nbands)], axis=-1)
+    pix[:5, :9] = nodata
+    return xr.DataArray(pix, attrs=xx.attrs, dims=("y", "x", "band"), coords=xx.coords)
+
+
+@pytest.mark.parametrize("dtype, nodata", [("int16", -999), ("uint8", 255), ("float32", np.nan)])
+@pytest.mark.parametrize("nbands", [1, 3])
+@pytest.mark.parametrize("overview_resampling", ["nearest", "average"])
+def test_cog_stream(dtype, nodata, nbands, overview_resampling):
+    xx = _sample_image((130, 200), dtype=dtype, nodata=nodata, nbands=nbands)
+    if nbands == 1:
+        expect = xx.values[np.newaxis]
+    else:
+        expect = xx.values.transpose(2, 0, 1)
+
+    out = io.BytesIO()
+    assert write_cog(xx, out, blocksize=32, overview_levels=[2, 4, 8],
+                     overview_resampling=overview_resampling) is out
+    bb = out.getvalue()
+    assert bb == to_cog(xx.chunk({"y": 50, "x": 70}), blocksize=32, overview_levels=[2, 4, 8],
+                        overview_resampling=overview_resampling).compute()
+
+    with rasterio.MemoryFile(bb) as mem, mem.open() as src:
+        assert src.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+        assert src.overviews(1) == [2, 4, 8]
+        assert src.block_shapes[0] == (32, 32)
+        assert src.crs == xx.geobox.crs
+        assert src.transform == xx.geobox.transform
+        np.testing.assert_array_equal(src.nodata, nodata)
+        np.testing.assert_array_equal(src.read(), expect)
+        ovr = src.read(out_shape=(nbands, 65, 100))
+
+    if overview_resampling == "nearest":
+        np.testing.assert_array_equal(ovr, expect[:, ::2, ::2])
+    else:
+        blocks = expect.astype("float64").reshape(nbands, 65, 2, 100, 2)
+        blocks[~valid_mask(blocks, nodata)] = np.nan
+        mean = np.nanmean(blocks, axis=(2, 4))
+        if dtype != "float32":
+            mean = np.floor(mean + 0.5)
+        mean[np.isnan(mean)] = nodata
+        np.testing.assert_array_equal(ovr, mean.astype(dtype))
+
+    # IFDs first, then overview tiles smallest first, then full resolution tiles
+    ifds = read_tiff_tags(bb)
+    assert [ifd[256][1][0] for ifd in ifds] == [200, 100, 50, 25]
+    first_tile = [min(ifd[324][1]) for ifd in ifds]
+    assert first_tile == sorted(first_tile, reverse=True)
+    assert all(max(ifd[324][1]) < first for ifd, first in zip(ifds[1:], first_tile))
+
+
+def test_cog_stream_options(tmpdir):
+    pp = Path(str(tmpdir))
+    xx = _sample_image((64, 96))
+
+    ff = write_cog(xx, pp / "big.tif", overview_levels=[2], bigtiff="YES", zlevel=9, num_threads=2)
+    assert ff.read_bytes()[:4] == b"II+\x00"
+    np.testing.assert_array_equal(rio_slurp_xarray(ff).values, xx.values)
+
+    ff = write_cog(xx, pp / "raw.tif", overview_levels=[2], compress="none")
+    assert ff.stat().st_size > 64 * 96 * 2
+    np.testing.assert_array_equal(rio_slurp_xarray(ff).values, xx.values)
+
+    assert _stream_options(xx.dtype, [2, 4], None, {}) is not None
+    assert _stream_options(xx.dtype, None, "average", dict(COMPRESS="DEFLATE", PREDICTOR=1)) is not None
+    assert _stream_options(xx.dtype, [3], None, {}) is None
+    assert _stream_options(xx.dtype, None, "bilinear", {}) is None
+    assert _stream_options(xx.dtype, None, None, dict(compress="lzw")) is None
+    assert _stream_options(xx.dtype, None, None, dict(predictor=3)) is None
+    assert _stream_options(np.dtype("complex64"), None, None, {}) is None
+
+    # GDAL fallback, to a stream
+    out = io.BytesIO()
+    write_cog(xx, out, overview_levels=[2], overview_resampling="bilinear", compress="lzw")
+    with rasterio.MemoryFile(out.getvalue()) as mem, mem.open() as src:
+        assert src.compression.name == "lzw"
+        np.testing.assert_array_equal(src.read(1), xx.values)
+
+
+def test_cog_stream_memory(tmpdir, monkeypatch):
+    monkeypatch.setattr(_cog_stream, "SPOOL_MAX_RAM", 1)
+    shape = (8192, 1024)
+    gbox = _sample_image((16, 16)).geobox
+    gbox = GeoBox(shape[1], shape[0], gbox.transform, gbox.crs)
+    pix = dask.array.arange(shape[0] * shape[1], dtype="float32", chunks=shape[1] * 128).reshape(shape)
+    assert pix.chunks[0] == (128,) * 64
+
+    path = Path(str(tmpdir)) / "big.tif"
+    tracemalloc.start()
+    try:
+        _write_cog(pix, gbox, path, blocksize=128, overview_levels=[2, 4, 8])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # memory use depends on the width of the image, not its height: a row of chunks is 512KiB,
+    # the image 32MiB
+    assert peak < pix.nbytes // 4
+
+    with rasterio.open(str(path)) as src:
+        np.testing.assert_array_equal(src.read(1, window=((8000, 8192), (0, 1024))), pix[8000:].compute())
+
+
+def test_cog_stream_dask_schedulers(tmpdir):
+    distributed = pytest.importorskip("distributed")
+    xx = _sample_image((300, 200))
+    xx = xx.copy(data=dask.array.from_array(xx.values, chunks=(64, 200)))
+
+    # local schedulers: the writer loads the array itself, a row of chunks at a time
+    delayed = write_cog(xx, ":mem:")
+    assert not any(xx.data.name in str(key) for key in delayed.dask)
+    with dask.config.set(scheduler="sync"):
+        expect = delayed.compute()
+
+    # with a distributed client the array is a dependency of the writer
+    with distributed.Client(processes=False, n_workers=1, threads_per_worker=2, dashboard_address=None):
+        delayed = write_cog(xx, ":mem:")
+        assert any(xx.data.name in str(key) for key in delayed.dask)
+        assert delayed.compute() == expect
+
+    with rasterio.MemoryFile(expect) as mem, mem.open() as src:
+        np.testing.assert_array_equal(src.read(1), xx.values)
+
+
+def _sample_dataset(shape=(64, 96)):
+    red = _sample_image(shape)
+    green = red.copy(data=red.values[::-1].copy())
+    ds = xr.Dataset({"red": red, "green": green})
+    ds2 = ds.copy(deep=True)
+    ds2.red.values[:] = 17
+    return xr.concat([ds, ds2], dim=pd.Index(pd.to_datetime(["2020-01-02", "2020-02-03"]), name="time"))
+
+
+def test_write_cogs(tmpdir):
+    pp = Path(str(tmpdir))
+    ds = _sample_dataset()
+    assert ds.geobox is not None
+
+    template = str(pp / "{time:%Y%m%d}" / "{band}.tif")
+    out = write_cogs(ds, template, overview_levels=[2], max_workers=3, memory_budget=1, eo3_product="sample")
+    assert out.paths == [pp / "20200102" / "red.tif", pp / "20200102" / "green.tif",
+                         pp / "20200203" / "red.tif", pp / "20200203" / "green.tif"]
+    assert out.nbytes == ds.red.nbytes + ds.green.nbytes
+    assert out.nbytes_written == sum(path.stat().st_size for path in out.paths)
+    assert out.throughput > 0
+
+    for path, (band, index) in zip(out.paths, [("red", 0), ("green", 0), ("red", 1), ("green", 1)]):
+        yy = rio_slurp_xarray(path)
+        assert yy.geobox == ds.geobox
+        assert yy.nodata == ds[band].nodata
+        np.testing.assert_array_equal(yy.values, ds[band].values[index])
+
+    assert out.documents == [path.with_suffix(".odc-metadata.yaml") for path in out.paths]
+    doc = yaml.safe_load(out.documents[1].read_text())
+    assert is_doc_eo3(doc)
+    assert doc["product"] == {"name": "sample"}
+    assert doc["measurements"] == {"green": {"path": "green.tif"}}
+    assert pd.Timestamp(doc["properties"]["datetime"]) == pd.Timestamp("2020-01-02")
+    lat = eo3_grid_spatial(doc)["extent"]["lat"]
+    assert lat["begin"] == pytest.approx(ds.extent.to_crs("EPSG:4326").boundingbox.bottom)
+
+    with pytest.raises(IOError):
+        write_cogs(ds, template, bands=["red"])
+
+    # dask input, on a caller supplied executor, and without a time dimension
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        out = write_cogs(ds.isel(time=1).chunk({"y": 20}), str(pp / "{band}-{index}.tif"), executor=pool)
+    assert out.paths == [pp / "red-0.tif", pp / "green-0.tif"]
+    assert out.documents == []
+    np.testing.assert_array_equal(rio_slurp_xarray(out.paths[0]).values, ds.red.values[1])
+
+    # EO3 documents need a datetime, a scalar time coordinate will do
+    out = write_cogs(ds.isel(time=1), str(pp / "eo3" / "{band}.tif"), eo3_product="sample")
+    doc = yaml.safe_load(out.documents[0].read_text())
+    assert pd.Timestamp(doc["properties"]["datetime"]) == pd.Timestamp("2020-02-03")
+    with pytest.raises(ValueError, match="datetime"):
+        write_cogs(ds.isel(time=1).drop_vars("time"), str(pp / "no-time" / "{band}.tif"), eo3_product="sample")
+    assert not (pp / "no-time").exists()
+
+    with pytest.raises(ValueError, match="different path"):
+        write_cogs(ds, str(pp / "{band}.tif"))
+    with pytest.raises(ValueError):
+        write_cogs(remove_crs(ds.red).to_dataset(), str(pp / "{band}.tif"))
@@ -197,6 +197,36 @@ def test_read_docs_from_s3(sample_document_files, monkeypatch):
             pass
 
 
+def test_read_docs_from_s3_prefetch(monkeypatch, without_aws_env):
+    moto = pytest.importorskip('moto')
+    from datacube_sp.utils.aws import _cache, s3_block_cache, s3_dump
+
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'fake')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'fake')
+    monkeypatch.setattr(_cache, '_DEFAULT', {})
+    urls = ['s3://mybucket/doc{}.yaml'.format(i) for i in range(20)]
+
+    with (moto.mock_aws() if hasattr(moto, 'mock_aws') else moto.mock_s3()):
+        cache = s3_block_cache(region_name='us-east-1', max_pool_connections=4)
+        cache.s3.create_bucket(Bucket='mybucket')
+        for i, url in enumerate(urls):
+            s3_dump('id: {}\n---\nid: {}b\n'.format(i, i), url, s3=cache.s3)
+
+        docs = list(read_documents(*urls, uri=True, prefetch=4))
+        assert [doc['id'] for _, doc in docs] == [v for i in range(20) for v in (i, '{}b'.format(i))]
+        assert docs[1][0] == urls[0] + '#part=1'
+
+        # every document fetched once, and not kept around once read
+        assert cache is s3_block_cache()
+        cache.close()  # wait for any prefetch still running
+        assert cache.stats.requests == 20
+        assert cache.nbytes == 0
+
+        with pytest.raises(InvalidDocException):
+            list(read_documents('s3://mybucket/nosuch.yaml'))
+    cache.close()
+
+
 def test_read_docs_from_http(sample_document_files, httpserver):
     http_docs = []
     for abs_fname, ndocs in sample_document_files:
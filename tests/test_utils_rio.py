@@ -14,6 +14,11 @@ from datacube_sp.utils.rio import (
     set_default_rio_config,
     activate_from_config,
     configure_s3_access,
+    use_io_profile,
+    effective_rio_options,
+    resolve_io_profile,
+    IOProfile,
+    IO_PROFILES,
 )
 
 
@@ -141,6 +146,66 @@ def test_rio_env_via_config():
     assert get_rio_env() == {}
 
 
+def test_io_profile():
+    import pickle
+
+    for name in IO_PROFILES:
+        profile = resolve_io_profile(name, available_memory=8 * 2**30)
+        assert profile.name == name
+        assert 'GDAL_NUM_THREADS' in profile.options
+        assert pickle.loads(pickle.dumps(profile)) == profile
+
+    assert resolve_io_profile('latency', available_memory=8 * 2**30).options['GDAL_CACHEMAX'] == 8 * 2**30 // 20
+    # bounded both ways
+    assert resolve_io_profile('local-nvme', available_memory=2**40).options['GDAL_CACHEMAX'] == 4096 * 2**20
+    assert resolve_io_profile('latency', available_memory=2**20).options['GDAL_CACHEMAX'] == 64 * 2**20
+    assert int(resolve_io_profile('cloud-bulk').options['GDAL_CACHEMAX']) >= 64 * 2**20
+
+    custom = IOProfile('custom', {'GDAL_NUM_THREADS': 4})
+    assert resolve_io_profile(custom) is custom
+    assert custom.options == {'GDAL_NUM_THREADS': 4}
+    assert resolve_io_profile(None) is None
+
+    with pytest.raises(ValueError):
+        resolve_io_profile('no-such-profile')
+
+
+def test_rio_env_io_profile():
+    deactivate_rio_env()
+    set_default_rio_config(aws=None, cloud_defaults=True, FAKE_OPTION='1')
+    profile = IOProfile('test', {'GDAL_NUM_THREADS': '3', 'GDAL_HTTP_MAX_RETRY': '2'})
+
+    ee = activate_from_config()
+    assert ee['GDAL_HTTP_MAX_RETRY'] == 10
+    assert 'GDAL_NUM_THREADS' not in ee
+
+    with use_io_profile(profile):
+        ee = activate_from_config()
+        assert ee['GDAL_NUM_THREADS'] == 3
+        assert ee['GDAL_HTTP_MAX_RETRY'] == 2
+        assert ee['FAKE_OPTION'] == 1
+
+        # same profile, e.g. unpickled in the next dask task: nothing to do
+        with use_io_profile(IOProfile('test', dict(profile.options))):
+            assert activate_from_config() is None
+        with use_io_profile(None):
+            assert activate_from_config() is None
+
+    # back to the defaults on next open
+    ee = activate_from_config()
+    assert 'GDAL_NUM_THREADS' not in ee
+    assert activate_from_config() is None
+
+    assert effective_rio_options(profile) == dict(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
+                                                  GDAL_HTTP_MAX_RETRY='2',
+                                                  GDAL_HTTP_RETRY_DELAY='0.5',
+                                                  GDAL_NUM_THREADS='3',
+                                                  FAKE_OPTION='1')
+
+    set_default_rio_config()
+    deactivate_rio_env()
+
+
 def test_rio_configure_aws_access(monkeypatch, without_aws_env, dask_client):
     monkeypatch.setenv("AWS_ACCESS_KEY_ID", "fake-key-id")
     monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "fake-secret")
@@ -3,10 +3,13 @@
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
 import numpy as np
+import pytest
 from affine import Affine
 import rasterio
+import rasterio.crs
 from datacube_sp.utils.geometry import warp_affine, rio_reproject, gbox as gbx
-from datacube_sp.utils.geometry._warp import resampling_s2rio, is_resampling_nn
+from datacube_sp.utils.geometry._warp import (resampling_s2rio, is_resampling_nn, warp_options, warp_affine_np,
+                                              warp_affine_rio)
 
 from datacube_sp.testutils.geom import (
     AlbersGS,
@@ -73,6 +76,75 @@ def test_warp():
     assert (dst[:, 20:] == -3).all()
 
 
+@pytest.mark.parametrize("resampling", ['nearest', 'bilinear', 'average'])
+@pytest.mark.parametrize("nodata", [None, 7])
+@pytest.mark.parametrize("A, shape", [
+    (Affine.scale(2), (48, 40)),
+    (Affine.scale(3, 2), (48, 26)),
+    (Affine.translation(0.3, 0.6)*Affine.scale(1.5), (63, 52)),
+    (Affine.translation(0.2, 0.1)*Affine.scale(0.5), (190, 160)),
+])
+def test_warp_affine_np(resampling, nodata, A, shape):
+    rng = np.random.default_rng(1)
+    src = (rng.random((97, 81))*100).astype('float32')
+    src[rng.random(src.shape) < 0.1] = 7
+
+    expect = np.full(shape, -1, dtype='float32')
+    warp_affine_rio(src, expect, A, resampling, src_nodata=nodata, dst_nodata=nodata)
+
+    dst = np.full(shape, -1, dtype='float32')
+    assert warp_affine_np(src, dst, A, resampling, src_nodata=nodata, dst_nodata=nodata) is dst
+    np.testing.assert_allclose(dst, expect, rtol=1e-5)
+
+    # same result with threads, and rounded for integer output
+    dst_mt = np.full(shape, -1, dtype='float32')
+    warp_affine_np(src, dst_mt, A, resampling, src_nodata=nodata, dst_nodata=nodata, num_threads=3)
+    np.testing.assert_array_equal(dst, dst_mt)
+
+    dst_i = np.zeros(shape, dtype='int16')
+    warp_affine_np(src, dst_i, A, resampling, src_nodata=nodata, dst_nodata=nodata)
+    np.testing.assert_array_equal(dst_i, np.floor(dst + 0.5))
+
+
+def test_warp_affine_backend():
+    src = np.zeros((16, 16), dtype='uint8')
+    src[4:8, 4:8] = 3
+    dst = np.zeros((8, 8), dtype='uint8')
+    for backend in (None, 'numpy', 'rio'):
+        dst[:] = 0
+        warp_affine(src, dst, Affine.scale(2), 'average', backend=backend)
+        assert (dst[2:4, 2:4] == 3).all()
+        assert dst.sum() == 12
+
+    with pytest.raises(ValueError):
+        warp_affine(src, dst, Affine.scale(2), 'average', backend='no-such-backend')
+
+    with pytest.raises(ValueError):
+        warp_affine_np(src, dst, Affine.rotation(10), 'nearest')
+
+    with pytest.raises(ValueError):
+        warp_affine_np(src, dst, Affine.scale(2), 'cubic')
+
+    # falls back to GDAL for anything else
+    warp_affine(src, dst, Affine.scale(2), 'cubic')
+    warp_affine(src, dst, Affine.scale(2)*Affine.rotation(10), 'nearest')
+
+
+@pytest.mark.parametrize("resampling", ['nearest', 'bilinear', 'average'])
+@pytest.mark.parametrize("A, shape", [
+    (Affine.scale(2.5), (40, 40)),
+    (Affine.translation(-3.2, -7.7)*Affine.scale(0.5), (60, 60)),
+])
+def test_warp_affine_past_source_edge(resampling, A, shape):
+    # destination extends past the source: GDAL clips its kernels there, the default backend must match it
+    rng = np.random.default_rng(2)
+    src = rng.integers(0, 200, (60, 50)).astype('uint8')
+
+    expect = warp_affine_rio(src, np.zeros(shape, dtype='uint8'), A, resampling)
+    dst = warp_affine(src, np.zeros(shape, dtype='uint8'), A, resampling)
+    np.testing.assert_array_equal(dst, expect)
+
+
 def test_rio_reproject():
     src = np.zeros((128, 256),
                    dtype='int16')
@@ -118,3 +190,25 @@ def test_rio_reproject():
     assert (dst[:10, :20] == 33).all()
     assert (dst[10:, :] == -3).all()
     assert (dst[:, 20:] == -3).all()
+
+    # int8 with no-data that doesn't fit in int8
+    dst = np.zeros_like(src)
+    dst_ = rio_reproject(src, dst,
+                         s_gbox,
+                         gbx.translate_pix(s_gbox, 30, 10),
+                         src_nodata=0,
+                         dst_nodata=-300,
+                         resampling='nearest')
+    assert dst_ is dst
+    assert (dst[:10, :20] == 33).all()
+    assert (dst[10:, :] == np.int16(-300).astype('int8')).all()
+
+
+def test_warp_options():
+    opts = warp_options(str(AlbersGS.crs), 'EPSG:4326')
+    assert warp_options(str(AlbersGS.crs), 'EPSG:4326') is opts
+    assert opts['src_crs'] == rasterio.crs.CRS.from_user_input(str(AlbersGS.crs))
+    assert opts['dst_crs'] == rasterio.crs.CRS.from_epsg(4326)
+
+    opts = warp_options('EPSG:3577', 'EPSG:3577')
+    assert opts['src_crs'] is opts['dst_crs']
@@ -6,7 +6,14 @@
 Module
 """
 
-from datacube_sp.ui.task_app import task_app, run_tasks, wrap_task
+from types import SimpleNamespace
+
+import numpy
+import pytest
+import xarray
+
+from datacube_sp.ui.task_app import QueueDepth, count_sources, task_app, task_id, run_tasks, wrap_task
+from datacube_sp.ui.task_journal import TaskJournal
 import datacube_sp.executor
 
 
@@ -182,6 +189,131 @@ def test_run_tasks():
     run_tasks(tasks, executor, task_func)
 
 
+def test_queue_depth():
+    # workers run tasks in 1s, queued tasks wait for a free worker
+    workers = 8
+    depth = QueueDepth(limit=100, initial=workers)
+    assert depth.size == workers
+    for _ in range(200):
+        depth.observe(max(1, depth.size / workers))
+    assert workers < depth.size <= 2 * workers
+
+    # tasks are quick to run, but the limit is tight
+    depth = QueueDepth(limit=3, initial=workers)
+    assert depth.size == 3
+    for _ in range(20):
+        depth.observe(0.1)
+    assert depth.size == 3
+
+
+def test_queue_depth_slow_start():
+    # tasks never queue, the depth doubles every round of tasks
+    depth = QueueDepth(limit=100, initial=2)
+    sizes = []
+    for _ in range(14):
+        depth.observe(1)
+        sizes.append(depth.size)
+    assert sizes == [2, 4, 4, 4, 4, 8, 8, 8, 8, 8, 8, 8, 8, 16]
+    assert depth.slow_start
+
+    # until tasks start waiting for a worker, then it is tuned one task at a time
+    depth.observe(2)
+    assert not depth.slow_start
+    assert depth.size == 16
+
+
+def test_run_tasks_starts_from_worker_count():
+    executor = datacube_sp.executor.get_executor(None, 3, threads=True)
+    events = []
+
+    def task_func(task):
+        return task
+
+    def tasks():
+        for i in range(3):
+            events.append(i)
+            yield {'tile_index': (0, i)}
+
+    # all the tasks for the workers are submitted before the first one completes
+    assert run_tasks(tasks(), executor, task_func, process_result=lambda _: events.append('done')) == (3, 0)
+    assert events[:3] == [0, 1, 2]
+
+
+def test_run_tasks_journal(tmpdir):
+    executor = datacube_sp.executor.SerialExecutor()
+    journal = str(tmpdir.join('journal.db'))
+    calls = []
+    flaky = {'tile_index': (0, 1), 'fails': 1}
+
+    def task_func(task):
+        calls.append(task['tile_index'])
+        if task.get('fails', 0) >= calls.count(task['tile_index']):
+            raise ValueError('failed {}'.format(task['tile_index']))
+        return task['tile_index']
+
+    def tasks():
+        yield {'tile_index': (0, 0)}
+        yield flaky
+        yield {'tile_index': (0, 2), 'fails': 100}
+
+    # the flaky task succeeds on its second attempt, the last one always fails
+    assert run_tasks(tasks(), executor, task_func, journal=journal, retries=1, retry_delay=0.01) == (2, 1)
+    assert calls == [(0, 0), (0, 1), (0, 2), (0, 1), (0, 2)]
+
+    with TaskJournal(journal) as jn:
+        assert jn.summary() == {'done': 2, 'failed': 1}
+        assert jn.attempts('(0, 1)') == 2
+        assert jn.status('(0, 2)') == 'failed'
+        assert jn.status('(1, 1)') is None
+
+    # resuming only runs the unfinished task
+    calls.clear()
+    assert run_tasks(tasks(), executor, task_func, journal=TaskJournal(journal)) == (0, 1)
+    assert calls == [(0, 2)]
+
+
+def test_run_tasks_journal_task_id(tmpdir):
+    executor = datacube_sp.executor.SerialExecutor()
+    journal = str(tmpdir.join('journal.db'))
+    assert task_id({'tile_index': (1, 2)}) == '(1, 2)'
+
+    # no stable id to resume from
+    with pytest.raises(ValueError, match='get_task_id'):
+        task_id({'path': 'a.nc'})
+    calls = []
+
+    def task_func(task):
+        calls.append(task)
+
+    with pytest.raises(ValueError, match='get_task_id'):
+        run_tasks([{'path': 'a.nc'}], executor, task_func, journal=journal)
+    assert calls == []
+
+    tasks = [{'path': 'a.nc'}, {'path': 'b.nc'}]
+    assert run_tasks(tasks, executor, task_func, journal=journal,
+                     get_task_id=lambda task: task['path']) == (2, 0)
+    with TaskJournal(journal) as jn:
+        assert jn.status('a.nc') == 'done'
+
+
+def test_run_tasks_cost_order():
+    executor = datacube_sp.executor.SerialExecutor()
+
+    def mk_task(i):
+        # tiles with two time slices, of (i % 3) and 1 datasets
+        sources = numpy.empty(2, dtype=object)
+        sources[:] = [(None,) * (i % 3), (None,)]
+        return {'tile_index': i, 'tile': SimpleNamespace(sources=xarray.DataArray(sources, dims=('time',)))}
+
+    tasks = [mk_task(i) for i in range(6)]
+    assert [count_sources(task) for task in tasks] == [1, 2, 3, 1, 2, 3]
+    assert count_sources({'tile_index': 0}) == 0
+
+    done = []
+    run_tasks(tasks, executor, lambda task: task['tile_index'], done.append, task_cost=count_sources)
+    assert done == [2, 5, 1, 4, 0, 3]
+
+
 def test_wrap_task():
     def task_with_args(task, a, b):
         return (task, a, b)